@@ -0,0 +1,80 @@
+"""
+Measure search latency of the SQLite message cache.
+
+Fills a MessageCache with one mailbox of generated messages (the listing a
+sync stores) and times searches like the ones search_messages serves from it:
+substring filters of three or more characters go through the FTS5 trigram
+index, shorter ones through LIKE. The sync time is the cost of storing the
+listing only; listing the mailbox from Mail comes on top (see bench_jxa.py).
+
+Usage:
+    python benchmarks/bench_cache.py [--messages 500000] [--repeat 20] [--path :memory:]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Any
+
+from apple_mail_mcp.memory_backend import format_date
+from apple_mail_mcp.message_cache import MessageCache
+
+SENDERS = 500
+TOPICS = ["invoice", "weekly update", "meeting notes", "release", "travel plans", "lunch"]
+
+
+def listing(messages: int) -> list[dict[str, Any]]:
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "id": str(100000 + i),
+            "subject": f"{TOPICS[i % len(TOPICS)].title()} #{i}",
+            "sender": f"Person {i % SENDERS} <person{i % SENDERS}@example.com>",
+            "date_received": format_date(start + timedelta(minutes=i)),
+            "read_status": i % 3 == 0,
+        }
+        for i in range(messages)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=500_000, help="messages in the mailbox")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per search")
+    parser.add_argument("--path", default=":memory:", help="database file")
+    args = parser.parse_args()
+
+    cache = MessageCache(args.path)
+    rows = listing(args.messages)
+    started = time.perf_counter()
+    cache.store_mailbox("Account 0", "INBOX", rows)
+    print(f"{args.messages} messages stored in {time.perf_counter() - started:.2f} s")
+
+    cases = {
+        "newest 50": {"limit": 50},
+        "unread, limit 50": {"read_status": False, "limit": 50},
+        "sender (FTS)": {"sender_contains": "person7@"},
+        "subject (FTS), limit 10": {"subject_contains": "meeting", "limit": 10},
+        "sender + subject (FTS)": {"sender_contains": "person42@", "subject_contains": "invoice"},
+        "subject (LIKE, 2 chars)": {"subject_contains": "#9", "limit": 50},
+    }
+    print(f"{'':28s}{'median':>10s}{'p95':>10s}{'rows':>8s}")
+    for name, filters in cases.items():
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = cache.search("Account 0", "INBOX", **filters)
+            times.append(time.perf_counter() - started)
+        times.sort()
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        print(
+            f"{name:28s}{statistics.median(times) * 1000:8.2f}ms{p95 * 1000:8.2f}ms"
+            f"{len(result):8d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
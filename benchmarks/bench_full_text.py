@@ -0,0 +1,99 @@
+"""
+Measure query latency of the full-text body index.
+
+Fills a BodyIndex with generated messages (bodies of a few dozen words drawn
+from a Zipf-like vocabulary, so some words are in most messages and most are
+rare) and times full_text_search queries: rare and common words, phrases,
+prefixes and exclusions. BM25 scores every match, so queries for words that
+occur in a large share of the messages are the slowest.
+
+Usage:
+    python benchmarks/bench_full_text.py [--messages 1000000] [--repeat 20] [--path :memory:]
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import statistics
+import time
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from typing import Any
+
+from apple_mail_mcp.body_index import BodyIndex
+from apple_mail_mcp.memory_backend import format_date
+
+VOCABULARY = 20_000
+BATCH = 10_000
+
+
+def word(rank: int) -> str:
+    return f"w{rank}"
+
+
+def messages(count: int, seed: int = 0) -> Iterator[dict[str, Any]]:
+    rng = random.Random(seed)
+    # Zipf-like: the word of rank r is drawn with probability ~ 1/r
+    cumulative = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+    ranks = range(1, VOCABULARY + 1)
+    start = datetime(2025, 1, 1)
+
+    def text(words: int) -> str:
+        return " ".join(word(rank) for rank in rng.choices(ranks, cum_weights=cumulative, k=words))
+
+    for i in range(count):
+        yield {
+            "id": str(100000 + i),
+            "subject": text(5),
+            "sender": f"person{i % 500}@example.com",
+            "date_received": format_date(start + timedelta(minutes=i)),
+            "content": text(40),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=1_000_000, help="indexed messages")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    parser.add_argument("--path", default=":memory:", help="database file")
+    args = parser.parse_args()
+
+    index = BodyIndex(args.path)
+    started = time.perf_counter()
+    batch: list[dict[str, Any]] = []
+    for message in messages(args.messages):
+        batch.append(message)
+        if len(batch) == BATCH:
+            index.add("Account 0", "INBOX", batch)
+            batch = []
+    index.add("Account 0", "INBOX", batch)
+    print(f"{args.messages} messages indexed in {time.perf_counter() - started:.2f} s")
+
+    cases = {
+        "rare word": word(15_000),
+        "medium word": word(500),
+        "two rare words": f"{word(3_000)} {word(4_000)}",
+        "phrase": f'"{word(1)} {word(2)}"',
+        "prefix": f"{word(1234)}*",
+        "exclusion": f"{word(300)} -{word(1)}",
+        "common word": word(20),
+    }
+    print(f"{'':20s}{'median':>10s}{'p95':>10s}{'rows':>8s}")
+    for name, query in cases.items():
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = index.search(query, limit=20)
+            times.append(time.perf_counter() - started)
+        times.sort()
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        print(
+            f"{name:20s}{statistics.median(times) * 1000:8.2f}ms{p95 * 1000:8.2f}ms"
+            f"{len(result):8d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
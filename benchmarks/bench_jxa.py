@@ -0,0 +1,155 @@
+"""
+Compare Apple Event counts and wall time of the AppleScript and JXA readers.
+
+Runs AppleMailConnector and JXAMailConnector against a stubbed osascript
+(installed through the script_runner hook) that stands in for Mail: it
+counts the Apple Events each script would send for a mailbox of the given
+size, sleeps --event-cost seconds per event and returns output in the
+script's format (wire records or JSON columns), so the numbers include the
+connector's parsing. Event counts follow the templates' access patterns:
+
+    AppleScript listing   1 read per property (of a range or whose set),
+                          plus 1 count for a limit without filters
+    JXA listing           2 existence checks, then 1 read per property
+
+Every event costs the same here; the larger replies of whole-column reads
+are only reflected in the parsing time.
+
+Usage:
+    python benchmarks/bench_jxa.py [--messages 2000] [--event-cost 0.0002]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+from apple_mail_mcp import jxa_connector, templates, wire
+from apple_mail_mcp.mail_connector import AppleMailConnector, script_runner
+
+SENDERS = 50
+
+
+class FakeCache:
+    """Script cache that remembers which source each fake path stands for."""
+
+    def __init__(self) -> None:
+        self.sources: dict[str, str] = {}
+
+    def path_for(self, source: str, language: str = "AppleScript") -> Path:
+        path = f"/fake/{templates.script_digest(source)}.scpt"
+        self.sources[path] = source
+        return Path(path)
+
+
+class FakeMail:
+    """Stubbed osascript: models Apple Events and answers search/list scripts."""
+
+    def __init__(self, cache: FakeCache, messages: int, accounts: int, event_cost: float) -> None:
+        self.cache = cache
+        self.event_cost = event_cost
+        self.events = 0
+        self.accounts = [(f"Account {i}", f"user{i}@example.com") for i in range(accounts)]
+        self.rows = [
+            [
+                str(100000 + i),
+                f"Weekly update #{i}",
+                f"Person {i % SENDERS} <person{i % SENDERS}@example.com>",
+                "Monday, January 6, 2025 at 9:15:00 AM",
+                i % 3 == 0,
+                "20094:33300",
+            ]
+            for i in range(messages)
+        ]
+
+    def __call__(
+        self, command: list[str], stdin: str | None, timeout: float
+    ) -> tuple[int, str, str]:
+        jxa = command[1] == "-l"
+        path, args = (command[3], command[4:]) if jxa else (command[1], command[2:])
+        source = self.cache.sources[path]
+
+        if source in (templates.LIST_ACCOUNTS, jxa_connector.LIST_ACCOUNTS):
+            events, output = self.list_accounts(jxa)
+        else:
+            events, output = self.search(jxa, args)
+
+        self.events += events
+        time.sleep(events * self.event_cost)
+        return 0, output + "\n", ""
+
+    def list_accounts(self, jxa: bool) -> tuple[int, str]:
+        if jxa:
+            names, emails = zip(*self.accounts, strict=True)
+            return 2, json.dumps({"name": names, "email": emails})
+        return 1 + 2 * len(self.accounts), wire.encode_records(self.accounts)
+
+    def search(self, jxa: bool, args: list[str]) -> tuple[int, str]:
+        sender, limit = args[2], int(args[5])
+        matches = [row for row in self.rows if sender in row[2]]
+        if limit:
+            matches = matches[:limit]
+
+        if jxa:
+            keys = ("id", "subject", "sender", "date_received", "read_status")
+            columns = {key: [row[i] for row in matches] for i, key in enumerate(keys)}
+            # formatDate and epochSeconds each read the dates
+            columns["timestamp"] = [1736151300] * len(matches)
+            return 2 + 6, json.dumps(columns)
+
+        # One read per column; a limit without filters counts the mailbox first
+        events = 5 + (1 if limit and not sender else 0)
+        return events, wire.encode_columns(matches)
+
+
+def measure(connector: AppleMailConnector, fake: FakeMail, call: Any) -> tuple[int, float, int]:
+    fake.events = 0
+    token = script_runner.set(fake)
+    try:
+        started = time.perf_counter()
+        result = call(connector)
+        elapsed = time.perf_counter() - started
+    finally:
+        script_runner.reset(token)
+    return fake.events, elapsed, len(result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=2000, help="messages in the mailbox")
+    parser.add_argument("--accounts", type=int, default=8)
+    parser.add_argument("--event-cost", type=float, default=0.0002, help="seconds per Apple Event")
+    args = parser.parse_args()
+
+    cases = {
+        "list_accounts": lambda c: c.list_accounts(),
+        "search (all)": lambda c: c.search_messages("Account 0"),
+        "search (limit 50)": lambda c: c.search_messages("Account 0", limit=50),
+        "search (sender)": lambda c: c.search_messages("Account 0", sender_contains="person7@"),
+        "search (sender, limit 10)": lambda c: c.search_messages(
+            "Account 0", sender_contains="person7@", limit=10
+        ),
+    }
+
+    cache = FakeCache()
+    fake = FakeMail(cache, args.messages, args.accounts, args.event_cost)
+    applescript = AppleMailConnector(script_cache=cache)  # type: ignore[arg-type]
+    jxa = jxa_connector.JXAMailConnector(script_cache=cache)  # type: ignore[arg-type]
+
+    print(f"{args.messages} messages, {args.event_cost * 1000:g} ms per Apple Event")
+    print(f"{'':28s}{'AppleScript':>24s}{'JXA':>24s}")
+    for name, call in cases.items():
+        as_events, as_time, as_rows = measure(applescript, fake, call)
+        jxa_events, jxa_time, jxa_rows = measure(jxa, fake, call)
+        assert as_rows == jxa_rows, f"{name}: {as_rows} != {jxa_rows} rows"
+        print(
+            f"{name:28s}{as_events:8d} ev {as_time * 1000:9.1f} ms"
+            f"{jxa_events:8d} ev {jxa_time * 1000:9.1f} ms   ({as_rows} rows)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Load-test the MCP tool handlers against the in-memory backend.
+
+Runs concurrent clients that call the server's tool functions (the same
+coroutines FastMCP dispatches to) with a mix of reads and mutations, and
+reports throughput, latency percentiles and the scheduler/coalescing
+counters. With --latency 0 the numbers are the server's own overhead; with a
+realistic latency they show how scheduling and coalescing shape a burst.
+
+Usage:
+    python benchmarks/bench_server.py [--clients 32] [--requests 2000] [--latency 0.0]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Any
+
+
+async def client(
+    server: Any, rng: random.Random, requests: int, latencies: list[float], ids: list[str]
+) -> int:
+    failures = 0
+    for _ in range(requests):
+        choice = rng.random()
+        started = time.perf_counter()
+        if choice < 0.4:
+            result = await server.search_messages("Work", limit=50)
+        elif choice < 0.7:
+            result = await server.get_message(rng.choice(ids))
+        elif choice < 0.8:
+            result = await server.list_accounts()
+        elif choice < 0.9:
+            result = await server.get_attachments(rng.choice(ids))
+        else:
+            result = await server.mark_as_read([rng.choice(ids)], read=rng.random() < 0.5)
+        latencies.append(time.perf_counter() - started)
+        failures += not result["success"]
+    return failures
+
+
+async def run(clients: int, requests: int) -> None:
+    from apple_mail_mcp import server
+
+    ids = [m["id"] for m in server.mail.connector.search_messages("Work", limit=1000)]
+    latencies: list[float] = []
+    rng = random.Random(42)
+
+    started = time.perf_counter()
+    failures = await asyncio.gather(
+        *(
+            client(server, random.Random(rng.random()), requests // clients, latencies, ids)
+            for _ in range(clients)
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    stats = server.mail.connector.stats()
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f}s")
+    print(f"  throughput  {len(latencies) / elapsed:10.0f} req/s")
+    print(f"  p50         {latencies[len(latencies) // 2] * 1000:10.3f} ms")
+    print(f"  p99         {latencies[int(len(latencies) * 0.99)] * 1000:10.3f} ms")
+    print(f"  failures    {sum(failures):10d}")
+    print(f"  coalesced   {stats['coalescing']['coalesced']:10d}")
+    for name, lane in stats["scheduler"]["lanes"].items():
+        print(
+            f"  {name:12s}completed {lane['completed']:6d}  rejected {lane['rejected']:5d}"
+            f"  p95 wait {lane['p95_wait'] * 1000:8.2f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per backend call")
+    parser.add_argument("--messages", type=int, default=1000, help="messages per mailbox")
+    args = parser.parse_args()
+
+    # The server creates its backend at import time
+    os.environ["APPLE_MAIL_MCP_BACKEND"] = "memory"
+    os.environ["APPLE_MAIL_MCP_MEMORY_LATENCY"] = str(args.latency)
+    os.environ["APPLE_MAIL_MCP_MEMORY_MESSAGES"] = str(args.messages)
+
+    asyncio.run(run(args.clients, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark parsing of search output.
+
+Compares the record encoding in apple_mail_mcp.wire against the previous
+"|"/linefeed format (split per line, then per field) on synthetic search
+results, and checks that adversarial subjects survive the round trip.
+
+Usage:
+    python benchmarks/bench_wire.py [--rows 100000] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any
+
+from apple_mail_mcp import wire
+
+ADVERSARIAL = [
+    "Re: a|b|c",
+    "Line one\nLine two",
+    "Q3 | Budget\r\nDraft",
+    f"Unit{wire.FIELD_SEP}separator",
+    f"Record{wire.RECORD_SEP}separator",
+    f"Escape{wire.ESCAPE}e",
+]
+
+
+def make_rows(count: int, adversarial_ratio: float) -> list[list[Any]]:
+    rng = random.Random(42)
+    rows = []
+    for index in range(count):
+        if rng.random() < adversarial_ratio:
+            subject = rng.choice(ADVERSARIAL)
+        else:
+            subject = f"Weekly update #{index} for project {rng.randint(1, 500)}"
+        rows.append(
+            [
+                str(100000 + index),
+                subject,
+                f"Person {index % 977} <person{index % 977}@example.com>",
+                "Monday, 6 January 2025 at 09:15:00",
+                index % 3 == 0,
+                "20094:33300",
+            ]
+        )
+    return rows
+
+
+def legacy_encode(rows: list[list[Any]]) -> str:
+    return "\n".join(
+        "|".join(("true" if v else "false") if isinstance(v, bool) else str(v) for v in row)
+        for row in rows
+    )
+
+
+def legacy_parse(output: str) -> list[dict[str, Any]]:
+    messages = []
+    for line in output.split("\n"):
+        if not line:
+            continue
+        parts = line.split("|")
+        if len(parts) >= 5:
+            messages.append(
+                {
+                    "id": parts[0],
+                    "subject": parts[1],
+                    "sender": parts[2],
+                    "date_received": parts[3],
+                    "read_status": parts[4].lower() == "true",
+                }
+            )
+    return messages
+
+
+def best_of(repeat: int, fn, *args) -> tuple[float, Any]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for ratio in (0.0, 0.01, 0.5):
+        rows = make_rows(args.rows, ratio)
+        encoded = wire.encode_records(rows)
+        legacy = legacy_encode(rows)
+
+        wire_time, records = best_of(args.repeat, wire.MESSAGE_SUMMARY.parse, encoded)
+        legacy_time, legacy_records = best_of(args.repeat, legacy_parse, legacy)
+
+        correct = [r["subject"] for r in records] == [row[1] for row in rows]
+        legacy_correct = [r["subject"] for r in legacy_records] == [row[1] for row in rows]
+
+        print(
+            f"{args.rows} rows, {ratio:.0%} adversarial: "
+            f"wire {wire_time * 1000:.1f} ms ({args.rows / wire_time:,.0f} rows/s, "
+            f"correct={correct}); "
+            f"legacy {legacy_time * 1000:.1f} ms (correct={legacy_correct}, "
+            f"{len(legacy_records)} rows parsed)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Asyncio front end for the Apple Mail connector.
+
+Connector methods keep their synchronous logic (argument validation, script
+selection, output parsing) and run in a worker thread, but every osascript
+process they start is created on the event loop with
+``asyncio.create_subprocess_exec``. Slow calls therefore no longer block
+other requests, timeouts kill the process, and cancelling the awaiting task
+kills the script that is in flight.
+
+Calls run on a dedicated thread pool sized to the connector's scheduler
+capacity, so threads parked in one lane's queue can never use up the threads
+another lane needs.
+
+Any MailBackend can be wrapped; backends that don't run osascript (such as
+the in-memory backend) simply never use the event-loop script runner.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import copy
+import logging
+import subprocess
+import threading
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+from typing import Any, TypeVar
+
+from .backend import DEFAULT_MAX_MATCHING, MailBackend, MutationResult, SavedAttachments
+from .body_index import DEFAULT_INDEX_BATCH
+from .exceptions import MailOperationCancelledError
+from .mail_connector import AppleMailConnector, script_runner
+from .timeouts import AdaptiveTimeouts
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def run_osascript(
+    command: list[str], script_input: str | None, timeout: float
+) -> tuple[int, str, str]:
+    """
+    Run an osascript command line as an asyncio subprocess.
+
+    The process is killed if it exceeds the timeout or if the awaiting task
+    is cancelled.
+
+    Args:
+        command: Command line to execute
+        script_input: Text to send on stdin (None for no input)
+        timeout: Timeout in seconds
+
+    Returns:
+        Tuple of (returncode, stdout, stderr)
+
+    Raises:
+        subprocess.TimeoutExpired: If the process exceeds the timeout
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE if script_input is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(script_input.encode("utf-8") if script_input is not None else None),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        await _kill(process)
+        raise subprocess.TimeoutExpired(command, timeout) from None
+    except asyncio.CancelledError:
+        await _kill(process)
+        raise
+
+    assert process.returncode is not None
+    return process.returncode, stdout.decode("utf-8"), stderr.decode("utf-8")
+
+
+async def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        logger.debug(f"Killing osascript process {process.pid}")
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
+
+class AsyncAppleMailConnector:
+    """Async interface to Apple Mail, mirroring AppleMailConnector."""
+
+    def __init__(
+        self,
+        connector: MailBackend | None = None,
+        executor: concurrent.futures.Executor | None = None,
+    ) -> None:
+        """
+        Initialize the async connector.
+
+        Args:
+            connector: Backend whose methods are run (default: a new
+                AppleMailConnector)
+            executor: Executor that runs connector methods (default: a thread
+                pool with one thread per request the scheduler can hold)
+        """
+        self.connector: MailBackend = connector or AppleMailConnector()
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.connector.scheduler.capacity + 1,
+            thread_name_prefix="apple-mail",
+        )
+        self.timeout: float | None = None
+
+    def with_timeout(self, seconds: float | None) -> AsyncAppleMailConnector:
+        """
+        Return a view of this connector whose scripts use a fixed timeout.
+
+        Args:
+            seconds: Timeout in seconds for every script the returned
+                connector runs, or None for the adaptive timeouts
+
+        Returns:
+            Connector sharing this one's connector and executor
+        """
+        if seconds is None:
+            return self
+        view = copy.copy(self)
+        view.timeout = seconds
+        return view
+
+    async def _call(self, method: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a connector method with its scripts executed on the event loop.
+
+        Args:
+            method: Bound connector method
+            *args: Positional arguments for the method
+            **kwargs: Keyword arguments for the method
+
+        Returns:
+            The method's return value
+
+        Raises:
+            asyncio.CancelledError: If the call is cancelled (in-flight
+                scripts are killed)
+        """
+        loop = asyncio.get_running_loop()
+        inflight: set[concurrent.futures.Future[tuple[int, str, str]]] = set()
+        cancelled = threading.Event()
+
+        def run_script(
+            command: list[str], script_input: str | None, timeout: float
+        ) -> tuple[int, str, str]:
+            if cancelled.is_set():
+                raise MailOperationCancelledError("Request was cancelled")
+
+            future = asyncio.run_coroutine_threadsafe(
+                run_osascript(command, script_input, timeout), loop
+            )
+            inflight.add(future)
+            try:
+                return future.result()
+            except concurrent.futures.CancelledError:
+                raise MailOperationCancelledError("Request was cancelled") from None
+            finally:
+                inflight.discard(future)
+
+        def target() -> T:
+            token = script_runner.set(run_script)
+            try:
+                with AdaptiveTimeouts.override(self.timeout):
+                    return method(*args, **kwargs)
+            finally:
+                script_runner.reset(token)
+
+        task = loop.run_in_executor(self.executor, target)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            cancelled.set()
+            for future in list(inflight):
+                future.cancel()
+            raise
+
+    async def list_accounts(self) -> list[dict[str, Any]]:
+        """List all mail accounts."""
+        return await self._call(self.connector.list_accounts)
+
+    async def list_mailboxes(self, account: str) -> list[dict[str, Any]]:
+        """List all mailboxes for an account."""
+        return await self._call(self.connector.list_mailboxes, account)
+
+    async def search_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Search for messages matching criteria (a MessagePage, newest first)."""
+        return await self._call(
+            self.connector.search_messages,
+            account=account,
+            mailbox=mailbox,
+            sender_contains=sender_contains,
+            subject_contains=subject_contains,
+            read_status=read_status,
+            limit=limit,
+            cursor=cursor,
+            received_after=received_after,
+            received_before=received_before,
+            query=query,
+        )
+
+    async def get_message(self, message_id: str, include_content: bool = True) -> dict[str, Any]:
+        """Get full message details."""
+        return await self._call(
+            self.connector.get_message, message_id, include_content=include_content
+        )
+
+    async def index_mailbox(
+        self, account: str, mailbox: str = "INBOX", limit: int | None = DEFAULT_INDEX_BATCH
+    ) -> dict[str, int]:
+        """Bring a mailbox's entries in the body index up to date."""
+        return await self._call(self.connector.index_mailbox, account, mailbox, limit=limit)
+
+    async def full_text_search(
+        self,
+        query: str,
+        account: str | None = None,
+        mailbox: str | None = None,
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """Search the bodies, subjects and senders of indexed messages."""
+        return await self._call(
+            self.connector.full_text_search, query, account=account, mailbox=mailbox, limit=limit
+        )
+
+    async def send_email(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+    ) -> bool:
+        """Send an email."""
+        return await self._call(
+            self.connector.send_email, subject=subject, body=body, to=to, cc=cc, bcc=bcc
+        )
+
+    async def create_draft(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+    ) -> str:
+        """Create a draft email without sending."""
+        return await self._call(
+            self.connector.create_draft, subject=subject, body=body, to=to, cc=cc, bcc=bcc
+        )
+
+    async def mark_as_read(self, message_ids: list[str], read: bool = True) -> MutationResult:
+        """Mark messages as read or unread."""
+        return await self._call(self.connector.mark_as_read, message_ids, read=read)
+
+    async def send_email_with_attachments(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        attachments: list[Path],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        max_attachment_size: int = 25 * 1024 * 1024,
+    ) -> bool:
+        """Send an email with file attachments."""
+        return await self._call(
+            self.connector.send_email_with_attachments,
+            subject=subject,
+            body=body,
+            to=to,
+            attachments=attachments,
+            cc=cc,
+            bcc=bcc,
+            max_attachment_size=max_attachment_size,
+        )
+
+    async def get_attachments(self, message_id: str) -> list[dict[str, Any]]:
+        """Get list of attachments from a message."""
+        return await self._call(self.connector.get_attachments, message_id)
+
+    async def save_attachments(
+        self,
+        message_id: str,
+        save_directory: Path,
+        attachment_indices: list[int] | None = None,
+    ) -> SavedAttachments:
+        """Save attachments from a message to a directory."""
+        return await self._call(
+            self.connector.save_attachments,
+            message_id=message_id,
+            save_directory=save_directory,
+            attachment_indices=attachment_indices,
+        )
+
+    async def move_messages(
+        self,
+        message_ids: list[str],
+        destination_mailbox: str,
+        account: str,
+        gmail_mode: bool = False,
+    ) -> MutationResult:
+        """Move messages to a different mailbox."""
+        return await self._call(
+            self.connector.move_messages,
+            message_ids=message_ids,
+            destination_mailbox=destination_mailbox,
+            account=account,
+            gmail_mode=gmail_mode,
+        )
+
+    async def flag_message(self, message_ids: list[str], flag_color: str) -> MutationResult:
+        """Set flag color on messages."""
+        return await self._call(
+            self.connector.flag_message, message_ids=message_ids, flag_color=flag_color
+        )
+
+    async def create_mailbox(
+        self,
+        account: str,
+        name: str,
+        parent_mailbox: str | None = None,
+    ) -> bool:
+        """Create a new mailbox/folder."""
+        return await self._call(
+            self.connector.create_mailbox,
+            account=account,
+            name=name,
+            parent_mailbox=parent_mailbox,
+        )
+
+    async def delete_messages(
+        self,
+        message_ids: list[str],
+        permanent: bool = False,
+        skip_bulk_check: bool = True,
+    ) -> MutationResult:
+        """Delete messages (move to trash or permanent delete)."""
+        return await self._call(
+            self.connector.delete_messages,
+            message_ids=message_ids,
+            permanent=permanent,
+            skip_bulk_check=skip_bulk_check,
+        )
+
+    async def update_matching(
+        self,
+        account: str,
+        mailbox: str,
+        action: str,
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        older_than_days: int | None = None,
+        read: bool = True,
+        flag_color: str | None = None,
+        destination_mailbox: str | None = None,
+        gmail_mode: bool = False,
+        dry_run: bool = False,
+        max_messages: int = DEFAULT_MAX_MATCHING,
+    ) -> dict[str, Any]:
+        """Apply an action to the messages of a mailbox matching a filter."""
+        return await self._call(
+            self.connector.update_matching,
+            account=account,
+            mailbox=mailbox,
+            action=action,
+            sender_contains=sender_contains,
+            subject_contains=subject_contains,
+            read_status=read_status,
+            older_than_days=older_than_days,
+            read=read,
+            flag_color=flag_color,
+            destination_mailbox=destination_mailbox,
+            gmail_mode=gmail_mode,
+            dry_run=dry_run,
+            max_messages=max_messages,
+        )
+
+    async def reply_to_message(
+        self,
+        message_id: str,
+        body: str,
+        reply_all: bool = False,
+        quote_original: bool = True,
+    ) -> str:
+        """Reply to a message."""
+        return await self._call(
+            self.connector.reply_to_message,
+            message_id=message_id,
+            body=body,
+            reply_all=reply_all,
+            quote_original=quote_original,
+        )
+
+    async def forward_message(
+        self,
+        message_id: str,
+        to: list[str],
+        body: str = "",
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        include_attachments: bool = True,
+    ) -> str:
+        """Forward a message to recipients."""
+        return await self._call(
+            self.connector.forward_message,
+            message_id=message_id,
+            to=to,
+            body=body,
+            cc=cc,
+            bcc=bcc,
+            include_attachments=include_attachments,
+        )
+
+    async def batch(self, operations: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Run several operations in a single script execution."""
+        return await self._call(self.connector.batch, operations)
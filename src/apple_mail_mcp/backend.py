@@ -0,0 +1,337 @@
+"""
+Mail backends.
+
+The server talks to Mail through a MailBackend: every operation the MCP
+tools need, with the signatures, return values and exceptions of
+AppleMailConnector. Besides the AppleScript connector there is a JXA
+connector (see jxa_connector) with bulk property reads, a connector that
+answers listings from Mail's Envelope Index database (see envelope_index),
+and an in-memory backend (see memory_backend) that runs anywhere, so the
+server's own overhead, coalescing and scheduling can be measured and
+load-tested without a Mac running Mail.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Protocol, runtime_checkable
+
+from .body_index import DEFAULT_INDEX_BATCH
+from .scheduler import LaneScheduler
+
+# Backend names accepted by create_backend() (and the APPLE_MAIL_MCP_BACKEND
+# environment variable)
+BACKENDS = ("applescript", "jxa", "envelope", "memory")
+
+# Default for the most messages update_matching() changes in one call
+DEFAULT_MAX_MATCHING = 1000
+
+# Per-id outcomes of a bulk mutation
+OUTCOME_OK = "ok"
+OUTCOME_NOT_FOUND = "not_found"
+
+
+class MutationResult(int):
+    """
+    Number of messages a bulk mutation changed, with the outcome per id.
+
+    Compares, formats and serializes as the plain count, so callers that
+    only want the number are unaffected.
+    """
+
+    outcomes: dict[str, str]
+    """Every distinct requested id, in request order: OUTCOME_OK or OUTCOME_NOT_FOUND."""
+
+    def __new__(cls, outcomes: dict[str, str] | None = None) -> MutationResult:
+        outcomes = outcomes or {}
+        result = super().__new__(cls, sum(outcome == OUTCOME_OK for outcome in outcomes.values()))
+        result.outcomes = outcomes
+        return result
+
+    @classmethod
+    def of(cls, requested: Iterable[str], changed: Iterable[str]) -> MutationResult:
+        """
+        Build a result from the requested ids and the ids that were changed.
+
+        Args:
+            requested: Requested message IDs (duplicates are reported once)
+            changed: IDs the mutation changed
+
+        Returns:
+            The result
+        """
+        done = set(changed)
+        return cls(
+            {
+                message_id: OUTCOME_OK if message_id in done else OUTCOME_NOT_FOUND
+                for message_id in requested
+            }
+        )
+
+    @property
+    def changed(self) -> list[str]:
+        """IDs that were changed, in request order."""
+        return [
+            message_id for message_id, outcome in self.outcomes.items() if outcome == OUTCOME_OK
+        ]
+
+    @property
+    def not_found(self) -> list[str]:
+        """IDs that were not changed, in request order."""
+        return [
+            message_id for message_id, outcome in self.outcomes.items() if outcome != OUTCOME_OK
+        ]
+
+
+class SavedAttachments(int):
+    """
+    Number of attachments save_attachments wrote, with a description of
+    each file.
+
+    Compares, formats and serializes as the plain count.
+    """
+
+    files: list[dict[str, Any]]
+    """Per file: "index", "name", "path", "mime_type", "size" and "sha256"."""
+
+    def __new__(cls, files: list[dict[str, Any]] | None = None) -> SavedAttachments:
+        files = files or []
+        result = super().__new__(cls, len(files))
+        result.files = files
+        return result
+
+
+@runtime_checkable
+class MailBackend(Protocol):
+    """Operations the server performs against a mail store."""
+
+    scheduler: LaneScheduler
+    """Admits operations; the async front end sizes its thread pool from it."""
+
+    def close(self) -> None:
+        """Release resources held by the backend."""
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        """Return scheduling, coalescing and backend-specific metrics."""
+        ...
+
+    def batch(self, operations: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Run several operations; one result dictionary per operation."""
+        ...
+
+    def list_accounts(self) -> list[dict[str, Any]]:
+        """List all mail accounts."""
+        ...
+
+    def list_mailboxes(self, account: str) -> list[dict[str, Any]]:
+        """List all mailboxes for an account."""
+        ...
+
+    def search_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Search for messages matching criteria (a MessagePage, newest first)."""
+        ...
+
+    def iter_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Yield messages matching criteria as they are found."""
+        ...
+
+    def get_message(self, message_id: str, include_content: bool = True) -> dict[str, Any]:
+        """Get full message details."""
+        ...
+
+    def index_mailbox(
+        self, account: str, mailbox: str = "INBOX", limit: int | None = DEFAULT_INDEX_BATCH
+    ) -> dict[str, int]:
+        """Bring a mailbox's entries in the body index up to date."""
+        ...
+
+    def full_text_search(
+        self,
+        query: str,
+        account: str | None = None,
+        mailbox: str | None = None,
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """Search the bodies, subjects and senders of indexed messages."""
+        ...
+
+    def send_email(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+    ) -> bool:
+        """Send an email."""
+        ...
+
+    def create_draft(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+    ) -> str:
+        """Create a draft; returns its message ID."""
+        ...
+
+    def mark_as_read(self, message_ids: list[str], read: bool = True) -> MutationResult:
+        """Mark messages as read or unread; returns the number updated."""
+        ...
+
+    def send_email_with_attachments(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        attachments: list[Path],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        max_attachment_size: int = 25 * 1024 * 1024,
+    ) -> bool:
+        """Send an email with file attachments."""
+        ...
+
+    def get_attachments(self, message_id: str) -> list[dict[str, Any]]:
+        """List a message's attachments."""
+        ...
+
+    def save_attachments(
+        self,
+        message_id: str,
+        save_directory: Path,
+        attachment_indices: list[int] | None = None,
+    ) -> SavedAttachments:
+        """Save attachments to a directory; returns the number saved, with the files."""
+        ...
+
+    def move_messages(
+        self,
+        message_ids: list[str],
+        destination_mailbox: str,
+        account: str,
+        gmail_mode: bool = False,
+    ) -> MutationResult:
+        """Move messages to another mailbox; returns the number moved."""
+        ...
+
+    def flag_message(self, message_ids: list[str], flag_color: str) -> MutationResult:
+        """Set the flag color on messages; returns the number flagged."""
+        ...
+
+    def create_mailbox(
+        self,
+        account: str,
+        name: str,
+        parent_mailbox: str | None = None,
+    ) -> bool:
+        """Create a mailbox."""
+        ...
+
+    def delete_messages(
+        self,
+        message_ids: list[str],
+        permanent: bool = False,
+        skip_bulk_check: bool = True,
+    ) -> MutationResult:
+        """Delete messages; returns the number deleted."""
+        ...
+
+    def update_matching(
+        self,
+        account: str,
+        mailbox: str,
+        action: str,
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        older_than_days: int | None = None,
+        read: bool = True,
+        flag_color: str | None = None,
+        destination_mailbox: str | None = None,
+        gmail_mode: bool = False,
+        dry_run: bool = False,
+        max_messages: int = DEFAULT_MAX_MATCHING,
+    ) -> dict[str, Any]:
+        """Apply an action to the messages of a mailbox matching a filter."""
+        ...
+
+    def reply_to_message(
+        self,
+        message_id: str,
+        body: str,
+        reply_all: bool = False,
+        quote_original: bool = True,
+    ) -> str:
+        """Reply to a message; returns the reply's message ID."""
+        ...
+
+    def forward_message(
+        self,
+        message_id: str,
+        to: list[str],
+        body: str = "",
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        include_attachments: bool = True,
+    ) -> str:
+        """Forward a message; returns the forwarded message's ID."""
+        ...
+
+
+def create_backend(name: str = "applescript", **options: Any) -> MailBackend:
+    """
+    Create a backend by name.
+
+    Args:
+        name: One of BACKENDS
+        **options: Keyword arguments for the backend's constructor
+
+    Returns:
+        The backend
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    if name == "applescript":
+        from .mail_connector import AppleMailConnector
+
+        return AppleMailConnector(**options)
+    if name == "jxa":
+        from .jxa_connector import JXAMailConnector
+
+        return JXAMailConnector(**options)
+    if name == "envelope":
+        from .envelope_index import EnvelopeIndexConnector
+
+        return EnvelopeIndexConnector(**options)
+    if name == "memory":
+        from .memory_backend import InMemoryBackend
+
+        return InMemoryBackend.with_sample_data(**options)
+    raise ValueError(f"Unknown mail backend: {name!r} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,343 @@
+"""
+Local full-text index of message bodies.
+
+Mail can only search bodies through ``content contains``, which renders
+every message of a mailbox through AppleScript. The index keeps subject,
+sender and body of each message it is given in an SQLite FTS5 table:
+
+- tokens are split and folded by FTS5's ``unicode61`` tokenizer (Unicode
+  letters and digits, case-insensitive, diacritics removed, so "cafe"
+  finds "Café");
+- results are ranked with BM25, a subject match weighing more than a body
+  match;
+- queries take words, "quoted phrases", ``prefix*`` and ``-excluded``
+  terms (see fts_query);
+- each result has a snippet of its best matching column with the matches
+  highlighted.
+
+The index grows incrementally: messages are added (or replaced) one at a
+time as their bodies are read, and removed when they are deleted or no
+longer listed in their mailbox. It is never rebuilt as a whole.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+DEFAULT_INDEX_PATH = Path.home() / "Library" / "Caches" / "apple-mail-mcp" / "bodies.db"
+
+# Most message bodies index_mailbox() reads in one call
+DEFAULT_INDEX_BATCH = 200
+
+# BM25 weights of the subject, sender and body columns
+COLUMN_WEIGHTS = (3.0, 1.0, 1.0)
+
+# Characters of a body that are indexed; the rest of very long bodies
+# (logs, forwarded threads) adds size but hardly any recall
+MAX_BODY_CHARS = 200_000
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    date_text TEXT NOT NULL DEFAULT '',
+    date_received INTEGER
+);
+CREATE INDEX IF NOT EXISTS documents_by_mailbox ON documents (account, mailbox);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS bodies_fts USING fts5(
+    subject, sender, body, tokenize='unicode61 remove_diacritics 2'
+);
+INSERT INTO bodies_fts (bodies_fts, rank)
+    VALUES ('rank', 'bm25({", ".join(map(str, COLUMN_WEIGHTS))})');
+
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    DELETE FROM bodies_fts WHERE rowid = old.rowid;
+END;
+"""
+
+_UPSERT = """
+INSERT INTO documents (id, account, mailbox, date_text, date_received)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    account = excluded.account,
+    mailbox = excluded.mailbox,
+    date_text = excluded.date_text,
+    date_received = excluded.date_received
+RETURNING rowid
+"""
+
+_TERM = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_query(text: str) -> str:
+    """
+    Translate a search box query into an FTS5 query.
+
+    Terms are combined with AND. A term is a word, a "quoted phrase"
+    (its words adjacent and in order), a word ending in ``*`` (any word
+    with that prefix), or one of these preceded by ``-`` (must not occur).
+    Everything else is taken literally; FTS5 operators in the text have no
+    effect.
+
+    Args:
+        text: Query text, e.g. ``invoice "march 2025" -draft``
+
+    Returns:
+        FTS5 query expression
+
+    Raises:
+        ValueError: If the query has no term that must occur
+    """
+    included: list[str] = []
+    excluded: list[str] = []
+    for match in _TERM.finditer(text):
+        negated, phrase, word = match.groups()
+        if word is not None:
+            negated, word = ("-", word[1:]) if word.startswith("-") else ("", word)
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            if not any(c.isalnum() for c in word):
+                continue
+            term = _quote(word) + (" *" if prefix else "")
+        elif phrase is not None and any(c.isalnum() for c in phrase):
+            term = _quote(phrase)
+        else:
+            continue
+        (excluded if negated else included).append(term)
+
+    if not included:
+        raise ValueError("The query needs at least one word that must occur")
+    query = " AND ".join(included)
+    if excluded:
+        query = f"({query}) NOT ({' OR '.join(excluded)})"
+    return query
+
+
+class BodyIndex:
+    """Thread-safe SQLite full-text index of message bodies."""
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        highlight: tuple[str, str] = ("**", "**"),
+        snippet_tokens: int = 16,
+    ) -> None:
+        """
+        Open (or create) the index.
+
+        Args:
+            path: Database file, or ":memory:" (default:
+                ~/Library/Caches/apple-mail-mcp/bodies.db)
+            highlight: Text put before and after each match in snippets
+            snippet_tokens: Most tokens in a snippet
+        """
+        self.path = str(path or DEFAULT_INDEX_PATH)
+        self.highlight = highlight
+        self.snippet_tokens = snippet_tokens
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            if self.path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        self.queries = 0
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+    def add(self, account: str, mailbox: str, messages: Iterable[dict[str, Any]]) -> int:
+        """
+        Index messages, replacing earlier versions of the same IDs.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            messages: Message dictionaries with "id", "subject", "sender",
+                "date_received", "timestamp" and "content"
+
+        Returns:
+            Number of messages indexed
+        """
+        count = 0
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            for message in messages:
+                date_text = message.get("date_received") or ""
+                (rowid,) = self._db.execute(
+                    _UPSERT,
+                    (message["id"], account, mailbox, date_text, message.get("timestamp")),
+                ).fetchone()
+                self._db.execute("DELETE FROM bodies_fts WHERE rowid = ?", (rowid,))
+                self._db.execute(
+                    "INSERT INTO bodies_fts (rowid, subject, sender, body) VALUES (?, ?, ?, ?)",
+                    (
+                        rowid,
+                        message.get("subject") or "",
+                        message.get("sender") or "",
+                        (message.get("content") or "")[:MAX_BODY_CHARS],
+                    ),
+                )
+                count += 1
+        return count
+
+    def indexed(self, message_ids: Iterable[str]) -> set[str]:
+        """
+        Return which of the given messages are in the index.
+
+        Args:
+            message_ids: Message IDs
+
+        Returns:
+            The indexed IDs
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM documents WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(message_ids)),),
+            ).fetchall()
+        return {message_id for (message_id,) in rows}
+
+    def move(self, message_ids: Iterable[str], account: str, mailbox: str) -> None:
+        """
+        Write a move through to indexed messages.
+
+        Args:
+            message_ids: IDs of the moved messages
+            account: Destination account
+            mailbox: Destination mailbox
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE documents SET account = ?, mailbox = ? WHERE id = ?",
+                ((account, mailbox, message_id) for message_id in message_ids),
+            )
+
+    def remove(self, message_ids: Iterable[str]) -> None:
+        """
+        Remove messages from the index.
+
+        Args:
+            message_ids: IDs of the messages (unknown IDs are ignored)
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "DELETE FROM documents WHERE id = ?", ((message_id,) for message_id in message_ids)
+            )
+
+    def prune(self, account: str, mailbox: str, keep: Iterable[str]) -> int:
+        """
+        Remove a mailbox's messages that are no longer in it.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            keep: IDs of every message the mailbox has now
+
+        Returns:
+            Number of messages removed
+        """
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "DELETE FROM documents WHERE account = ? AND mailbox = ?"
+                " AND id NOT IN (SELECT value FROM json_each(?))",
+                (account, mailbox, json.dumps(list(keep))),
+            )
+        return cursor.rowcount
+
+    def search(
+        self,
+        query: str,
+        account: str | None = None,
+        mailbox: str | None = None,
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """
+        Find the messages that best match a query.
+
+        Args:
+            query: Query text (see fts_query)
+            account: Only search this account
+            mailbox: Only search this mailbox
+            limit: Maximum results
+
+        Returns:
+            Message dictionaries ("id", "account", "mailbox", "subject",
+            "sender", "date_received", "score" and "snippet"), best match
+            first; a higher score is a better match
+
+        Raises:
+            ValueError: If the query has no term that must occur
+        """
+        conditions = ["bodies_fts MATCH ?"]
+        params: list[Any] = [fts_query(query)]
+        if account is not None:
+            conditions.append("d.account = ?")
+            params.append(account)
+        if mailbox is not None:
+            conditions.append("d.mailbox = ?")
+            params.append(mailbox)
+        before, after = self.highlight
+        sql = (
+            "SELECT d.id, d.account, d.mailbox, f.subject, f.sender, d.date_text, f.rank,"
+            " snippet(bodies_fts, -1, ?, ?, '…', ?)"
+            " FROM bodies_fts f JOIN documents d ON d.rowid = f.rowid"
+            f" WHERE {' AND '.join(conditions)}"
+            " ORDER BY f.rank LIMIT ?"
+        )
+        with self._lock:
+            self.queries += 1
+            rows = self._db.execute(
+                sql, [before, after, self.snippet_tokens, *params, limit]
+            ).fetchall()
+        return [
+            {
+                "id": message_id,
+                "account": account_name,
+                "mailbox": mailbox_name,
+                "subject": subject,
+                "sender": sender,
+                "date_received": date_text,
+                # bm25() is lower for better matches
+                "score": -rank,
+                "snippet": snippet,
+            }
+            for (
+                message_id,
+                account_name,
+                mailbox_name,
+                subject,
+                sender,
+                date_text,
+                rank,
+                snippet,
+            ) in rows
+        ]
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return index size and query count.
+
+        Returns:
+            Dictionary with "messages" (indexed messages) and "queries"
+        """
+        with self._lock:
+            messages = self._db.execute("SELECT count(*) FROM documents").fetchone()[0]
+        return {"messages": messages, "queries": self.queries}
@@ -0,0 +1,291 @@
+"""
+Reader for the .emlx files Mail stores messages in.
+
+``content of msg`` makes Mail render the whole body through AppleScript,
+which is slow for large messages and returns neither headers nor MIME
+structure. Mail keeps every downloaded message on disk as
+
+    ~/Library/Mail/V*/<account UUID>/<Mailbox>.mbox/<store UUID>/Data/
+        <digits>/Messages/<message id>.emlx
+
+(nested mailboxes are nested ``.mbox`` directories; ``<digits>`` are the
+digits of ``id // 1000`` in reverse order, one directory each). A file
+starts with the byte count of the RFC 822 message on a line of its own,
+followed by the message and an XML property list of Mail's flags.
+``.partial.emlx`` files hold messages whose attachments are stored apart;
+their text parts are complete.
+
+The message is fed to ``email.parser`` in chunks, so only the parsed
+structure is held in memory, never a second copy of the raw file.
+Reading these files needs Full Disk Access.
+"""
+
+from __future__ import annotations
+
+import email.policy
+import html
+import logging
+import os
+import re
+import threading
+import time
+from email.message import EmailMessage
+from email.parser import BytesFeedParser
+from pathlib import Path
+from typing import IO, Any
+
+logger = logging.getLogger(__name__)
+
+MAIL_DIRECTORY = Path.home() / "Library" / "Mail"
+
+EMLX_SUFFIXES = (".emlx", ".partial.emlx")
+
+# Bytes fed to the parser at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# Minimum seconds between rescans of the mailbox directories after a miss
+RESCAN_INTERVAL = 60.0
+
+_TAG = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_BLANK_LINES = re.compile(r"\n\s*\n\s*(\n\s*)+")
+
+
+class EmlxError(Exception):
+    """An .emlx file is malformed."""
+
+
+def message_directory(message_id: str) -> Path:
+    """
+    Return where a message's file lives relative to a store's Data directory.
+
+    Args:
+        message_id: Numeric message ID
+
+    Returns:
+        E.g. ``3/2/1/Messages`` for message 123456
+    """
+    thousands = int(message_id) // 1000
+    if not thousands:
+        return Path("Messages")
+    return Path(*reversed(str(thousands)), "Messages")
+
+
+def html_to_text(markup: str) -> str:
+    """Reduce an HTML body to its text, roughly as Mail's content does."""
+    text = re.sub(r"<br\s*/?>|</p\s*>|</div\s*>", "\n", markup, flags=re.IGNORECASE)
+    text = html.unescape(_TAG.sub("", text))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def open_message(path: Path | str) -> tuple[IO[bytes], int]:
+    """
+    Open an .emlx file at the start of its message.
+
+    Args:
+        path: File path
+
+    Returns:
+        (binary file positioned after the byte count line, byte count of
+        the message); the caller closes the file
+
+    Raises:
+        EmlxError: If the byte count prefix is missing
+        OSError: If the file cannot be read
+    """
+    path = Path(path)
+    f = path.open("rb")
+    prefix = f.readline(32).strip()
+    if not prefix.isdigit():
+        f.close()
+        raise EmlxError(f"Missing byte count in {path.name}")
+    return f, int(prefix)
+
+
+def read_emlx(path: Path | str) -> dict[str, Any]:
+    """
+    Parse an .emlx file into headers and a decoded text body.
+
+    Args:
+        path: File path
+
+    Returns:
+        Dictionary with "headers" (name -> value; repeated headers are
+        joined with newlines), "content" (the text/plain body, or the
+        text of the text/html body) and "partial" (True for .partial.emlx)
+
+    Raises:
+        EmlxError: If the byte count prefix is missing or the file is short
+        OSError: If the file cannot be read
+    """
+    path = Path(path)
+    parser = BytesFeedParser(policy=email.policy.default)
+    f, remaining = open_message(path)
+    with f:
+        while remaining:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise EmlxError(f"{path.name} is shorter than its byte count")
+            parser.feed(chunk)
+            remaining -= len(chunk)
+    message = parser.close()
+    # The default policy always builds an EmailMessage
+    assert isinstance(message, EmailMessage)
+
+    headers: dict[str, str] = {}
+    for name, value in message.items():
+        headers[name] = f"{headers[name]}\n{value}" if name in headers else str(value)
+
+    return {
+        "headers": headers,
+        "content": _text_body(message),
+        "partial": path.name.endswith(".partial.emlx"),
+    }
+
+
+def _text_body(message: EmailMessage) -> str:
+    body = message.get_body(preferencelist=("plain", "html"))
+    if body is None:
+        return ""
+    try:
+        content = body.get_content()
+    except (LookupError, ValueError) as e:
+        # Unknown charset or broken transfer encoding: best-effort decode
+        logger.debug(f"Could not decode body part: {e}")
+        payload = body.get_payload(decode=True)
+        content = payload.decode("utf-8", errors="replace") if isinstance(payload, bytes) else ""
+    if not isinstance(content, str):
+        return ""
+    return html_to_text(content) if body.get_content_subtype() == "html" else content
+
+
+class EmlxReader:
+    """Finds and reads message files under Mail's data directory."""
+
+    def __init__(
+        self, mail_directory: Path | str = MAIL_DIRECTORY, rescan_interval: float = RESCAN_INTERVAL
+    ) -> None:
+        """
+        Initialize the reader; directories are scanned on first use.
+
+        Args:
+            mail_directory: Mail's directory (~/Library/Mail)
+            rescan_interval: Minimum seconds between rescans after a miss
+        """
+        self.mail_directory = Path(mail_directory)
+        self.rescan_interval = rescan_interval
+        self._stores: list[tuple[tuple[str, ...], Path]] | None = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _scan_stores(self) -> list[tuple[tuple[str, ...], Path]]:
+        """
+        Find the Data directory of every mailbox.
+
+        Returns:
+            (account UUID, mailbox name parts...) and Data directory pairs,
+            of the newest V* directory; message directories are not walked
+        """
+        versions = [
+            path
+            for path in self.mail_directory.glob("V*")
+            if path.name[1:].isdigit() and path.is_dir()
+        ]
+        if not versions:
+            return []
+        version = max(versions, key=lambda path: int(path.name[1:]))
+
+        stores = []
+
+        def walk(directory: Path, owner: tuple[str, ...]) -> None:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                return
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                if entry.name.endswith(".mbox"):
+                    walk(Path(entry.path), (*owner, entry.name[: -len(".mbox")]))
+                elif len(owner) > 1 and os.path.isdir(os.path.join(entry.path, "Data")):
+                    stores.append((owner, Path(entry.path, "Data")))
+
+        for account in version.iterdir():
+            if account.is_dir() and account.name != "MailData":
+                walk(account, (account.name,))
+        return stores
+
+    def find(self, message_id: str, hint: tuple[str, str] | None = None) -> Path | None:
+        """
+        Locate a message's file.
+
+        A miss rescans the directories for mailboxes created since, at
+        most once per rescan_interval: messages that are not on disk at all
+        (not downloaded yet) must not walk the whole tree on every lookup.
+
+        Args:
+            message_id: Numeric message ID
+            hint: (account name, mailbox name) the message was seen in;
+                stores of that mailbox are tried first (stores are keyed by
+                account UUID, so the account does not narrow them down)
+
+        Returns:
+            Path of the .emlx (or .partial.emlx) file, or None
+        """
+        if not message_id.isdigit():
+            return None
+        relative = message_directory(message_id)
+
+        for rescan in (False, True):
+            with self._lock:
+                if rescan and time.monotonic() - self._scanned_at < self.rescan_interval:
+                    break
+                if rescan or self._stores is None:
+                    self._stores = self._scan_stores()
+                    self._scanned_at = time.monotonic()
+                stores = list(self._stores)
+            if hint is not None:
+                parts = tuple(hint[1].split("/"))
+                stores.sort(key=lambda store: store[0][1:] != parts)
+            for _, data in stores:
+                for suffix in EMLX_SUFFIXES:
+                    path = data / relative / f"{message_id}{suffix}"
+                    if path.is_file():
+                        self.hits += 1
+                        return path
+        self.misses += 1
+        return None
+
+    def read(self, message_id: str, hint: tuple[str, str] | None = None) -> dict[str, Any] | None:
+        """
+        Read a message's headers and text body from disk.
+
+        Args:
+            message_id: Numeric message ID
+            hint: (account, mailbox) the message was seen in
+
+        Returns:
+            As read_emlx(), or None if there is no readable file
+        """
+        path = self.find(message_id, hint)
+        if path is None:
+            return None
+        try:
+            return read_emlx(path)
+        except (OSError, EmlxError) as e:
+            logger.warning(f"Could not read {path}: {e}")
+            return None
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return lookup counters.
+
+        Returns:
+            Dictionary with "stores" (mailboxes found), "hits" and "misses"
+        """
+        return {
+            "stores": len(self._stores or ()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,603 @@
+"""
+Read-only backend on Mail's own metadata database.
+
+Mail keeps the metadata of every message (sender, subject, dates, flags,
+mailbox) in an SQLite database, ``~/Library/Mail/V*/MailData/Envelope
+Index``. Reading it answers searches, mailbox listings and unread counts
+with one query instead of Apple Events, and without Mail running. Reading
+it needs Full Disk Access for the process running the server.
+
+The database belongs to Mail: it is only ever opened with a ``mode=ro``
+URI. While Mail holds a write lock, queries go to a snapshot instead: the
+database and its write-ahead log are copied to a temporary directory,
+checkpointed there and opened ``immutable=1``. The snapshot is reused for
+SNAPSHOT_MAX_AGE seconds.
+
+The layout of the database changed between Mail versions; a SchemaAdapter
+per layout knows where subjects, senders and flags are stored, and the
+first adapter whose tables and columns are present is used.
+
+Message IDs are the ``ROWID`` of the messages table, which is what
+AppleScript reports as ``id of message``, so everything this backend does
+not serve (get_message, mutations, sending) goes through the inherited
+AppleScript templates with the same IDs.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from urllib.parse import unquote, urlsplit
+
+from .emlx import MAIL_DIRECTORY
+from .exceptions import (
+    MailAccountNotFoundError,
+    MailMailboxNotFoundError,
+    MailUnavailableError,
+)
+from .mail_connector import AppleMailConnector
+from .memory_backend import format_date
+from .pagination import CursorPosition
+from .planner import SearchPlan
+from .query import CompiledQuery, SqlColumns
+from .utils import sanitize_input
+
+logger = logging.getLogger(__name__)
+
+# Mail's copy of the Internet Accounts database: account UUID -> name
+ACCOUNTS_DATABASE = Path.home() / "Library" / "Accounts" / "Accounts4.sqlite"
+
+# Seconds a snapshot taken while Mail held a lock is reused
+SNAPSHOT_MAX_AGE = 60.0
+
+# Errors that mean "Mail is writing right now", not "the database is unusable"
+_LOCKED = re.compile(r"locked|busy|readonly|unable to open", re.IGNORECASE)
+
+# Query expressions test the schema's columns (filled in like the filters)
+_QUERY_COLUMNS = SqlColumns("{sender}", "{subject}", "{read}", "m.date_received")
+
+
+def find_envelope_index(mail_directory: Path = MAIL_DIRECTORY) -> Path:
+    """
+    Locate the Envelope Index of the newest Mail data directory.
+
+    Args:
+        mail_directory: Mail's directory (~/Library/Mail)
+
+    Returns:
+        Path of the database
+
+    Raises:
+        MailUnavailableError: If there is none (or it is not readable)
+    """
+    candidates = []
+    for path in mail_directory.glob("V*/MailData/Envelope Index"):
+        version = path.parent.parent.name[1:]
+        if version.isdigit():
+            candidates.append((int(version), path))
+    if not candidates:
+        raise MailUnavailableError(
+            f"No Envelope Index under {mail_directory} (is Full Disk Access granted?)"
+        )
+    return max(candidates)[1]
+
+
+class SchemaAdapter:
+    """SQL fragments for one layout of the Envelope Index."""
+
+    name = ""
+    required: dict[str, set[str]] = {}
+    """Tables and columns the layout is recognized by."""
+
+    joins = ""
+    subject = "m.subject"
+    sender = "m.sender"
+    read = "m.read"
+    flagged = "m.flagged"
+    deleted = "m.deleted"
+
+    @classmethod
+    def matches(cls, tables: dict[str, set[str]]) -> bool:
+        """Return True if the tables have every column the layout needs."""
+        return all(columns <= tables.get(table, set()) for table, columns in cls.required.items())
+
+
+class NormalizedSchema(SchemaAdapter):
+    """
+    Subjects and addresses in tables of their own (current layouts).
+
+    Subject prefixes ("Re: ") are stored apart from the subject; senders
+    are an address and a display name.
+    """
+
+    name = "normalized"
+    required = {
+        "messages": {
+            "sender",
+            "subject",
+            "subject_prefix",
+            "date_received",
+            "mailbox",
+            "read",
+            "flagged",
+            "deleted",
+        },
+        "subjects": {"subject"},
+        "addresses": {"address", "comment"},
+        "mailboxes": {"url"},
+    }
+    joins = (
+        " LEFT JOIN subjects s ON s.ROWID = m.subject"
+        " LEFT JOIN addresses a ON a.ROWID = m.sender"
+    )
+    subject = "coalesce(m.subject_prefix, '') || coalesce(s.subject, '')"
+    sender = (
+        "CASE WHEN coalesce(a.comment, '') = '' THEN coalesce(a.address, '')"
+        " ELSE a.comment || ' <' || a.address || '>' END"
+    )
+
+
+class InlineSchema(SchemaAdapter):
+    """
+    Subject and sender stored as text, state in a flags bit field (early
+    layouts).
+
+    Bit 0 of ``flags`` is the read status, bit 1 deleted and bit 4 flagged,
+    as in the flags of .emlx files.
+    """
+
+    name = "inline"
+    required = {
+        "messages": {"sender", "subject", "date_received", "mailbox", "flags"},
+        "mailboxes": {"url"},
+    }
+    read = "(m.flags & 1)"
+    flagged = "((m.flags >> 4) & 1)"
+    deleted = "((m.flags >> 1) & 1)"
+
+
+# Tried in order; the first that matches is used
+SCHEMA_ADAPTERS: tuple[type[SchemaAdapter], ...] = (NormalizedSchema, InlineSchema)
+
+
+def detect_schema(connection: sqlite3.Connection) -> type[SchemaAdapter]:
+    """
+    Pick the adapter for a database's layout.
+
+    Args:
+        connection: Open connection to an Envelope Index
+
+    Returns:
+        The first adapter in SCHEMA_ADAPTERS that matches
+
+    Raises:
+        MailUnavailableError: If no adapter matches
+    """
+    tables = {}
+    for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+        columns = connection.execute(f'PRAGMA table_info("{table}")').fetchall()
+        tables[table] = {column[1] for column in columns}
+    for adapter in SCHEMA_ADAPTERS:
+        if adapter.matches(tables):
+            return adapter
+    raise MailUnavailableError("Unsupported Envelope Index layout")
+
+
+def parse_mailbox_url(url: str) -> tuple[str, str]:
+    """
+    Split a mailbox URL into account UUID and mailbox name.
+
+    Args:
+        url: Mailbox URL, e.g. "imap://6F2C...9A/%5BGmail%5D/All%20Mail"
+
+    Returns:
+        (account UUID, mailbox name), e.g. ("6F2C...9A", "[Gmail]/All Mail")
+    """
+    parts = urlsplit(url)
+    return unquote(parts.netloc), unquote(parts.path.lstrip("/"))
+
+
+class EnvelopeIndex:
+    """Thread-safe read-only access to an Envelope Index."""
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        accounts_database: Path | str | None = ACCOUNTS_DATABASE,
+        account_names: dict[str, str] | None = None,
+        snapshot_max_age: float = SNAPSHOT_MAX_AGE,
+        busy_timeout: float = 0.2,
+    ) -> None:
+        """
+        Initialize the reader; nothing is opened until the first query.
+
+        Args:
+            path: Database file (default: the newest under ~/Library/Mail)
+            accounts_database: Accounts database to read account names from
+                (None to not read one)
+            account_names: Account names by UUID, taking precedence over
+                the accounts database
+            snapshot_max_age: Seconds a snapshot is reused
+            busy_timeout: Seconds a query waits for Mail's lock before a
+                snapshot is read instead
+        """
+        self._path = Path(path) if path else None
+        self.accounts_database = Path(accounts_database) if accounts_database else None
+        self.account_names = dict(account_names or {})
+        self.snapshot_max_age = snapshot_max_age
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._live: sqlite3.Connection | None = None
+        self._snapshot: sqlite3.Connection | None = None
+        self._snapshot_dir: Path | None = None
+        self._snapshot_taken = 0.0
+        self._schema: type[SchemaAdapter] | None = None
+        self._names: dict[str, str] | None = None
+        self.queries = 0
+        self.snapshots = 0
+
+    @property
+    def path(self) -> Path:
+        """Location of the database."""
+        if self._path is None:
+            self._path = find_envelope_index()
+        return self._path
+
+    def close(self) -> None:
+        """Close connections and remove the snapshot."""
+        with self._lock:
+            if self._live is not None:
+                self._live.close()
+                self._live = None
+            self._drop_snapshot()
+
+    def _drop_snapshot(self) -> None:
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+        if self._snapshot_dir is not None:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            self._snapshot_dir = None
+
+    def _open_live(self) -> sqlite3.Connection:
+        if self._live is None:
+            if not self.path.exists():
+                raise MailUnavailableError(f"Envelope Index not found: {self.path}")
+            self._live = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+            )
+        return self._live
+
+    def _open_snapshot(self) -> sqlite3.Connection:
+        """Copy the database (and its WAL) aside and open the copy immutable."""
+        if (
+            self._snapshot is not None
+            and time.monotonic() - self._snapshot_taken < self.snapshot_max_age
+        ):
+            return self._snapshot
+
+        self._drop_snapshot()
+        directory = Path(tempfile.mkdtemp(prefix="apple-mail-mcp-envelope-"))
+        copy = directory / self.path.name
+        try:
+            shutil.copyfile(self.path, copy)
+            wal = self.path.with_name(f"{self.path.name}-wal")
+            if wal.exists():
+                shutil.copyfile(wal, copy.with_name(f"{copy.name}-wal"))
+            # Fold the log into the copy so it can be opened immutable
+            writer = sqlite3.connect(copy)
+            try:
+                writer.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                writer.close()
+        except (OSError, sqlite3.Error) as e:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise MailUnavailableError(f"Could not snapshot the Envelope Index: {e}") from e
+
+        self._snapshot_dir = directory
+        self._snapshot = sqlite3.connect(
+            f"{copy.resolve().as_uri()}?immutable=1", uri=True, check_same_thread=False
+        )
+        self._snapshot_taken = time.monotonic()
+        self.snapshots += 1
+        logger.info(f"Envelope Index is locked, reading a snapshot ({directory})")
+        return self._snapshot
+
+    def query(self, sql: str, params: tuple[Any, ...] | list[Any] = ()) -> list[tuple[Any, ...]]:
+        """
+        Run a read query, on a snapshot while Mail holds a lock.
+
+        Args:
+            sql: SQL with ``{joins}``, ``{subject}``, ``{sender}``, ``{read}``,
+                ``{flagged}`` and ``{deleted}`` placeholders for the layout's
+                fragments (messages aliased ``m``)
+            params: Query parameters
+
+        Returns:
+            Result rows
+
+        Raises:
+            MailUnavailableError: If the database cannot be read
+        """
+        with self._lock:
+            self.queries += 1
+            try:
+                connection = self._open_live()
+                return self._run(connection, sql, params)
+            except sqlite3.OperationalError as e:
+                if not _LOCKED.search(str(e)):
+                    raise MailUnavailableError(f"Envelope Index query failed: {e}") from e
+            try:
+                return self._run(self._open_snapshot(), sql, params)
+            except sqlite3.Error as e:
+                raise MailUnavailableError(f"Envelope Index query failed: {e}") from e
+
+    def _run(
+        self, connection: sqlite3.Connection, sql: str, params: tuple[Any, ...] | list[Any]
+    ) -> list[tuple[Any, ...]]:
+        if self._schema is None:
+            self._schema = detect_schema(connection)
+        schema = self._schema
+        statement = sql.format(
+            joins=schema.joins,
+            subject=schema.subject,
+            sender=schema.sender,
+            read=schema.read,
+            flagged=schema.flagged,
+            deleted=schema.deleted,
+        )
+        return connection.execute(statement, params).fetchall()
+
+    def _read_account_names(self) -> dict[str, str]:
+        """Read account names by UUID from the accounts database."""
+        database = self.accounts_database
+        if database is None or not database.exists():
+            return {}
+        try:
+            connection = sqlite3.connect(f"{database.resolve().as_uri()}?mode=ro", uri=True)
+            try:
+                rows = connection.execute(
+                    "SELECT a.ZIDENTIFIER,"
+                    " coalesce(a.ZACCOUNTDESCRIPTION, p.ZACCOUNTDESCRIPTION)"
+                    " FROM ZACCOUNT a LEFT JOIN ZACCOUNT p ON p.Z_PK = a.ZPARENTACCOUNT"
+                ).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read account names from {database}: {e}")
+            return {}
+        return {uuid: name for uuid, name in rows if uuid and name}
+
+    def mailboxes(self) -> list[tuple[int, str, str]]:
+        """
+        List every mailbox Mail knows.
+
+        Returns:
+            (mailbox rowid, account UUID, mailbox name) tuples
+        """
+        rows = self.query("SELECT ROWID, url FROM mailboxes")
+        return [(rowid, *parse_mailbox_url(url)) for rowid, url in rows]
+
+    def account_uuid(self, account: str) -> str:
+        """
+        Resolve an account name (or UUID) to the UUID in mailbox URLs.
+
+        Args:
+            account: Account name as Mail shows it, or its UUID
+
+        Returns:
+            The account UUID
+
+        Raises:
+            MailAccountNotFoundError: If no mailbox belongs to the account
+        """
+        uuids = {uuid for _, uuid, _ in self.mailboxes()}
+        if account in uuids:
+            return account
+        for refresh in (False, True):
+            if refresh or self._names is None:
+                # Accounts added since the last read show up on a miss
+                self._names = self._read_account_names()
+            names = {**self._names, **self.account_names}
+            for uuid, name in names.items():
+                if name.lower() == account.lower() and uuid in uuids:
+                    return uuid
+        raise MailAccountNotFoundError(f'Can\'t get account "{account}"')
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return reader metrics.
+
+        Returns:
+            Dictionary with "path", "schema", "queries" and "snapshots"
+            (snapshots taken because Mail held a lock)
+        """
+        return {
+            "path": str(self._path) if self._path else None,
+            "schema": self._schema.name if self._schema else None,
+            "queries": self.queries,
+            "snapshots": self.snapshots,
+        }
+
+
+class EnvelopeIndexConnector(AppleMailConnector):
+    """Mail connector whose listings are SQL queries on the Envelope Index."""
+
+    def __init__(self, *args: Any, index: EnvelopeIndex | None = None, **kwargs: Any) -> None:
+        """
+        Initialize the connector.
+
+        Args:
+            *args: Arguments for AppleMailConnector
+            index: Envelope Index reader (default: the newest database under
+                ~/Library/Mail)
+            **kwargs: Keyword arguments for AppleMailConnector
+        """
+        super().__init__(*args, **kwargs)
+        self.index = index or EnvelopeIndex()
+
+    def close(self) -> None:
+        """Close the database and stop the runner process, if any."""
+        self.index.close()
+        super().close()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return the connector's metrics plus the reader's.
+
+        Returns:
+            AppleMailConnector.stats() with an "envelope_index" entry
+        """
+        return {**super().stats(), "envelope_index": self.index.stats()}
+
+    def _emlx_hint(self, message_id: str) -> tuple[str, str] | None:
+        """Return the account UUID and mailbox the index files the message under."""
+        rows = self.index.query(
+            "SELECT mb.url FROM messages m JOIN mailboxes mb ON mb.ROWID = m.mailbox"
+            " WHERE m.ROWID = ?",
+            (int(message_id),),
+        )
+        return parse_mailbox_url(rows[0][0]) if rows else None
+
+    def _mailbox_ids(self, account: str, mailbox: str | None = None) -> dict[int, str]:
+        uuid = self.index.account_uuid(account)
+        mailboxes = {
+            rowid: name
+            for rowid, owner, name in self.index.mailboxes()
+            if owner == uuid and (mailbox is None or name.lower() == mailbox.lower())
+        }
+        if mailbox is not None and not mailboxes:
+            raise MailMailboxNotFoundError(f'Can\'t get mailbox "{mailbox}"')
+        return mailboxes
+
+    def list_mailboxes(self, account: str) -> list[dict[str, Any]]:
+        """
+        List all mailboxes for an account, with message and unread counts.
+
+        Args:
+            account: Account name (or UUID)
+
+        Returns:
+            List of mailbox dictionaries with name, message_count and
+            unread_count
+
+        Raises:
+            MailAccountNotFoundError: If account doesn't exist
+        """
+        mailboxes = self._mailbox_ids(sanitize_input(account))
+        if not mailboxes:
+            return []
+        placeholders = ", ".join("?" * len(mailboxes))
+        counts = {
+            rowid: (total, unread or 0)
+            for rowid, total, unread in self.index.query(
+                "SELECT m.mailbox, count(*), sum(NOT {read}) FROM messages m"
+                f" WHERE m.mailbox IN ({placeholders}) AND NOT {{deleted}}"
+                " GROUP BY m.mailbox",
+                list(mailboxes),
+            )
+        }
+        return [
+            {
+                "name": name,
+                "message_count": counts.get(rowid, (0, 0))[0],
+                "unread_count": counts.get(rowid, (0, 0))[1],
+            }
+            for rowid, name in sorted(mailboxes.items(), key=lambda item: item[1].lower())
+        ]
+
+    def _plan_search(
+        self,
+        account: str,
+        mailbox: str,
+        filters: tuple[str | None, str | None, bool | None],
+        limit: int | None,
+        after: CursorPosition | None,
+        window: tuple[datetime | None, datetime | None],
+        query: CompiledQuery | None = None,
+    ) -> SearchPlan:
+        """Every search is one query on the Envelope Index (see _search_live)."""
+        return SearchPlan("index", "the Envelope Index answers every search")
+
+    def _search_live(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        after: CursorPosition | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: CompiledQuery | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Search with one query on the Envelope Index (see search_messages).
+
+        Filters match case-insensitively anywhere in the sender ("Name
+        <address>") and subject, like Mail's ``contains``. Results are
+        newest first; a page after a cursor seeks to its (date, ROWID) key,
+        and a date window is a range of date_received. A query expression's
+        pushdown part becomes part of the WHERE clause.
+        """
+        account, mailbox = sanitize_input(account), sanitize_input(mailbox)
+        mailboxes = self._mailbox_ids(account, mailbox)
+
+        conditions = [f"m.mailbox IN ({', '.join('?' * len(mailboxes))})", "NOT {deleted}"]
+        params: list[Any] = list(mailboxes)
+        if sender_contains:
+            conditions.append("instr(lower({sender}), lower(?)) > 0")
+            params.append(sanitize_input(sender_contains))
+        if subject_contains:
+            conditions.append("instr(lower({subject}), lower(?)) > 0")
+            params.append(sanitize_input(subject_contains))
+        if read_status is not None:
+            conditions.append("{read} = ?")
+            params.append(int(read_status))
+        if received_after is not None:
+            conditions.append("m.date_received >= ?")
+            params.append(int(received_after.timestamp()))
+        if received_before is not None:
+            conditions.append("m.date_received < ?")
+            params.append(int(received_before.timestamp()))
+        if query is not None and query.pushdown is not None:
+            condition, values = query.sql(_QUERY_COLUMNS)
+            conditions.append(condition)
+            params.extend(values)
+        if after is not None:
+            conditions.append("(COALESCE(m.date_received, 0), m.ROWID) < (?, ?)")
+            params.extend([after.key or 0, int(after.message_id)])
+        sql = (
+            "SELECT m.ROWID, {subject}, {sender}, m.date_received, {read}"
+            " FROM messages m{joins}"
+            f" WHERE {' AND '.join(conditions)}"
+            " ORDER BY m.date_received DESC, m.ROWID DESC"
+        )
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        messages = [
+            {
+                "id": str(rowid),
+                "subject": subject,
+                "sender": sender,
+                "date_received": format_date(datetime.fromtimestamp(received or 0)),
+                "read_status": bool(read),
+                "timestamp": received,
+            }
+            for rowid, subject, sender, received, read in self.index.query(sql, params)
+        ]
+        return self._remember(account, mailbox, messages)
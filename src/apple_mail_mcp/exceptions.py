@@ -6,7 +6,8 @@ Custom exceptions for Apple Mail MCP operations.
 class MailError(Exception):
     """Base exception for Mail operations."""
 
-    pass
+    error_number: int | None = None
+    """AppleScript error number, when the error was reported by a script."""
 
 
 class MailAccountNotFoundError(MailError):
@@ -43,3 +44,27 @@ class MailOperationCancelledError(MailError):
     """User cancelled the operation."""
 
     pass
+
+
+class MailBusyError(MailError):
+    """Too many requests are queued; the operation was not started."""
+
+    pass
+
+
+class MailTimeoutError(MailAppleScriptError):
+    """Script execution exceeded its timeout and was killed."""
+
+    pass
+
+
+class MailTransientError(MailAppleScriptError):
+    """Mail did not answer or is not running; retrying may succeed."""
+
+    pass
+
+
+class MailUnavailableError(MailError):
+    """Mail is not responding; requests fail fast until it recovers."""
+
+    pass
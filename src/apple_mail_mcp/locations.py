@@ -0,0 +1,141 @@
+"""
+Index of where messages live.
+
+Operations that take message IDs have to find each message first, and Mail
+has no global lookup by id: a script asks every mailbox of every account
+(``first message of mb whose id is X``) until one answers. The index
+remembers the account and mailbox of every message a search returned, so
+scripts can ask that mailbox first and only scan on a miss.
+
+Entries are hints, never trusted blindly: a script that does not find the
+message in the remembered mailbox falls back to the full scan.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any
+
+from .wire import FIELD_SEP
+
+# Entries kept before the least recently used are evicted (~100 bytes each)
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+class MessageLocations:
+    """Thread-safe, bounded map from message id to (account, mailbox)."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        """
+        Initialize the index.
+
+        Args:
+            max_entries: Entries kept before the least recently used are
+                evicted
+        """
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, message_id: str) -> tuple[str, str] | None:
+        """
+        Return the remembered location of a message.
+
+        Args:
+            message_id: Message ID
+
+        Returns:
+            (account, mailbox), or None if the message is not indexed
+        """
+        with self._lock:
+            location = self._entries.get(message_id)
+            if location is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(message_id)
+            return location
+
+    def record(self, account: str, mailbox: str, message_ids: Iterable[str]) -> None:
+        """
+        Remember that messages are in a mailbox.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            message_ids: IDs of messages seen in the mailbox
+        """
+        location = (account, mailbox)
+        with self._lock:
+            for message_id in message_ids:
+                self._entries[message_id] = location
+                self._entries.move_to_end(message_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, message_ids: Iterable[str]) -> None:
+        """
+        Forget messages (deleted, or moved somewhere unknown).
+
+        Args:
+            message_ids: Message IDs
+        """
+        with self._lock:
+            for message_id in message_ids:
+                self._entries.pop(message_id, None)
+
+    def annotate(self, message_ids: Iterable[str]) -> list[str]:
+        """
+        Build script arguments for message IDs, with locations where known.
+
+        Each argument is the id alone, or ``id<US>account<US>mailbox`` (US
+        being the wire field separator) for indexed messages; the
+        ``findMessage`` script handler understands both.
+
+        Args:
+            message_ids: Validated message IDs
+
+        Returns:
+            One argument per id
+        """
+        refs = []
+        for message_id in message_ids:
+            location = self.get(message_id)
+            if location is None:
+                refs.append(message_id)
+            else:
+                refs.append(FIELD_SEP.join((message_id, *location)))
+        return refs
+
+    def group(self, message_ids: Iterable[str]) -> dict[tuple[str, str], list[str]]:
+        """
+        Group message IDs by their remembered location.
+
+        Args:
+            message_ids: Validated message IDs
+
+        Returns:
+            IDs per (account, mailbox), in first-seen order; IDs that are
+            not indexed are grouped under ("", "")
+        """
+        groups: dict[tuple[str, str], list[str]] = {}
+        for message_id in message_ids:
+            groups.setdefault(self.get(message_id) or ("", ""), []).append(message_id)
+        return groups
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return index size and lookup counters.
+
+        Returns:
+            Dictionary with "entries", "hits" and "misses"
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -4,88 +4,705 @@ AppleScript-based connector for Apple Mail.
 
 from __future__ import annotations
 
+import codecs
 import json
 import logging
+import os
+import secrets
+import selectors
 import subprocess
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from contextvars import ContextVar
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
 
+from . import templates, wire
+from .backend import DEFAULT_MAX_MATCHING, MutationResult, SavedAttachments
+from .body_index import DEFAULT_INDEX_BATCH, BodyIndex
+from .emlx import EmlxReader, open_message
 from .exceptions import (
     MailAccountNotFoundError,
     MailAppleScriptError,
+    MailError,
     MailMailboxNotFoundError,
     MailMessageNotFoundError,
+    MailTimeoutError,
+    MailTransientError,
+    MailUnavailableError,
 )
-from .utils import escape_applescript_string, sanitize_input
+from .locations import MessageLocations
+from .message_cache import MessageCache
+from .mime_stream import extract_attachments
+from .pagination import CursorPosition, MessagePage, decode_cursor, next_page, search_digest
+from .planner import (
+    DEFAULT_WINDOW_FRACTION,
+    MAX_CHUNK,
+    MIN_CHUNK,
+    QueryPlanner,
+    SearchPlan,
+    predicate_keys,
+    window_fraction,
+)
+from .query import CompiledQuery, compile_query
+from .resilience import TRANSIENT_ERRORS, CircuitBreaker, RetryPolicy, error_number
+from .scheduler import LaneScheduler
+from .singleflight import SingleFlight
+from .templates import CompiledScriptCache
+from .timeouts import AdaptiveTimeouts
+from .utils import local_days_seconds, sanitize_input, validate_message_id
+from .worker import AppleScriptWorker, ScriptFailedError
 
 logger = logging.getLogger(__name__)
 
+OSASCRIPT = "/usr/bin/osascript"
+
+# Bytes read per call while streaming script output
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Timeout in seconds for the script that checks whether Mail responds again
+PROBE_TIMEOUT = 10
+
+# Message IDs per set-based mutation statement (`whose id is in {...}`);
+# larger groups are split so no single Apple Event grows unbounded
+MUTATION_CHUNK_SIZE = 200
+
+# Actions update_matching() can apply to the messages matching a filter
+MATCHING_ACTIONS = ("mark_as_read", "flag_message", "move_messages", "delete_messages")
+
+# Executes an osascript command line: (command, stdin, timeout) ->
+# (returncode, stdout, stderr). Raises subprocess.TimeoutExpired on timeout.
+ScriptRunner = Callable[[list[str], str | None, float], tuple[int, str, str]]
+
+# Overrides how scripts are executed in the current context. The asyncio
+# front end sets this so that connector methods running in a worker thread
+# hand their osascript processes back to the event loop.
+script_runner: ContextVar[ScriptRunner | None] = ContextVar("script_runner", default=None)
+
+# Operations that can be combined into one script with
+# AppleMailConnector.batch()
+BATCH_OPERATIONS = (
+    "list_accounts",
+    "search_messages",
+    "get_message",
+    "get_attachments",
+    "mark_as_read",
+    "flag_message",
+    "move_messages",
+    "delete_messages",
+    "update_matching",
+)
+
+# error_type reported for each exception in batch results (matches the
+# error_type values the MCP tools use)
+_ERROR_TYPES: dict[type[MailError], str] = {
+    MailAccountNotFoundError: "account_not_found",
+    MailMailboxNotFoundError: "mailbox_not_found",
+    MailMessageNotFoundError: "message_not_found",
+    MailAppleScriptError: "applescript_error",
+    MailTransientError: "transient",
+}
+
+
+class _ScriptCall(NamedTuple):
+    """A prepared operation: template, its argv and the output parser."""
+
+    script: str | None
+    """Template to run, or None if there is nothing to do (parse(""))."""
+
+    args: list[str]
+    parse: Callable[[str], Any]
+    size: int | None = None
+    """Number of message IDs the script works on (None: argv length)."""
+
+
+def _batch_error(operation: str, error_type: str, error: str) -> dict[str, Any]:
+    return {"operation": operation, "success": False, "error": error, "error_type": error_type}
+
+
+def _parse_changed(message_ids: list[str]) -> Callable[[str], MutationResult]:
+    """Parser for mutation templates, which return a wire record of the changed IDs."""
+
+    def parse(output: str) -> MutationResult:
+        return MutationResult.of(message_ids, output.split(wire.FIELD_SEP) if output else [])
+
+    return parse
+
+
+def _window_args(received_after: datetime | None, received_before: datetime | None) -> list[str]:
+    """argv for a date window: local days and seconds of each bound ("" if unset), or none."""
+    if received_after is None and received_before is None:
+        return []
+    args: list[str] = []
+    for moment in (received_after, received_before):
+        args.extend(["", ""] if moment is None else map(str, local_days_seconds(moment)))
+    return args
+
+
+def _split_envelope(output: str, marker: str) -> list[tuple[bool, int | None, str]]:
+    """
+    Split batch script output into (ok, error number, text) per operation.
+
+    Raises:
+        MailAppleScriptError: If the output is not a batch envelope
+    """
+    if not output.startswith(marker):
+        raise MailAppleScriptError(f"Malformed batch output: {output[:200]!r}")
+
+    replies: list[tuple[bool, int | None, str]] = []
+    for chunk in output.split(marker)[1:]:
+        header, _, text = chunk.partition("\n")
+        if header == "ok":
+            replies.append((True, None, text))
+        elif header.startswith("error "):
+            number = header[len("error ") :]
+            replies.append((False, int(number) if number.lstrip("-").isdigit() else None, text))
+        else:
+            raise MailAppleScriptError(f"Malformed batch output: {chunk[:200]!r}")
+    return replies
+
 
 class AppleMailConnector:
     """Interface to Apple Mail via AppleScript."""
 
-    def __init__(self, timeout: int = 60) -> None:
+    def __init__(
+        self,
+        timeout: int = 60,
+        use_worker: bool = False,
+        worker_command: list[str] | None = None,
+        script_cache: CompiledScriptCache | None = None,
+        scheduler: LaneScheduler | None = None,
+        timeouts: AdaptiveTimeouts | None = None,
+        retry: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
+        locations: MessageLocations | None = None,
+        cache: MessageCache | None = None,
+        emlx: EmlxReader | None = None,
+        body_index: BodyIndex | None = None,
+    ) -> None:
         """
         Initialize the Mail connector.
 
         Args:
-            timeout: Timeout in seconds for AppleScript operations
+            timeout: Timeout in seconds for AppleScript operations until their
+                observed latency sets an adaptive timeout
+            use_worker: Run scripts in one persistent runner process instead of
+                spawning osascript for every call
+            worker_command: Runner command line for worker mode (defaults to
+                the bundled JXA runner)
+            script_cache: Cache of compiled script templates
+            scheduler: Lane scheduler that admits script executions (default:
+                a LaneScheduler with the default lanes)
+            timeouts: Per-operation timeout policies (default: adaptive
+                timeouts starting from ``timeout``)
+            retry: Retry policy for transient errors (default: reads are
+                retried up to 3 times, mutations never)
+            breaker: Circuit breaker that fails fast while Mail is
+                unresponsive
+            locations: Index of the mailbox each message was last seen in
+            cache: SQLite cache of message metadata that answers searches
+                (default: none, every search asks Mail)
+            emlx: Reader of Mail's message files, which then supply the
+                headers and body of get_message (default: none, Mail
+                renders the body)
+            body_index: Full-text index of message bodies that answers
+                full_text_search (default: none)
         """
         self.timeout = timeout
+        self.script_cache = script_cache or CompiledScriptCache()
+        self.scheduler = scheduler or LaneScheduler()
+        self.timeouts = timeouts or AdaptiveTimeouts(default=timeout)
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.locations = locations or MessageLocations()
+        self.cache = cache
+        self.emlx = emlx
+        self.body_index = body_index
+        # Identical concurrent reads share one execution
+        self.single_flight = SingleFlight()
+        self.planner = QueryPlanner()
+        self.worker: AppleScriptWorker | None = None
+        if use_worker:
+            self.worker = AppleScriptWorker(command=worker_command, timeout=timeout)
+
+    def close(self) -> None:
+        """Stop the persistent runner process, if one is running."""
+        if self.worker is not None:
+            self.worker.stop()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return scheduling, coalescing, timeout, circuit breaker, location
+        index, planner, compiled query, message cache, message file and body
+        index metrics.
+
+        Returns:
+            Dictionary with "scheduler", "coalescing", "timeouts", "circuit",
+            "locations", "planner" and "queries" entries, plus "cache", "emlx"
+            and "body_index" when a cache, message file reader or body index is
+            attached
+        """
+        queries = compile_query.cache_info()
+        stats = {
+            "scheduler": self.scheduler.stats(),
+            "coalescing": self.single_flight.stats(),
+            "timeouts": self.timeouts.stats(),
+            "circuit": self.breaker.stats(),
+            "locations": self.locations.stats(),
+            "planner": self.planner.stats(),
+            "queries": {"hits": queries.hits, "misses": queries.misses, "size": queries.currsize},
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.emlx is not None:
+            stats["emlx"] = self.emlx.stats()
+        if self.body_index is not None:
+            stats["body_index"] = self.body_index.stats()
+        return stats
+
+    @staticmethod
+    def _error_for(error_msg: str, number: int | None = None) -> MailError:
+        """
+        Map an AppleScript error to the matching exception.
 
-    def _run_applescript(self, script: str) -> str:
+        Args:
+            error_msg: Error text reported by the script
+            number: AppleScript error number (default: parsed from the end
+                of an osascript error message)
+
+        Returns:
+            MailTransientError if the error number means Mail could not be
+            reached, MailAccountNotFoundError, MailMailboxNotFoundError or
+            MailMessageNotFoundError if the message names a missing object,
+            otherwise MailAppleScriptError; ``error_number`` is set on it
+        """
+        if number is None:
+            number = error_number(error_msg)
+
+        error: MailError
+        if number in TRANSIENT_ERRORS:
+            error = MailTransientError(error_msg)
+        elif "Can't get account" in error_msg:
+            error = MailAccountNotFoundError(error_msg)
+        elif "Can't get mailbox" in error_msg:
+            error = MailMailboxNotFoundError(error_msg)
+        elif "Can't get message" in error_msg:
+            error = MailMessageNotFoundError(error_msg)
+        else:
+            error = MailAppleScriptError(error_msg)
+        error.error_number = number
+        return error
+
+    @staticmethod
+    def _raise_for_error(error_msg: str, number: int | None = None) -> None:
+        """
+        Raise the exception matching an AppleScript error.
+
+        Args:
+            error_msg: Error text reported by the script
+            number: AppleScript error number, if known
+
+        Raises:
+            MailTransientError: If Mail could not be reached
+            MailAccountNotFoundError: If account not found
+            MailMailboxNotFoundError: If mailbox not found
+            MailMessageNotFoundError: If message not found
+            MailAppleScriptError: For any other error
+        """
+        logger.error(f"AppleScript error: {error_msg}")
+        raise AppleMailConnector._error_for(error_msg, number)
+
+    def _run_applescript(
+        self,
+        script: str,
+        args: list[str] | None = None,
+        operation: str | None = None,
+        timeout_key: str | None = None,
+        retry: bool | None = None,
+        input_size: int | None = None,
+    ) -> str:
         """
         Execute AppleScript and return output.
 
+        When ``args`` is given, ``script`` is a template with an
+        ``on run argv`` handler: it is compiled once (cached by content hash)
+        and the arguments are passed to the handler instead of being
+        interpolated into the source.
+
+        Execution waits for a slot in the operation's scheduler lane and is
+        killed after the operation's adaptive timeout; its run time feeds
+        that timeout. Transient errors are retried with backoff if the retry
+        policy allows it, and fail fast while the circuit breaker is open.
+
         Args:
             script: AppleScript code to execute
+            args: Arguments for the script's run handler
+            operation: Connector operation name (selects the scheduler lane)
+            timeout_key: Name the run time is tracked under (default: the
+                operation)
+            retry: Whether transient errors may be retried (default: if the
+                retry policy allows the operation)
+            input_size: Number of items (message IDs) the script works on,
+                reported if it times out (default: the number of arguments)
 
         Returns:
             Script output as string
 
         Raises:
+            MailBusyError: If the operation's lane queue is full
+            MailUnavailableError: If Mail is not responding (circuit open)
+            MailTransientError: If Mail could not be reached on every try
+            MailTimeoutError: If the script exceeds its timeout
             MailAppleScriptError: If script execution fails
             MailAccountNotFoundError: If account not found
             MailMailboxNotFoundError: If mailbox not found
             MailMessageNotFoundError: If message not found
         """
+        key = timeout_key or operation
+        if retry is None:
+            retry = self.retry.allows(key)
+
+        attempt = 1
+        while True:
+            self._ensure_available()
+            try:
+                with self.scheduler.slot(operation):
+                    output = self._timed_execute(script, args, key, input_size)
+            except (MailTransientError, MailTimeoutError) as e:
+                self.breaker.record_failure()
+                # Our own timeout already waited as long as the operation
+                # may take, so only errors reported by Mail are retried
+                if not retry or isinstance(e, MailTimeoutError):
+                    raise
+                if attempt >= self.retry.attempts:
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.warning(f"{key or 'script'} failed ({e}), retry {attempt} in {delay:.2f}s")
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return output
+
+    def _timed_execute(
+        self, script: str, args: list[str] | None, key: str | None, input_size: int | None = None
+    ) -> str:
+        """Execute a script with the adaptive timeout for ``key``; record its run time."""
+        timeout = self.timeouts.timeout_for(key)
+        started = time.monotonic()
         try:
-            logger.debug(f"Executing AppleScript: {script[:200]}...")
-
-            result = subprocess.run(
-                ["/usr/bin/osascript", "-"],
-                input=script,
-                text=True,
-                capture_output=True,
-                timeout=self.timeout,
-            )
+            output = self._execute(script, args, timeout)
+        except MailTimeoutError:
+            if input_size is None:
+                input_size = len(args or ())
+            self.timeouts.record_timeout(key, timeout, input_size)
+            raise
+        self.timeouts.record(key, time.monotonic() - started)
+        return output
+
+    def _ensure_available(self) -> None:
+        """
+        Fail fast while the circuit breaker is open; probe Mail when due.
 
-            if result.returncode != 0:
-                error_msg = result.stderr.strip()
-                logger.error(f"AppleScript error: {error_msg}")
-
-                # Parse error and raise appropriate exception
-                if "Can't get account" in error_msg:
-                    raise MailAccountNotFoundError(error_msg)
-                elif "Can't get mailbox" in error_msg:
-                    raise MailMailboxNotFoundError(error_msg)
-                elif "Can't get message" in error_msg:
-                    raise MailMessageNotFoundError(error_msg)
-                else:
-                    raise MailAppleScriptError(error_msg)
+        Raises:
+            MailUnavailableError: If the circuit is open or the probe failed
+        """
+        if not self.breaker.acquire():
+            return
+
+        logger.info("Probing whether Mail responds again")
+        try:
+            with self.scheduler.slot("probe"):
+                self._execute(templates.PROBE, [], PROBE_TIMEOUT)
+        except Exception as e:
+            self.breaker.record_failure()
+            raise MailUnavailableError(f"Mail is not responding: {e}") from e
+        self.breaker.record_success()
+
+    def _execute(self, script: str, args: list[str] | None = None, timeout: float = 60) -> str:
+        """
+        Execute AppleScript without going through the scheduler.
+
+        Args:
+            script: AppleScript code to execute
+            args: Arguments for the script's run handler
+            timeout: Timeout in seconds
+
+        Returns:
+            Script output as string
+        """
+        if self.worker is not None:
+            return self._run_in_worker(self.worker, script, args, timeout)
+
+        logger.debug(f"Executing AppleScript: {script[:200]}...")
+
+        if args is None:
+            return self._run_osascript([OSASCRIPT, "-"], script, timeout)
+        try:
+            compiled = self.script_cache.path_for(script)
+        except OSError as e:
+            raise MailAppleScriptError(f"Unexpected error: {str(e)}") from e
+        return self._run_osascript([OSASCRIPT, str(compiled), *args], None, timeout)
+
+    def _run_osascript(self, command: list[str], script_input: str | None, timeout: float) -> str:
+        """
+        Run an osascript command line and return its output.
+
+        Args:
+            command: osascript command line
+            script_input: Script source to pass on stdin, if any
+            timeout: Timeout in seconds
+
+        Returns:
+            Script output as string
+        """
+        try:
+            runner = script_runner.get()
+            if runner is not None:
+                returncode, stdout, stderr = runner(command, script_input, timeout)
+            else:
+                result = subprocess.run(
+                    command,
+                    input=script_input,
+                    text=True,
+                    capture_output=True,
+                    timeout=timeout,
+                )
+                returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+
+            if returncode != 0:
+                self._raise_for_error(stderr.strip())
 
-            output = result.stdout.strip()
-            logger.debug(f"AppleScript output: {output[:200]}...")
+            # osascript ends its output with a newline; any other whitespace
+            # belongs to the result (e.g. the end of a message body)
+            output = stdout[:-1] if stdout.endswith("\n") else stdout
+            logger.debug(f"Script output: {output[:200]}...")
             return output
 
         except subprocess.TimeoutExpired:
-            raise MailAppleScriptError(f"Script execution timeout after {self.timeout}s")
+            raise MailTimeoutError(f"Script execution timeout after {timeout:g}s") from None
         except Exception as e:
-            if isinstance(e, (MailAccountNotFoundError, MailMailboxNotFoundError,
-                            MailMessageNotFoundError, MailAppleScriptError)):
+            if isinstance(e, MailError):
                 raise
             raise MailAppleScriptError(f"Unexpected error: {str(e)}")
 
+    def _run_in_worker(
+        self,
+        worker: AppleScriptWorker,
+        script: str,
+        args: list[str] | None = None,
+        timeout: float = 60,
+    ) -> str:
+        """
+        Execute AppleScript in the persistent runner process.
+
+        Args:
+            worker: Runner to execute in
+            script: AppleScript code to execute
+            args: Arguments for the script's run handler
+            timeout: Timeout in seconds
+
+        Returns:
+            Script output as string
+        """
+        logger.debug(f"Executing AppleScript in worker: {script[:200]}...")
+
+        try:
+            output = worker.run(script, timeout=timeout, args=args)
+        except ScriptFailedError as e:
+            self._raise_for_error(str(e), e.number)
+            raise
+        except OSError as e:
+            raise MailAppleScriptError(f"Unexpected error: {str(e)}") from e
+
+        logger.debug(f"AppleScript output: {output[:200]}...")
+        return output
+
+    def _execute_call(self, call: _ScriptCall, operation: str) -> Any:
+        """
+        Run a prepared operation and parse its output.
+
+        Args:
+            call: Prepared operation
+            operation: Connector operation name (selects the scheduler lane)
+
+        Returns:
+            Parsed result
+        """
+        if call.script is None:
+            return call.parse("")
+        output = self._run_applescript(
+            call.script, call.args, operation=operation, input_size=call.size
+        )
+        return call.parse(output)
+
+    def batch(self, operations: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Run several operations in a single script execution.
+
+        The operations are compiled into one script and run in order, so a
+        burst of calls costs one osascript run (one Mail wake-up) instead of
+        one per call. A failing operation does not abort the others.
+
+        Args:
+            operations: Operations to run, each
+                ``{"operation": "<name>", "params": {...}}`` where name is
+                one of BATCH_OPERATIONS and params are the keyword
+                arguments of the matching connector method
+
+        Returns:
+            One entry per operation, in order: ``{"operation", "success":
+            True, "result"}`` or ``{"operation", "success": False, "error",
+            "error_type"}`` (plus ``"error_number"`` for script errors)
+
+        Raises:
+            MailAppleScriptError: If the batch script itself fails
+
+        Example:
+            >>> connector.batch([
+            ...     {"operation": "get_message", "params": {"message_id": "12345"}},
+            ...     {"operation": "mark_as_read", "params": {"message_ids": ["12345"]}},
+            ... ])
+            [{"operation": "get_message", "success": True, "result": {...}},
+             {"operation": "mark_as_read", "success": True, "result": 1}]
+        """
+        results: list[dict[str, Any]] = [{} for _ in operations]
+        pending: list[tuple[int, str, _ScriptCall]] = []
+
+        for index, entry in enumerate(operations):
+            name = str(entry.get("operation", ""))
+            try:
+                if name not in BATCH_OPERATIONS:
+                    raise ValueError(f"Unsupported batch operation: {name!r}")
+                params = dict(entry.get("params", {}))
+                if name == "search_messages" and "query" in params:
+                    text = params["query"]
+                    params["query"] = compile_query(str(text)) if text else None
+                call: _ScriptCall = getattr(self, f"_{name}_call")(**params)
+            except (TypeError, ValueError) as e:
+                results[index] = _batch_error(name, "validation_error", str(e))
+                continue
+
+            if call.script is None:
+                results[index] = {"operation": name, "success": True, "result": call.parse("")}
+            else:
+                pending.append((index, name, call))
+
+        if not pending:
+            return results
+
+        # Canonical handler order, so a given set of templates always
+        # produces the same (cached) batch script
+        sources = sorted(
+            {call.script for _, _, call in pending if call.script}, key=templates.script_digest
+        )
+        handler_numbers = {source: number for number, source in enumerate(sources, start=1)}
+
+        marker = f"<<batch:{secrets.token_hex(16)}>>"
+        args = [marker, str(len(pending))]
+        for _, _, call in pending:
+            assert call.script is not None
+            args += [str(handler_numbers[call.script]), str(len(call.args)), *call.args]
+
+        # The batch waits in the least urgent lane among its operations
+        operation = max((name for _, name, _ in pending), key=self.scheduler.priority_of)
+        output = self._run_applescript(
+            templates.batch_script(sources),
+            args,
+            operation=operation,
+            timeout_key="batch",
+            retry=all(self.retry.allows(name) for _, name, _ in pending),
+            input_size=sum(
+                len(call.args) if call.size is None else call.size for _, _, call in pending
+            ),
+        )
+
+        replies = _split_envelope(output, marker)
+        if len(replies) != len(pending):
+            raise MailAppleScriptError(
+                f"Batch returned {len(replies)} results for {len(pending)} operations"
+            )
+
+        for (index, name, call), (ok, number, text) in zip(pending, replies, strict=True):
+            try:
+                if not ok:
+                    raise self._error_for(text, number)
+                results[index] = {"operation": name, "success": True, "result": call.parse(text)}
+            except MailError as e:
+                results[index] = _batch_error(name, _ERROR_TYPES.get(type(e), "unknown"), str(e))
+                if e.error_number is not None:
+                    results[index]["error_number"] = e.error_number
+
+        return results
+
+    @staticmethod
+    def _message_id_args(message_ids: list[str]) -> list[str]:
+        """
+        Validate message IDs before passing them to a script.
+
+        Args:
+            message_ids: Message IDs
+
+        Returns:
+            Sanitized message IDs
+
+        Raises:
+            ValueError: If an ID is not a valid Mail message ID
+        """
+        ids = [sanitize_input(message_id).strip() for message_id in message_ids]
+        for message_id in ids:
+            if not validate_message_id(message_id):
+                raise ValueError(f"Invalid message ID: {message_id!r}")
+        return ids
+
+    def _message_ref_args(self, message_ids: list[str]) -> list[str]:
+        """
+        Validate message IDs and add the location of indexed messages.
+
+        Args:
+            message_ids: Message IDs
+
+        Returns:
+            Script arguments understood by the findMessage handler
+
+        Raises:
+            ValueError: If an ID is not a valid Mail message ID
+        """
+        return self.locations.annotate(self._message_id_args(message_ids))
+
+    def _message_group_args(self, message_ids: list[str]) -> tuple[list[str], list[str]]:
+        """
+        Validate and deduplicate message IDs and group them by mailbox.
+
+        Args:
+            message_ids: Message IDs
+
+        Returns:
+            (distinct IDs, script arguments for the set-based mutation
+            templates: one per chunk of at most MUTATION_CHUNK_SIZE IDs of
+            the same indexed mailbox)
+
+        Raises:
+            ValueError: If an ID is not a valid Mail message ID
+        """
+        ids = list(dict.fromkeys(self._message_id_args(message_ids)))
+        args = []
+        for (account, mailbox), group in self.locations.group(ids).items():
+            for start in range(0, len(group), MUTATION_CHUNK_SIZE):
+                chunk = group[start : start + MUTATION_CHUNK_SIZE]
+                args.append(wire.FIELD_SEP.join((account, mailbox, *chunk)))
+        return ids, args
+
+    def _remember(
+        self, account: str, mailbox: str, messages: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """Index the location of listed messages; returns them unchanged."""
+        self.locations.record(account, mailbox, (message["id"] for message in messages))
+        return messages
+
     def list_accounts(self) -> list[dict[str, Any]]:
         """
         List all mail accounts.
@@ -100,86 +717,289 @@ class AppleMailConnector:
             >>> connector.list_accounts()
             [{"name": "Gmail", "email": "user@gmail.com"}, ...]
         """
-        script = """
-        tell application "Mail"
-            set resultList to {}
+        call = self._list_accounts_call()
+        return self.single_flight.do(
+            ("list_accounts",), lambda: self._execute_call(call, "list_accounts")
+        )
 
-            repeat with acc in accounts
-                set accName to name of acc
-                set emailAddrs to email addresses of acc
+    def _list_accounts_call(self) -> _ScriptCall:
+        return _ScriptCall(templates.LIST_ACCOUNTS, [], wire.ACCOUNT.parse)
 
-                -- Get primary email (first in list)
-                set primaryEmail to ""
-                if (count of emailAddrs) > 0 then
-                    set primaryEmail to item 1 of emailAddrs
-                end if
+    def list_mailboxes(self, account: str) -> list[dict[str, Any]]:
+        """
+        List all mailboxes for an account.
 
-                set accData to accName & "|" & primaryEmail
-                set end of resultList to accData
-            end repeat
+        Args:
+            account: Account name
 
-            -- Join with newlines
-            set AppleScript's text item delimiters to linefeed
-            set output to resultList as text
-            set AppleScript's text item delimiters to ""
+        Returns:
+            List of mailbox dictionaries
 
-            return output
-        end tell
+        Raises:
+            MailAccountNotFoundError: If account doesn't exist
         """
+        args = [sanitize_input(account)]
 
-        result = self._run_applescript(script)
+        def fetch() -> list[dict[str, Any]]:
+            result = self._run_applescript(
+                templates.LIST_MAILBOXES, args, operation="list_mailboxes"
+            )
 
-        # Parse the result
-        accounts = []
-        if result:
-            for line in result.split("\n"):
-                if not line:
-                    continue
-                parts = line.split("|")
-                if len(parts) >= 2:
-                    accounts.append({
-                        "name": parts[0],
-                        "email": parts[1],
-                    })
+            # TODO: Parse AppleScript records properly
+            # For now return raw
+            return [{"raw": result}]
 
-        return accounts
+        return self.single_flight.do(("list_mailboxes", *args), fetch)
 
-    def list_mailboxes(self, account: str) -> list[dict[str, Any]]:
+    def search_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: str | None = None,
+    ) -> MessagePage:
         """
-        List all mailboxes for an account.
+        Search for messages matching criteria.
+
+        Results are newest first. A full page (limit results) carries a
+        next_cursor; passing it back with the same search returns the page
+        after it (see pagination). A date window is a range of the
+        date-ordered listing, so its cost follows the number of messages
+        in the window rather than in the mailbox.
+
+        How the search runs (cache, ``whose`` clause, chunked scan, ...) is
+        chosen by estimated cost (see planner); the page's ``plan`` says
+        which strategy ran, why, and how long planning and execution took.
 
         Args:
             account: Account name
+            mailbox: Mailbox name
+            sender_contains: Filter by sender
+            subject_contains: Filter by subject
+            read_status: Filter by read status (True=read, False=unread)
+            limit: Maximum results (the page size)
+            cursor: next_cursor of the previous page
+            received_after: Only messages received at or after this local time
+            received_before: Only messages received before this local time
+            query: Query expression with AND, OR and NOT (see query), ANDed
+                with the other filters
 
         Returns:
-            List of mailbox dictionaries
+            Page of message dictionaries; a CachedListing (which carries
+            when the mailbox was listed) if the cache answered
 
         Raises:
+            ValueError: If the cursor is invalid, belongs to another search,
+                or its message can no longer be located, or the query is
+                invalid
             MailAccountNotFoundError: If account doesn't exist
+            MailMailboxNotFoundError: If mailbox doesn't exist
         """
-        account_safe = escape_applescript_string(sanitize_input(account))
+        filters = (sender_contains, subject_contains, read_status)
+        window = (received_after, received_before)
+        search = search_digest(account, mailbox, *filters, *window, query=query)
+        after = None if cursor is None else decode_cursor(cursor, search)
+        compiled = compile_query(query) if query else None
+
+        started = time.perf_counter()
+        plan = self._plan_search(account, mailbox, filters, limit, after, window, compiled)
+        planned = time.perf_counter()
+        page = self._run_plan(
+            plan, account, mailbox, filters, limit, after, window, search, compiled
+        )
+        page.plan = plan.explain(
+            plan_ms=(planned - started) * 1000, execute_ms=(time.perf_counter() - planned) * 1000
+        )
+        return page
 
-        script = f"""
-        tell application "Mail"
-            set accountRef to account "{account_safe}"
-            set mailboxList to {{}}
+    def _plan_search(
+        self,
+        account: str,
+        mailbox: str,
+        filters: tuple[str | None, str | None, bool | None],
+        limit: int | None,
+        after: CursorPosition | None,
+        window: tuple[datetime | None, datetime | None],
+        query: CompiledQuery | None = None,
+    ) -> SearchPlan:
+        """
+        Choose how a search runs (see planner).
 
-            repeat with mb in mailboxes of accountRef
-                set mbInfo to {{mbName:(name of mb), unreadCount:(unread count of mb)}}
-                set end of mailboxList to mbInfo
-            end repeat
+        The signals are the cache's last listing of the mailbox (size,
+        date span and age), else a recently recorded size, else, for a
+        filtered search without a cache, ``count of messages``. A query
+        expression compiles to SQL on the cache or to a ``whose`` clause;
+        the planner's estimates do not cover it.
+        """
+        if after is not None:
+            if self.cache is not None:
+                return SearchPlan("cache", "pages of a cached search continue in the cache")
+            return SearchPlan("page", "the page continues after the cursor's message")
+
+        account, mailbox = sanitize_input(account), sanitize_input(mailbox)
+        predicates = predicate_keys(*filters)
+        if query is not None:
+            if self.cache is not None:
+                return SearchPlan("cache", "the query compiles to SQL on the cache")
+            if query.whose is None and not predicates:
+                return SearchPlan("range", "the query can only be evaluated here")
+            return SearchPlan("whose", "the query compiles to a whose clause")
+        cache, size, fraction = None, None, DEFAULT_WINDOW_FRACTION
+        if self.cache is not None:
+            cache = "stale"
+            stats = self.cache.mailbox_stats(account, mailbox)
+            if stats is not None:
+                if time.time() - stats["synced_at"] < self.cache.max_age:
+                    cache = "fresh"
+                size = stats["messages"]
+                fraction = window_fraction(*window, stats["oldest"], stats["newest"])
+        if size is None:
+            size = self.planner.mailbox_size(account, mailbox)
+        if size is None and predicates and cache is None:
+            size = self._count_messages(account, mailbox)
+        bounds = sum(moment is not None for moment in window)
+        return self.planner.plan(account, mailbox, predicates, limit, size, bounds, fraction, cache)
+
+    def _run_plan(
+        self,
+        plan: SearchPlan,
+        account: str,
+        mailbox: str,
+        filters: tuple[str | None, str | None, bool | None],
+        limit: int | None,
+        after: CursorPosition | None,
+        window: tuple[datetime | None, datetime | None],
+        search: str,
+        query: CompiledQuery | None = None,
+    ) -> MessagePage:
+        """Run a search as planned and record what it showed about the filters."""
+        account, mailbox = sanitize_input(account), sanitize_input(mailbox)
+        if query is not None and query.residual is not None:
+            return self._run_residual(
+                plan, account, mailbox, filters, limit, after, window, search, query
+            )
 
-            return mailboxList
-        end tell
+        if plan.strategy == "cache":
+            assert self.cache is not None
+            if not self.cache.is_fresh(account, mailbox):
+                self.sync_mailbox(account, mailbox)
+            listing = self.cache.search(
+                account, mailbox, *filters, limit, after, *window, query=query
+            )
+            self._remember(account, mailbox, listing)
+            return next_page(listing, limit, search)
+
+        predicates = predicate_keys(*filters)
+        messages: list[dict[str, Any]]
+        if plan.strategy in ("scan", "hybrid"):
+            messages, examined, size = self._search_scan(
+                account, mailbox, *filters, limit, plan.chunk_size, *window
+            )
+            self.planner.record_size(account, mailbox, size)
+            self.planner.observe(account, mailbox, predicates, len(messages), examined)
+        else:
+            messages = self._search_live(
+                account, mailbox, *filters, limit, after, *window, query=query
+            )
+            complete = not limit or len(messages) < limit
+            if plan.strategy == "whose" and plan.mailbox_size and complete and not any(window):
+                self.planner.observe(account, mailbox, predicates, len(messages), plan.mailbox_size)
+
+        if after is None and limit and (window[1] is None or predicates or query):
+            # The first page is the start of the listing (the mailbox, or
+            # the filtered messages); only an unfiltered window that ends
+            # before the newest message starts further down
+            return next_page(messages, limit, search, last_index=len(messages))
+        return next_page(messages, limit, search)
+
+    def _run_residual(
+        self,
+        plan: SearchPlan,
+        account: str,
+        mailbox: str,
+        filters: tuple[str | None, str | None, bool | None],
+        limit: int | None,
+        after: CursorPosition | None,
+        window: tuple[datetime | None, datetime | None],
+        search: str,
+        query: CompiledQuery,
+    ) -> MessagePage:
         """
+        Run a query whose residual is tested here, a page of candidates at a time.
 
-        result = self._run_applescript(script)
+        The limit applies to the messages the residual accepts, so candidates
+        are fetched in growing pages (from MIN_CHUNK up to MAX_CHUNK) until
+        enough have matched or the listing ends.
+        """
+        residual = query.residual_filter()
+        assert residual is not None
+        pushed = query._replace(residual=None)
+        fetch = max(limit, MIN_CHUNK) if limit else None
+        matched: list[dict[str, Any]] = []
+        while True:
+            page = self._run_plan(
+                plan, account, mailbox, filters, fetch, after, window, search, pushed
+            )
+            matched.extend(message for message in page if residual(message))
+            if page.next_cursor is None or (limit and len(matched) >= limit):
+                break
+            after = decode_cursor(page.next_cursor, search)
+            fetch = min(2 * fetch, MAX_CHUNK) if fetch else None
+        return next_page(matched[:limit] if limit else matched, limit, search)
+
+    def _count_messages(self, account: str, mailbox: str) -> int | None:
+        """Ask Mail for a mailbox's message count and record it (None if the reply is not one)."""
+
+        def parse(output: str) -> int | None:
+            return int(output) if output.strip().isdigit() else None
+
+        call = _ScriptCall(templates.COUNT_MESSAGES, [account, mailbox], parse)
+        count: int | None = self.single_flight.do(
+            ("count_messages", account, mailbox),
+            lambda: self._execute_call(call, "count_messages"),
+        )
+        if count is not None:
+            self.planner.record_size(account, mailbox, count)
+        return count
 
-        # TODO: Parse AppleScript records properly
-        # For now return raw
-        return [{"raw": result}]
+    def sync_mailbox(self, account: str, mailbox: str = "INBOX") -> int:
+        """
+        List a whole mailbox from Mail into the message cache.
 
-    def search_messages(
+        Concurrent syncs of the same mailbox share one listing.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+
+        Returns:
+            Number of messages in the mailbox
+
+        Raises:
+            MailError: If no cache is attached
+            MailAccountNotFoundError: If account doesn't exist
+            MailMailboxNotFoundError: If mailbox doesn't exist
+        """
+        cache = self.cache
+        if cache is None:
+            raise MailError("No message cache is attached")
+        account, mailbox = sanitize_input(account), sanitize_input(mailbox)
+
+        def sync() -> int:
+            messages = self._search_live(account, mailbox)
+            cache.store_mailbox(account, mailbox, messages)
+            self.planner.record_size(account, mailbox, len(messages))
+            return len(messages)
+
+        return self.single_flight.do(("sync_mailbox", account, mailbox), sync)
+
+    def _search_live(
         self,
         account: str,
         mailbox: str = "INBOX",
@@ -187,9 +1007,97 @@ class AppleMailConnector:
         subject_contains: str | None = None,
         read_status: bool | None = None,
         limit: int | None = None,
+        after: CursorPosition | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: CompiledQuery | None = None,
     ) -> list[dict[str, Any]]:
+        """Search by asking Mail (see search_messages); a query's residual is not applied."""
+        filters = (sender_contains, subject_contains, read_status)
+        window = (received_after, received_before)
+        if after is None:
+            call = self._search_messages_call(
+                account, mailbox, *filters, limit, *window, query=query
+            )
+        else:
+            call = self._search_page_call(
+                account, mailbox, *filters, limit, after, *window, query=query
+            )
+        assert call.script is not None
+        key = ("search_messages", templates.script_digest(call.script), *call.args)
+        return self.single_flight.do(key, lambda: self._execute_call(call, "search_messages"))
+
+    def _search_scan(
+        self,
+        account: str,
+        mailbox: str,
+        sender_contains: str | None,
+        subject_contains: str | None,
+        read_status: bool | None,
+        limit: int | None,
+        chunk_size: int,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+    ) -> tuple[list[dict[str, Any]], int, int]:
         """
-        Search for messages matching criteria.
+        Search by scanning the mailbox in chunks (see templates.scan_messages_script).
+
+        Returns:
+            (messages, number of messages examined, number in the mailbox)
+        """
+        script = templates.scan_messages_script(
+            sender=bool(sender_contains),
+            subject=bool(subject_contains),
+            read_status=read_status is not None,
+            received_after=received_after is not None,
+            received_before=received_before is not None,
+        )
+        args = [
+            sanitize_input(account),
+            sanitize_input(mailbox),
+            sanitize_input(sender_contains),
+            sanitize_input(subject_contains),
+            "" if read_status is None else str(read_status).lower(),
+            str(limit or 0),
+            str(chunk_size),
+            *_window_args(received_after, received_before),
+        ]
+
+        def parse(output: str) -> tuple[list[dict[str, Any]], int, int]:
+            examined, _, rest = output.partition(wire.RECORD_SEP)
+            size, _, columns = rest.partition(wire.RECORD_SEP)
+            if not (examined.isdigit() and size.isdigit()):
+                raise MailAppleScriptError(f"Malformed script output: {output[:200]!r}")
+            messages = wire.MESSAGE_SUMMARY.parse_columns(columns)
+            return self._remember(args[0], args[1], messages), int(examined), int(size)
+
+        call = _ScriptCall(script, args, parse)
+        key = ("search_messages", templates.script_digest(script), *args)
+        result: tuple[list[dict[str, Any]], int, int] = self.single_flight.do(
+            key, lambda: self._execute_call(call, "search_messages")
+        )
+        return result
+
+    def iter_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Stream messages matching criteria while the search is running.
+
+        Unlike search_messages, records are yielded as the script finds
+        them, so the first result arrives after the first match and memory
+        stays flat however large the mailbox is. Stopping early (break, or
+        close() on the generator) kills the script.
+
+        The script runs outside the persistent worker. It takes a bulk-lane
+        scheduler slot only while it starts, and the operation's timeout
+        bounds the wait for each record rather than the whole run.
 
         Args:
             account: Account name
@@ -199,193 +1107,213 @@ class AppleMailConnector:
             read_status: Filter by read status (True=read, False=unread)
             limit: Maximum results
 
-        Returns:
-            List of message dictionaries
+        Yields:
+            Message dictionaries (same keys as search_messages)
 
         Raises:
+            MailUnavailableError: If Mail is not responding (circuit open)
             MailAccountNotFoundError: If account doesn't exist
             MailMailboxNotFoundError: If mailbox doesn't exist
+            MailTimeoutError: If the script produces no output for longer
+                than the operation's timeout
+            MailAppleScriptError: If the script fails
+
+        Example:
+            >>> for message in connector.iter_messages("Gmail", sender_contains="boss"):
+            ...     if message["subject"].startswith("Urgent"):
+            ...         break  # the script is killed here
         """
-        account_safe = escape_applescript_string(sanitize_input(account))
-        mailbox_safe = escape_applescript_string(sanitize_input(mailbox))
-
-        # Build whose clause
-        conditions = []
-        if sender_contains:
-            sender_safe = escape_applescript_string(sanitize_input(sender_contains))
-            conditions.append(f'sender contains "{sender_safe}"')
-
-        if subject_contains:
-            subject_safe = escape_applescript_string(sanitize_input(subject_contains))
-            conditions.append(f'subject contains "{subject_safe}"')
-
-        if read_status is not None:
-            status = "true" if read_status else "false"
-            conditions.append(f"read status is {status}")
-
-        # Build filter conditions for inline checking
-        filter_checks = []
-        if sender_contains:
-            sender_safe = escape_applescript_string(sanitize_input(sender_contains))
-            filter_checks.append(f'(sender of msg contains "{sender_safe}")')
-
-        if subject_contains:
-            subject_safe = escape_applescript_string(sanitize_input(subject_contains))
-            filter_checks.append(f'(subject of msg contains "{subject_safe}")')
-
-        if read_status is not None:
-            status = "true" if read_status else "false"
-            filter_checks.append(f"(read status of msg is {status})")
-
-        # When we have a limit, process messages one by one with early exit
-        # This avoids loading all messages into memory first
-        if limit and filter_checks:
-            # With limit and filters: iterate through all messages, check conditions inline
-            filter_condition = " and ".join(filter_checks)
-            script = f"""
-        tell application "Mail"
-            set accountRef to account "{account_safe}"
-            set mailboxRef to mailbox "{mailbox_safe}" of accountRef
-
-            set resultList to {{}}
-            set matchCount to 0
-
-            repeat with msg in (messages of mailboxRef)
-                -- Check if message matches all filter conditions
-                if {filter_condition} then
-                    set matchCount to matchCount + 1
-
-                    set msgId to id of msg as text
-                    set msgSubject to subject of msg
-                    set msgSender to sender of msg
-                    set msgDate to date received of msg as text
-                    set msgRead to read status of msg
-
-                    set msgData to msgId & "|" & msgSubject & "|" & msgSender & "|" & msgDate & "|" & msgRead
-                    set end of resultList to msgData
-
-                    if matchCount >= {limit} then exit repeat
-                end if
-            end repeat
-
-            -- Join with newlines
-            set AppleScript's text item delimiters to linefeed
-            set output to resultList as text
-            set AppleScript's text item delimiters to ""
+        args = [
+            sanitize_input(account),
+            sanitize_input(mailbox),
+            sanitize_input(sender_contains),
+            sanitize_input(subject_contains),
+            "" if read_status is None else str(read_status).lower(),
+            str(limit or 0),
+        ]
+
+        # Not retried: records may already have been yielded. The lane slot
+        # only covers starting the script, so a caller may run other bulk
+        # operations while it iterates, and abandoned iterators block no one.
+        self._ensure_available()
+        timeout = self.timeouts.timeout_for("iter_messages")
+        with self.scheduler.slot("iter_messages"):
+            try:
+                compiled = self.script_cache.path_for(templates.ITER_MESSAGES)
+                process = subprocess.Popen(
+                    [OSASCRIPT, str(compiled), *args],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                )
+            except OSError as e:
+                raise MailAppleScriptError(f"Unexpected error: {str(e)}") from e
 
-            return output
-        end tell
-        """
-        elif limit:
-            # With limit but no filters: get first N messages directly
-            script = f"""
-        tell application "Mail"
-            set accountRef to account "{account_safe}"
-            set mailboxRef to mailbox "{mailbox_safe}" of accountRef
-
-            set allMessages to messages of mailboxRef
-            set msgCount to count of allMessages
-            if msgCount > {limit} then set msgCount to {limit}
-
-            set resultList to {{}}
-            repeat with i from 1 to msgCount
-                set msg to item i of allMessages
-
-                set msgId to id of msg as text
-                set msgSubject to subject of msg
-                set msgSender to sender of msg
-                set msgDate to date received of msg as text
-                set msgRead to read status of msg
-
-                set msgData to msgId & "|" & msgSubject & "|" & msgSender & "|" & msgDate & "|" & msgRead
-                set end of resultList to msgData
-            end repeat
-
-            -- Join with newlines
-            set AppleScript's text item delimiters to linefeed
-            set output to resultList as text
-            set AppleScript's text item delimiters to ""
+        count = 0
+        try:
+            for record in self._stream_records(process, wire.MESSAGE_SUMMARY, timeout):
+                count += 1
+                yield record
+        except (MailTransientError, MailTimeoutError) as e:
+            self.breaker.record_failure()
+            if isinstance(e, MailTimeoutError):
+                self.timeouts.record_timeout("iter_messages", timeout, count)
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            if process.poll() is None:
+                logger.debug(f"Stopping streaming script {process.pid}")
+                process.kill()
+            process.wait()
+            if process.stderr is not None:
+                process.stderr.close()
+
+    def _stream_records(
+        self, process: subprocess.Popen[bytes], schema: wire.RecordSchema, timeout: float
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Parse records a streaming script writes to stderr as they arrive.
 
-            return output
-        end tell
-        """
-        elif filter_checks:
-            # No limit but with filters: use whose clause for efficiency
-            whose_clause = " and ".join(conditions)
-            script = f"""
-        tell application "Mail"
-            set accountRef to account "{account_safe}"
-            set mailboxRef to mailbox "{mailbox_safe}" of accountRef
-            set matchedMessages to (messages of mailboxRef whose {whose_clause})
-
-            set resultList to {{}}
-            repeat with msg in matchedMessages
-                set msgId to id of msg as text
-                set msgSubject to subject of msg
-                set msgSender to sender of msg
-                set msgDate to date received of msg as text
-                set msgRead to read status of msg
-
-                set msgData to msgId & "|" & msgSubject & "|" & msgSender & "|" & msgDate & "|" & msgRead
-                set end of resultList to msgData
-            end repeat
-
-            -- Join with newlines
-            set AppleScript's text item delimiters to linefeed
-            set output to resultList as text
-            set AppleScript's text item delimiters to ""
+        Each record is terminated by RS and the linefeed ``log`` appends;
+        whatever follows the last record is the script's error output.
 
-            return output
-        end tell
-        """
-        else:
-            # No limit and no filters: get all messages
-            script = f"""
-        tell application "Mail"
-            set accountRef to account "{account_safe}"
-            set mailboxRef to mailbox "{mailbox_safe}" of accountRef
-            set matchedMessages to messages of mailboxRef
-
-            set resultList to {{}}
-            repeat with msg in matchedMessages
-                set msgId to id of msg as text
-                set msgSubject to subject of msg
-                set msgSender to sender of msg
-                set msgDate to date received of msg as text
-                set msgRead to read status of msg
-
-                set msgData to msgId & "|" & msgSubject & "|" & msgSender & "|" & msgDate & "|" & msgRead
-                set end of resultList to msgData
-            end repeat
-
-            -- Join with newlines
-            set AppleScript's text item delimiters to linefeed
-            set output to resultList as text
-            set AppleScript's text item delimiters to ""
+        Args:
+            process: Running script
+            schema: Record schema
+            timeout: Longest wait for output, in seconds
 
-            return output
-        end tell
-        """
-
-        result = self._run_applescript(script)
-
-        # Parse results
-        messages = []
-        if result:
-            for line in result.split("\n"):
-                if not line:
-                    continue
-                parts = line.split("|")
-                if len(parts) >= 5:
-                    messages.append({
-                        "id": parts[0],
-                        "subject": parts[1],
-                        "sender": parts[2],
-                        "date_received": parts[3],
-                        "read_status": parts[4].lower() == "true",
-                    })
+        Yields:
+            Parsed records
 
-        return messages
+        Raises:
+            MailTimeoutError: If the script produces no output for longer
+                than the timeout
+        """
+        assert process.stderr is not None
+        fd = process.stderr.fileno()
+        terminator = wire.RECORD_SEP + "\n"
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while True:
+                if not selector.select(timeout):
+                    raise MailTimeoutError(f"Script execution timeout: no output for {timeout:g}s")
+
+                chunk = os.read(fd, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                buffer += decoder.decode(chunk)
+                *records, buffer = buffer.split(terminator)
+                for record in records:
+                    parsed = schema.parse_one(record)
+                    if parsed is not None:
+                        yield parsed
+
+        buffer += decoder.decode(b"", final=True)
+        if process.wait() != 0:
+            self._raise_for_error(buffer.strip())
+
+    def _search_messages_call(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: CompiledQuery | None = None,
+    ) -> _ScriptCall:
+        whose = None if query is None else query.whose
+        residual = None if query is None else query.residual_filter()
+        kept = limit
+        if residual is not None:
+            # The limit applies to what the residual accepts (see parse)
+            limit = None
+        script = templates.search_messages_script(
+            sender=bool(sender_contains),
+            subject=bool(subject_contains),
+            read_status=read_status is not None,
+            limited=bool(limit),
+            received_after=received_after is not None,
+            received_before=received_before is not None,
+            query=whose,
+        )
+        args = [
+            sanitize_input(account),
+            sanitize_input(mailbox),
+            sanitize_input(sender_contains),
+            sanitize_input(subject_contains),
+            "" if read_status is None else str(read_status).lower(),
+            str(limit or 0),
+            *_window_args(received_after, received_before),
+            *([] if whose is None else whose.args()),
+        ]
+
+        def parse(output: str) -> list[dict[str, Any]]:
+            messages = wire.MESSAGE_SUMMARY.parse_columns(output)
+            if residual is not None:
+                messages = [message for message in messages if residual(message)][: kept or None]
+            return self._remember(args[0], args[1], messages)
+
+        return _ScriptCall(script, args, parse)
+
+    def _search_page_call(
+        self,
+        account: str,
+        mailbox: str,
+        sender_contains: str | None,
+        subject_contains: str | None,
+        read_status: bool | None,
+        limit: int | None,
+        after: CursorPosition,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: CompiledQuery | None = None,
+    ) -> _ScriptCall:
+        whose = None if query is None else query.whose
+        script = templates.search_page_script(
+            sender=bool(sender_contains),
+            subject=bool(subject_contains),
+            read_status=read_status is not None,
+            received_after=received_after is not None,
+            received_before=received_before is not None,
+            query=whose,
+        )
+        local_key = after.local_key()
+        args = [
+            sanitize_input(account),
+            sanitize_input(mailbox),
+            sanitize_input(sender_contains),
+            sanitize_input(subject_contains),
+            "" if read_status is None else str(read_status).lower(),
+            str(limit or 0),
+            str(after.listing_index),
+            after.message_id,
+            "" if local_key is None else str(local_key[0]),
+            "" if local_key is None else str(local_key[1]),
+            *_window_args(received_after, received_before),
+            *([] if whose is None else whose.args()),
+        ]
+
+        def parse(output: str) -> MessagePage:
+            last_index, _, columns = output.partition(wire.RECORD_SEP)
+            if last_index == "lost":
+                raise ValueError(
+                    "The cursor's message is no longer in the mailbox; search again without it"
+                )
+            if not last_index.isdigit():
+                raise MailAppleScriptError(f"Malformed script output: {output[:200]!r}")
+            messages = wire.MESSAGE_SUMMARY.parse_columns(columns)
+            self._remember(args[0], args[1], messages)
+            return MessagePage(messages, last_index=int(last_index))
+
+        return _ScriptCall(script, args, parse)
 
     def get_message(self, message_id: str, include_content: bool = True) -> dict[str, Any]:
         """
@@ -396,60 +1324,180 @@ class AppleMailConnector:
             include_content: Include message body
 
         Returns:
-            Message dictionary
+            Message dictionary; read from the message file (see emlx), the
+            content is the decoded text body and "headers" maps header
+            names to values
 
         Raises:
             MailMessageNotFoundError: If message doesn't exist
         """
-        message_id_safe = escape_applescript_string(sanitize_input(message_id))
+        if include_content and self.emlx is not None:
+            # Mail only reports the state; the body comes from disk
+            message = self._get_message(message_id, include_content=False)
+            local = self.emlx.read(message["id"], self._emlx_hint(message["id"]))
+            if local is not None:
+                message = {**message, "content": local["content"], "headers": local["headers"]}
+            else:
+                logger.debug(f"No message file for {message_id}, asking Mail for the content")
+                message = self._get_message(message_id, include_content)
+        else:
+            message = self._get_message(message_id, include_content)
+        if include_content and self.body_index is not None:
+            location = self.locations.get(message["id"])
+            if location is not None:
+                # Bodies read anyway keep the index current
+                self.body_index.add(*location, [message])
+        return message
+
+    def index_mailbox(
+        self, account: str, mailbox: str = "INBOX", limit: int | None = DEFAULT_INDEX_BATCH
+    ) -> dict[str, int]:
+        """
+        Bring a mailbox's entries in the body index up to date.
 
-        # Note: Direct message ID lookup is tricky in AppleScript
-        # We need to search through mailboxes
-        # For now, we'll use a simplified approach
+        Lists the mailbox (see _index_listing), reads the bodies of the
+        messages the index does not have yet, newest first, and removes the
+        entries of messages that left the mailbox. Bodies come from the
+        message files when an emlx reader is attached, otherwise from Mail.
+        Concurrent calls for the same mailbox share one run.
 
-        content_clause = 'set msgContent to content of msg' if include_content else 'set msgContent to ""'
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            limit: Most bodies read in this call (None = all); the rest are
+                read by later calls
 
-        script = f"""
-        tell application "Mail"
-            -- Search all accounts for message
-            repeat with acc in accounts
-                repeat with mb in mailboxes of acc
-                    try
-                        set msg to first message of mb whose id is {message_id_safe}
+        Returns:
+            Dictionary with "indexed" (messages added), "pending" (messages
+            still missing) and "removed" (entries dropped)
 
-                        set msgId to id of msg as text
-                        set msgSubject to subject of msg
-                        set msgSender to sender of msg
-                        set msgDate to date received of msg as text
-                        set msgRead to read status of msg
-                        set msgFlagged to flagged status of msg
-                        {content_clause}
+        Raises:
+            MailError: If no body index is attached
+            MailAccountNotFoundError: If account doesn't exist
+            MailMailboxNotFoundError: If mailbox doesn't exist
+        """
+        body_index = self.body_index
+        if body_index is None:
+            raise MailError("No body index is attached")
+        account, mailbox = sanitize_input(account), sanitize_input(mailbox)
+
+        def index() -> dict[str, int]:
+            listing = self._index_listing(account, mailbox)
+            removed = body_index.prune(account, mailbox, (m["id"] for m in listing))
+            known = body_index.indexed(m["id"] for m in listing)
+            missing = [m for m in listing if m["id"] not in known]
+            batch = missing if limit is None else missing[:limit]
+            for message in batch:
+                local = None
+                if self.emlx is not None:
+                    local = self.emlx.read(message["id"], (account, mailbox))
+                if local is not None:
+                    content = local["content"]
+                else:
+                    content = self._get_message(message["id"])["content"]
+                body_index.add(account, mailbox, [{**message, "content": content}])
+            return {
+                "indexed": len(batch),
+                "pending": len(missing) - len(batch),
+                "removed": removed,
+            }
 
-                        return msgId & "|" & msgSubject & "|" & msgSender & "|" & msgDate & "|" & msgRead & "|" & msgFlagged & "|" & msgContent
-                    end try
-                end repeat
-            end repeat
+        return self.single_flight.do(("index_mailbox", account, mailbox, limit), index)
 
-            error "Message not found"
-        end tell
+    def _index_listing(self, account: str, mailbox: str) -> list[dict[str, Any]]:
         """
+        List a whole mailbox for index_mailbox.
 
-        result = self._run_applescript(script)
+        With a message cache the listing comes from the cache, and Mail is
+        only asked again once the cached listing is stale; without one it
+        is a single listing from Mail.
+        """
+        if self.cache is None:
+            return self._search_live(account, mailbox)
+        if not self.cache.is_fresh(account, mailbox):
+            self.sync_mailbox(account, mailbox)
+        return self.cache.search(account, mailbox)
 
-        # Parse result
-        parts = result.split("|", 6)  # Max 7 parts
-        if len(parts) >= 6:
-            return {
-                "id": parts[0],
-                "subject": parts[1],
-                "sender": parts[2],
-                "date_received": parts[3],
-                "read_status": parts[4].lower() == "true",
-                "flagged": parts[5].lower() == "true",
-                "content": parts[6] if len(parts) > 6 else "",
-            }
+    def full_text_search(
+        self,
+        query: str,
+        account: str | None = None,
+        mailbox: str | None = None,
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """
+        Search the bodies, subjects and senders of indexed messages.
+
+        Only messages in the body index are found; see index_mailbox.
+
+        Args:
+            query: Words, "quoted phrases", prefix* and -excluded terms
+            account: Only search this account
+            mailbox: Only search this mailbox
+            limit: Maximum results
 
-        raise MailMessageNotFoundError(f"Could not parse message: {message_id}")
+        Returns:
+            Message dictionaries with "score" and a highlighted "snippet",
+            best match first
+
+        Raises:
+            MailError: If no body index is attached
+            ValueError: If the query has no term that must occur
+        """
+        if self.body_index is None:
+            raise MailError("No body index is attached")
+        results = self.body_index.search(
+            query,
+            None if account is None else sanitize_input(account),
+            None if mailbox is None else sanitize_input(mailbox),
+            limit,
+        )
+        for result in results:
+            self.locations.record(result["account"], result["mailbox"], [result["id"]])
+        return results
+
+    def _get_message(self, message_id: str, include_content: bool = True) -> dict[str, Any]:
+        """Get a message from Mail (see get_message)."""
+        call = self._get_message_call(message_id, include_content)
+        result: dict[str, Any] = self._execute_call(call, "get_message")
+        return result
+
+    def _emlx_hint(self, message_id: str) -> tuple[str, str] | None:
+        """Return the (account, mailbox) to look for a message's file in first."""
+        return self.locations.get(message_id)
+
+    def _get_message_call(self, message_id: str, include_content: bool = True) -> _ScriptCall:
+        # Note: Direct message ID lookup is tricky in AppleScript
+        # We need to search through mailboxes
+        args = [*self._message_ref_args([message_id]), str(include_content).lower()]
+
+        def parse(result: str) -> dict[str, Any]:
+            try:
+                message = wire.MESSAGE.parse_one(result)
+            except MailAppleScriptError:
+                message = None
+            if message is None:
+                raise MailMessageNotFoundError(f"Could not parse message: {message_id}")
+            return message
+
+        return _ScriptCall(templates.GET_MESSAGE, args, parse)
+
+    @staticmethod
+    def _compose_args(
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None,
+        bcc: list[str] | None,
+    ) -> list[str]:
+        """Build argv for the compose templates (lists are linefeed-joined)."""
+        return [
+            sanitize_input(subject),
+            sanitize_input(body),
+            "\n".join(sanitize_input(addr) for addr in to),
+            "\n".join(sanitize_input(addr) for addr in (cc or [])),
+            "\n".join(sanitize_input(addr) for addr in (bcc or [])),
+        ]
 
     def send_email(
         self,
@@ -475,42 +1523,9 @@ class AppleMailConnector:
         Raises:
             MailAppleScriptError: If send fails
         """
-        subject_safe = escape_applescript_string(sanitize_input(subject))
-        body_safe = escape_applescript_string(sanitize_input(body))
-
-        # Build recipient lists
-        to_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in to)
-        cc_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in (cc or []))
-        bcc_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in (bcc or []))
-
-        script = f"""
-        tell application "Mail"
-            set theMessage to make new outgoing message with properties {{subject:"{subject_safe}", content:"{body_safe}", visible:false}}
-
-            tell theMessage
-                -- Add To recipients
-                repeat with addr in {{{to_list}}}
-                    make new to recipient with properties {{address:addr}}
-                end repeat
-
-                -- Add CC recipients
-                repeat with addr in {{{cc_list}}}
-                    make new cc recipient with properties {{address:addr}}
-                end repeat
-
-                -- Add BCC recipients
-                repeat with addr in {{{bcc_list}}}
-                    make new bcc recipient with properties {{address:addr}}
-                end repeat
+        args = self._compose_args(subject, body, to, cc, bcc)
 
-                send
-            end tell
-
-            return "sent"
-        end tell
-        """
-
-        result = self._run_applescript(script)
+        result = self._run_applescript(templates.SEND_EMAIL, args, operation="send_email")
         return result == "sent"
 
     def create_draft(
@@ -537,48 +1552,12 @@ class AppleMailConnector:
         Raises:
             MailAppleScriptError: If draft creation fails
         """
-        subject_safe = escape_applescript_string(sanitize_input(subject))
-        body_safe = escape_applescript_string(sanitize_input(body))
-
-        # Build recipient lists
-        to_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in to)
-        cc_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in (cc or []))
-        bcc_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in (bcc or []))
-
-        script = f"""
-        tell application "Mail"
-            set theMessage to make new outgoing message with properties {{subject:"{subject_safe}", content:"{body_safe}", visible:false}}
-
-            tell theMessage
-                -- Add To recipients
-                repeat with addr in {{{to_list}}}
-                    make new to recipient with properties {{address:addr}}
-                end repeat
-
-                -- Add CC recipients
-                repeat with addr in {{{cc_list}}}
-                    make new cc recipient with properties {{address:addr}}
-                end repeat
-
-                -- Add BCC recipients
-                repeat with addr in {{{bcc_list}}}
-                    make new bcc recipient with properties {{address:addr}}
-                end repeat
-
-                -- Save as draft (don't send)
-                save
-            end tell
-
-            -- Return the message ID
-            set msgId to id of theMessage as text
-            return "draft_" & msgId
-        end tell
-        """
+        args = self._compose_args(subject, body, to, cc, bcc)
 
-        result = self._run_applescript(script)
+        result = self._run_applescript(templates.CREATE_DRAFT, args, operation="create_draft")
         return result
 
-    def mark_as_read(self, message_ids: list[str], read: bool = True) -> int:
+    def mark_as_read(self, message_ids: list[str], read: bool = True) -> MutationResult:
         """
         Mark messages as read or unread.
 
@@ -587,42 +1566,31 @@ class AppleMailConnector:
             read: True for read, False for unread
 
         Returns:
-            Number of messages updated
+            Number of messages updated, with the outcome per id
 
         Raises:
+            ValueError: If a message ID is invalid
             MailAppleScriptError: If operation fails
         """
-        if not message_ids:
-            return 0
-
-        status = "true" if read else "false"
+        result: MutationResult = self._execute_call(
+            self._mark_as_read_call(message_ids, read), "mark_as_read"
+        )
+        return result
 
-        # Build list of IDs
-        id_list = ", ".join(message_ids)
+    def _mark_as_read_call(self, message_ids: list[str], read: bool = True) -> _ScriptCall:
+        if not message_ids:
+            return _ScriptCall(None, [], _parse_changed([]))
 
-        script = f"""
-        tell application "Mail"
-            set idList to {{{id_list}}}
-            set updateCount to 0
+        ids, groups = self._message_group_args(message_ids)
+        args = [str(read).lower(), *groups]
 
-            repeat with msgId in idList
-                repeat with acc in accounts
-                    repeat with mb in mailboxes of acc
-                        try
-                            set msg to first message of mb whose id is msgId
-                            set read status of msg to {status}
-                            set updateCount to updateCount + 1
-                        end try
-                    end repeat
-                end repeat
-            end repeat
+        def parse(output: str) -> MutationResult:
+            result = _parse_changed(ids)(output)
+            if self.cache is not None:
+                self.cache.update(result.changed, read=read)
+            return result
 
-            return updateCount
-        end tell
-        """
-
-        result = self._run_applescript(script)
-        return int(result) if result.isdigit() else 0
+        return _ScriptCall(templates.MARK_AS_READ, args, parse, len(ids))
 
     def send_email_with_attachments(
         self,
@@ -676,53 +1644,12 @@ class AppleMailConnector:
                     f"Attachment type not allowed: {attachment_path.name}"
                 )
 
-        subject_safe = escape_applescript_string(sanitize_input(subject))
-        body_safe = escape_applescript_string(sanitize_input(body))
-
-        # Build recipient lists
-        to_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in to)
-        cc_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in (cc or []))
-        bcc_list = ", ".join(f'"{escape_applescript_string(addr)}"' for addr in (bcc or []))
+        args = self._compose_args(subject, body, to, cc, bcc)
+        args.append("\n".join(str(path.absolute()) for path in attachments))
 
-        # Build attachment list (convert to POSIX file references)
-        attachment_list = ", ".join(
-            f'POSIX file "{escape_applescript_string(str(path.absolute()))}"'
-            for path in attachments
+        result = self._run_applescript(
+            templates.SEND_EMAIL_WITH_ATTACHMENTS, args, operation="send_email_with_attachments"
         )
-
-        script = f"""
-        tell application "Mail"
-            set theMessage to make new outgoing message with properties {{subject:"{subject_safe}", content:"{body_safe}", visible:false}}
-
-            tell theMessage
-                -- Add To recipients
-                repeat with addr in {{{to_list}}}
-                    make new to recipient with properties {{address:addr}}
-                end repeat
-
-                -- Add CC recipients
-                repeat with addr in {{{cc_list}}}
-                    make new cc recipient with properties {{address:addr}}
-                end repeat
-
-                -- Add BCC recipients
-                repeat with addr in {{{bcc_list}}}
-                    make new bcc recipient with properties {{address:addr}}
-                end repeat
-
-                -- Add attachments
-                repeat with filePath in {{{attachment_list}}}
-                    make new attachment with properties {{file name:filePath}} at after last paragraph
-                end repeat
-
-                send
-            end tell
-
-            return "sent"
-        end tell
-        """
-
-        result = self._run_applescript(script)
         return result == "sent"
 
     def get_attachments(self, message_id: str) -> list[dict[str, Any]]:
@@ -738,77 +1665,39 @@ class AppleMailConnector:
         Raises:
             MailMessageNotFoundError: If message doesn't exist
         """
-        message_id_safe = escape_applescript_string(sanitize_input(message_id))
-
-        script = f"""
-        tell application "Mail"
-            -- Search all accounts for message
-            repeat with acc in accounts
-                repeat with mb in mailboxes of acc
-                    try
-                        set msg to first message of mb whose id is {message_id_safe}
-                        set attList to mail attachments of msg
-
-                        set resultList to {{}}
-                        repeat with att in attList
-                            set attName to name of att
-                            set attType to MIME type of att
-                            set attSize to file size of att
-                            set attDownloaded to downloaded of att
-
-                            set attData to attName & "|" & attType & "|" & attSize & "|" & attDownloaded
-                            set end of resultList to attData
-                        end repeat
-
-                        -- Join with newlines
-                        set AppleScript's text item delimiters to linefeed
-                        set output to resultList as text
-                        set AppleScript's text item delimiters to ""
-
-                        return output
-                    end try
-                end repeat
-            end repeat
-
-            error "Message not found"
-        end tell
-        """
-
-        result = self._run_applescript(script)
-
-        # Parse results
-        attachments = []
-        if result:
-            for line in result.split("\n"):
-                if not line:
-                    continue
-                parts = line.split("|")
-                if len(parts) >= 4:
-                    attachments.append({
-                        "name": parts[0],
-                        "mime_type": parts[1],
-                        "size": int(parts[2]) if parts[2].isdigit() else 0,
-                        "downloaded": parts[3].lower() == "true",
-                    })
-
+        attachments: list[dict[str, Any]] = self._execute_call(
+            self._get_attachments_call(message_id), "get_attachments"
+        )
         return attachments
 
+    def _get_attachments_call(self, message_id: str) -> _ScriptCall:
+        args = self._message_ref_args([message_id])
+
+        return _ScriptCall(templates.GET_ATTACHMENTS, args, wire.ATTACHMENT.parse)
+
     def save_attachments(
         self,
         message_id: str,
         save_directory: Path,
         attachment_indices: list[int] | None = None,
-    ) -> int:
+    ) -> SavedAttachments:
         """
         Save attachments from a message to a directory.
 
+        The attachments are decoded from the message source as it is read
+        (see mime_stream): from the message file when an emlx reader is
+        attached and has the complete message, otherwise from the source
+        Mail writes to a temporary file. Existing files are not overwritten;
+        a taken name gets a " (n)" suffix.
+
         Args:
             message_id: Message ID
             save_directory: Directory to save attachments to
             attachment_indices: Indices of attachments to save (None = all)
 
         Returns:
-            Number of attachments saved
+            Number of attachments saved, with the path, size and SHA-256
+            digest of each file
 
         Raises:
             FileNotFoundError: If save directory doesn't exist
@@ -831,46 +1720,30 @@ class AppleMailConnector:
         except (RuntimeError, OSError) as e:
             raise ValueError(f"Invalid save directory: {e}")
 
-        message_id_safe = escape_applescript_string(sanitize_input(message_id))
-        dir_safe = escape_applescript_string(str(save_directory))
-
-        # Build index filter if specified
-        if attachment_indices is not None:
-            # Convert to 1-based indexing for AppleScript
-            indices_str = ", ".join(str(i + 1) for i in attachment_indices)
-            index_filter = f"items {{{indices_str}}} of"
-        else:
-            index_filter = ""
-
-        script = f"""
-        tell application "Mail"
-            -- Search all accounts for message
-            repeat with acc in accounts
-                repeat with mb in mailboxes of acc
-                    try
-                        set msg to first message of mb whose id is {message_id_safe}
-                        set attList to {index_filter} mail attachments of msg
-                        set saveCount to 0
-
-                        repeat with att in attList
-                            try
-                                set attName to name of att
-                                save att in ("{dir_safe}/" & attName)
-                                set saveCount to saveCount + 1
-                            end try
-                        end repeat
-
-                        return saveCount
-                    end try
-                end repeat
-            end repeat
-
-            error "Message not found"
-        end tell
-        """
-
-        result = self._run_applescript(script)
-        return int(result) if result.isdigit() else 0
+        (message_id,) = self._message_id_args([message_id])
+        message_file = None
+        if self.emlx is not None:
+            message_file = self.emlx.find(message_id, self._emlx_hint(message_id))
+        if message_file is not None and not message_file.name.endswith(".partial.emlx"):
+            f, size = open_message(message_file)
+            with f:
+                files = extract_attachments(f, save_directory, attachment_indices, size)
+            return SavedAttachments(files)
+
+        # .partial.emlx files lack the attachments: ask Mail for the source
+        fd, source_path = tempfile.mkstemp(prefix="apple-mail-mcp-", suffix=".eml")
+        os.close(fd)
+        try:
+            self._run_applescript(
+                templates.SAVE_SOURCE,
+                [*self._message_ref_args([message_id]), source_path],
+                operation="save_attachments",
+            )
+            with open(source_path, "rb") as f:
+                files = extract_attachments(f, save_directory, attachment_indices)
+        finally:
+            os.unlink(source_path)
+        return SavedAttachments(files)
 
     def move_messages(
         self,
@@ -878,7 +1751,7 @@ class AppleMailConnector:
         destination_mailbox: str,
         account: str,
         gmail_mode: bool = False,
-    ) -> int:
+    ) -> MutationResult:
         """
         Move messages to a different mailbox.
 
@@ -889,79 +1762,61 @@ class AppleMailConnector:
             gmail_mode: Use Gmail-specific handling (copy + delete)
 
         Returns:
-            Number of messages moved
+            Number of messages moved, with the outcome per id
 
         Raises:
             MailAccountNotFoundError: If account doesn't exist
             MailMailboxNotFoundError: If destination mailbox doesn't exist
         """
-        if not message_ids:
-            return 0
-
-        from .utils import sanitize_input
+        call = self._move_messages_call(message_ids, destination_mailbox, account, gmail_mode)
+        result: MutationResult = self._execute_call(call, "move_messages")
+        return result
 
-        account_safe = escape_applescript_string(sanitize_input(account))
-        mailbox_safe = escape_applescript_string(sanitize_input(destination_mailbox))
-        id_list = ", ".join(message_ids)
+    def _move_messages_call(
+        self,
+        message_ids: list[str],
+        destination_mailbox: str,
+        account: str,
+        gmail_mode: bool = False,
+    ) -> _ScriptCall:
+        if not message_ids:
+            return _ScriptCall(None, [], _parse_changed([]))
+
+        ids, groups = self._message_group_args(message_ids)
+        args = [sanitize_input(account), sanitize_input(destination_mailbox), *groups]
+
+        def parse(output: str) -> MutationResult:
+            result = _parse_changed(ids)(output)
+            if gmail_mode:
+                # The copies get new ids
+                self.locations.discard(ids)
+                if self.cache is not None:
+                    self.cache.delete(result.changed)
+                    self.cache.invalidate(args[0], args[1])
+                if self.body_index is not None:
+                    self.body_index.remove(result.changed)
+            else:
+                self.locations.record(args[0], args[1], result.changed)
+                if self.cache is not None:
+                    self.cache.move(result.changed, args[0], args[1])
+                if self.body_index is not None:
+                    self.body_index.move(result.changed, args[0], args[1])
+            return result
 
         if gmail_mode:
             # Gmail requires copy + delete approach to properly handle labels
-            script = f"""
-            tell application "Mail"
-                set accountRef to account "{account_safe}"
-                set destMailbox to mailbox "{mailbox_safe}" of accountRef
-                set idList to {{{id_list}}}
-                set moveCount to 0
-
-                repeat with msgId in idList
-                    repeat with acc in accounts
-                        repeat with mb in mailboxes of acc
-                            try
-                                set msg to first message of mb whose id is msgId
-                                duplicate msg to destMailbox
-                                delete msg
-                                set moveCount to moveCount + 1
-                            end try
-                        end repeat
-                    end repeat
-                end repeat
-
-                return moveCount
-            end tell
-            """
+            script = templates.MOVE_MESSAGES_GMAIL
         else:
             # Standard IMAP move
-            script = f"""
-            tell application "Mail"
-                set accountRef to account "{account_safe}"
-                set destMailbox to mailbox "{mailbox_safe}" of accountRef
-                set idList to {{{id_list}}}
-                set moveCount to 0
-
-                repeat with msgId in idList
-                    repeat with acc in accounts
-                        repeat with mb in mailboxes of acc
-                            try
-                                set msg to first message of mb whose id is msgId
-                                set mailbox of msg to destMailbox
-                                set moveCount to moveCount + 1
-                            end try
-                        end repeat
-                    end repeat
-                end repeat
-
-                return moveCount
-            end tell
-            """
-
-        result = self._run_applescript(script)
-        return int(result) if result.isdigit() else 0
+            script = templates.MOVE_MESSAGES
+
+        return _ScriptCall(script, args, parse, len(ids))
 
     def flag_message(
         self,
         message_ids: list[str],
         flag_color: str,
-    ) -> int:
+    ) -> MutationResult:
         """
         Set flag color on messages.
 
@@ -970,13 +1825,19 @@ class AppleMailConnector:
             flag_color: Flag color (none, orange, red, yellow, blue, green, purple, gray)
 
         Returns:
-            Number of messages flagged
+            Number of messages flagged, with the outcome per id
 
         Raises:
             ValueError: If flag color is invalid
         """
+        result: MutationResult = self._execute_call(
+            self._flag_message_call(message_ids, flag_color), "flag_message"
+        )
+        return result
+
+    def _flag_message_call(self, message_ids: list[str], flag_color: str) -> _ScriptCall:
         if not message_ids:
-            return 0
+            return _ScriptCall(None, [], _parse_changed([]))
 
         from .utils import get_flag_index, validate_flag_color
 
@@ -985,32 +1846,11 @@ class AppleMailConnector:
 
         flag_index = get_flag_index(flag_color)
         flagged_status = "true" if flag_color != "none" else "false"
-        id_list = ", ".join(message_ids)
 
-        script = f"""
-        tell application "Mail"
-            set idList to {{{id_list}}}
-            set flagCount to 0
+        ids, groups = self._message_group_args(message_ids)
+        args = [str(flag_index), flagged_status, *groups]
 
-            repeat with msgId in idList
-                repeat with acc in accounts
-                    repeat with mb in mailboxes of acc
-                        try
-                            set msg to first message of mb whose id is msgId
-                            set flag index of msg to {flag_index}
-                            set flagged status of msg to {flagged_status}
-                            set flagCount to flagCount + 1
-                        end try
-                    end repeat
-                end repeat
-            end repeat
-
-            return flagCount
-        end tell
-        """
-
-        result = self._run_applescript(script)
-        return int(result) if result.isdigit() else 0
+        return _ScriptCall(templates.FLAG_MESSAGE, args, _parse_changed(ids), len(ids))
 
     def create_mailbox(
         self,
@@ -1041,29 +1881,15 @@ class AppleMailConnector:
         if not sanitized_name:
             raise ValueError(f"Invalid mailbox name: {name}")
 
-        account_safe = escape_applescript_string(sanitize_input(account))
-        name_safe = escape_applescript_string(sanitized_name)
+        args = [sanitize_input(account), sanitized_name]
 
         if parent_mailbox:
-            parent_safe = escape_applescript_string(sanitize_input(parent_mailbox))
-            script = f"""
-            tell application "Mail"
-                set accountRef to account "{account_safe}"
-                set parentMailbox to mailbox "{parent_safe}" of accountRef
-                make new mailbox at parentMailbox with properties {{name:"{name_safe}"}}
-                return "success"
-            end tell
-            """
+            args.append(sanitize_input(parent_mailbox))
+            script = templates.CREATE_NESTED_MAILBOX
         else:
-            script = f"""
-            tell application "Mail"
-                set accountRef to account "{account_safe}"
-                make new mailbox at accountRef with properties {{name:"{name_safe}"}}
-                return "success"
-            end tell
-            """
-
-        result = self._run_applescript(script)
+            script = templates.CREATE_MAILBOX
+
+        result = self._run_applescript(script, args, operation="create_mailbox")
         return result == "success"
 
     def delete_messages(
@@ -1071,7 +1897,7 @@ class AppleMailConnector:
         message_ids: list[str],
         permanent: bool = False,
         skip_bulk_check: bool = True,
-    ) -> int:
+    ) -> MutationResult:
         """
         Delete messages (move to trash or permanent delete).
 
@@ -1081,13 +1907,23 @@ class AppleMailConnector:
             skip_bulk_check: If False, enforce bulk operation limits
 
         Returns:
-            Number of messages deleted
+            Number of messages deleted, with the outcome per id
 
         Raises:
             ValueError: If bulk check fails
         """
+        call = self._delete_messages_call(message_ids, permanent, skip_bulk_check)
+        result: MutationResult = self._execute_call(call, "delete_messages")
+        return result
+
+    def _delete_messages_call(
+        self,
+        message_ids: list[str],
+        permanent: bool = False,
+        skip_bulk_check: bool = True,
+    ) -> _ScriptCall:
         if not message_ids:
-            return 0
+            return _ScriptCall(None, [], _parse_changed([]))
 
         # Safety check for bulk operations
         if not skip_bulk_check and len(message_ids) > 100:
@@ -1096,55 +1932,156 @@ class AppleMailConnector:
                 "Maximum is 100 without skip_bulk_check=True"
             )
 
-        id_list = ", ".join(message_ids)
-
-        if permanent:
-            # Permanent delete (not recommended, requires extra caution)
-            script = f"""
-            tell application "Mail"
-                set idList to {{{id_list}}}
-                set deleteCount to 0
-
-                repeat with msgId in idList
-                    repeat with acc in accounts
-                        repeat with mb in mailboxes of acc
-                            try
-                                set msg to first message of mb whose id is msgId
-                                delete msg
-                                set deleteCount to deleteCount + 1
-                            end try
-                        end repeat
-                    end repeat
-                end repeat
-
-                return deleteCount
-            end tell
-            """
-        else:
-            # Move to trash (standard delete)
-            script = f"""
-            tell application "Mail"
-                set idList to {{{id_list}}}
-                set deleteCount to 0
-
-                repeat with msgId in idList
-                    repeat with acc in accounts
-                        repeat with mb in mailboxes of acc
-                            try
-                                set msg to first message of mb whose id is msgId
-                                delete msg
-                                set deleteCount to deleteCount + 1
-                            end try
-                        end repeat
-                    end repeat
-                end repeat
-
-                return deleteCount
-            end tell
-            """
-
-        result = self._run_applescript(script)
-        return int(result) if result.isdigit() else 0
+        # Mail's delete command moves to trash; permanent deletion uses the
+        # same script (not recommended, requires extra caution)
+        ids, groups = self._message_group_args(message_ids)
+
+        def parse(output: str) -> MutationResult:
+            # Deleted messages move to the account's trash (or are gone)
+            self.locations.discard(ids)
+            result = _parse_changed(ids)(output)
+            if self.cache is not None:
+                self.cache.delete(result.changed)
+            if self.body_index is not None:
+                self.body_index.remove(result.changed)
+            return result
+
+        return _ScriptCall(templates.DELETE_MESSAGES, groups, parse, len(ids))
+
+    def update_matching(
+        self,
+        account: str,
+        mailbox: str,
+        action: str,
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        older_than_days: int | None = None,
+        read: bool = True,
+        flag_color: str | None = None,
+        destination_mailbox: str | None = None,
+        gmail_mode: bool = False,
+        dry_run: bool = False,
+        max_messages: int = DEFAULT_MAX_MATCHING,
+    ) -> dict[str, Any]:
+        """
+        Apply an action to every message of a mailbox that matches a filter.
+
+        Mail selects the messages itself (a ``whose`` clause), so no IDs
+        travel back and forth and the whole set changes in one statement.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox to search
+            action: One of MATCHING_ACTIONS
+            sender_contains: Filter by sender
+            subject_contains: Filter by subject
+            read_status: Filter by read status (True=read, False=unread)
+            older_than_days: Only messages received more than this many days ago
+            read: New read status (mark_as_read)
+            flag_color: Flag color (flag_message)
+            destination_mailbox: Mailbox of the same account (move_messages)
+            gmail_mode: Use Gmail-specific handling (move_messages)
+            dry_run: Only count the matching messages
+            max_messages: Change nothing if more messages than this match
+
+        Returns:
+            Dictionary with "matched" (messages matching the filter) and
+            "changed" (0 on a dry run or when more than max_messages match)
+
+        Raises:
+            ValueError: If the action or its arguments are invalid
+            MailAccountNotFoundError: If account doesn't exist
+            MailMailboxNotFoundError: If a mailbox doesn't exist
+        """
+        call = self._update_matching_call(
+            account,
+            mailbox,
+            action,
+            sender_contains,
+            subject_contains,
+            read_status,
+            older_than_days,
+            read,
+            flag_color,
+            destination_mailbox,
+            gmail_mode,
+            dry_run,
+            max_messages,
+        )
+        result: dict[str, Any] = self._execute_call(call, "update_matching")
+        return result
+
+    def _update_matching_call(
+        self,
+        account: str,
+        mailbox: str,
+        action: str,
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        older_than_days: int | None = None,
+        read: bool = True,
+        flag_color: str | None = None,
+        destination_mailbox: str | None = None,
+        gmail_mode: bool = False,
+        dry_run: bool = False,
+        max_messages: int = DEFAULT_MAX_MATCHING,
+    ) -> _ScriptCall:
+        from .utils import get_flag_index, validate_flag_color
+
+        if action not in MATCHING_ACTIONS:
+            raise ValueError(
+                f"Invalid action: {action!r} (expected one of {', '.join(MATCHING_ACTIONS)})"
+            )
+        if older_than_days is not None and older_than_days < 0:
+            raise ValueError(f"older_than_days must not be negative: {older_than_days}")
+        if max_messages < 0:
+            raise ValueError(f"max_messages must not be negative: {max_messages}")
+
+        args = [
+            sanitize_input(account),
+            sanitize_input(mailbox),
+            sanitize_input(sender_contains),
+            sanitize_input(subject_contains),
+            "" if read_status is None else str(read_status).lower(),
+            str(older_than_days or 0),
+            str(max_messages),
+            str(dry_run).lower(),
+        ]
+
+        template_action = action
+        if action == "mark_as_read":
+            args.append(str(read).lower())
+        elif action == "flag_message":
+            if flag_color is None or not validate_flag_color(flag_color):
+                raise ValueError(f"Invalid flag color: {flag_color}")
+            args += [str(get_flag_index(flag_color)), str(flag_color != "none").lower()]
+        elif action == "move_messages":
+            if not destination_mailbox:
+                raise ValueError("move_messages requires a destination_mailbox")
+            args.append(sanitize_input(destination_mailbox))
+            if gmail_mode:
+                template_action = "move_messages_gmail"
+
+        script = templates.update_matching_script(
+            template_action,
+            sender=bool(sender_contains),
+            subject=bool(subject_contains),
+            read_status=read_status is not None,
+            older_than=older_than_days is not None,
+        )
+
+        def parse(output: str) -> dict[str, Any]:
+            matched, changed = (wire.as_int(value) for value in output.split(wire.FIELD_SEP))
+            if changed and self.cache is not None:
+                # Which messages changed is not reported: list them again
+                self.cache.invalidate(args[0], args[1])
+                if action == "move_messages":
+                    self.cache.invalidate(args[0], args[-1])
+            return {"matched": matched, "changed": changed}
+
+        return _ScriptCall(script, args, parse)
 
     def reply_to_message(
         self,
@@ -1168,44 +2105,17 @@ class AppleMailConnector:
         Raises:
             MailMessageNotFoundError: If message doesn't exist
         """
-        from .utils import sanitize_input
-
-        body_safe = escape_applescript_string(sanitize_input(body))
-        reply_type = "reply to all" if reply_all else "reply"
-
         # Apple Mail's reply command automatically handles quoting if opened in editor
         # We'll create a reply and set its content
-        script = f"""
-        tell application "Mail"
-            set idList to {{"{message_id}"}}
-
-            repeat with acc in accounts
-                repeat with mb in mailboxes of acc
-                    try
-                        set origMsg to first message of mb whose id is "{message_id}"
-
-                        -- Create reply message
-                        set replyMsg to {reply_type} origMsg
-
-                        -- Set body content
-                        set content of replyMsg to "{body_safe}"
-
-                        -- Get the message ID
-                        set replyId to id of replyMsg
-
-                        -- Send the message
-                        send replyMsg
-
-                        return replyId
-                    end try
-                end repeat
-            end repeat
-
-            error "Message not found"
-        end tell
-        """
-
-        result = self._run_applescript(script)
+        args = [
+            *self._message_ref_args([message_id]),
+            sanitize_input(body),
+            str(reply_all).lower(),
+        ]
+
+        result = self._run_applescript(
+            templates.REPLY_TO_MESSAGE, args, operation="reply_to_message"
+        )
         return result
 
     def forward_message(
@@ -1235,7 +2145,7 @@ class AppleMailConnector:
             ValueError: If no recipients or invalid emails
             MailMessageNotFoundError: If message doesn't exist
         """
-        from .utils import format_applescript_list, sanitize_input, validate_email
+        from .utils import validate_email
 
         if not to:
             raise ValueError("At least one recipient required")
@@ -1255,63 +2165,13 @@ class AppleMailConnector:
                 if not validate_email(email):
                     raise ValueError(f"Invalid BCC email address: {email}")
 
-        body_safe = escape_applescript_string(sanitize_input(body))
-        to_list = format_applescript_list(to)
-        cc_list = format_applescript_list(cc) if cc else '""'
-        bcc_list = format_applescript_list(bcc) if bcc else '""'
-
-        script = f"""
-        tell application "Mail"
-            repeat with acc in accounts
-                repeat with mb in mailboxes of acc
-                    try
-                        set origMsg to first message of mb whose id is "{message_id}"
-
-                        -- Create forward message
-                        set fwdMsg to forward origMsg
-
-                        -- Add body text before forwarded content
-                        if "{body_safe}" is not "" then
-                            set origContent to content of fwdMsg
-                            set content of fwdMsg to "{body_safe}" & return & return & origContent
-                        end if
-
-                        -- Set recipients
-                        set toRecipients to {to_list}
-                        repeat with recipientAddr in toRecipients
-                            make new to recipient at end of to recipients of fwdMsg with properties {{address:recipientAddr}}
-                        end repeat
-
-                        -- Set CC if provided
-                        if {cc_list} is not "" then
-                            set ccRecipients to {cc_list}
-                            repeat with recipientAddr in ccRecipients
-                                make new cc recipient at end of cc recipients of fwdMsg with properties {{address:recipientAddr}}
-                            end repeat
-                        end if
-
-                        -- Set BCC if provided
-                        if {bcc_list} is not "" then
-                            set bccRecipients to {bcc_list}
-                            repeat with recipientAddr in bccRecipients
-                                make new bcc recipient at end of bcc recipients of fwdMsg with properties {{address:recipientAddr}}
-                            end repeat
-                        end if
-
-                        -- Get the message ID
-                        set fwdId to id of fwdMsg
-
-                        -- Send the message
-                        send fwdMsg
-
-                        return fwdId
-                    end try
-                end repeat
-            end repeat
-
-            error "Message not found"
-        end tell
-        """
-
-        result = self._run_applescript(script)
+        args = [
+            *self._message_ref_args([message_id]),
+            sanitize_input(body),
+            "\n".join(to),
+            "\n".join(cc or []),
+            "\n".join(bcc or []),
+        ]
+
+        result = self._run_applescript(templates.FORWARD_MESSAGE, args, operation="forward_message")
         return result
@@ -0,0 +1,1025 @@
+"""
+In-memory mail backend.
+
+Models accounts, mailboxes, messages, read state, flags and attachments in
+process memory, with the same method signatures, return values and
+exceptions as AppleMailConnector. Operations go through the same lane
+scheduler and request coalescing as the AppleScript connector, and can be
+given an artificial per-call latency, so the server can be benchmarked and
+load-tested on any platform.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import mimetypes
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from .backend import DEFAULT_MAX_MATCHING, MutationResult, SavedAttachments
+from .body_index import DEFAULT_INDEX_BATCH, BodyIndex
+from .exceptions import (
+    MailAccountNotFoundError,
+    MailAppleScriptError,
+    MailError,
+    MailMailboxNotFoundError,
+    MailMessageNotFoundError,
+)
+from .mail_connector import (
+    _ERROR_TYPES,
+    BATCH_OPERATIONS,
+    MATCHING_ACTIONS,
+    AppleMailConnector,
+    _batch_error,
+)
+from .pagination import CursorPosition, MessagePage, decode_cursor, next_page, search_digest
+from .query import compile_query, matcher
+from .scheduler import LaneScheduler
+from .singleflight import SingleFlight
+from .utils import (
+    get_flag_index,
+    sanitize_filename,
+    sanitize_mailbox_name,
+    validate_email,
+    validate_flag_color,
+)
+
+DEFAULT_MAILBOXES = ("INBOX", "Archive", "Sent", "Drafts", "Trash")
+
+
+@dataclass
+class MemoryAttachment:
+    """An attachment stored in memory."""
+
+    name: str
+    data: bytes
+    mime_type: str = "application/octet-stream"
+    downloaded: bool = True
+
+
+@dataclass
+class MemoryMessage:
+    """A message stored in memory."""
+
+    id: str
+    subject: str
+    sender: str
+    date_received: datetime
+    content: str = ""
+    read: bool = False
+    flag_index: int = -1
+    """Mail's flag index (0-6), or -1 if the message is not flagged."""
+
+    to: list[str] = field(default_factory=list)
+    cc: list[str] = field(default_factory=list)
+    bcc: list[str] = field(default_factory=list)
+    attachments: list[MemoryAttachment] = field(default_factory=list)
+
+
+@dataclass
+class MemoryAccount:
+    """An account and its mailboxes (mailbox name -> messages by ID)."""
+
+    name: str
+    email: str
+    mailboxes: dict[str, dict[str, MemoryMessage]] = field(default_factory=dict)
+
+
+def format_date(value: datetime) -> str:
+    """Format a date the way AppleScript converts dates to text."""
+    hour = value.hour % 12 or 12
+    return f"{value:%A, %B} {value.day}, {value.year} at {hour}:{value:%M:%S %p}"
+
+
+class InMemoryBackend:
+    """Mail backend that keeps everything in process memory."""
+
+    def __init__(
+        self,
+        latency: float | dict[str, float] = 0.0,
+        scheduler: LaneScheduler | None = None,
+    ) -> None:
+        """
+        Initialize an empty backend.
+
+        Args:
+            latency: Seconds each call takes, or seconds per operation name
+                (operations not listed take no time). The delay is spent
+                holding the operation's scheduler slot, like a script
+                waiting on Mail.
+            scheduler: Lane scheduler that admits calls (default: a
+                LaneScheduler with the default lanes)
+        """
+        self.latency = latency
+        self.scheduler = scheduler or LaneScheduler()
+        self.single_flight = SingleFlight()
+        self.accounts: dict[str, MemoryAccount] = {}
+        # message ID -> (account, mailbox)
+        self._locations: dict[str, tuple[str, str]] = {}
+        self._ids = itertools.count(10001)
+        self._lock = threading.RLock()
+        self._calls: dict[str, int] = {}
+        self.body_index = BodyIndex(":memory:")
+
+    @classmethod
+    def with_sample_data(
+        cls,
+        accounts: int = 2,
+        messages_per_mailbox: int = 200,
+        seed: int = 0,
+        **options: Any,
+    ) -> InMemoryBackend:
+        """
+        Create a backend filled with generated mail.
+
+        Args:
+            accounts: Number of accounts
+            messages_per_mailbox: Messages in each INBOX and Archive
+            seed: Random seed; the same seed always produces the same data
+            **options: Keyword arguments for the constructor
+
+        Returns:
+            The populated backend
+        """
+        backend = cls(**options)
+        rng = random.Random(seed)
+        topics = [
+            "Quarterly report",
+            "Lunch",
+            "Invoice",
+            "Release plan",
+            "Meeting notes",
+            "Travel",
+            "Contract",
+            "Newsletter",
+            "Build failed",
+            "Welcome",
+        ]
+        senders = ["alice", "bob", "carol", "dave", "erin", "frank", "grace"]
+        domains = ["example.com", "example.org", "corp.example.net"]
+        start = datetime(2025, 1, 1, 9, 0, 0)
+
+        for number in range(accounts):
+            name = ["Work", "Personal", "iCloud", "Gmail"][number % 4]
+            if number >= 4:
+                name = f"{name} {number // 4 + 1}"
+            backend.add_account(name, f"{name.lower().replace(' ', '.')}@example.com")
+
+            for mailbox in ("INBOX", "Archive"):
+                for index in range(messages_per_mailbox):
+                    sender = f"{rng.choice(senders)}@{rng.choice(domains)}"
+                    attachments = []
+                    if rng.random() < 0.1:
+                        attachments.append(
+                            MemoryAttachment(
+                                "report.pdf",
+                                rng.randbytes(rng.randint(1_000, 50_000)),
+                                "application/pdf",
+                            )
+                        )
+                    backend.add_message(
+                        name,
+                        mailbox,
+                        subject=f"{rng.choice(topics)} #{index}",
+                        sender=sender,
+                        content=f"Hello,\n\nMessage {index} in {mailbox}.\n\n-- \n{sender}\n",
+                        date_received=start + timedelta(minutes=17 * index),
+                        read=rng.random() < 0.7,
+                        flag_index=rng.randrange(7) if rng.random() < 0.05 else -1,
+                        attachments=attachments,
+                    )
+
+        return backend
+
+    def add_account(
+        self, name: str, email: str, mailboxes: tuple[str, ...] = DEFAULT_MAILBOXES
+    ) -> MemoryAccount:
+        """
+        Add an account with empty mailboxes.
+
+        Args:
+            name: Account name
+            email: Primary email address
+            mailboxes: Mailbox names
+
+        Returns:
+            The new account
+        """
+        with self._lock:
+            account = MemoryAccount(name, email, {mailbox: {} for mailbox in mailboxes})
+            self.accounts[name] = account
+            return account
+
+    def add_message(
+        self,
+        account: str,
+        mailbox: str,
+        subject: str,
+        sender: str,
+        content: str = "",
+        date_received: datetime | None = None,
+        read: bool = False,
+        flag_index: int = -1,
+        attachments: list[MemoryAttachment] | None = None,
+        to: list[str] | None = None,
+    ) -> str:
+        """
+        Add a message to a mailbox.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            subject: Subject
+            sender: Sender address
+            content: Plain text body
+            date_received: Received date (default: now)
+            read: Read status
+            flag_index: Mail flag index (0-6), or -1 for unflagged
+            attachments: Attachments
+            to: To recipients
+
+        Returns:
+            The new message's ID
+
+        Raises:
+            MailAccountNotFoundError: If account doesn't exist
+            MailMailboxNotFoundError: If mailbox doesn't exist
+        """
+        with self._lock:
+            messages = self._mailbox(account, mailbox)
+            message = MemoryMessage(
+                id=str(next(self._ids)),
+                subject=subject,
+                sender=sender,
+                date_received=date_received or datetime.now(),
+                content=content,
+                read=read,
+                flag_index=flag_index,
+                to=list(to or []),
+                attachments=list(attachments or []),
+            )
+            self._store(message, account, mailbox, messages)
+            return message.id
+
+    def close(self) -> None:
+        """Close the body index."""
+        self.body_index.close()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return scheduling and coalescing metrics and call counts.
+
+        Returns:
+            Dictionary with "scheduler", "coalescing", "calls" (calls per
+            operation) and "body_index"
+        """
+        with self._lock:
+            calls = dict(self._calls)
+        return {
+            "scheduler": self.scheduler.stats(),
+            "coalescing": self.single_flight.stats(),
+            "calls": calls,
+            "body_index": self.body_index.stats(),
+        }
+
+    # -- internals ---------------------------------------------------------
+
+    @contextmanager
+    def _call(self, operation: str) -> Iterator[None]:
+        """Hold a scheduler slot for the operation and spend its latency."""
+        with self.scheduler.slot(operation):
+            with self._lock:
+                self._calls[operation] = self._calls.get(operation, 0) + 1
+            latency = (
+                self.latency.get(operation, 0.0) if isinstance(self.latency, dict) else self.latency
+            )
+            if latency > 0:
+                time.sleep(latency)
+            yield
+
+    def _account(self, name: str) -> MemoryAccount:
+        account = self.accounts.get(name)
+        if account is None:
+            raise MailAccountNotFoundError(f'Can\'t get account "{name}".')
+        return account
+
+    def _mailbox(self, account: str, mailbox: str) -> dict[str, MemoryMessage]:
+        messages = self._account(account).mailboxes.get(mailbox)
+        if messages is None:
+            raise MailMailboxNotFoundError(
+                f'Can\'t get mailbox "{mailbox}" of account "{account}".'
+            )
+        return messages
+
+    def _store(
+        self,
+        message: MemoryMessage,
+        account: str,
+        mailbox: str,
+        messages: dict[str, MemoryMessage],
+    ) -> None:
+        messages[message.id] = message
+        self._locations[message.id] = (account, mailbox)
+
+    def _message(self, message_id: str) -> MemoryMessage:
+        location = self._locations.get(message_id)
+        if location is None:
+            raise MailMessageNotFoundError(f'Can\'t get message id "{message_id}".')
+        return self.accounts[location[0]].mailboxes[location[1]][message_id]
+
+    def _found(self, message_ids: list[str]) -> tuple[list[str], list[MemoryMessage]]:
+        """Distinct (validated) IDs, and the messages that exist among them."""
+        ids = list(dict.fromkeys(AppleMailConnector._message_id_args(message_ids)))
+        found = [self._message(message_id) for message_id in ids if message_id in self._locations]
+        return ids, found
+
+    @staticmethod
+    def _changed(ids: list[str], messages: list[MemoryMessage]) -> MutationResult:
+        return MutationResult.of(ids, (message.id for message in messages))
+
+    @staticmethod
+    def _summary(message: MemoryMessage) -> dict[str, Any]:
+        return {
+            "id": message.id,
+            "subject": message.subject,
+            "sender": message.sender,
+            "date_received": format_date(message.date_received),
+            "read_status": message.read,
+            "timestamp": int(message.date_received.timestamp()),
+        }
+
+    @staticmethod
+    def _check_recipients(to: list[str], cc: list[str] | None, bcc: list[str] | None) -> None:
+        for label, addresses in (("", to), ("CC ", cc or []), ("BCC ", bcc or [])):
+            for email in addresses:
+                if not validate_email(email):
+                    raise ValueError(f"Invalid {label}email address: {email}")
+
+    def _outgoing(
+        self,
+        mailbox: str,
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        attachments: list[MemoryAttachment] | None = None,
+    ) -> str:
+        """Store a composed message in the first account's Sent or Drafts."""
+        if not self.accounts:
+            raise MailAppleScriptError("No mail accounts are configured")
+        account = next(iter(self.accounts.values()))
+        messages = account.mailboxes.setdefault(mailbox, {})
+        message = MemoryMessage(
+            id=str(next(self._ids)),
+            subject=subject,
+            sender=account.email,
+            date_received=datetime.now(),
+            content=body,
+            read=True,
+            to=list(to),
+            cc=list(cc or []),
+            bcc=list(bcc or []),
+            attachments=list(attachments or []),
+        )
+        self._store(message, account.name, mailbox, messages)
+        return message.id
+
+    def _search(
+        self,
+        account: str,
+        mailbox: str,
+        sender_contains: str | None,
+        subject_contains: str | None,
+        read_status: bool | None,
+        limit: int | None,
+        after: CursorPosition | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        test: Callable[[dict[str, Any]], bool] | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        def key(message: MemoryMessage) -> tuple[int, int]:
+            return int(message.date_received.timestamp()), int(message.id)
+
+        with self._lock:
+            messages = sorted(self._mailbox(account, mailbox).values(), key=key, reverse=True)
+
+        start = (-1 if after.key is None else after.key, int(after.message_id)) if after else None
+        count = 0
+        for message in messages:
+            if limit and count >= limit:
+                return
+            if start is not None and key(message) >= start:
+                continue
+            if received_after is not None and message.date_received < received_after:
+                # Newest first: every later message is older still
+                return
+            if not self._matches(
+                message, sender_contains, subject_contains, read_status, received_before
+            ):
+                continue
+            summary = self._summary(message)
+            if test is not None and not test(summary):
+                continue
+            count += 1
+            yield summary
+
+    @staticmethod
+    def _matches(
+        message: MemoryMessage,
+        sender_contains: str | None,
+        subject_contains: str | None,
+        read_status: bool | None,
+        received_before: datetime | None = None,
+    ) -> bool:
+        """Apply Mail's filters (case-insensitive "contains") to a message."""
+        if sender_contains and sender_contains.casefold() not in message.sender.casefold():
+            return False
+        if subject_contains and subject_contains.casefold() not in message.subject.casefold():
+            return False
+        if read_status is not None and message.read != read_status:
+            return False
+        return received_before is None or message.date_received < received_before
+
+    # -- MailBackend -------------------------------------------------------
+
+    def batch(self, operations: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Run several operations as one call.
+
+        The batch holds one scheduler slot (in the least urgent lane among
+        its operations) and spends one call's latency, like a batch script.
+
+        Args:
+            operations: Operations to run, each
+                ``{"operation": "<name>", "params": {...}}`` where name is
+                one of BATCH_OPERATIONS
+
+        Returns:
+            One result dictionary per operation, as AppleMailConnector.batch
+        """
+        valid = [str(entry.get("operation", "")) for entry in operations]
+        lane_operation = max(
+            (name for name in valid if name in BATCH_OPERATIONS),
+            key=self.scheduler.priority_of,
+            default="batch",
+        )
+
+        results: list[dict[str, Any]] = []
+        with self._call(lane_operation):
+            for name, entry in zip(valid, operations, strict=True):
+                if name not in BATCH_OPERATIONS:
+                    results.append(
+                        _batch_error(
+                            name, "validation_error", f"Unsupported batch operation: {name!r}"
+                        )
+                    )
+                    continue
+                method: Callable[..., Any] = getattr(self, f"_{name}")
+                try:
+                    result = method(**entry.get("params", {}))
+                except (TypeError, ValueError) as e:
+                    results.append(_batch_error(name, "validation_error", str(e)))
+                except MailError as e:
+                    results.append(_batch_error(name, _ERROR_TYPES.get(type(e), "unknown"), str(e)))
+                else:
+                    results.append({"operation": name, "success": True, "result": result})
+        return results
+
+    def list_accounts(self) -> list[dict[str, Any]]:
+        """List all mail accounts."""
+
+        def fetch() -> list[dict[str, Any]]:
+            with self._call("list_accounts"):
+                return self._list_accounts()
+
+        return self.single_flight.do(("list_accounts",), fetch)
+
+    def _list_accounts(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [{"name": a.name, "email": a.email} for a in self.accounts.values()]
+
+    def list_mailboxes(self, account: str) -> list[dict[str, Any]]:
+        """List all mailboxes for an account, with unread counts."""
+
+        def fetch() -> list[dict[str, Any]]:
+            with self._call("list_mailboxes"), self._lock:
+                return [
+                    {
+                        "name": name,
+                        "unread_count": sum(1 for m in messages.values() if not m.read),
+                    }
+                    for name, messages in self._account(account).mailboxes.items()
+                ]
+
+        return self.single_flight.do(("list_mailboxes", account), fetch)
+
+    def search_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: str | None = None,
+    ) -> MessagePage:
+        """Search for messages matching criteria, newest first, a page at a time."""
+        args = (
+            account,
+            mailbox,
+            sender_contains,
+            subject_contains,
+            read_status,
+            limit,
+            cursor,
+            received_after,
+            received_before,
+            query,
+        )
+
+        def fetch() -> MessagePage:
+            with self._call("search_messages"):
+                return self._search_messages(*args)
+
+        return self.single_flight.do(("search_messages", *args), fetch)
+
+    def _search_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: str | None = None,
+    ) -> MessagePage:
+        filters = (sender_contains, subject_contains, read_status)
+        window = (received_after, received_before)
+        search = search_digest(account, mailbox, *filters, *window, query=query)
+        after = None if cursor is None else decode_cursor(cursor, search)
+        test = matcher(compile_query(query).tree) if query else None
+        messages = self._search(account, mailbox, *filters, limit, after, *window, test)
+        return next_page(list(messages), limit, search)
+
+    def iter_messages(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Yield messages matching criteria, newest first."""
+        # Like the AppleScript connector, hold the lane slot only to start
+        with self._call("iter_messages"):
+            messages = list(
+                self._search(
+                    account, mailbox, sender_contains, subject_contains, read_status, limit
+                )
+            )
+        yield from messages
+
+    def get_message(self, message_id: str, include_content: bool = True) -> dict[str, Any]:
+        """Get full message details."""
+        with self._call("get_message"):
+            return self._get_message(message_id, include_content)
+
+    def _get_message(self, message_id: str, include_content: bool = True) -> dict[str, Any]:
+        (message_id,) = AppleMailConnector._message_id_args([message_id])
+        with self._lock:
+            message = self._message(message_id)
+            return {
+                **self._summary(message),
+                "flagged": message.flag_index >= 0,
+                "content": message.content if include_content else "",
+            }
+
+    def index_mailbox(
+        self, account: str, mailbox: str = "INBOX", limit: int | None = DEFAULT_INDEX_BATCH
+    ) -> dict[str, int]:
+        """Index the bodies of a mailbox's messages the body index lacks, newest first."""
+        args = (account, mailbox, limit)
+
+        def run() -> dict[str, int]:
+            with self._call("index_mailbox"):
+                return self._index_mailbox(*args)
+
+        return self.single_flight.do(("index_mailbox", *args), run)
+
+    def _index_mailbox(
+        self, account: str, mailbox: str = "INBOX", limit: int | None = DEFAULT_INDEX_BATCH
+    ) -> dict[str, int]:
+        with self._lock:
+            listing = [
+                {**self._summary(message), "content": message.content}
+                for message in sorted(
+                    self._mailbox(account, mailbox).values(),
+                    key=lambda message: message.date_received,
+                    reverse=True,
+                )
+            ]
+        removed = self.body_index.prune(account, mailbox, (m["id"] for m in listing))
+        known = self.body_index.indexed(m["id"] for m in listing)
+        missing = [message for message in listing if message["id"] not in known]
+        batch = missing if limit is None else missing[:limit]
+        self.body_index.add(account, mailbox, batch)
+        return {"indexed": len(batch), "pending": len(missing) - len(batch), "removed": removed}
+
+    def full_text_search(
+        self,
+        query: str,
+        account: str | None = None,
+        mailbox: str | None = None,
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """Search the bodies, subjects and senders of indexed messages."""
+        with self._call("full_text_search"):
+            return self.body_index.search(query, account, mailbox, limit)
+
+    def send_email(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+    ) -> bool:
+        """Send an email (stored in the first account's Sent mailbox)."""
+        self._check_recipients(to, cc, bcc)
+        with self._call("send_email"), self._lock:
+            self._outgoing("Sent", subject, body, to, cc, bcc)
+            return True
+
+    def create_draft(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+    ) -> str:
+        """Create a draft in the first account's Drafts mailbox."""
+        with self._call("create_draft"), self._lock:
+            return self._outgoing("Drafts", subject, body, to, cc, bcc)
+
+    def mark_as_read(self, message_ids: list[str], read: bool = True) -> MutationResult:
+        """Mark messages as read or unread."""
+        if not message_ids:
+            return MutationResult()
+        with self._call("mark_as_read"):
+            return self._mark_as_read(message_ids, read)
+
+    def _mark_as_read(self, message_ids: list[str], read: bool = True) -> MutationResult:
+        with self._lock:
+            ids, messages = self._found(message_ids)
+            for message in messages:
+                message.read = read
+            return self._changed(ids, messages)
+
+    def send_email_with_attachments(
+        self,
+        subject: str,
+        body: str,
+        to: list[str],
+        attachments: list[Path],
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        max_attachment_size: int = 25 * 1024 * 1024,
+    ) -> bool:
+        """Send an email with file attachments (contents are read into memory)."""
+        from .security import validate_attachment_size, validate_attachment_type
+
+        stored = []
+        for path in attachments:
+            if not path.exists():
+                raise FileNotFoundError(f"Attachment not found: {path}")
+            if not path.is_file():
+                raise ValueError(f"Attachment is not a file: {path}")
+            size = path.stat().st_size
+            if not validate_attachment_size(size, max_attachment_size):
+                raise ValueError(
+                    f"Attachment {path.name} exceeds size limit "
+                    f"({size} bytes > {max_attachment_size} bytes)"
+                )
+            if not validate_attachment_type(path.name):
+                raise ValueError(f"Attachment type not allowed: {path.name}")
+            mime_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            stored.append(MemoryAttachment(path.name, path.read_bytes(), mime_type))
+
+        self._check_recipients(to, cc, bcc)
+        with self._call("send_email_with_attachments"), self._lock:
+            self._outgoing("Sent", subject, body, to, cc, bcc, stored)
+            return True
+
+    def get_attachments(self, message_id: str) -> list[dict[str, Any]]:
+        """List a message's attachments."""
+        with self._call("get_attachments"):
+            return self._get_attachments(message_id)
+
+    def _get_attachments(self, message_id: str) -> list[dict[str, Any]]:
+        (message_id,) = AppleMailConnector._message_id_args([message_id])
+        with self._lock:
+            return [
+                {
+                    "name": attachment.name,
+                    "mime_type": attachment.mime_type,
+                    "size": len(attachment.data),
+                    "downloaded": attachment.downloaded,
+                }
+                for attachment in self._message(message_id).attachments
+            ]
+
+    def save_attachments(
+        self,
+        message_id: str,
+        save_directory: Path,
+        attachment_indices: list[int] | None = None,
+    ) -> SavedAttachments:
+        """Write a message's attachments to a directory."""
+        if not save_directory.exists():
+            raise FileNotFoundError(f"Save directory does not exist: {save_directory}")
+        if not save_directory.is_dir():
+            raise ValueError(f"Save path is not a directory: {save_directory}")
+        save_directory = save_directory.resolve()
+        (message_id,) = AppleMailConnector._message_id_args([message_id])
+
+        with self._call("save_attachments"):
+            with self._lock:
+                attachments = list(self._message(message_id).attachments)
+            indices: Sequence[int] = range(len(attachments))
+            if attachment_indices is not None:
+                indices = [index for index in attachment_indices if 0 <= index < len(attachments)]
+
+            files = []
+            for index in indices:
+                attachment = attachments[index]
+                if not attachment.downloaded:
+                    continue
+                path = save_directory / sanitize_filename(attachment.name)
+                path.write_bytes(attachment.data)
+                files.append(
+                    {
+                        "index": index,
+                        "name": path.name,
+                        "path": str(path),
+                        "mime_type": attachment.mime_type,
+                        "size": len(attachment.data),
+                        "sha256": hashlib.sha256(attachment.data).hexdigest(),
+                    }
+                )
+            return SavedAttachments(files)
+
+    def move_messages(
+        self,
+        message_ids: list[str],
+        destination_mailbox: str,
+        account: str,
+        gmail_mode: bool = False,
+    ) -> MutationResult:
+        """Move messages to a mailbox of an account."""
+        if not message_ids:
+            return MutationResult()
+        with self._call("move_messages"):
+            return self._move_messages(message_ids, destination_mailbox, account, gmail_mode)
+
+    def _move_messages(
+        self,
+        message_ids: list[str],
+        destination_mailbox: str,
+        account: str,
+        gmail_mode: bool = False,
+    ) -> MutationResult:
+        with self._lock:
+            destination = self._mailbox(account, destination_mailbox)
+            ids, messages = self._found(message_ids)
+            for message in messages:
+                source_account, source_mailbox = self._locations[message.id]
+                del self.accounts[source_account].mailboxes[source_mailbox][message.id]
+                self._store(message, account, destination_mailbox, destination)
+            result = self._changed(ids, messages)
+        self.body_index.move(result.changed, account, destination_mailbox)
+        return result
+
+    def flag_message(self, message_ids: list[str], flag_color: str) -> MutationResult:
+        """Set the flag color on messages ("none" clears the flag)."""
+        if not message_ids:
+            return MutationResult()
+        if not validate_flag_color(flag_color):
+            raise ValueError(f"Invalid flag color: {flag_color}")
+        with self._call("flag_message"):
+            return self._flag_message(message_ids, flag_color)
+
+    def _flag_message(self, message_ids: list[str], flag_color: str) -> MutationResult:
+        if not validate_flag_color(flag_color):
+            raise ValueError(f"Invalid flag color: {flag_color}")
+        flag_index = get_flag_index(flag_color)
+        with self._lock:
+            ids, messages = self._found(message_ids)
+            for message in messages:
+                message.flag_index = flag_index
+            return self._changed(ids, messages)
+
+    def create_mailbox(
+        self,
+        account: str,
+        name: str,
+        parent_mailbox: str | None = None,
+    ) -> bool:
+        """Create a mailbox; nested mailboxes are named "parent/name"."""
+        sanitized_name = sanitize_mailbox_name(name)
+        if not sanitized_name:
+            raise ValueError(f"Invalid mailbox name: {name}")
+
+        with self._call("create_mailbox"), self._lock:
+            mailboxes = self._account(account).mailboxes
+            if parent_mailbox:
+                self._mailbox(account, parent_mailbox)
+                sanitized_name = f"{parent_mailbox}/{sanitized_name}"
+            if sanitized_name in mailboxes:
+                raise MailAppleScriptError(f'Mailbox "{sanitized_name}" already exists.')
+            mailboxes[sanitized_name] = {}
+            return True
+
+    def delete_messages(
+        self,
+        message_ids: list[str],
+        permanent: bool = False,
+        skip_bulk_check: bool = True,
+    ) -> MutationResult:
+        """Move messages to their account's Trash, or remove them permanently."""
+        if not message_ids:
+            return MutationResult()
+        with self._call("delete_messages"):
+            return self._delete_messages(message_ids, permanent, skip_bulk_check)
+
+    def _delete_messages(
+        self,
+        message_ids: list[str],
+        permanent: bool = False,
+        skip_bulk_check: bool = True,
+    ) -> MutationResult:
+        if not skip_bulk_check and len(message_ids) > 100:
+            raise ValueError(
+                f"Too many messages for bulk delete ({len(message_ids)}). "
+                "Maximum is 100 without skip_bulk_check=True"
+            )
+        with self._lock:
+            ids, messages = self._found(message_ids)
+            for message in messages:
+                account_name, mailbox = self._locations.pop(message.id)
+                account = self.accounts[account_name]
+                del account.mailboxes[mailbox][message.id]
+                if not permanent and mailbox != "Trash":
+                    trash = account.mailboxes.setdefault("Trash", {})
+                    self._store(message, account_name, "Trash", trash)
+            result = self._changed(ids, messages)
+        self.body_index.remove(result.changed)
+        return result
+
+    def update_matching(
+        self,
+        account: str,
+        mailbox: str,
+        action: str,
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        older_than_days: int | None = None,
+        read: bool = True,
+        flag_color: str | None = None,
+        destination_mailbox: str | None = None,
+        gmail_mode: bool = False,
+        dry_run: bool = False,
+        max_messages: int = DEFAULT_MAX_MATCHING,
+    ) -> dict[str, Any]:
+        """Apply an action to the messages of a mailbox matching a filter."""
+        with self._call("update_matching"):
+            return self._update_matching(
+                account,
+                mailbox,
+                action,
+                sender_contains,
+                subject_contains,
+                read_status,
+                older_than_days,
+                read,
+                flag_color,
+                destination_mailbox,
+                gmail_mode,
+                dry_run,
+                max_messages,
+            )
+
+    def _update_matching(
+        self,
+        account: str,
+        mailbox: str,
+        action: str,
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        older_than_days: int | None = None,
+        read: bool = True,
+        flag_color: str | None = None,
+        destination_mailbox: str | None = None,
+        gmail_mode: bool = False,
+        dry_run: bool = False,
+        max_messages: int = DEFAULT_MAX_MATCHING,
+    ) -> dict[str, Any]:
+        if action not in MATCHING_ACTIONS:
+            raise ValueError(
+                f"Invalid action: {action!r} (expected one of {', '.join(MATCHING_ACTIONS)})"
+            )
+        if older_than_days is not None and older_than_days < 0:
+            raise ValueError(f"older_than_days must not be negative: {older_than_days}")
+        if max_messages < 0:
+            raise ValueError(f"max_messages must not be negative: {max_messages}")
+        if action == "flag_message" and (flag_color is None or not validate_flag_color(flag_color)):
+            raise ValueError(f"Invalid flag color: {flag_color}")
+        if action == "move_messages" and not destination_mailbox:
+            raise ValueError("move_messages requires a destination_mailbox")
+
+        cutoff = None
+        if older_than_days is not None:
+            cutoff = datetime.now() - timedelta(days=older_than_days)
+        with self._lock:
+            ids = [
+                message.id
+                for message in self._mailbox(account, mailbox).values()
+                if self._matches(message, sender_contains, subject_contains, read_status, cutoff)
+            ]
+
+        if dry_run or not ids or len(ids) > max_messages:
+            return {"matched": len(ids), "changed": 0}
+        if action == "mark_as_read":
+            self._mark_as_read(ids, read)
+        elif action == "flag_message":
+            assert flag_color is not None
+            self._flag_message(ids, flag_color)
+        elif action == "move_messages":
+            assert destination_mailbox is not None
+            self._move_messages(ids, destination_mailbox, account, gmail_mode)
+        else:
+            self._delete_messages(ids)
+        return {"matched": len(ids), "changed": len(ids)}
+
+    def reply_to_message(
+        self,
+        message_id: str,
+        body: str,
+        reply_all: bool = False,
+        quote_original: bool = True,
+    ) -> str:
+        """Reply to a message (stored in the first account's Sent mailbox)."""
+        (message_id,) = AppleMailConnector._message_id_args([message_id])
+        with self._call("reply_to_message"), self._lock:
+            original = self._message(message_id)
+            if quote_original:
+                quoted = "\n".join(f"> {line}" for line in original.content.splitlines())
+                body = f"{body}\n\n{quoted}"
+            recipients = [original.sender, *(original.to if reply_all else [])]
+            cc = original.cc if reply_all else []
+            return self._outgoing("Sent", f"Re: {original.subject}", body, recipients, cc)
+
+    def forward_message(
+        self,
+        message_id: str,
+        to: list[str],
+        body: str = "",
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        include_attachments: bool = True,
+    ) -> str:
+        """Forward a message (stored in the first account's Sent mailbox)."""
+        if not to:
+            raise ValueError("At least one recipient required")
+        self._check_recipients(to, cc, bcc)
+        (message_id,) = AppleMailConnector._message_id_args([message_id])
+
+        with self._call("forward_message"), self._lock:
+            original = self._message(message_id)
+            return self._outgoing(
+                "Sent",
+                f"Fwd: {original.subject}",
+                f"{body}\n\n---------- Forwarded message ----------\n{original.content}",
+                to,
+                cc,
+                bcc,
+                list(original.attachments) if include_attachments else [],
+            )
@@ -0,0 +1,424 @@
+"""
+Local SQLite cache of message metadata.
+
+A search through AppleScript walks the live mailbox on every call, even when
+nothing in it has changed. With a cache attached, the connector lists a
+mailbox once (one column-wise listing, see templates.search_messages_script)
+and answers searches from SQLite until the listing is older than the
+cache's maximum age. Subject and sender are indexed with FTS5's trigram
+tokenizer, which matches substrings case-insensitively like Mail's
+``contains``; filters shorter than three characters fall back to LIKE.
+
+The connector writes its own changes through (read status, moves,
+deletes), so the cache only lags behind changes made elsewhere (new mail,
+other clients) and never by more than the maximum age. Searches served
+from the cache say when their mailbox was listed (CachedListing.synced_at).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from .pagination import CursorPosition, MessagePage
+from .query import CompiledQuery, SqlColumns
+
+DEFAULT_CACHE_PATH = Path.home() / "Library" / "Caches" / "apple-mail-mcp" / "messages.db"
+
+# Seconds a mailbox listing is trusted before the next search lists it again
+DEFAULT_MAX_AGE = 300.0
+
+# Shortest filter the trigram index can answer
+_MIN_TRIGRAM = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    subject TEXT NOT NULL DEFAULT '',
+    sender TEXT NOT NULL DEFAULT '',
+    date_text TEXT NOT NULL DEFAULT '',
+    date_received INTEGER,
+    read INTEGER NOT NULL DEFAULT 0,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_by_mailbox
+    ON messages (account, mailbox, date_received DESC);
+
+CREATE TABLE IF NOT EXISTS mailboxes (
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (account, mailbox)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, content='messages', content_rowid='rowid', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender)
+        VALUES (new.rowid, new.subject, new.sender);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender)
+        VALUES ('delete', old.rowid, old.subject, old.sender);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF subject, sender ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender)
+        VALUES ('delete', old.rowid, old.subject, old.sender);
+    INSERT INTO messages_fts (rowid, subject, sender)
+        VALUES (new.rowid, new.subject, new.sender);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO messages (id, account, mailbox, subject, sender, date_text, date_received, read,
+                      position)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    account = excluded.account,
+    mailbox = excluded.mailbox,
+    subject = excluded.subject,
+    sender = excluded.sender,
+    date_text = excluded.date_text,
+    date_received = excluded.date_received,
+    read = excluded.read,
+    position = excluded.position
+"""
+
+
+# Listing order, newest first; messages without a known date come last
+_SORT_KEY = "COALESCE(date_received, -1), CAST(id AS INTEGER)"
+
+# Columns query expressions test (see query.SqlColumns)
+_QUERY_COLUMNS = SqlColumns("sender", "subject", "read", "date_received")
+
+
+def _fts_phrase(column: str, text: str) -> str:
+    """Build an FTS5 query matching text anywhere in a column."""
+    return f'{column} : "{text.replace(chr(34), chr(34) * 2)}"'
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class CachedListing(MessagePage):
+    """Search results served from the cache."""
+
+    synced_at: float
+    """When the mailbox was last listed from Mail (epoch seconds)."""
+
+    def __init__(self, messages: Iterable[dict[str, Any]], synced_at: float) -> None:
+        super().__init__(messages)
+        self.synced_at = synced_at
+
+    @property
+    def age(self) -> float:
+        """Seconds since the mailbox was listed."""
+        return max(0.0, time.time() - self.synced_at)
+
+
+class MessageCache:
+    """Thread-safe SQLite store of message metadata, one row per message."""
+
+    def __init__(self, path: Path | str | None = None, max_age: float = DEFAULT_MAX_AGE) -> None:
+        """
+        Open (or create) the cache.
+
+        Args:
+            path: Database file, or ":memory:" (default:
+                ~/Library/Caches/apple-mail-mcp/messages.db)
+            max_age: Seconds a mailbox listing is trusted
+        """
+        self.path = str(path or DEFAULT_CACHE_PATH)
+        self.max_age = max_age
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            if self.path != ":memory:":
+                # Readers never block the writer (and vice versa)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+    def synced_at(self, account: str, mailbox: str) -> float | None:
+        """
+        Return when a mailbox was last listed.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+
+        Returns:
+            Epoch seconds, or None if the mailbox was never listed (or was
+            invalidated since)
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT synced_at FROM mailboxes WHERE account = ? AND mailbox = ?",
+                (account, mailbox),
+            ).fetchone()
+        return row[0] if row else None
+
+    def mailbox_stats(self, account: str, mailbox: str) -> dict[str, Any] | None:
+        """
+        Describe a mailbox as of its last listing.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+
+        Returns:
+            Dictionary with "messages", "oldest" and "newest" (epoch
+            seconds of date received, None if unknown) and "synced_at", or
+            None if the mailbox was never listed (or was invalidated since)
+        """
+        with self._lock:
+            synced = self._db.execute(
+                "SELECT synced_at FROM mailboxes WHERE account = ? AND mailbox = ?",
+                (account, mailbox),
+            ).fetchone()
+            if synced is None:
+                return None
+            messages, oldest, newest = self._db.execute(
+                "SELECT count(*), min(date_received), max(date_received) FROM messages"
+                " WHERE account = ? AND mailbox = ?",
+                (account, mailbox),
+            ).fetchone()
+        return {"messages": messages, "oldest": oldest, "newest": newest, "synced_at": synced[0]}
+
+    def is_fresh(self, account: str, mailbox: str) -> bool:
+        """Return True if a mailbox was listed less than max_age seconds ago."""
+        synced_at = self.synced_at(account, mailbox)
+        fresh = synced_at is not None and time.time() - synced_at < self.max_age
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def store_mailbox(self, account: str, mailbox: str, messages: list[dict[str, Any]]) -> None:
+        """
+        Replace the cached contents of a mailbox with a complete listing.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            messages: Every message of the mailbox, as search_messages
+                returns them, in Mail's order
+        """
+        rows = [
+            (
+                message["id"],
+                account,
+                mailbox,
+                message["subject"],
+                message["sender"],
+                message["date_received"],
+                message.get("timestamp"),
+                int(message["read_status"]),
+                position,
+            )
+            for position, message in enumerate(messages)
+        ]
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "DELETE FROM messages WHERE account = ? AND mailbox = ?", (account, mailbox)
+            )
+            self._db.executemany(_UPSERT, rows)
+            self._db.execute(
+                "INSERT OR REPLACE INTO mailboxes (account, mailbox, synced_at) VALUES (?, ?, ?)",
+                (account, mailbox, time.time()),
+            )
+
+    def search(
+        self,
+        account: str,
+        mailbox: str = "INBOX",
+        sender_contains: str | None = None,
+        subject_contains: str | None = None,
+        read_status: bool | None = None,
+        limit: int | None = None,
+        after: CursorPosition | None = None,
+        received_after: datetime | None = None,
+        received_before: datetime | None = None,
+        query: CompiledQuery | None = None,
+    ) -> CachedListing:
+        """
+        Search a listed mailbox, with the filters of search_messages.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            sender_contains: Filter by sender (case-insensitive substring)
+            subject_contains: Filter by subject (case-insensitive substring)
+            read_status: Filter by read status
+            limit: Maximum results
+            after: Only return messages listed after this position (the
+                next page of an earlier search)
+            received_after: Only messages received at or after this local time
+            received_before: Only messages received before this local time
+            query: Compiled query expression; only its pushdown part is
+                applied
+
+        Returns:
+            Matching messages, newest first (ties by descending ID)
+        """
+        conditions = ["account = ?", "mailbox = ?"]
+        params: list[Any] = [account, mailbox]
+
+        phrases = []
+        for column, text in (("sender", sender_contains), ("subject", subject_contains)):
+            if not text:
+                continue
+            if len(text) >= _MIN_TRIGRAM:
+                phrases.append(_fts_phrase(column, text))
+            else:
+                conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(text))
+        if phrases:
+            conditions.append(
+                "rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)"
+            )
+            params.append(" AND ".join(phrases))
+        if read_status is not None:
+            conditions.append("read = ?")
+            params.append(int(read_status))
+        # A range scan of the (account, mailbox, date_received) index
+        if received_after is not None:
+            conditions.append("date_received >= ?")
+            params.append(int(received_after.timestamp()))
+        if received_before is not None:
+            conditions.append("date_received < ?")
+            params.append(int(received_before.timestamp()))
+        if query is not None and query.pushdown is not None:
+            condition, values = query.sql(_QUERY_COLUMNS)
+            conditions.append(condition)
+            params.extend(values)
+        if after is not None:
+            # Keyset: continue strictly after the last message of the previous page
+            conditions.append(f"({_SORT_KEY}) < (?, ?)")
+            params.extend([-1 if after.key is None else after.key, int(after.message_id)])
+
+        sql = (
+            "SELECT id, subject, sender, date_text, read, date_received FROM messages"
+            f" WHERE {' AND '.join(conditions)}"
+            " ORDER BY COALESCE(date_received, -1) DESC, CAST(id AS INTEGER) DESC"
+        )
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+            synced = self._db.execute(
+                "SELECT synced_at FROM mailboxes WHERE account = ? AND mailbox = ?",
+                (account, mailbox),
+            ).fetchone()
+        messages = (
+            {
+                "id": message_id,
+                "subject": subject,
+                "sender": sender,
+                "date_received": date_text,
+                "read_status": bool(read),
+                "timestamp": timestamp,
+            }
+            for message_id, subject, sender, date_text, read, timestamp in rows
+        )
+        return CachedListing(messages, synced[0] if synced else 0.0)
+
+    def update(self, message_ids: Iterable[str], read: bool) -> None:
+        """
+        Write a change of read status through to cached messages.
+
+        Args:
+            message_ids: IDs of the changed messages (unknown IDs are ignored)
+            read: New read status
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE messages SET read = ? WHERE id = ?",
+                ((int(read), message_id) for message_id in message_ids),
+            )
+
+    def move(self, message_ids: Iterable[str], account: str, mailbox: str) -> None:
+        """
+        Write a move through to cached messages.
+
+        Args:
+            message_ids: IDs of the moved messages
+            account: Destination account
+            mailbox: Destination mailbox
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE messages SET account = ?, mailbox = ?, position = -1 WHERE id = ?",
+                ((account, mailbox, message_id) for message_id in message_ids),
+            )
+
+    def delete(self, message_ids: Iterable[str]) -> None:
+        """
+        Forget deleted messages.
+
+        Args:
+            message_ids: IDs of the deleted messages
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "DELETE FROM messages WHERE id = ?", ((message_id,) for message_id in message_ids)
+            )
+
+    def invalidate(self, account: str, mailbox: str) -> None:
+        """
+        Mark a mailbox as changed in ways the cache cannot follow.
+
+        Its next search lists it from Mail again.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM mailboxes WHERE account = ? AND mailbox = ?", (account, mailbox)
+            )
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return cache size and freshness counters.
+
+        Returns:
+            Dictionary with "messages", "mailboxes" (listed mailboxes),
+            "hits" and "misses" (searches a fresh listing could or could
+            not answer)
+        """
+        with self._lock:
+            messages = self._db.execute("SELECT count(*) FROM messages").fetchone()[0]
+            mailboxes = self._db.execute("SELECT count(*) FROM mailboxes").fetchone()[0]
+        return {
+            "messages": messages,
+            "mailboxes": mailboxes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,258 @@
+"""
+Streaming extraction of attachments from a message's MIME source.
+
+``email.parser`` builds the whole message in memory, attachments included,
+and Mail's own ``save`` command handles one attachment per Apple Event and
+reports nothing about what it wrote. This module reads the source line by
+line instead, follows the multipart boundaries and writes each attachment
+part to its file while decoding it (base64 and quoted-printable in chunks
+of at most CHUNK_SIZE bytes), hashing what it writes. Memory stays bounded
+by the chunk size and the part headers, whatever the attachment sizes.
+"""
+
+from __future__ import annotations
+
+import binascii
+import email.policy
+import hashlib
+import mimetypes
+import re
+from email.message import EmailMessage
+from email.parser import BytesHeaderParser
+from pathlib import Path
+from typing import IO, Any
+
+from .utils import sanitize_filename
+
+# Largest line piece read, and the most undecoded base64 kept, at a time
+CHUNK_SIZE = 64 * 1024
+
+# Most bytes of headers read for one part; the rest is ignored
+MAX_HEADER_BYTES = 256 * 1024
+
+_NOT_BASE64 = re.compile(rb"[^A-Za-z0-9+/]")
+
+
+class MimeSource:
+    """Line reader over a binary stream, optionally bounded to a byte count."""
+
+    def __init__(self, stream: IO[bytes], limit: int | None = None) -> None:
+        """
+        Wrap a stream.
+
+        Args:
+            stream: Stream positioned at the start of the message
+            limit: Bytes the message has (the rest of the stream is not
+                read), or None to read to the end
+        """
+        self.stream = stream
+        self.remaining = limit
+        self.at_line_start = True
+
+    def readline(self) -> tuple[bytes, bool]:
+        """
+        Read the next line, or the next CHUNK_SIZE bytes of a longer one.
+
+        Returns:
+            (data, True if the data starts a line); data is b"" at the end
+        """
+        size = CHUNK_SIZE if self.remaining is None else min(CHUNK_SIZE, self.remaining)
+        line = self.stream.readline(size) if size else b""
+        if self.remaining is not None:
+            self.remaining -= len(line)
+        starts_line = self.at_line_start
+        self.at_line_start = line.endswith(b"\n")
+        return line, starts_line
+
+
+class _Base64Decoder:
+    def __init__(self) -> None:
+        self.pending = b""
+
+    def feed(self, line: bytes) -> bytes:
+        data = self.pending + _NOT_BASE64.sub(b"", line.split(b"=", 1)[0])
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b""
+
+    def finish(self) -> bytes:
+        # A truncated final group decodes as far as it goes
+        data, self.pending = self.pending, b""
+        if len(data) < 2:
+            return b""
+        return binascii.a2b_base64(data + b"=" * (-len(data) % 4))
+
+
+class _LineDecoder:
+    """Identity or quoted-printable decoding; the last line break is dropped."""
+
+    def __init__(self, quoted_printable: bool) -> None:
+        self.quoted_printable = quoted_printable
+        self.line_break = b""
+
+    def feed(self, line: bytes) -> bytes:
+        # The line break before a boundary belongs to the boundary, so each
+        # break is only written once another line follows
+        content = line.rstrip(b"\r\n")
+        output = self.line_break
+        if self.quoted_printable and content.endswith(b"=") and line != content:
+            # Soft line break
+            self.line_break = b""
+            return output + binascii.a2b_qp(content[:-1])
+        self.line_break = line[len(content) :]
+        return output + (binascii.a2b_qp(content) if self.quoted_printable else content)
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _Extractor:
+    def __init__(self, source: MimeSource, directory: Path, indices: set[int] | None) -> None:
+        self.source = source
+        self.directory = directory
+        self.indices = indices
+        self.count = 0
+        self.saved: list[dict[str, Any]] = []
+
+    def read_headers(self) -> EmailMessage:
+        data = bytearray()
+        while True:
+            line, _ = self.source.readline()
+            if not line or line in (b"\n", b"\r\n"):
+                break
+            if len(data) < MAX_HEADER_BYTES:
+                data += line
+        headers = BytesHeaderParser(policy=email.policy.default).parsebytes(bytes(data))
+        assert isinstance(headers, EmailMessage)
+        return headers
+
+    def next_line(self, boundaries: list[bytes]) -> tuple[bytes, bytes | None]:
+        """Return the next line and, if it is a delimiter, its stripped form."""
+        line, starts_line = self.source.readline()
+        if starts_line and line.startswith(b"--"):
+            stripped = line.rstrip()
+            for boundary in boundaries:
+                if stripped in (b"--" + boundary, b"--" + boundary + b"--"):
+                    return line, stripped
+        return line, None
+
+    def skip(self, boundaries: list[bytes]) -> bytes | None:
+        """Skip to the next delimiter of the enclosing multiparts."""
+        while True:
+            line, delimiter = self.next_line(boundaries)
+            if delimiter is not None:
+                return delimiter
+            if not line:
+                return None
+
+    def part(self, boundaries: list[bytes]) -> bytes | None:
+        """
+        Process one entity (headers and body).
+
+        Returns:
+            The delimiter line that ended it, or None at the end of input
+        """
+        headers = self.read_headers()
+        boundary = headers.get_boundary()
+        if headers.get_content_maintype() == "multipart" and boundary:
+            inner = [*boundaries, boundary.encode("ascii", "replace")]
+            delimiter = self.skip(inner)
+            while delimiter == b"--" + inner[-1]:
+                delimiter = self.part(inner)
+            if delimiter == b"--" + inner[-1] + b"--":
+                # Epilogue
+                delimiter = self.skip(boundaries)
+            return delimiter
+        if headers.get_content_type() == "message/rfc822" and not headers.get_filename():
+            return self.part(boundaries)
+
+        filename = headers.get_filename()
+        if filename or headers.get_content_disposition() == "attachment":
+            index = self.count
+            self.count += 1
+            if self.indices is None or index in self.indices:
+                return self.save(headers, filename, index, boundaries)
+        return self.skip(boundaries)
+
+    def save(
+        self, headers: EmailMessage, filename: str | None, index: int, boundaries: list[bytes]
+    ) -> bytes | None:
+        mime_type = headers.get_content_type()
+        if filename:
+            name = sanitize_filename(filename)
+        else:
+            name = f"attachment-{index + 1}{mimetypes.guess_extension(mime_type) or '.bin'}"
+        encoding = headers.get("Content-Transfer-Encoding", "").strip().lower()
+        decoder: _Base64Decoder | _LineDecoder
+        if encoding == "base64":
+            decoder = _Base64Decoder()
+        else:
+            decoder = _LineDecoder(quoted_printable=encoding == "quoted-printable")
+
+        digest = hashlib.sha256()
+        size = 0
+        path, f = _create_unique(self.directory, name)
+        with f:
+            while True:
+                line, delimiter = self.next_line(boundaries)
+                data = decoder.finish() if delimiter is not None or not line else decoder.feed(line)
+                if data:
+                    f.write(data)
+                    digest.update(data)
+                    size += len(data)
+                if delimiter is not None or not line:
+                    break
+
+        self.saved.append(
+            {
+                "index": index,
+                "name": path.name,
+                "path": str(path),
+                "mime_type": mime_type,
+                "size": size,
+                "sha256": digest.hexdigest(),
+            }
+        )
+        return delimiter
+
+
+def _create_unique(directory: Path, name: str) -> tuple[Path, IO[bytes]]:
+    """Create a new file, adding " (n)" to the name if it is taken."""
+    path = directory / name
+    stem, suffix = path.stem, path.suffix
+    for n in range(1, 1000):
+        try:
+            return path, path.open("xb")
+        except FileExistsError:
+            path = directory / f"{stem} ({n}){suffix}"
+    raise FileExistsError(f"Too many files named like {name} in {directory}")
+
+
+def extract_attachments(
+    stream: IO[bytes],
+    directory: Path,
+    indices: list[int] | None = None,
+    limit: int | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Write the attachments of a message to a directory while reading it.
+
+    Attachments are the parts with a file name or an ``attachment``
+    disposition, numbered in source order (the order of Mail's ``mail
+    attachments``). Existing files are never overwritten.
+
+    Args:
+        stream: Binary stream of the RFC 822 message
+        directory: Existing directory to write to
+        indices: Attachment indices to save (None = all)
+        limit: Bytes of the stream that belong to the message
+
+    Returns:
+        One dictionary per saved attachment with "index", "name", "path",
+        "mime_type", "size" (decoded bytes) and "sha256" (hex digest)
+    """
+    extractor = _Extractor(
+        MimeSource(stream, limit), directory, None if indices is None else set(indices)
+    )
+    extractor.part([])
+    return extractor.saved
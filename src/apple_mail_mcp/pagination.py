@@ -0,0 +1,176 @@
+"""
+Continuation cursors for search_messages.
+
+Listings are ordered newest first: by date received, then by message ID
+(both descending). A cursor records where a page ended — the last
+message's date and ID, and its index in the listing when the source knows
+it — so the next page continues strictly after that message instead of
+listing the first N + limit messages again:
+
+- the message cache, the Envelope Index and the in-memory backend seek to
+  the (date, id) key, so messages that arrive meanwhile (which are newer)
+  do not shift later pages;
+- AppleScript reads the next range of the listing (the mailbox, or the
+  ``whose`` set of a filtered search), after checking that the message at
+  the recorded index is still the last one returned. If messages arrived
+  or left above it, it is found again by ID, and if it left the mailbox
+  too, by its date (see templates.search_page_script).
+
+Cursors are opaque to clients (URL-safe base64 of a small JSON object)
+and only valid for the search they came from: the account, mailbox,
+filters and date window are part of them.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import json
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from .utils import local_days_seconds
+
+_VERSION = 1
+
+
+class CursorPosition(NamedTuple):
+    """Where a page of search results ended."""
+
+    key: int | None
+    """Epoch seconds of the last message's date received (None if unknown)."""
+
+    message_id: str
+    """ID of the last message."""
+
+    listing_index: int = 0
+    """1-based index of the last message in the listing, or 0 if unknown."""
+
+    def local_key(self) -> tuple[int, int] | None:
+        """Return the date as (days, seconds) of local time since 1970-01-01."""
+        if self.key is None:
+            return None
+        return local_days_seconds(datetime.fromtimestamp(self.key))
+
+
+class MessagePage(list[dict[str, Any]]):
+    """One page of search results."""
+
+    next_cursor: str | None
+    """Cursor for the following page, or None if this is the last one."""
+
+    last_index: int
+    """1-based listing index of the last message, or 0 if the source does not know it."""
+
+    plan: dict[str, Any] | None
+    """How the search ran (see planner.SearchPlan.explain), if the source plans searches."""
+
+    def __init__(
+        self,
+        messages: Iterable[dict[str, Any]] = (),
+        next_cursor: str | None = None,
+        last_index: int = 0,
+    ) -> None:
+        super().__init__(messages)
+        self.next_cursor = next_cursor
+        self.last_index = last_index
+        self.plan = None
+
+
+def search_digest(
+    account: str,
+    mailbox: str,
+    sender_contains: str | None = None,
+    subject_contains: str | None = None,
+    read_status: bool | None = None,
+    received_after: datetime | None = None,
+    received_before: datetime | None = None,
+    query: str | None = None,
+) -> str:
+    """Identify a search (everything but its limit and position)."""
+    window = [moment and moment.isoformat() for moment in (received_after, received_before)]
+    terms = [account, mailbox, sender_contains, subject_contains, read_status, *window]
+    if query:
+        # Only appended when set, so cursors from before query existed stay valid
+        terms.append(query)
+    return hashlib.sha256(json.dumps(terms).encode()).hexdigest()[:16]
+
+
+def encode_cursor(search: str, position: CursorPosition) -> str:
+    """
+    Build the cursor for the page after a position.
+
+    Args:
+        search: search_digest() of the search
+        position: Where the page ended
+
+    Returns:
+        Opaque cursor text
+    """
+    state = {"v": _VERSION, "s": search, "k": position.key, "i": position.message_id}
+    if position.listing_index:
+        state["n"] = position.listing_index
+    data = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, search: str) -> CursorPosition:
+    """
+    Read a cursor.
+
+    Args:
+        cursor: Cursor from a previous page
+        search: search_digest() of the search it is used with
+
+    Returns:
+        The position the cursor points after
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another search
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(data)
+        if not isinstance(state, dict) or state.get("v") != _VERSION:
+            raise ValueError("unknown version")
+        key = state["k"]
+        position = CursorPosition(
+            None if key is None else int(key), str(state["i"]), int(state.get("n", 0))
+        )
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from None
+    if state.get("s") != search:
+        raise ValueError("The cursor belongs to a different search")
+    if not position.message_id.isdigit():
+        raise ValueError("Invalid cursor: bad message ID")
+    return position
+
+
+def next_page(
+    messages: list[dict[str, Any]],
+    limit: int | None,
+    search: str,
+    last_index: int = 0,
+) -> MessagePage:
+    """
+    Wrap a page of results with the cursor for the next one.
+
+    Args:
+        messages: The page, in listing order
+        limit: Page size; a full page gets a cursor
+        search: search_digest() of the search
+        last_index: Listing index of the last message, if known
+
+    Returns:
+        The page (the same object if it already is a MessagePage)
+    """
+    page = messages if isinstance(messages, MessagePage) else MessagePage(messages)
+    page.last_index = last_index or page.last_index
+    page.next_cursor = None
+    if limit and len(page) >= limit:
+        last = page[-1]
+        position = CursorPosition(last.get("timestamp"), last["id"], page.last_index)
+        page.next_cursor = encode_cursor(search, position)
+    return page
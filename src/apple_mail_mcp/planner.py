@@ -0,0 +1,452 @@
+"""
+Cost-based choice of how a search runs.
+
+A search can be answered several ways, and which is cheapest depends on
+the mailbox and the filters rather than on which arguments are set:
+
+- ``cache``: a query on the message cache, after listing the whole mailbox
+  into it if its listing is stale (see message_cache);
+- ``index``: a query on Mail's own database (see envelope_index);
+- ``range``: an unfiltered listing reads a range of the mailbox, bounded by
+  binary search for a date window (see templates.search_messages_script);
+- ``whose``: the filters are pushed down into a ``whose`` clause, which Mail
+  tests against every message of the mailbox;
+- ``scan``: the script reads the mailbox newest first in chunks, applies the
+  filters itself and stops at the limit (see templates.scan_messages_script);
+- ``hybrid``: the same scan, over just the date window's range of indices.
+
+The planner estimates each applicable strategy from signals that cost at
+most one Apple Event: the mailbox's message count (from the cache's last
+listing, an earlier search, or ``count of messages``), the cache's
+freshness and date span, and the historical selectivity of each filter
+(the fraction of messages it matched in earlier searches of the mailbox).
+A limited search with common matches favours a scan, which examines about
+limit / selectivity messages; a rare match favours ``whose``, which
+examines every message but inside Mail and reads only the matches.
+
+Costs are estimated milliseconds under a CostModel whose defaults are
+rough orders of magnitude; only their ratios matter for the choice.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, NamedTuple
+
+# Preference between strategies whose estimates are equal
+STRATEGIES = ("cache", "index", "range", "hybrid", "scan", "whose")
+
+# Fraction of messages each filter is assumed to match until searches
+# have shown otherwise
+DEFAULT_SELECTIVITY = {"sender": 0.05, "subject": 0.05, "read=true": 0.8, "read=false": 0.2}
+
+# Fraction of a mailbox a date window is assumed to cover when the
+# mailbox's date span is unknown
+DEFAULT_WINDOW_FRACTION = 0.25
+
+# Bounds of the number of messages a scan reads per chunk
+MIN_CHUNK = 50
+MAX_CHUNK = 2000
+
+# Seconds a mailbox's message count is trusted
+DEFAULT_SIZE_TTL = 300.0
+
+# Properties read per message of a listing (id, subject, sender, date, read)
+_COLUMNS = 5
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """Estimated cost of the work a search does, in milliseconds."""
+
+    event_ms: float = 10.0
+    """One Apple Event from a running script to Mail."""
+
+    read_ms: float = 0.01
+    """Reading one property of one message as part of a column."""
+
+    whose_ms: float = 0.02
+    """Mail testing one condition of a ``whose`` clause on one message."""
+
+    loop_ms: float = 0.05
+    """A script testing one message of a scan against the filters."""
+
+    store_ms: float = 0.02
+    """Writing one message into the message cache."""
+
+    query_ms: float = 2.0
+    """One SQLite query on the message cache or the Envelope Index."""
+
+    listing_reuse: float = 5.0
+    """Searches a cache listing answers before it is stale; they share its cost."""
+
+
+class SearchPlan(NamedTuple):
+    """How a search runs, and why."""
+
+    strategy: str
+    """One of STRATEGIES, or "page" for a page after a cursor."""
+
+    reason: str
+
+    estimates: dict[str, float] | None = None
+    """Estimated milliseconds of each strategy considered."""
+
+    mailbox_size: int | None = None
+    selectivity: float | None = None
+    """Estimated fraction of messages the filters match."""
+
+    chunk_size: int = 0
+    """Messages per chunk of a scan or hybrid plan."""
+
+    def explain(self, **timings: float) -> dict[str, Any]:
+        """
+        Describe the plan for a client.
+
+        Args:
+            timings: Measured milliseconds by phase (e.g. plan_ms)
+
+        Returns:
+            Dictionary with "strategy", "reason", "estimates_ms",
+            "mailbox_size", "selectivity", "chunk_size" (scans only) and
+            "timings_ms"
+        """
+        explained: dict[str, Any] = {
+            "strategy": self.strategy,
+            "reason": self.reason,
+            "estimates_ms": {
+                strategy: round(cost, 1) for strategy, cost in (self.estimates or {}).items()
+            },
+            "mailbox_size": self.mailbox_size,
+            "selectivity": None if self.selectivity is None else round(self.selectivity, 4),
+        }
+        if self.chunk_size:
+            explained["chunk_size"] = self.chunk_size
+        explained["timings_ms"] = {phase: round(ms, 1) for phase, ms in timings.items()}
+        return explained
+
+
+def predicate_keys(
+    sender_contains: str | None = None,
+    subject_contains: str | None = None,
+    read_status: bool | None = None,
+) -> tuple[str, ...]:
+    """
+    Name the filters of a search, as selectivity is recorded for them.
+
+    Args:
+        sender_contains: Sender filter
+        subject_contains: Subject filter
+        read_status: Read status filter
+
+    Returns:
+        Sorted keys, e.g. ("read=false", "sender")
+    """
+    keys = []
+    if sender_contains:
+        keys.append("sender")
+    if subject_contains:
+        keys.append("subject")
+    if read_status is not None:
+        keys.append(f"read={str(read_status).lower()}")
+    return tuple(sorted(keys))
+
+
+def window_fraction(
+    received_after: datetime | None,
+    received_before: datetime | None,
+    oldest: int | None = None,
+    newest: int | None = None,
+) -> float:
+    """
+    Estimate the fraction of a mailbox a date window covers.
+
+    Args:
+        received_after: Start of the window
+        received_before: End of the window
+        oldest: Epoch seconds of the mailbox's oldest message, if known
+        newest: Epoch seconds of its newest message, if known
+
+    Returns:
+        Fraction between 0 and 1, assuming messages arrive evenly over the
+        mailbox's span (DEFAULT_WINDOW_FRACTION if the span is unknown)
+    """
+    if oldest is None or newest is None or newest <= oldest:
+        return DEFAULT_WINDOW_FRACTION
+    start = oldest if received_after is None else max(oldest, received_after.timestamp())
+    end = newest if received_before is None else min(newest, received_before.timestamp())
+    return min(1.0, max(0.0, (end - start) / (newest - oldest)))
+
+
+def chunk_size(limit: int | None, selectivity: float) -> int:
+    """
+    Size a scan's chunks so that the limit is usually reached in the first one.
+
+    Args:
+        limit: Results wanted (None or 0 for all)
+        selectivity: Estimated fraction of messages that match
+
+    Returns:
+        Messages per chunk, between MIN_CHUNK and MAX_CHUNK
+    """
+    if not limit:
+        return MAX_CHUNK
+    expected = math.ceil(limit / max(selectivity, 1e-6) * 1.25)
+    return min(MAX_CHUNK, max(MIN_CHUNK, expected))
+
+
+class QueryPlanner:
+    """Chooses search strategies and learns from the searches that ran."""
+
+    def __init__(
+        self,
+        costs: CostModel | None = None,
+        size_ttl: float = DEFAULT_SIZE_TTL,
+        smoothing: float = 0.3,
+    ) -> None:
+        """
+        Initialize the planner.
+
+        Args:
+            costs: Cost model (default: CostModel())
+            size_ttl: Seconds a recorded message count is trusted
+            smoothing: Weight of a new observation in the moving average
+                of a filter's selectivity
+        """
+        self.costs = costs or CostModel()
+        self.size_ttl = size_ttl
+        self.smoothing = smoothing
+        self._sizes: dict[tuple[str, str], tuple[int, float]] = {}
+        self._selectivity: dict[tuple[str, str, tuple[str, ...]], float] = {}
+        self._lock = threading.Lock()
+        self.plans: Counter[str] = Counter()
+
+    def mailbox_size(self, account: str, mailbox: str, now: float | None = None) -> int | None:
+        """
+        Return a mailbox's recorded message count, if recent enough.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            now: Current epoch seconds (default: time.time())
+
+        Returns:
+            Number of messages, or None if unknown or older than size_ttl
+        """
+        with self._lock:
+            recorded = self._sizes.get((account, mailbox))
+        if recorded is None or (now or time.time()) - recorded[1] >= self.size_ttl:
+            return None
+        return recorded[0]
+
+    def record_size(self, account: str, mailbox: str, count: int) -> None:
+        """
+        Record a mailbox's message count.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            count: Number of messages
+        """
+        with self._lock:
+            self._sizes[(account, mailbox)] = (count, time.time())
+
+    def selectivity(self, account: str, mailbox: str, predicates: tuple[str, ...]) -> float:
+        """
+        Estimate the fraction of a mailbox's messages a combination of filters matches.
+
+        Uses what searches of the mailbox with the same filters matched,
+        else of any mailbox, else the product of each filter's own
+        estimate (observed or DEFAULT_SELECTIVITY).
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            predicates: predicate_keys() of the search
+
+        Returns:
+            Fraction between 0 and 1 (1.0 without filters)
+        """
+        with self._lock:
+            for scope in ((account, mailbox), ("", "")):
+                observed = self._selectivity.get((*scope, predicates))
+                if observed is not None:
+                    return observed
+            estimate = 1.0
+            for key in predicates:
+                single = self._selectivity.get((account, mailbox, (key,)))
+                if single is None:
+                    single = self._selectivity.get(("", "", (key,)), DEFAULT_SELECTIVITY[key])
+                estimate *= single
+        return estimate
+
+    def observe(
+        self,
+        account: str,
+        mailbox: str,
+        predicates: tuple[str, ...],
+        matched: int,
+        examined: int,
+    ) -> None:
+        """
+        Record what fraction of the messages a search examined matched.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            predicates: predicate_keys() of the search
+            matched: Messages that matched
+            examined: Messages tested (ignored if 0)
+        """
+        if not predicates or examined <= 0:
+            return
+        # Never exactly 0: a filter that matched nothing so far still might
+        fraction = max(matched, 0.5) / examined
+        with self._lock:
+            for scope in ((account, mailbox), ("", "")):
+                key = (*scope, predicates)
+                previous = self._selectivity.get(key)
+                self._selectivity[key] = (
+                    fraction
+                    if previous is None
+                    else previous + self.smoothing * (fraction - previous)
+                )
+
+    def estimate(
+        self,
+        predicates: tuple[str, ...],
+        limit: int | None,
+        size: int,
+        selectivity: float,
+        bounds: int = 0,
+        fraction: float = 1.0,
+        cache: str | None = None,
+    ) -> dict[str, float]:
+        """
+        Estimate the cost of each strategy that can answer a search.
+
+        Args:
+            predicates: predicate_keys() of the search
+            limit: Results wanted (None or 0 for all)
+            size: Messages in the mailbox
+            selectivity: Estimated fraction of messages the filters match
+            bounds: Number of date window bounds (0 to 2)
+            fraction: Estimated fraction of the mailbox in the date window
+            cache: "fresh" or "stale" if a message cache is attached
+
+        Returns:
+            Estimated milliseconds by strategy
+        """
+        c = self.costs
+        rows = size * fraction if bounds else size
+        bisect = bounds * math.log2(size + 1) * c.event_ms
+        # A count and one event per column
+        listing = (1 + _COLUMNS) * c.event_ms
+
+        estimates = {}
+        if cache == "fresh":
+            estimates["cache"] = c.query_ms
+        elif cache == "stale":
+            per_message = _COLUMNS * c.read_ms + c.store_ms
+            sync = listing + size * per_message
+            estimates["cache"] = sync / c.listing_reuse + c.query_ms
+        if not predicates:
+            returned = min(rows, limit) if limit else rows
+            estimates["range"] = listing + bisect + returned * _COLUMNS * c.read_ms
+            return estimates
+
+        matches = rows * selectivity
+        conditions = len(predicates) + bounds
+        estimates["whose"] = (
+            listing + size * conditions * c.whose_ms + matches * _COLUMNS * c.read_ms
+        )
+
+        examined = min(rows, limit / max(selectivity, 1e-6)) if limit else rows
+        chunks = max(1, math.ceil(examined / chunk_size(limit, selectivity)))
+        estimates["hybrid" if bounds else "scan"] = (
+            c.event_ms
+            + bisect
+            + chunks * _COLUMNS * c.event_ms
+            + examined * (_COLUMNS * c.read_ms + c.loop_ms)
+        )
+        return estimates
+
+    def plan(
+        self,
+        account: str,
+        mailbox: str,
+        predicates: tuple[str, ...],
+        limit: int | None,
+        size: int | None,
+        bounds: int = 0,
+        fraction: float = 1.0,
+        cache: str | None = None,
+    ) -> SearchPlan:
+        """
+        Choose the cheapest strategy for a search.
+
+        Args:
+            account: Account name
+            mailbox: Mailbox name
+            predicates: predicate_keys() of the search
+            limit: Results wanted (None or 0 for all)
+            size: Messages in the mailbox, or None if unknown
+            bounds: Number of date window bounds (0 to 2)
+            fraction: Estimated fraction of the mailbox in the date window
+            cache: "fresh" or "stale" if a message cache is attached
+
+        Returns:
+            The plan
+        """
+        selectivity = self.selectivity(account, mailbox, predicates)
+        if cache == "fresh":
+            plan = SearchPlan(
+                "cache", "the cached listing is fresh", {"cache": self.costs.query_ms}
+            )
+        elif size is None:
+            # Nothing to compare: keep the plan that needs no estimate
+            if cache is not None:
+                strategy, reason = "cache", "the mailbox was never listed into the cache"
+            else:
+                strategy = "whose" if predicates else "range"
+                reason = "the mailbox size is unknown"
+            plan = SearchPlan(strategy, reason, selectivity=selectivity)
+        else:
+            estimates = self.estimate(predicates, limit, size, selectivity, bounds, fraction, cache)
+            ranked = sorted(estimates, key=lambda s: (estimates[s], STRATEGIES.index(s)))
+            strategy = ranked[0]
+            reason = "lowest estimated cost"
+            if len(ranked) > 1:
+                reason += f" ({ranked[1]} estimated {estimates[ranked[1]]:.0f} ms)"
+            plan = SearchPlan(
+                strategy,
+                reason,
+                estimates,
+                size,
+                selectivity,
+                chunk_size(limit, selectivity) if strategy in ("scan", "hybrid") else 0,
+            )
+        with self._lock:
+            self.plans[plan.strategy] += 1
+        return plan
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return planning counters.
+
+        Returns:
+            Dictionary with "plans" (plans chosen by strategy), "mailboxes"
+            (mailboxes with a recorded size) and "selectivities" (filter
+            combinations with observed selectivity)
+        """
+        with self._lock:
+            return {
+                "plans": dict(self.plans),
+                "mailboxes": len(self._sizes),
+                "selectivities": len(self._selectivity),
+            }
@@ -0,0 +1,564 @@
+"""
+Boolean query expressions for search_messages.
+
+The keyword filters of search_messages are always combined with AND. A
+query expression also has OR, NOT and parentheses::
+
+    from alice OR bob, NOT read, subject contains invoice
+
+Terms:
+
+- ``from X`` (or ``sender X``, ``from:X``, ``from contains X``): the
+  sender contains X, case-insensitively;
+- ``subject X`` (``subject:X``, ``subject contains X``): the subject
+  contains X;
+- ``from matches R`` / ``subject matches R``: a regular expression
+  matches somewhere in the sender / subject, case-insensitively;
+- ``read`` / ``unread``;
+- ``after D`` / ``before D`` (``received after D``): received at or after /
+  before a date, in any form utils.parse_received_date accepts
+  (``after "7 days ago"``, ``before 2025-01-15``).
+
+A value with spaces, or one that is a keyword, is written in double
+quotes (``\\"`` for a quote inside). Terms are combined with ``NOT``
+(binds tightest), ``AND`` (or nothing, or a comma) and ``OR``; a comma
+binds loosest, so the example reads (from alice OR from bob) AND NOT read
+AND subject contains invoice. After OR, a bare value repeats the previous
+term's filter (``from alice OR bob``). Keywords are case-insensitive.
+
+A parsed query (an AST of the node classes below) is split into the part
+a source can evaluate and a residual. Everything but ``matches`` compiles
+to a Mail ``whose`` clause (NOT pushed down to the terms: ``does not
+contain``, the opposite read status, the opposite date comparison) and to
+SQL for the message cache and the Envelope Index; the values always
+travel as script arguments or SQL parameters. Top-level conjuncts that
+cannot be compiled are the residual, evaluated in Python on what the
+compiled part returned. Compiled queries are cached by their text; dates
+like "7 days ago" are resolved each time the query runs.
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from .utils import local_days_seconds, parse_received_date
+
+# Compiled queries kept by query text
+QUERY_CACHE_SIZE = 256
+
+_TOKEN = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|([(),])|([^\s(),"]+))')
+
+_KEYWORDS = {"and", "or", "not"}
+
+# Terms a word can start, and the field their values filter
+_FIELDS = {"from": "sender", "sender": "sender", "subject": "subject"}
+_DATE_OPS = {"after": ">=", "before": "<"}
+_FLAGS = {"read": True, "unread": False}
+_TERMS = {*_FIELDS, *_DATE_OPS, *_FLAGS, "received"}
+
+
+@dataclass(frozen=True)
+class Contains:
+    """The field ("sender" or "subject") contains text, case-insensitively."""
+
+    field: str
+    text: str
+
+
+@dataclass(frozen=True)
+class Matches:
+    """A regular expression matches somewhere in the field, case-insensitively."""
+
+    field: str
+    pattern: str
+
+
+@dataclass(frozen=True)
+class ReadStatus:
+    """The message is read (True) or unread (False)."""
+
+    read: bool
+
+
+@dataclass(frozen=True)
+class Received:
+    """The message was received at or after (">=") or before ("<") a date."""
+
+    op: str
+    when: str
+    """Date text, resolved with utils.parse_received_date when the query runs."""
+
+
+@dataclass(frozen=True)
+class Not:
+    operand: Node
+
+
+@dataclass(frozen=True)
+class And:
+    operands: tuple[Node, ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    operands: tuple[Node, ...]
+
+
+Node = Contains | Matches | ReadStatus | Received | Not | And | Or
+
+
+class _Token(NamedTuple):
+    text: str
+    quoted: bool
+    position: int
+
+
+def _tokenize(text: str) -> list[_Token]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            if text[position:].strip():
+                raise ValueError(f"Unterminated quote at position {position} of the query")
+            break
+        quoted, punct, word = match.groups()
+        start = match.start(1 if quoted is not None else 2 if punct else 3)
+        if quoted is not None:
+            tokens.append(_Token(re.sub(r"\\(.)", r"\1", quoted), True, start))
+        else:
+            tokens.append(_Token(punct or word, False, start))
+        position = match.end()
+    return tokens
+
+
+def _combine(kind: type[And] | type[Or], parts: list[Node]) -> Node:
+    """Combine nodes, flattening nested nodes of the same kind."""
+    operands: list[Node] = []
+    for part in parts:
+        operands.extend(part.operands if isinstance(part, kind) else [part])
+    return operands[0] if len(operands) == 1 else kind(tuple(operands))
+
+
+class _Parser:
+    """Recursive descent over the tokens: all (",") > any (OR) > every (AND) > NOT."""
+
+    def __init__(self, text: str) -> None:
+        self.tokens = _tokenize(text)
+        self.index = 0
+        self.last_term: Node | None = None
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise ValueError("The query is empty")
+        node = self._all()
+        if self.index < len(self.tokens):
+            token = self.tokens[self.index]
+            raise ValueError(f"Unexpected {token.text!r} at position {token.position}")
+        return node
+
+    def _peek(self) -> _Token | None:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def _keyword(self, *words: str) -> bool:
+        token = self._peek()
+        return token is not None and not token.quoted and token.text.lower() in words
+
+    def _next(self, expected: str) -> _Token:
+        token = self._peek()
+        if token is None:
+            raise ValueError(f"The query ends where {expected} was expected")
+        self.index += 1
+        return token
+
+    def _starts_term(self) -> bool:
+        token = self._peek()
+        if token is None or token.quoted:
+            return False
+        word = token.text.lower()
+        return word in ("(", "not") or word.split(":", 1)[0] in _TERMS
+
+    def _all(self) -> Node:
+        parts = [self._any()]
+        while self._keyword(","):
+            self.index += 1
+            parts.append(self._any())
+        return _combine(And, parts)
+
+    def _any(self) -> Node:
+        parts = [self._every()]
+        while self._keyword("or"):
+            self.index += 1
+            previous = self.last_term
+            if not self._starts_term() and isinstance(previous, (Contains, Matches, Received)):
+                # "from alice OR bob": another value for the previous term's filter
+                value = self._value()
+                if isinstance(previous, Contains):
+                    self.last_term = Contains(previous.field, value)
+                elif isinstance(previous, Matches):
+                    self.last_term = Matches(previous.field, _pattern(value))
+                else:
+                    self.last_term = Received(previous.op, _date(value))
+                parts.append(self._every(self.last_term))
+            else:
+                parts.append(self._every())
+        return _combine(Or, parts)
+
+    def _every(self, first: Node | None = None) -> Node:
+        parts = [first or self._unary()]
+        while True:
+            if self._keyword("and"):
+                self.index += 1
+                parts.append(self._unary())
+            elif self._starts_term():
+                parts.append(self._unary())
+            else:
+                return _combine(And, parts)
+
+    def _unary(self) -> Node:
+        if self._keyword("not"):
+            self.index += 1
+            return Not(self._unary())
+        if self._keyword("("):
+            self.index += 1
+            node = self._all()
+            if not self._keyword(")"):
+                raise ValueError("Missing ')' in the query")
+            self.index += 1
+            return node
+        return self._term()
+
+    def _term(self) -> Node:
+        self.last_term = self._read_term()
+        return self.last_term
+
+    def _read_term(self) -> Node:
+        token = self._next("a filter")
+        word = token.text.lower()
+        name, colon, rest = word.partition(":")
+        if token.quoted or name not in _TERMS or (colon and name in _FLAGS):
+            raise ValueError(
+                f"Unknown filter {token.text!r} at position {token.position}; expected from,"
+                " subject, read, unread, after or before"
+            )
+        if name in _FLAGS:
+            return ReadStatus(_FLAGS[name])
+        # "from:alice" is "from alice"; keep the value's original case
+        inline = token.text[len(name) + 1 :] if colon and rest else None
+
+        if name == "received":
+            if not self._keyword(*_DATE_OPS):
+                raise ValueError("'received' must be followed by 'after' or 'before'")
+            name = self._next("after or before").text.lower()
+        if name in _DATE_OPS:
+            return Received(_DATE_OPS[name], _date(inline or self._value()))
+
+        field = _FIELDS[name]
+        if inline is None and self._keyword("matches"):
+            self.index += 1
+            return Matches(field, _pattern(self._value()))
+        if inline is None and self._keyword("contains"):
+            self.index += 1
+        return Contains(field, inline or self._value())
+
+    def _value(self) -> str:
+        token = self._next("a value")
+        if not token.quoted and (token.text.lower() in _KEYWORDS or token.text in ("(", ")", ",")):
+            raise ValueError(
+                f"Expected a value at position {token.position}, got {token.text!r}"
+                " (quote values that are keywords)"
+            )
+        return token.text
+
+
+def _date(text: str) -> str:
+    parse_received_date(text)
+    return text
+
+
+def _pattern(text: str) -> str:
+    try:
+        re.compile(text)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression {text!r}: {e}") from None
+    return text
+
+
+def parse_query(text: str) -> Node:
+    """
+    Parse a query expression.
+
+    Args:
+        text: Query text, e.g. ``from alice OR bob, NOT read``
+
+    Returns:
+        The query's AST
+
+    Raises:
+        ValueError: If the text is not a valid query (the message says
+            where), has an invalid date or regular expression
+    """
+    return _Parser(text).parse()
+
+
+def pushable(node: Node) -> bool:
+    """Return True if Mail's ``whose`` clauses and SQL can evaluate a node."""
+    if isinstance(node, Matches):
+        return False
+    if isinstance(node, Not):
+        return pushable(node.operand)
+    if isinstance(node, (And, Or)):
+        return all(pushable(operand) for operand in node.operands)
+    return True
+
+
+def _received_bound(node: Received, now: datetime | None) -> datetime:
+    return parse_received_date(node.when, now)
+
+
+class WhoseClause(NamedTuple):
+    """A query compiled to the condition of a ``whose`` clause."""
+
+    text: str
+    """Condition, e.g. ``(sender contains queryValue1 or ...)``."""
+
+    values: tuple[Contains | Received, ...]
+    """Term of each queryValueN variable, in order."""
+
+    def preamble(self, first_item: int) -> str:
+        """
+        Statements setting the clause's variables from argv.
+
+        Args:
+            first_item: argv index of the first value
+
+        Returns:
+            AppleScript statements (one per line, indented for a run handler)
+        """
+        lines = ""
+        item = first_item
+        for number, value in enumerate(self.values, 1):
+            if isinstance(value, Received):
+                lines += (
+                    f"    set queryValue{number} to my keyDate(item {item} of argv,"
+                    f" item {item + 1} of argv)\n"
+                )
+                item += 2
+            else:
+                lines += f"    set queryValue{number} to item {item} of argv\n"
+                item += 1
+        return lines
+
+    @property
+    def dated(self) -> bool:
+        """True if the clause compares dates (the script needs DATE_HANDLERS)."""
+        return any(isinstance(value, Received) for value in self.values)
+
+    def args(self, now: datetime | None = None) -> list[str]:
+        """
+        argv values for the clause's variables.
+
+        Args:
+            now: Current local time for relative dates (default: now)
+
+        Returns:
+            Text values; a date is two items, local days and seconds
+        """
+        args: list[str] = []
+        for value in self.values:
+            if isinstance(value, Received):
+                args.extend(map(str, local_days_seconds(_received_bound(value, now))))
+            else:
+                args.append(value.text)
+        return args
+
+
+def _whose(node: Node, negate: bool, values: list[Contains | Received]) -> str:
+    """Render a pushable node, with NOT moved down to the terms (De Morgan)."""
+    if isinstance(node, Not):
+        return _whose(node.operand, not negate, values)
+    if isinstance(node, (And, Or)):
+        joiner = " and " if isinstance(node, And) != negate else " or "
+        return "(" + joiner.join(_whose(operand, negate, values) for operand in node.operands) + ")"
+    if isinstance(node, ReadStatus):
+        return f"read status is {str(node.read != negate).lower()}"
+    if isinstance(node, Received):
+        values.append(node)
+        op = {">=": "<", "<": ">="}[node.op] if negate else node.op
+        return f"date received {op} queryValue{len(values)}"
+    assert isinstance(node, Contains)
+    values.append(node)
+    verb = "does not contain" if negate else "contains"
+    return f"{node.field} {verb} queryValue{len(values)}"
+
+
+def compile_whose(node: Node) -> WhoseClause:
+    """
+    Compile a pushable node to a ``whose`` condition.
+
+    Args:
+        node: Query AST without Matches terms
+
+    Returns:
+        The condition and the terms whose values it takes from argv
+    """
+    values: list[Contains | Received] = []
+    text = _whose(node, False, values)
+    return WhoseClause(text, tuple(values))
+
+
+class SqlColumns(NamedTuple):
+    """SQL expressions of the fields a query tests, in one database."""
+
+    sender: str
+    subject: str
+    read: str
+    date_received: str
+    """Epoch seconds."""
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _compile_sql(node: Node, columns: SqlColumns) -> tuple[str, tuple[Contains | Received, ...]]:
+    values: list[Contains | Received] = []
+
+    def render(node: Node) -> str:
+        if isinstance(node, Not):
+            return f"NOT ({render(node.operand)})"
+        if isinstance(node, (And, Or)):
+            joiner = " AND " if isinstance(node, And) else " OR "
+            return "(" + joiner.join(render(operand) for operand in node.operands) + ")"
+        if isinstance(node, ReadStatus):
+            return f"{columns.read} = {int(node.read)}"
+        values.append(node)  # type: ignore[arg-type]
+        if isinstance(node, Received):
+            return f"{columns.date_received} {node.op} ?"
+        assert isinstance(node, Contains)
+        column = columns.sender if node.field == "sender" else columns.subject
+        return f"instr(lower({column}), lower(?)) > 0"
+
+    return render(node), tuple(values)
+
+
+def _matches(node: Node, message: dict[str, Any], bounds: dict[Received, float]) -> bool:
+    if isinstance(node, Not):
+        return not _matches(node.operand, message, bounds)
+    if isinstance(node, And):
+        return all(_matches(operand, message, bounds) for operand in node.operands)
+    if isinstance(node, Or):
+        return any(_matches(operand, message, bounds) for operand in node.operands)
+    if isinstance(node, ReadStatus):
+        return bool(message.get("read_status")) == node.read
+    if isinstance(node, Received):
+        received: int | None = message.get("timestamp")
+        if received is None:
+            return False
+        return received >= bounds[node] if node.op == ">=" else received < bounds[node]
+    text = message.get(node.field) or ""
+    if isinstance(node, Matches):
+        return re.search(node.pattern, text, re.IGNORECASE) is not None
+    return node.text.casefold() in text.casefold()
+
+
+def _dates(node: Node) -> list[Received]:
+    if isinstance(node, Received):
+        return [node]
+    if isinstance(node, Not):
+        return _dates(node.operand)
+    if isinstance(node, (And, Or)):
+        return [date for operand in node.operands for date in _dates(operand)]
+    return []
+
+
+def matcher(node: Node, now: datetime | None = None) -> Callable[[dict[str, Any]], bool]:
+    """
+    Build a Python test of a node on message dictionaries.
+
+    Args:
+        node: Query AST
+        now: Current local time for relative dates (default: now)
+
+    Returns:
+        Function of a message dictionary ("sender", "subject",
+        "read_status", "timestamp") that returns True if it matches
+    """
+    bounds = {date: _received_bound(date, now).timestamp() for date in _dates(node)}
+    return lambda message: _matches(node, message, bounds)
+
+
+class CompiledQuery(NamedTuple):
+    """A parsed query, split into what sources evaluate and what Python does."""
+
+    text: str
+    tree: Node
+
+    pushdown: Node | None
+    """Conjuncts a whose clause or SQL can evaluate (None if none)."""
+
+    residual: Node | None
+    """Conjuncts evaluated in Python on the results (None if none)."""
+
+    whose: WhoseClause | None
+    """pushdown compiled for Mail."""
+
+    def sql(self, columns: SqlColumns, now: datetime | None = None) -> tuple[str, list[Any]]:
+        """
+        Compile the pushdown part to an SQL condition.
+
+        Args:
+            columns: The database's expressions for the tested fields
+            now: Current local time for relative dates (default: now)
+
+        Returns:
+            (condition, parameters); ("1", []) if nothing can be pushed down
+        """
+        if self.pushdown is None:
+            return "1", []
+        condition, values = _compile_sql(self.pushdown, columns)
+        params: list[Any] = [
+            (
+                int(_received_bound(value, now).timestamp())
+                if isinstance(value, Received)
+                else value.text
+            )
+            for value in values
+        ]
+        return condition, params
+
+    def residual_filter(
+        self, now: datetime | None = None
+    ) -> Callable[[dict[str, Any]], bool] | None:
+        """Return the Python test of the residual, or None if there is none."""
+        return None if self.residual is None else matcher(self.residual, now)
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(text: str) -> CompiledQuery:
+    """
+    Parse and compile a query, reusing the result for the same text.
+
+    Args:
+        text: Query text (see the module documentation)
+
+    Returns:
+        The compiled query
+
+    Raises:
+        ValueError: If the text is not a valid query
+    """
+    tree = parse_query(text)
+    conjuncts = tree.operands if isinstance(tree, And) else (tree,)
+    pushed = [node for node in conjuncts if pushable(node)]
+    rest = [node for node in conjuncts if not pushable(node)]
+    pushdown = _combine(And, pushed) if pushed else None
+    return CompiledQuery(
+        text,
+        tree,
+        pushdown,
+        _combine(And, rest) if rest else None,
+        None if pushdown is None else compile_whose(pushdown),
+    )
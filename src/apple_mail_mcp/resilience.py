@@ -0,0 +1,207 @@
+"""
+Retries and circuit breaking for transient Mail failures.
+
+While Mail is launching, relaunching or busy syncing, scripts fail with
+errors that say nothing about the request itself: the Apple Event timed out
+(-1712), the application isn't running (-600) or the connection to it went
+away (-609). Idempotent reads are retried after a jittered exponential
+backoff; mutations are only retried if their operation is explicitly added
+to the retry policy.
+
+When failures like these keep coming, the circuit breaker opens and calls
+fail immediately with MailUnavailableError instead of each waiting out its
+own timeout. After a cool-down the next caller probes Mail with a trivial
+script; success closes the circuit, failure opens it again for twice as
+long (up to a maximum).
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from .exceptions import MailUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# AppleScript error numbers meaning Mail could not be reached, not that the
+# request was wrong
+TRANSIENT_ERRORS: dict[int, str] = {
+    -600: "application isn't running",
+    -609: "connection is invalid",
+    -1712: "Apple event timed out",
+}
+
+# Operations that only read, and so are safe to run twice
+READ_OPERATIONS = frozenset(
+    {
+        "list_accounts",
+        "list_mailboxes",
+        "search_messages",
+        "get_message",
+        "get_attachments",
+    }
+)
+
+# osascript ends error messages with the error number: "... (-1712)"
+_ERROR_NUMBER = re.compile(r"\((-?\d+)\)\s*$")
+
+
+def error_number(error_msg: str) -> int | None:
+    """
+    Extract the AppleScript error number from an osascript error message.
+
+    Args:
+        error_msg: Error text reported by osascript
+
+    Returns:
+        The error number, or None if the message doesn't end with one
+    """
+    match = _ERROR_NUMBER.search(error_msg)
+    return int(match.group(1)) if match else None
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Which operations are retried, how often and how long to wait."""
+
+    attempts: int = 3
+    """Total tries, including the first."""
+
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    operations: frozenset[str] = READ_OPERATIONS
+    """Operations that may be retried. Add mutations only if running them
+    twice is harmless (e.g. mark_as_read, flag_message)."""
+
+    def allows(self, operation: str | None) -> bool:
+        """Return True if an operation may be retried."""
+        return operation in self.operations
+
+    def delay(self, attempt: int) -> float:
+        """
+        Return the wait before the next try ("full jitter" backoff).
+
+        Args:
+            attempt: Number of tries that failed so far, starting at 1
+
+        Returns:
+            Seconds to wait, uniform between 0 and the capped exponential delay
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Fail fast while Mail is unresponsive."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 300.0,
+    ) -> None:
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe
+            max_reset_timeout: Longest open period after repeated failed probes
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._open_for = reset_timeout
+        self._opened_at = 0.0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        """Current state: closed, open or half_open."""
+        with self._lock:
+            return self._state
+
+    def acquire(self) -> bool:
+        """
+        Check whether a call may proceed.
+
+        Returns:
+            True if the caller must probe Mail before running its script
+            (the circuit was open and its cool-down has passed), False if
+            the circuit is closed
+
+        Raises:
+            MailUnavailableError: If the circuit is open, or another caller
+                is already probing
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+
+            remaining = self._opened_at + self._open_for - time.monotonic()
+            if self._state == self.OPEN and remaining <= 0:
+                self._state = self.HALF_OPEN
+                return True
+
+            raise MailUnavailableError(
+                f"Mail is not responding; retrying in {max(remaining, 0):.0f}s"
+            )
+
+    def record_success(self) -> None:
+        """Record that Mail answered; closes the circuit."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Mail is responding again, closing circuit")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._open_for = self.reset_timeout
+
+    def record_failure(self) -> None:
+        """Record that Mail could not be reached; may open the circuit."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN:
+                # Failed probe: stay away longer next time
+                self._open_for = min(self._open_for * 2, self.max_reset_timeout)
+            elif self._state == self.OPEN or self._failures < self.failure_threshold:
+                return
+
+            logger.warning(
+                f"Mail unresponsive after {self._failures} failures, "
+                f"failing fast for {self._open_for:.0f}s"
+            )
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._times_opened += 1
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return the breaker state.
+
+        Returns:
+            Dictionary with the state, consecutive failures, how often the
+            circuit opened and the seconds until the next probe
+        """
+        with self._lock:
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(self._opened_at + self._open_for - time.monotonic(), 0.0)
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+                "retry_in": retry_in,
+            }
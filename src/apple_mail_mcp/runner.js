@@ -0,0 +1,134 @@
+// Persistent AppleScript runner for apple-mail-mcp.
+//
+// Started once by AppleScriptWorker (worker.py) with
+// `osascript -l JavaScript runner.js`. Reads length-prefixed JSON requests
+// from stdin, executes AppleScript source in-process with NSAppleScript and
+// writes length-prefixed JSON replies to stdout:
+//
+//   <payload length in bytes>\n<UTF-8 JSON payload>
+//
+// Template requests carry "args" and a content "digest": the compiled
+// script is kept per digest and its run handler is called with the args,
+// so each template is compiled once per runner lifetime.
+
+ObjC.import("Foundation");
+
+var stdin = $.NSFileHandle.fileHandleWithStandardInput;
+var stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+var compiled = {};
+
+function readHeader() {
+  var digits = "";
+  while (true) {
+    var byte = stdin.readDataOfLength(1);
+    if (byte.length === 0) return null;
+    var ch = ObjC.unwrap($.NSString.alloc.initWithDataEncoding(byte, $.NSASCIIStringEncoding));
+    if (ch === "\n") return parseInt(digits, 10);
+    digits += ch;
+  }
+}
+
+function readExactly(length) {
+  var data = $.NSMutableData.alloc.init;
+  while (data.length < length) {
+    var chunk = stdin.readDataOfLength(length - data.length);
+    if (chunk.length === 0) return null;
+    data.appendData(chunk);
+  }
+  return data;
+}
+
+function readRequest() {
+  var length = readHeader();
+  if (length === null) return null;
+  var data = readExactly(length);
+  if (data === null) return null;
+  return JSON.parse(ObjC.unwrap($.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding)));
+}
+
+function writeReply(reply) {
+  var body = $(JSON.stringify(reply)).dataUsingEncoding($.NSUTF8StringEncoding);
+  var header = $(body.length + "\n").dataUsingEncoding($.NSUTF8StringEncoding);
+  stdout.writeData(header);
+  stdout.writeData(body);
+}
+
+function fourCharCode(code) {
+  return ((code.charCodeAt(0) << 24) | (code.charCodeAt(1) << 16) |
+    (code.charCodeAt(2) << 8) | code.charCodeAt(3)) >>> 0;
+}
+
+function compile(source, digest) {
+  if (digest && compiled[digest]) return { script: compiled[digest] };
+
+  var script = $.NSAppleScript.alloc.initWithSource($(source));
+  var error = Ref();
+  if (!script.compileAndReturnError(error)) return { error: error };
+
+  if (digest) compiled[digest] = script;
+  return { script: script };
+}
+
+function runEvent(args) {
+  // "Run" Apple Event whose direct parameter is the argv list of strings
+  var argv = $.NSAppleEventDescriptor.listDescriptor;
+  args.forEach(function (arg, index) {
+    argv.insertDescriptorAtIndex($.NSAppleEventDescriptor.descriptorWithString($(arg)), index + 1);
+  });
+
+  var event = $.NSAppleEventDescriptor.appleEventWithEventClassEventIDTargetDescriptorReturnIDTransactionID(
+    fourCharCode("aevt"), fourCharCode("oapp"),
+    $.NSAppleEventDescriptor.currentProcessDescriptor, -1, 0);
+  event.setParamDescriptorForKeyword(argv, fourCharCode("----"));
+  return event;
+}
+
+function execute(source, args, digest) {
+  var error = Ref();
+  var result;
+
+  var compiledScript = compile(source, digest);
+  if (compiledScript.error) {
+    error = compiledScript.error;
+    result = $();
+  } else if (args) {
+    result = compiledScript.script.executeAppleEventError(runEvent(args), error);
+  } else {
+    result = compiledScript.script.executeAndReturnError(error);
+  }
+
+  if (result.isNil()) {
+    var info = ObjC.deepUnwrap(error[0]) || {};
+    return {
+      ok: false,
+      error: info.NSAppleScriptErrorMessage || "Unknown AppleScript error",
+      number: info.NSAppleScriptErrorNumber
+    };
+  }
+
+  var output = ObjC.unwrap(result.stringValue);
+  return { ok: true, output: output === undefined || output === null ? "" : output };
+}
+
+function run() {
+  while (true) {
+    var request = readRequest();
+    if (request === null) return;
+
+    var reply;
+    try {
+      if (request.type === "ping") {
+        reply = { ok: true, output: "pong" };
+      } else if (request.type === "run") {
+        reply = execute(request.script, request.args, request.digest);
+      } else {
+        reply = { ok: false, error: "Unknown request type: " + request.type };
+      }
+    } catch (e) {
+      reply = { ok: false, error: String(e) };
+    }
+
+    reply.id = request.id;
+    writeReply(reply);
+  }
+}
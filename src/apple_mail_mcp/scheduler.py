@@ -0,0 +1,246 @@
+"""
+Priority scheduling of Apple Event traffic.
+
+Mail.app processes Apple Events one at a time, so letting every request
+start its script immediately only moves the queue into Mail where nobody can
+see it. The scheduler keeps that queue on our side instead: each operation
+belongs to a lane with its own concurrency and queue depth, a global limit
+caps how many scripts talk to Mail at once, and free slots go to the
+highest-priority lane first.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from .exceptions import MailBusyError
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+MUTATION = "mutation"
+SEND = "send"
+
+# Lane for each connector operation; unknown operations are interactive
+OPERATION_LANES: dict[str, str] = {
+    "list_accounts": INTERACTIVE,
+    "list_mailboxes": INTERACTIVE,
+    "get_message": INTERACTIVE,
+    "get_attachments": INTERACTIVE,
+    "count_messages": INTERACTIVE,
+    "search_messages": BULK,
+    "iter_messages": BULK,
+    "save_attachments": BULK,
+    "mark_as_read": MUTATION,
+    "move_messages": MUTATION,
+    "flag_message": MUTATION,
+    "delete_messages": MUTATION,
+    "update_matching": MUTATION,
+    "create_mailbox": MUTATION,
+    "send_email": SEND,
+    "send_email_with_attachments": SEND,
+    "create_draft": SEND,
+    "reply_to_message": SEND,
+    "forward_message": SEND,
+}
+
+
+@dataclass
+class LaneConfig:
+    """Limits for one lane."""
+
+    priority: int
+    """Lower values are served first when slots free up."""
+
+    concurrency: int = 1
+    """Scripts from this lane that may run at the same time."""
+
+    max_queue: int = 16
+    """Requests that may wait for a slot before new ones are rejected."""
+
+
+DEFAULT_LANES: dict[str, LaneConfig] = {
+    INTERACTIVE: LaneConfig(priority=0, concurrency=2, max_queue=32),
+    SEND: LaneConfig(priority=1, concurrency=1, max_queue=8),
+    MUTATION: LaneConfig(priority=2, concurrency=1, max_queue=16),
+    BULK: LaneConfig(priority=3, concurrency=1, max_queue=8),
+}
+
+
+@dataclass
+class _LaneState:
+    config: LaneConfig
+    active: int = 0
+    waiting: int = 0
+    completed: int = 0
+    rejected: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    recent_waits: deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+
+class LaneScheduler:
+    """Admission control and priority ordering for script execution."""
+
+    def __init__(
+        self,
+        lanes: dict[str, LaneConfig] | None = None,
+        max_in_flight: int = 2,
+    ) -> None:
+        """
+        Initialize the scheduler.
+
+        Args:
+            lanes: Lane configuration (default: DEFAULT_LANES)
+            max_in_flight: Scripts that may run at once across all lanes
+        """
+        self.max_in_flight = max_in_flight
+        self._lanes = {
+            name: _LaneState(config) for name, config in (lanes or DEFAULT_LANES).items()
+        }
+        self._cond = threading.Condition()
+        self._active = 0
+        self._sequence = 0
+        self._waiters: list[tuple[int, int, str]] = []
+
+    @property
+    def capacity(self) -> int:
+        """Requests the scheduler can hold at once (running plus queued)."""
+        return sum(lane.config.concurrency + lane.config.max_queue for lane in self._lanes.values())
+
+    @staticmethod
+    def lane_for(operation: str | None) -> str:
+        """
+        Return the lane an operation is scheduled in.
+
+        Args:
+            operation: Connector operation name
+
+        Returns:
+            Lane name
+        """
+        return OPERATION_LANES.get(operation or "", INTERACTIVE)
+
+    def priority_of(self, operation: str | None) -> int:
+        """
+        Return the priority of an operation's lane (lower is served first).
+
+        Args:
+            operation: Connector operation name
+
+        Returns:
+            Lane priority
+        """
+        return self._lane(operation)[1].config.priority
+
+    def _lane(self, operation: str | None) -> tuple[str, _LaneState]:
+        lane_name = self.lane_for(operation)
+        if lane_name not in self._lanes:
+            lane_name = INTERACTIVE
+        return lane_name, self._lanes[lane_name]
+
+    @contextmanager
+    def slot(self, operation: str | None = None) -> Iterator[None]:
+        """
+        Hold an execution slot for the duration of the block.
+
+        Args:
+            operation: Connector operation name (selects the lane)
+
+        Raises:
+            MailBusyError: If the lane's queue is full
+        """
+        lane_name, lane = self._lane(operation)
+        started = time.monotonic()
+
+        with self._cond:
+            self._sequence += 1
+            ticket = (lane.config.priority, self._sequence, lane_name)
+
+            if not self._may_run(ticket, lane):
+                if lane.waiting >= lane.config.max_queue:
+                    lane.rejected += 1
+                    raise MailBusyError(
+                        f"Mail is busy: the {lane_name} queue is full "
+                        f"({lane.waiting} waiting), try again later"
+                    )
+
+                lane.waiting += 1
+                self._waiters.append(ticket)
+                try:
+                    while not self._may_run(ticket, lane):
+                        self._cond.wait()
+                finally:
+                    lane.waiting -= 1
+                    self._waiters.remove(ticket)
+
+            lane.active += 1
+            self._active += 1
+
+            waited = time.monotonic() - started
+            lane.total_wait += waited
+            lane.max_wait = max(lane.max_wait, waited)
+            lane.recent_waits.append(waited)
+
+        if waited > 1.0:
+            logger.info(f"{operation or 'script'} waited {waited:.2f}s in the {lane_name} lane")
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                lane.active -= 1
+                lane.completed += 1
+                self._active -= 1
+                self._cond.notify_all()
+
+    def _may_run(self, ticket: tuple[int, int, str], lane: _LaneState) -> bool:
+        if self._active >= self.max_in_flight or lane.active >= lane.config.concurrency:
+            return False
+
+        # Yield to earlier or higher-priority waiters that could run now
+        for other in self._waiters:
+            if other < ticket:
+                other_lane = self._lanes[other[2]]
+                if other_lane.active < other_lane.config.concurrency:
+                    return False
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return queue and wait-time metrics per lane.
+
+        Returns:
+            Dictionary with global counters and per-lane metrics (wait
+            times in seconds)
+        """
+        with self._cond:
+            lanes = {}
+            for name, lane in self._lanes.items():
+                waits = sorted(lane.recent_waits)
+                admitted = lane.completed + lane.active
+                lanes[name] = {
+                    "concurrency": lane.config.concurrency,
+                    "max_queue": lane.config.max_queue,
+                    "active": lane.active,
+                    "waiting": lane.waiting,
+                    "completed": lane.completed,
+                    "rejected": lane.rejected,
+                    "avg_wait": lane.total_wait / admitted if admitted else 0.0,
+                    "p95_wait": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                    "max_wait": lane.max_wait,
+                }
+
+            return {
+                "max_in_flight": self.max_in_flight,
+                "active": self._active,
+                "lanes": lanes,
+            }
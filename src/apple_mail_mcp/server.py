@@ -3,23 +3,34 @@ FastMCP server for Apple Mail integration.
 """
 
 import logging
+import os
+import time
 from typing import Any
 
 from fastmcp import FastMCP
 
+from .async_connector import AsyncAppleMailConnector
+from .backend import MailBackend, create_backend
+from .body_index import DEFAULT_INDEX_BATCH, BodyIndex
+from .emlx import EmlxReader
+from .envelope_index import EnvelopeIndex
 from .exceptions import (
     MailAccountNotFoundError,
     MailAppleScriptError,
+    MailBusyError,
+    MailError,
     MailMailboxNotFoundError,
     MailMessageNotFoundError,
+    MailUnavailableError,
 )
-from .mail_connector import AppleMailConnector
+from .message_cache import DEFAULT_MAX_AGE, CachedListing, MessageCache
 from .security import (
     operation_logger,
     require_confirmation,
     validate_bulk_operation,
     validate_send_operation,
 )
+from .utils import parse_received_date
 
 # Configure logging
 logging.basicConfig(
@@ -31,12 +42,73 @@ logger = logging.getLogger(__name__)
 # Create FastMCP server
 mcp = FastMCP("apple-mail")
 
-# Initialize mail connector
-mail = AppleMailConnector()
+# Most messages update_matching_messages may change in one call
+MAX_MATCHING_MESSAGES = 1000
+
+
+def _env_flag(name: str) -> bool:
+    """Return True if an environment variable is set to a truthy value."""
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _create_backend() -> MailBackend:
+    """
+    Create the mail backend selected by the environment.
+
+    APPLE_MAIL_MCP_BACKEND chooses "applescript" (default), "jxa", "envelope" or
+    "memory". The envelope backend reads APPLE_MAIL_MCP_ENVELOPE_INDEX (default:
+    the newest under ~/Library/Mail). The in-memory backend takes
+    APPLE_MAIL_MCP_MEMORY_LATENCY (seconds per call) and
+    APPLE_MAIL_MCP_MEMORY_MESSAGES (messages per mailbox). For the others,
+    APPLE_MAIL_MCP_CACHE turns on the SQLite message cache (at
+    APPLE_MAIL_MCP_CACHE_PATH, trusted for APPLE_MAIL_MCP_CACHE_MAX_AGE seconds),
+    APPLE_MAIL_MCP_EMLX reads message bodies from Mail's message files and
+    APPLE_MAIL_MCP_BODY_INDEX turns on the full-text body index (at
+    APPLE_MAIL_MCP_BODY_INDEX_PATH).
+    """
+    name = os.environ.get("APPLE_MAIL_MCP_BACKEND", "applescript").strip().lower()
+    if name == "memory":
+        return create_backend(
+            "memory",
+            latency=float(os.environ.get("APPLE_MAIL_MCP_MEMORY_LATENCY", "0")),
+            messages_per_mailbox=int(os.environ.get("APPLE_MAIL_MCP_MEMORY_MESSAGES", "200")),
+        )
+    cache = None
+    if _env_flag("APPLE_MAIL_MCP_CACHE"):
+        cache = MessageCache(
+            os.environ.get("APPLE_MAIL_MCP_CACHE_PATH") or None,
+            max_age=float(os.environ.get("APPLE_MAIL_MCP_CACHE_MAX_AGE", DEFAULT_MAX_AGE)),
+        )
+    options: dict[str, Any] = {}
+    if _env_flag("APPLE_MAIL_MCP_EMLX"):
+        options["emlx"] = EmlxReader()
+    if _env_flag("APPLE_MAIL_MCP_BODY_INDEX"):
+        options["body_index"] = BodyIndex(os.environ.get("APPLE_MAIL_MCP_BODY_INDEX_PATH") or None)
+    if name == "envelope":
+        options["index"] = EnvelopeIndex(os.environ.get("APPLE_MAIL_MCP_ENVELOPE_INDEX") or None)
+    return create_backend(
+        name, use_worker=_env_flag("APPLE_MAIL_MCP_WORKER"), cache=cache, **options
+    )
+
+
+def _freshness(messages: list[dict[str, Any]]) -> dict[str, Any]:
+    """Describe where search results came from and how old they may be."""
+    if isinstance(messages, CachedListing):
+        return {
+            "source": "cache",
+            "synced_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(messages.synced_at)),
+            "age_seconds": round(messages.age, 1),
+        }
+    return {"source": "mail", "synced_at": None, "age_seconds": 0.0}
+
+
+# Initialize mail backend (tools await it, so slow scripts don't block
+# other requests)
+mail = AsyncAppleMailConnector(_create_backend())
 
 
 @mcp.tool()
-def list_accounts() -> dict[str, Any]:
+async def list_accounts() -> dict[str, Any]:
     """
     List all email accounts configured in Apple Mail.
 
@@ -57,7 +129,7 @@ def list_accounts() -> dict[str, Any]:
     try:
         logger.info("Listing all email accounts")
 
-        accounts = mail.list_accounts()
+        accounts = await mail.list_accounts()
 
         operation_logger.log_operation(
             "list_accounts",
@@ -78,6 +150,20 @@ def list_accounts() -> dict[str, Any]:
             "error": str(e),
             "error_type": "applescript_error",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Unexpected error listing accounts: {e}")
         return {
@@ -88,7 +174,7 @@ def list_accounts() -> dict[str, Any]:
 
 
 @mcp.tool()
-def list_mailboxes(account: str) -> dict[str, Any]:
+async def list_mailboxes(account: str) -> dict[str, Any]:
     """
     List all mailboxes for an account.
 
@@ -105,7 +191,7 @@ def list_mailboxes(account: str) -> dict[str, Any]:
     try:
         logger.info(f"Listing mailboxes for account: {account}")
 
-        mailboxes = mail.list_mailboxes(account)
+        mailboxes = await mail.list_mailboxes(account)
 
         operation_logger.log_operation(
             "list_mailboxes",
@@ -126,6 +212,20 @@ def list_mailboxes(account: str) -> dict[str, Any]:
             "error": f"Account '{account}' not found",
             "error_type": "account_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error listing mailboxes: {e}")
         return {
@@ -136,16 +236,26 @@ def list_mailboxes(account: str) -> dict[str, Any]:
 
 
 @mcp.tool()
-def search_messages(
+async def search_messages(
     account: str,
     mailbox: str = "INBOX",
     sender_contains: str | None = None,
     subject_contains: str | None = None,
     read_status: bool | None = None,
+    received_after: str | None = None,
+    received_before: str | None = None,
+    query: str | None = None,
     limit: int = 50,
+    cursor: str | None = None,
+    explain: bool = False,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     """
-    Search for messages matching criteria.
+    Search for messages matching criteria, newest first.
+
+    A full page comes with a "next_cursor"; pass it back (with the same
+    account, mailbox and filters) to get the next page. Messages that arrive
+    in between do not shift later pages.
 
     Args:
         account: Account name (e.g., "Gmail", "iCloud")
@@ -153,28 +263,51 @@ def search_messages(
         sender_contains: Filter by sender email/domain
         subject_contains: Filter by subject keywords
         read_status: Filter by read status (true=read, false=unread)
-        limit: Maximum results to return (default: 50)
+        received_after: Only messages received at or after this date ("7 days ago",
+            "last week", "yesterday", "2025-01-15" or "2025-01-15T09:30")
+        received_before: Only messages received before this date (same forms)
+        query: Query expression, ANDed with the other filters, e.g.
+            'from alice or bob, subject invoice, not read'. Terms: from X,
+            subject X, from/subject matches REGEX, read, unread, after D,
+            before D; combined with not, and, or, parentheses and commas
+            (a comma is an AND that binds loosest)
+        limit: Maximum results to return (default: 50), the page size
+        cursor: "next_cursor" of the previous page
+        explain: Also return how the search ran
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
-        Dictionary containing matching messages
+        Dictionary containing matching messages, "next_cursor" (null on the
+        last page), and their "freshness":
+        "source" ("mail", or "cache" when the message cache answered),
+        "synced_at" and "age_seconds" (when the cached mailbox was listed);
+        with explain, a "plan": the strategy chosen ("cache", "index",
+        "range", "whose", "scan", "hybrid" or "page"), the reason, the
+        estimated cost of each strategy considered and the measured
+        planning and execution times (null if the backend does not plan)
 
     Example:
         >>> search_messages("Gmail", sender_contains="john@example.com", read_status=False, limit=10)
-        {"success": True, "messages": [...], "count": 5}
+        {"success": True, "messages": [...], "count": 5, "next_cursor": None, "freshness": {...}}
     """
     try:
         logger.info(
             f"Searching messages in {account}/{mailbox} with filters: "
-            f"sender={sender_contains}, subject={subject_contains}, read={read_status}"
+            f"sender={sender_contains}, subject={subject_contains}, read={read_status}, "
+            f"received={received_after}..{received_before}, query={query}"
         )
 
-        messages = mail.search_messages(
+        messages = await mail.with_timeout(timeout).search_messages(
             account=account,
             mailbox=mailbox,
             sender_contains=sender_contains,
             subject_contains=subject_contains,
             read_status=read_status,
             limit=limit,
+            cursor=cursor,
+            received_after=parse_received_date(received_after) if received_after else None,
+            received_before=parse_received_date(received_before) if received_before else None,
+            query=query,
         )
 
         operation_logger.log_operation(
@@ -186,6 +319,9 @@ def search_messages(
                     "sender": sender_contains,
                     "subject": subject_contains,
                     "read_status": read_status,
+                    "received_after": received_after,
+                    "received_before": received_before,
+                    "query": query,
                 },
             },
             "success"
@@ -197,6 +333,17 @@ def search_messages(
             "mailbox": mailbox,
             "messages": messages,
             "count": len(messages),
+            "next_cursor": getattr(messages, "next_cursor", None),
+            "freshness": _freshness(messages),
+            **({"plan": getattr(messages, "plan", None)} if explain else {}),
+        }
+
+    except ValueError as e:
+        logger.error(f"Invalid search: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "validation_error",
         }
 
     except (MailAccountNotFoundError, MailMailboxNotFoundError) as e:
@@ -206,6 +353,20 @@ def search_messages(
             "error": str(e),
             "error_type": "not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error searching messages: {e}")
         return {
@@ -216,16 +377,179 @@ def search_messages(
 
 
 @mcp.tool()
-def get_message(message_id: str, include_content: bool = True) -> dict[str, Any]:
+async def full_text_search(
+    query: str,
+    account: str | None = None,
+    mailbox: str | None = None,
+    limit: int = 20,
+) -> dict[str, Any]:
+    """
+    Search message bodies, subjects and senders, best matches first.
+
+    Searches a local index of message bodies without asking Mail. Only
+    indexed messages are found: index_mailbox adds a mailbox's messages.
+
+    Args:
+        query: Words (all must occur), "quoted phrases", prefix* and -excluded terms
+        account: Only search this account
+        mailbox: Only search this mailbox
+        limit: Maximum results to return (default: 20)
+
+    Returns:
+        Dictionary containing matching messages, each with a relevance
+        "score" and a "snippet" with the matches in **bold**
+
+    Example:
+        >>> full_text_search('"wire transfer" invoice -draft', account="Work")
+        {"success": True, "messages": [{"id": "12345", "score": 7.31,
+         "snippet": "…confirm the **wire transfer** for **invoice** 2041…", ...}], "count": 1}
+    """
+    try:
+        logger.info(f"Full-text search in {account}/{mailbox}: {query!r}")
+
+        messages = await mail.full_text_search(query, account=account, mailbox=mailbox, limit=limit)
+
+        operation_logger.log_operation(
+            "full_text_search", {"query": query, "account": account, "mailbox": mailbox}, "success"
+        )
+
+        return {
+            "success": True,
+            "query": query,
+            "messages": messages,
+            "count": len(messages),
+        }
+
+    except ValueError as e:
+        logger.error(f"Invalid query: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "validation_error",
+        }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailError as e:
+        # No body index is attached
+        logger.error(f"Full-text search is not configured: {e}")
+        return {
+            "success": False,
+            "error": f"{e} (set APPLE_MAIL_MCP_BODY_INDEX to enable it)",
+            "error_type": "not_configured",
+        }
+    except Exception as e:
+        logger.error(f"Error in full-text search: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unknown",
+        }
+
+
+@mcp.tool()
+async def index_mailbox(
+    account: str,
+    mailbox: str = "INBOX",
+    limit: int = DEFAULT_INDEX_BATCH,
+    timeout: float | None = None,
+) -> dict[str, Any]:
+    """
+    Bring a mailbox's entries in the full-text index up to date.
+
+    Reads the bodies of up to `limit` messages the index does not have yet,
+    newest first, and drops messages that left the mailbox. Call it again
+    while "pending" is above zero.
+
+    Args:
+        account: Account name
+        mailbox: Mailbox name (default: "INBOX")
+        limit: Most message bodies to read in this call (default: 200)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
+
+    Returns:
+        Dictionary with the number of messages indexed, still pending and removed
+
+    Example:
+        >>> index_mailbox("Work", "INBOX")
+        {"success": True, "account": "Work", "mailbox": "INBOX",
+         "indexed": 200, "pending": 1340, "removed": 2}
+    """
+    try:
+        logger.info(f"Indexing {account}/{mailbox} (up to {limit} messages)")
+
+        result = await mail.with_timeout(timeout).index_mailbox(account, mailbox, limit=limit)
+
+        operation_logger.log_operation(
+            "index_mailbox", {"account": account, "mailbox": mailbox, "limit": limit}, "success"
+        )
+
+        return {"success": True, "account": account, "mailbox": mailbox, **result}
+
+    except (MailAccountNotFoundError, MailMailboxNotFoundError) as e:
+        logger.error(f"Not found error: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "not_found",
+        }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
+    except MailAppleScriptError as e:
+        logger.error(f"AppleScript error: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "applescript_error",
+        }
+    except MailError as e:
+        # No body index is attached
+        logger.error(f"Full-text indexing is not configured: {e}")
+        return {
+            "success": False,
+            "error": f"{e} (set APPLE_MAIL_MCP_BODY_INDEX to enable it)",
+            "error_type": "not_configured",
+        }
+    except Exception as e:
+        logger.error(f"Error indexing mailbox: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unknown",
+        }
+
+
+@mcp.tool()
+async def get_message(
+    message_id: str, include_content: bool = True, timeout: float | None = None
+) -> dict[str, Any]:
     """
     Get full details of a specific message.
 
     Args:
         message_id: Message ID from search results
         include_content: Include message body (default: true)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
-        Dictionary containing message details
+        Dictionary containing message details; with message files enabled
+        (APPLE_MAIL_MCP_EMLX), the message also has its "headers"
 
     Example:
         >>> get_message("12345")
@@ -234,7 +558,9 @@ def get_message(message_id: str, include_content: bool = True) -> dict[str, Any]
     try:
         logger.info(f"Getting message: {message_id}")
 
-        message = mail.get_message(message_id, include_content=include_content)
+        message = await mail.with_timeout(timeout).get_message(
+            message_id, include_content=include_content
+        )
 
         operation_logger.log_operation(
             "get_message",
@@ -254,6 +580,20 @@ def get_message(message_id: str, include_content: bool = True) -> dict[str, Any]
             "error": f"Message '{message_id}' not found",
             "error_type": "message_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error getting message: {e}")
         return {
@@ -264,7 +604,7 @@ def get_message(message_id: str, include_content: bool = True) -> dict[str, Any]
 
 
 @mcp.tool()
-def send_email(
+async def send_email(
     subject: str,
     body: str,
     to: list[str],
@@ -333,7 +673,7 @@ def send_email(
             }
 
         # Send the email
-        result = mail.send_email(
+        result = await mail.send_email(
             subject=subject,
             body=body,
             to=to,
@@ -368,6 +708,20 @@ def send_email(
             "error": f"Failed to send email: {str(e)}",
             "error_type": "send_error",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Unexpected error sending email: {e}")
         return {
@@ -378,7 +732,7 @@ def send_email(
 
 
 @mcp.tool()
-def create_draft(
+async def create_draft(
     subject: str,
     body: str,
     to: list[str],
@@ -421,7 +775,7 @@ def create_draft(
         logger.info(f"Recipients: {to}, CC: {cc}, BCC: {bcc}")
 
         # Create the draft
-        draft_id = mail.create_draft(
+        draft_id = await mail.create_draft(
             subject=subject,
             body=body,
             to=to,
@@ -452,6 +806,20 @@ def create_draft(
             "error": str(e),
             "error_type": "applescript_error",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Unexpected error creating draft: {e}")
         return {
@@ -462,20 +830,24 @@ def create_draft(
 
 
 @mcp.tool()
-def mark_as_read(message_ids: list[str], read: bool = True) -> dict[str, Any]:
+async def mark_as_read(
+    message_ids: list[str], read: bool = True, timeout: float | None = None
+) -> dict[str, Any]:
     """
     Mark messages as read or unread.
 
     Args:
         message_ids: List of message IDs to update
         read: True to mark as read, False to mark as unread (default: true)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
-        Dictionary indicating success and number of messages updated
+        Dictionary indicating success, number of messages updated and the
+        IDs that were not found
 
     Example:
         >>> mark_as_read(["12345", "12346"], read=True)
-        {"success": True, "updated": 2}
+        {"success": True, "updated": 2, "requested": 2, "not_found": []}
     """
     try:
         # Validate bulk operation
@@ -490,7 +862,7 @@ def mark_as_read(message_ids: list[str], read: bool = True) -> dict[str, Any]:
 
         logger.info(f"Marking {len(message_ids)} messages as {'read' if read else 'unread'}")
 
-        count = mail.mark_as_read(message_ids, read=read)
+        count = await mail.with_timeout(timeout).mark_as_read(message_ids, read=read)
 
         operation_logger.log_operation(
             "mark_as_read",
@@ -502,8 +874,23 @@ def mark_as_read(message_ids: list[str], read: bool = True) -> dict[str, Any]:
             "success": True,
             "updated": count,
             "requested": len(message_ids),
+            "not_found": count.not_found,
         }
 
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error marking messages: {e}")
         return {
@@ -514,7 +901,7 @@ def mark_as_read(message_ids: list[str], read: bool = True) -> dict[str, Any]:
 
 
 @mcp.tool()
-def send_email_with_attachments(
+async def send_email_with_attachments(
     subject: str,
     body: str,
     to: list[str],
@@ -598,7 +985,7 @@ def send_email_with_attachments(
             }
 
         # Send the email
-        result = mail.send_email_with_attachments(
+        result = await mail.send_email_with_attachments(
             subject=subject,
             body=body,
             to=to,
@@ -647,6 +1034,20 @@ def send_email_with_attachments(
             "error": f"Failed to send email: {str(e)}",
             "error_type": "send_error",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Unexpected error sending email with attachments: {e}")
         return {
@@ -657,7 +1058,7 @@ def send_email_with_attachments(
 
 
 @mcp.tool()
-def get_attachments(message_id: str) -> dict[str, Any]:
+async def get_attachments(message_id: str) -> dict[str, Any]:
     """
     Get list of attachments from a message.
 
@@ -685,7 +1086,7 @@ def get_attachments(message_id: str) -> dict[str, Any]:
     try:
         logger.info(f"Getting attachments for message: {message_id}")
 
-        attachments = mail.get_attachments(message_id)
+        attachments = await mail.get_attachments(message_id)
 
         operation_logger.log_operation(
             "get_attachments",
@@ -706,6 +1107,20 @@ def get_attachments(message_id: str) -> dict[str, Any]:
             "error": f"Message '{message_id}' not found",
             "error_type": "message_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error getting attachments: {e}")
         return {
@@ -716,10 +1131,11 @@ def get_attachments(message_id: str) -> dict[str, Any]:
 
 
 @mcp.tool()
-def save_attachments(
+async def save_attachments(
     message_id: str,
     save_directory: str,
     attachment_indices: list[int] | None = None,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     """
     Save attachments from a message to a directory.
@@ -728,16 +1144,18 @@ def save_attachments(
         message_id: Message ID from search results
         save_directory: Directory path to save attachments to
         attachment_indices: Specific attachment indices to save (0-based), None for all
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
-        Dictionary indicating success and number of attachments saved
+        Dictionary indicating success, the number of attachments saved and
+        each file's index, name, path, MIME type, size and SHA-256 digest
 
     Example:
         >>> save_attachments("12345", "/Users/me/Downloads")
-        {"success": True, "saved": 2, "directory": "/Users/me/Downloads"}
+        {"success": True, "saved": 2, "directory": "/Users/me/Downloads", "files": [...]}
 
         >>> save_attachments("12345", "/Users/me/Downloads", [0, 2])
-        {"success": True, "saved": 2, "directory": "/Users/me/Downloads"}
+        {"success": True, "saved": 2, "directory": "/Users/me/Downloads", "files": [...]}
     """
     from pathlib import Path
 
@@ -763,7 +1181,7 @@ def save_attachments(
             f"Saving attachments from message {message_id} to {save_directory}"
         )
 
-        count = mail.save_attachments(
+        count = await mail.with_timeout(timeout).save_attachments(
             message_id=message_id,
             save_directory=save_path,
             attachment_indices=attachment_indices,
@@ -783,6 +1201,7 @@ def save_attachments(
             "success": True,
             "saved": count,
             "directory": save_directory,
+            "files": count.files,
         }
 
     except (FileNotFoundError, ValueError) as e:
@@ -799,6 +1218,20 @@ def save_attachments(
             "error": f"Message '{message_id}' not found",
             "error_type": "message_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error saving attachments: {e}")
         return {
@@ -809,11 +1242,12 @@ def save_attachments(
 
 
 @mcp.tool()
-def move_messages(
+async def move_messages(
     message_ids: list[str],
     destination_mailbox: str,
     account: str,
     gmail_mode: bool = False,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     """
     Move messages to a different mailbox/folder.
@@ -823,9 +1257,11 @@ def move_messages(
         destination_mailbox: Name of destination mailbox (use "/" for nested: "Projects/Client Work")
         account: Account name containing the messages
         gmail_mode: Use Gmail-specific move handling (copy + delete) for label-based systems
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
-        Dictionary with success status and number of messages moved
+        Dictionary with success status, number of messages moved and the IDs
+        that were not found
 
     Example:
         move_messages(
@@ -847,7 +1283,7 @@ def move_messages(
         )
 
         # Move the messages
-        count = mail.move_messages(
+        count = await mail.with_timeout(timeout).move_messages(
             message_ids=message_ids,
             destination_mailbox=destination_mailbox,
             account=account,
@@ -857,6 +1293,7 @@ def move_messages(
         return {
             "success": True,
             "count": count,
+            "not_found": count.not_found,
             "destination": destination_mailbox,
             "account": account,
         }
@@ -875,6 +1312,20 @@ def move_messages(
             "error": f"Account '{account}' not found",
             "error_type": "account_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error moving messages: {e}")
         return {
@@ -885,9 +1336,10 @@ def move_messages(
 
 
 @mcp.tool()
-def flag_message(
+async def flag_message(
     message_ids: list[str],
     flag_color: str,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     """
     Set flag color on messages.
@@ -895,9 +1347,11 @@ def flag_message(
     Args:
         message_ids: List of message IDs to flag
         flag_color: Flag color name (none, orange, red, yellow, blue, green, purple, gray)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
-        Dictionary with success status and number of messages flagged
+        Dictionary with success status, number of messages flagged and the
+        IDs that were not found
 
     Example:
         flag_message(
@@ -916,7 +1370,7 @@ def flag_message(
         logger.info(f"Flagging {len(message_ids)} message(s) with color {flag_color}")
 
         # Flag the messages
-        count = mail.flag_message(
+        count = await mail.with_timeout(timeout).flag_message(
             message_ids=message_ids,
             flag_color=flag_color,
         )
@@ -924,6 +1378,7 @@ def flag_message(
         return {
             "success": True,
             "count": count,
+            "not_found": count.not_found,
             "flag_color": flag_color,
         }
 
@@ -941,6 +1396,20 @@ def flag_message(
             "error": str(e),
             "error_type": "message_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error flagging messages: {e}")
         return {
@@ -951,7 +1420,7 @@ def flag_message(
 
 
 @mcp.tool()
-def create_mailbox(
+async def create_mailbox(
     account: str,
     name: str,
     parent_mailbox: str | None = None,
@@ -985,7 +1454,7 @@ def create_mailbox(
         logger.info(f"Creating mailbox '{name}' in account {account}")
 
         # Create the mailbox
-        success = mail.create_mailbox(
+        success = await mail.create_mailbox(
             account=account,
             name=name,
             parent_mailbox=parent_mailbox,
@@ -1019,6 +1488,20 @@ def create_mailbox(
             "error": str(e),
             "error_type": "applescript_error",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error creating mailbox: {e}")
         return {
@@ -1029,9 +1512,10 @@ def create_mailbox(
 
 
 @mcp.tool()
-def delete_messages(
+async def delete_messages(
     message_ids: list[str],
     permanent: bool = False,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     """
     Delete messages (move to trash or permanently delete).
@@ -1039,9 +1523,11 @@ def delete_messages(
     Args:
         message_ids: List of message IDs to delete
         permanent: If True, permanently delete; if False, move to Trash (default: False)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
-        Dictionary with success status and number of messages deleted
+        Dictionary with success status, number of messages deleted and the
+        IDs that were not found
 
     Example:
         delete_messages(
@@ -1073,7 +1559,7 @@ def delete_messages(
         logger.info(f"Deleting {len(message_ids)} message(s) {delete_type}")
 
         # Delete the messages
-        count = mail.delete_messages(
+        count = await mail.with_timeout(timeout).delete_messages(
             message_ids=message_ids,
             permanent=permanent,
             skip_bulk_check=False,  # Enforce limit
@@ -1082,6 +1568,7 @@ def delete_messages(
         return {
             "success": True,
             "count": count,
+            "not_found": count.not_found,
             "permanent": permanent,
         }
 
@@ -1099,6 +1586,20 @@ def delete_messages(
             "error": str(e),
             "error_type": "message_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error deleting messages: {e}")
         return {
@@ -1109,10 +1610,165 @@ def delete_messages(
 
 
 @mcp.tool()
-def reply_to_message(
+async def update_matching_messages(
+    account: str,
+    action: str,
+    mailbox: str = "INBOX",
+    sender_contains: str | None = None,
+    subject_contains: str | None = None,
+    read_status: bool | None = None,
+    older_than_days: int | None = None,
+    read: bool = True,
+    flag_color: str | None = None,
+    destination_mailbox: str | None = None,
+    gmail_mode: bool = False,
+    dry_run: bool = False,
+    max_messages: int = 100,
+    timeout: float | None = None,
+) -> dict[str, Any]:
+    """
+    Mark, flag, move or delete every message in a mailbox that matches a filter.
+
+    Mail selects the messages itself, so there is no need to search first
+    and pass message IDs back. Run with dry_run=True to see how many
+    messages match before changing anything.
+
+    Args:
+        account: Account name
+        action: "mark_as_read", "flag_message", "move_messages" or "delete_messages"
+        mailbox: Mailbox to search (default: INBOX)
+        sender_contains: Only messages whose sender contains this text
+        subject_contains: Only messages whose subject contains this text
+        read_status: Only read (true) or unread (false) messages
+        older_than_days: Only messages received more than this many days ago
+        read: New read status for mark_as_read (default: true)
+        flag_color: Flag color for flag_message (none, orange, red, yellow, blue, green,
+            purple, gray)
+        destination_mailbox: Mailbox of the same account for move_messages
+        gmail_mode: Use Gmail-specific handling (copy + delete) for move_messages
+        dry_run: Only count the matching messages (default: false)
+        max_messages: Change nothing if more messages than this match
+            (default: 100, at most 1000)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
+
+    Returns:
+        Dictionary with success status, number of matching messages and
+        number changed
+
+    Example:
+        >>> update_matching_messages(
+        ...     account="Gmail",
+        ...     action="mark_as_read",
+        ...     sender_contains="newsletters@example.com",
+        ... )
+        {"success": True, "action": "mark_as_read", "matched": 42, "changed": 42,
+         "dry_run": False}
+    """
+    try:
+        if not 1 <= max_messages <= MAX_MATCHING_MESSAGES:
+            return {
+                "success": False,
+                "error": f"max_messages must be between 1 and {MAX_MATCHING_MESSAGES}",
+                "error_type": "validation_error",
+            }
+
+        logger.info(
+            f"{'Counting' if dry_run else 'Applying'} {action} on matching messages "
+            f"in {mailbox} of account {account}"
+        )
+
+        result = await mail.with_timeout(timeout).update_matching(
+            account=account,
+            mailbox=mailbox,
+            action=action,
+            sender_contains=sender_contains,
+            subject_contains=subject_contains,
+            read_status=read_status,
+            older_than_days=older_than_days,
+            read=read,
+            flag_color=flag_color,
+            destination_mailbox=destination_mailbox,
+            gmail_mode=gmail_mode,
+            dry_run=dry_run,
+            max_messages=max_messages,
+        )
+
+        if not dry_run and result["matched"] > max_messages:
+            return {
+                "success": False,
+                "error": (
+                    f"{result['matched']} messages match, more than max_messages "
+                    f"({max_messages}); nothing was changed"
+                ),
+                "error_type": "validation_error",
+                "matched": result["matched"],
+            }
+
+        if not dry_run:
+            operation_logger.log_operation(
+                "update_matching",
+                {"action": action, "account": account, "mailbox": mailbox, **result},
+                "success",
+            )
+
+        return {
+            "success": True,
+            "action": action,
+            "matched": result["matched"],
+            "changed": result["changed"],
+            "dry_run": dry_run,
+        }
+
+    except ValueError as e:
+        logger.error(f"Validation error: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "validation_error",
+        }
+    except MailAccountNotFoundError as e:
+        logger.error(f"Account not found: {e}")
+        return {
+            "success": False,
+            "error": f"Account '{account}' not found",
+            "error_type": "account_not_found",
+        }
+    except MailMailboxNotFoundError as e:
+        logger.error(f"Mailbox not found: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "mailbox_not_found",
+        }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
+    except Exception as e:
+        logger.error(f"Error updating matching messages: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unknown",
+        }
+
+
+@mcp.tool()
+async def reply_to_message(
     message_id: str,
     body: str,
     reply_all: bool = False,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     """
     Reply to a message.
@@ -1121,6 +1777,7 @@ def reply_to_message(
         message_id: ID of the message to reply to
         body: Reply body text
         reply_all: If True, reply to all recipients; if False, reply only to sender (default: False)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
         Dictionary with success status and reply message ID
@@ -1136,7 +1793,7 @@ def reply_to_message(
         logger.info(f"Creating reply to message {message_id}")
 
         # Reply to the message
-        reply_id = mail.reply_to_message(
+        reply_id = await mail.with_timeout(timeout).reply_to_message(
             message_id=message_id,
             body=body,
             reply_all=reply_all,
@@ -1156,6 +1813,20 @@ def reply_to_message(
             "error": f"Message '{message_id}' not found",
             "error_type": "message_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error replying to message: {e}")
         return {
@@ -1166,12 +1837,13 @@ def reply_to_message(
 
 
 @mcp.tool()
-def forward_message(
+async def forward_message(
     message_id: str,
     to: list[str],
     body: str = "",
     cc: list[str] | None = None,
     bcc: list[str] | None = None,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     """
     Forward a message to recipients.
@@ -1182,6 +1854,7 @@ def forward_message(
         body: Optional body text to add before forwarded content (default: "")
         cc: Optional CC recipients
         bcc: Optional BCC recipients
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
 
     Returns:
         Dictionary with success status and forwarded message ID
@@ -1207,7 +1880,7 @@ def forward_message(
         logger.info(f"Forwarding message {message_id} to {len(to)} recipient(s)")
 
         # Forward the message
-        forward_id = mail.forward_message(
+        forward_id = await mail.with_timeout(timeout).forward_message(
             message_id=message_id,
             to=to,
             body=body,
@@ -1238,6 +1911,20 @@ def forward_message(
             "error": f"Message '{message_id}' not found",
             "error_type": "message_not_found",
         }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
     except Exception as e:
         logger.error(f"Error forwarding message: {e}")
         return {
@@ -1247,6 +1934,195 @@ def forward_message(
         }
 
 
+@mcp.tool()
+async def batch(operations: list[dict[str, Any]], timeout: float | None = None) -> dict[str, Any]:
+    """
+    Run several operations in one round trip to Mail.
+
+    The operations are combined into a single script, so a burst such as
+    ten get_message calls, or "flag these, then move those", wakes Mail
+    once. Operations run in order and one failing operation does not stop
+    the others.
+
+    Supported operations: list_accounts, search_messages, get_message,
+    get_attachments, mark_as_read, flag_message, move_messages,
+    delete_messages, update_matching (the params of
+    update_matching_messages). Their params are the same as the matching
+    tools.
+
+    Args:
+        operations: List of {"operation": name, "params": {...}} (max 50)
+        timeout: Script timeout in seconds, replacing the adaptive timeout for this call
+
+    Returns:
+        Dictionary with one result per operation, in order. Each result
+        has "success" and either "result" or "error" and "error_type".
+
+    Example:
+        >>> batch([
+        ...     {"operation": "flag_message",
+        ...      "params": {"message_ids": ["1"], "flag_color": "red"}},
+        ...     {"operation": "move_messages",
+        ...      "params": {"message_ids": ["2"], "destination_mailbox": "Archive",
+        ...                 "account": "Gmail"}},
+        ... ])
+        {
+            "success": True,
+            "results": [
+                {"operation": "flag_message", "success": True, "result": 1},
+                {"operation": "move_messages", "success": False,
+                 "error": "Can't get mailbox...", "error_type": "mailbox_not_found"}
+            ],
+            "count": 2,
+            "failed": 1
+        }
+    """
+    try:
+        is_valid, error_msg = validate_bulk_operation(len(operations), max_items=50)
+        if not is_valid:
+            logger.error(f"Validation failed: {error_msg}")
+            return {
+                "success": False,
+                "error": error_msg,
+                "error_type": "validation_error",
+            }
+
+        requests = []
+        rejected: dict[int, dict[str, Any]] = {}
+        for position, entry in enumerate(operations):
+            params = dict(entry.get("params") or {})
+
+            # Same per-call limits as the individual tools
+            message_ids = params.get("message_ids")
+            if isinstance(message_ids, list) and len(message_ids) > 100:
+                return {
+                    "success": False,
+                    "error": f"Too many messages in one operation ({len(message_ids)}), "
+                    "maximum is 100",
+                    "error_type": "validation_error",
+                }
+            if entry.get("operation") == "delete_messages":
+                params["skip_bulk_check"] = False
+            if entry.get("operation") == "update_matching":
+                max_messages = params.setdefault("max_messages", 100)
+                if not isinstance(max_messages, int) or not (
+                    1 <= max_messages <= MAX_MATCHING_MESSAGES
+                ):
+                    return {
+                        "success": False,
+                        "error": f"max_messages must be between 1 and {MAX_MATCHING_MESSAGES}",
+                        "error_type": "validation_error",
+                    }
+            if entry.get("operation") == "search_messages":
+                # Dates arrive as text, as for the search_messages tool
+                try:
+                    for bound in ("received_after", "received_before"):
+                        if params.get(bound):
+                            params[bound] = parse_received_date(str(params[bound]))
+                except ValueError as e:
+                    rejected[position] = {
+                        "operation": "search_messages",
+                        "success": False,
+                        "error": str(e),
+                        "error_type": "validation_error",
+                    }
+                    continue
+
+            requests.append({"operation": entry.get("operation"), "params": params})
+
+        logger.info(f"Running batch of {len(requests)} operation(s)")
+
+        ran = iter(await mail.with_timeout(timeout).batch(requests))
+        results = [rejected.get(position) or next(ran) for position in range(len(operations))]
+        failed = sum(1 for result in results if not result["success"])
+
+        operation_logger.log_operation(
+            "batch",
+            {"operations": [request["operation"] for request in requests], "failed": failed},
+            "success",
+        )
+
+        return {
+            "success": True,
+            "results": results,
+            "count": len(results),
+            "failed": failed,
+        }
+
+    except MailAppleScriptError as e:
+        logger.error(f"AppleScript error running batch: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "applescript_error",
+        }
+    except MailBusyError as e:
+        logger.warning(f"Mail is busy: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "busy",
+        }
+    except MailUnavailableError as e:
+        logger.warning(f"Mail is unavailable: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unavailable",
+        }
+    except Exception as e:
+        logger.error(f"Unexpected error running batch: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "error_type": "unknown",
+        }
+
+
+@mcp.tool()
+async def get_server_stats() -> dict[str, Any]:
+    """
+    Get scheduler and request-coalescing statistics for Apple Mail requests.
+
+    Requests are scheduled in lanes (interactive reads, bulk reads,
+    mutations, sends), each with its own concurrency and queue limit.
+    Requests that find their lane's queue full fail with error_type "busy".
+    Identical concurrent reads (list_accounts, list_mailboxes,
+    search_messages) share one execution. Each operation's timeout adapts
+    to its observed run times (p99 x 3 within per-lane bounds). When Mail
+    stops responding the circuit opens and requests fail with error_type
+    "unavailable" until a probe succeeds.
+
+    Returns:
+        Dictionary with per-lane queue depth, completed and rejected
+        counts, queue-wait times in seconds, coalescing counters, and
+        per-operation latency, current timeout and recent timeouts, and
+        circuit breaker state
+
+    Example:
+        >>> get_server_stats()
+        {
+            "success": True,
+            "scheduler": {
+                "max_in_flight": 2,
+                "active": 1,
+                "lanes": {"interactive": {"waiting": 0, "p95_wait": 0.01, ...}, ...}
+            },
+            "coalescing": {"calls": 40, "executions": 31, "coalesced": 9, "in_flight": 0},
+            "timeouts": {
+                "operations": {
+                    "list_accounts": {"samples": 25, "p50": 0.4, "p99": 0.9, "timeout": 5, ...}
+                },
+                "recent_timeouts": [
+                    {"operation": "search_messages", "timeout": 60, "input_size": 6, ...}
+                ]
+            },
+            "circuit": {"state": "closed", "consecutive_failures": 0, ...}
+        }
+    """
+    return {"success": True, **mail.connector.stats()}
+
+
 def main() -> None:
     """Run the MCP server."""
     logger.info("Starting Apple Mail MCP server")
@@ -0,0 +1,120 @@
+"""
+Coalescing of identical concurrent calls.
+
+When several callers ask for the same read at the same time, only the first
+one (the leader) runs it; the others wait for the leader's result instead of
+starting their own osascript process. Nothing is cached: once the call
+finishes, the next caller runs it again.
+"""
+
+from __future__ import annotations
+
+import copy
+import logging
+import threading
+from collections.abc import Callable, Hashable
+from typing import Any, TypeVar
+
+from .exceptions import MailOperationCancelledError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Share one in-flight execution between identical concurrent calls."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Run fn, or wait for the identical call already in flight.
+
+        Followers receive a deep copy of the leader's result, or the
+        leader's exception. If the leader was cancelled, a waiting follower
+        runs the call itself instead of failing with it.
+
+        Args:
+            key: Normalized operation and arguments
+            fn: Function producing the result
+
+        Returns:
+            The result of fn
+        """
+        with self._lock:
+            self.calls += 1
+
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.executions += 1
+                    leader = True
+                else:
+                    call.followers += 1
+                    self.coalesced += 1
+                    leader = False
+
+            if leader:
+                return self._lead(key, call, fn)
+
+            call.done.wait()
+            if isinstance(call.error, MailOperationCancelledError):
+                with self._lock:
+                    self.coalesced -= 1
+                continue
+            if call.error is not None:
+                raise call.error
+            result: T = copy.deepcopy(call.result)
+            return result
+
+    def _lead(self, key: Hashable, call: _Call, fn: Callable[[], T]) -> T:
+        try:
+            result = fn()
+            call.result = result
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                followers = call.followers
+            if followers:
+                logger.debug(f"Sharing one execution of {key!r} with {followers} callers")
+                if call.error is None:
+                    # Snapshot before the leader's caller can mutate the result
+                    call.result = copy.deepcopy(call.result)
+            call.done.set()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return coalescing counters.
+
+        Returns:
+            Dictionary with total calls, executions actually run, calls
+            that shared another call's execution, and calls in flight
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
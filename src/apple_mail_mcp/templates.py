@@ -0,0 +1,1351 @@
+"""
+Precompiled AppleScript templates for Apple Mail operations.
+
+Every connector operation is a static script with an ``on run argv``
+handler. Runtime values (account names, message IDs, subjects, ...) are
+passed as arguments instead of being escaped into the source, so the source
+of a template never changes and can be compiled once and cached on disk,
+keyed by a hash of its content.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import subprocess
+import threading
+from collections.abc import Sequence
+from pathlib import Path
+
+from .exceptions import MailAppleScriptError
+from .query import WhoseClause
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path.home() / "Library" / "Caches" / "apple-mail-mcp" / "scripts"
+
+
+def script_digest(source: str) -> str:
+    """
+    Content hash used to key compiled scripts.
+
+    Args:
+        source: AppleScript source
+
+    Returns:
+        Hex SHA-256 digest of the source
+    """
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class CompiledScriptCache:
+    """On-disk cache of compiled scripts (.scpt), keyed by content hash."""
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        compiler: str = "/usr/bin/osacompile",
+        timeout: int = 60,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory for compiled scripts (default: the
+                APPLE_MAIL_MCP_SCRIPT_CACHE environment variable, or
+                ~/Library/Caches/apple-mail-mcp/scripts)
+            compiler: Path to osacompile
+            timeout: Timeout in seconds for compiling one script
+        """
+        env_dir = os.environ.get("APPLE_MAIL_MCP_SCRIPT_CACHE")
+        self.cache_dir = cache_dir or (Path(env_dir) if env_dir else DEFAULT_CACHE_DIR)
+        self.compiler = compiler
+        self.timeout = timeout
+        self._known: set[str] = set()
+        self._lock = threading.Lock()
+
+    def path_for(self, source: str, language: str = "AppleScript") -> Path:
+        """
+        Return the compiled script for a source, compiling it on first use.
+
+        Args:
+            source: Script source
+            language: OSA language of the source ("AppleScript" or
+                "JavaScript")
+
+        Returns:
+            Path to the compiled .scpt file
+
+        Raises:
+            MailAppleScriptError: If compilation fails
+        """
+        digest = script_digest(source)
+        path = self.cache_dir / f"{digest}.scpt"
+
+        with self._lock:
+            if digest in self._known:
+                return path
+
+            if not path.exists():
+                self._compile(source, path, language)
+
+            self._known.add(digest)
+            return path
+
+    def _compile(self, source: str, path: Path, language: str = "AppleScript") -> None:
+        logger.debug(f"Compiling AppleScript template {path.name}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Compile to a temporary name and rename, so concurrent servers never
+        # see a half-written script
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.scpt")
+        try:
+            result = subprocess.run(
+                [self.compiler, "-l", language, "-o", str(tmp_path)],
+                input=source,
+                text=True,
+                capture_output=True,
+                timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            raise MailAppleScriptError(
+                f"Script compilation timeout after {self.timeout}s"
+            ) from None
+        except OSError as e:
+            raise MailAppleScriptError(f"Script compilation failed: {e}") from e
+
+        if result.returncode != 0:
+            tmp_path.unlink(missing_ok=True)
+            raise MailAppleScriptError(f"Script compilation failed: {result.stderr.strip()}")
+
+        os.replace(tmp_path, path)
+
+
+# Handler shared by templates that take linefeed-separated lists
+SPLIT_LINES_HANDLER = """
+on splitLines(theText)
+    if theText is "" then return {}
+    set savedDelimiters to AppleScript's text item delimiters
+    set AppleScript's text item delimiters to linefeed
+    set theItems to text items of theText
+    set AppleScript's text item delimiters to savedDelimiters
+    return theItems
+end splitLines
+"""
+
+# Handlers producing the record encoding described in wire.py. Templates that
+# return rows build each row with `my wireRecord({...})` and the output with
+# `my wireJoin(rows)`.
+WIRE_HANDLERS = """
+on wireRecord(fields)
+    set savedDelimiters to AppleScript's text item delimiters
+    set AppleScript's text item delimiters to ""
+    set probe to fields as text
+    if probe contains (character id 16) or probe contains (character id 30) or probe contains (character id 31) then
+        set escapedFields to {}
+        repeat with fieldValue in fields
+            set end of escapedFields to my wireEscape(fieldValue as text)
+        end repeat
+        set fields to escapedFields
+    end if
+    set AppleScript's text item delimiters to (character id 31)
+    set theRecord to fields as text
+    set AppleScript's text item delimiters to savedDelimiters
+    return theRecord
+end wireRecord
+
+on wireJoin(records)
+    set savedDelimiters to AppleScript's text item delimiters
+    set AppleScript's text item delimiters to (character id 30)
+    set output to records as text
+    set AppleScript's text item delimiters to savedDelimiters
+    return output
+end wireJoin
+
+on wireEscape(theText)
+    set theText to my wireReplace(theText, character id 16, (character id 16) & "e")
+    set theText to my wireReplace(theText, character id 31, (character id 16) & "f")
+    set theText to my wireReplace(theText, character id 30, (character id 16) & "r")
+    return theText
+end wireEscape
+
+on wireReplace(theText, findText, replacement)
+    set AppleScript's text item delimiters to findText
+    set theItems to text items of theText
+    set AppleScript's text item delimiters to replacement
+    return theItems as text
+end wireReplace
+"""
+
+# Handler shared by templates that take message IDs. Each id argument is
+# "<id>", or "<id><US><account><US><mailbox>" when the connector's location
+# index knows where the message is (see locations.MessageLocations): that
+# mailbox is asked first, and every mailbox of every account only on a miss.
+FIND_MESSAGE_HANDLER = """
+on findMessage(msgRef)
+    set savedDelimiters to AppleScript's text item delimiters
+    set AppleScript's text item delimiters to (character id 31)
+    set refParts to text items of (msgRef as text)
+    set AppleScript's text item delimiters to savedDelimiters
+    set msgId to (item 1 of refParts) as integer
+
+    tell application "Mail"
+        if (count of refParts) is 3 then
+            try
+                return first message of mailbox (item 3 of refParts) of account (item 2 of refParts) whose id is msgId
+            end try
+        end if
+
+        repeat with acc in accounts
+            repeat with mb in mailboxes of acc
+                try
+                    return first message of mb whose id is msgId
+                end try
+            end repeat
+        end repeat
+    end tell
+
+    error "Message not found"
+end findMessage
+"""
+
+# Cheapest round trip to Mail; used to check whether it responds again
+PROBE = """
+on run argv
+    tell application "Mail"
+        return version
+    end tell
+end run
+"""
+
+LIST_ACCOUNTS = """
+on run argv
+    tell application "Mail"
+        set resultList to {}
+
+        repeat with acc in accounts
+            set accName to name of acc
+            set emailAddrs to email addresses of acc
+
+            -- Get primary email (first in list)
+            set primaryEmail to ""
+            if (count of emailAddrs) > 0 then
+                set primaryEmail to item 1 of emailAddrs
+            end if
+
+            set end of resultList to my wireRecord({accName, primaryEmail})
+        end repeat
+
+        return my wireJoin(resultList)
+    end tell
+end run
+""" + WIRE_HANDLERS
+
+# argv: account
+LIST_MAILBOXES = """
+on run argv
+    set accountName to item 1 of argv
+
+    tell application "Mail"
+        set accountRef to account accountName
+        set mailboxList to {}
+
+        repeat with mb in mailboxes of accountRef
+            set mbInfo to {mbName:(name of mb), unreadCount:(unread count of mb)}
+            set end of mailboxList to mbInfo
+        end repeat
+
+        return mailboxList
+    end tell
+end run
+"""
+
+_SEARCH_HEADER = """
+on run argv
+    set accountName to item 1 of argv
+    set mailboxName to item 2 of argv
+    set senderFilter to item 3 of argv
+    set subjectFilter to item 4 of argv
+    set readFilter to (item 5 of argv) is "true"
+    set maxCount to (item 6 of argv) as integer
+DATES
+
+    tell application "Mail"
+        set accountRef to account accountName
+        set mailboxRef to mailbox mailboxName of accountRef
+"""
+
+_SEARCH_FOOTER = """
+        return my wireJoin({msgCount as text, my wireRecord(msgIds), my wireRecord(msgSubjects), my wireRecord(msgSenders), my wireRecord(msgDates), my wireRecord(msgReads), my wireRecord(my dateKeys(msgDates))})
+    end tell
+end run
+""" + WIRE_HANDLERS
+
+# (variable, property) for each column of a listing, in MESSAGE_SUMMARY order
+# (the date key column is computed from msgDates)
+_SEARCH_COLUMNS = (
+    ("msgIds", "id"),
+    ("msgSubjects", "subject"),
+    ("msgSenders", "sender"),
+    ("msgDates", "date received"),
+    ("msgReads", "read status"),
+)
+
+# Dates arrive as local days and seconds since 1970 (see
+# utils.local_days_seconds), never as date text, which Mail would parse in
+# the user's locale, and leave the same way: listings return a date key
+# "<days>:<seconds>" next to each date's text (see wire.as_timestamp). Mailboxes list messages newest first, so the messages
+# received in a date window are a range of indices that a binary search
+# finds with one date read per probe.
+DATE_HANDLERS = """
+on keyDate(keyDays, keySeconds)
+    set theDate to current date
+    set day of theDate to 1
+    set year of theDate to 1970
+    set month of theDate to January
+    set time of theDate to 0
+    return theDate + (keyDays as integer) * days + (keySeconds as integer)
+end keyDate
+
+on dateKey(theDate, epoch)
+    try
+        set delta to theDate - epoch
+        -- Whole seconds since 1970 exceed AppleScript's integer range
+        return ((delta div days) as text) & ":" & ((delta mod days) as integer)
+    on error
+        return ""
+    end try
+end dateKey
+
+on dateKeys(theDates)
+    set epoch to my keyDate(0, 0)
+    set theKeys to {}
+    repeat with theDate in theDates
+        set end of theKeys to my dateKey(contents of theDate, epoch)
+    end repeat
+    return theKeys
+end dateKeys
+
+on firstOlder(mailboxRef, cutoff, msgCount)
+    set low to 1
+    set high to msgCount + 1
+    tell application "Mail"
+        repeat while low < high
+            set middle to (low + high) div 2
+            if date received of message middle of mailboxRef < cutoff then
+                set high to middle
+            else
+                set low to middle + 1
+            end if
+        end repeat
+    end tell
+    return low
+end firstOlder
+"""
+
+
+def _date_args(first_item: int, received_after: bool, received_before: bool) -> str:
+    """Statements reading the date window from argv (days and seconds of each bound)."""
+    lines = ""
+    if received_after:
+        lines += (
+            f"    set afterDate to my keyDate(item {first_item} of argv,"
+            f" item {first_item + 1} of argv)\n"
+        )
+    if received_before:
+        lines += (
+            f"    set beforeDate to my keyDate(item {first_item + 2} of argv,"
+            f" item {first_item + 3} of argv)\n"
+        )
+    return lines
+
+
+def _filter_conditions(sender: bool, subject: bool, read_status: bool) -> list[str]:
+    conditions = []
+    if sender:
+        conditions.append("sender contains senderFilter")
+    if subject:
+        conditions.append("subject contains subjectFilter")
+    if read_status:
+        conditions.append("read status is readFilter")
+    return conditions
+
+
+def search_messages_script(
+    sender: bool = False,
+    subject: bool = False,
+    read_status: bool = False,
+    limited: bool = False,
+    received_after: bool = False,
+    received_before: bool = False,
+    query: WhoseClause | None = None,
+) -> str:
+    """
+    Build the search template for a combination of active filters.
+
+    Only the *shape* of the query varies (which filters are present and
+    whether there is a limit), so there are at most 64 distinct templates;
+    the filter values themselves always arrive through argv.
+
+    Each property is read for the whole matching set in one Apple Event
+    (``subject of messages 1 thru N of mb``, or of a ``whose`` clause), so
+    a listing costs about six events however many messages it returns. The
+    output is column-wise (see wire.RecordSchema.parse_columns).
+
+    Without other filters, a date window is never a ``whose`` test over the
+    whole mailbox: its bounds are found by binary search (see
+    DATE_HANDLERS) and the columns of just that range are read, so a "last
+    week" listing costs about log2(mailbox size) events plus the size of
+    the week. With other filters, the window's bounds join the ``whose``
+    clause; scan_messages_script is the alternative that narrows by date
+    first (the planner chooses, see planner).
+
+    argv: account, mailbox, sender filter, subject filter,
+    read filter ("true"/"false"/""), limit ("0" for no limit), then, with
+    a date window: received after as local days and seconds, received
+    before as local days and seconds ("" for an unset bound), then the
+    query's values (see query.WhoseClause.args)
+
+    Args:
+        sender: Filter on sender
+        subject: Filter on subject
+        read_status: Filter on read status
+        limited: Stop after the limit is reached
+        received_after: Only messages received at or after a date
+        received_before: Only messages received before a date
+        query: Compiled query expression, joined to the ``whose`` clause
+
+    Returns:
+        AppleScript template source
+    """
+    conditions = _filter_conditions(sender, subject, read_status)
+    dated = received_after or received_before
+    params = _date_args(7, received_after, received_before)
+    if query is not None:
+        conditions.append(query.text)
+        params += query.preamble(11 if dated else 7)
+    header = _SEARCH_HEADER.replace("DATES\n", params)
+
+    if dated and not conditions:
+        body = """
+        set msgCount to count of messages of mailboxRef
+        set firstIndex to 1
+        set lastIndex to msgCount
+"""
+        if received_before:
+            body += "        set firstIndex to my firstOlder(mailboxRef, beforeDate, msgCount)\n"
+        if received_after:
+            body += (
+                "        set lastIndex to (my firstOlder(mailboxRef, afterDate, msgCount)) - 1\n"
+            )
+        if limited:
+            body += """        if lastIndex - firstIndex + 1 > maxCount then set lastIndex to firstIndex + maxCount - 1
+"""
+        body += """        set msgCount to lastIndex - firstIndex + 1
+        if msgCount < 1 then return ""
+"""
+        for variable, prop in _SEARCH_COLUMNS:
+            body += f"        set {variable} to {prop} of messages firstIndex thru lastIndex of mailboxRef\n"
+        return header + body + _SEARCH_FOOTER + DATE_HANDLERS
+
+    if received_after:
+        conditions.append("date received >= afterDate")
+    if received_before:
+        conditions.append("date received < beforeDate")
+
+    if limited and not conditions:
+        # Range reference: Mail resolves only the first N messages
+        messages = "messages 1 thru msgCount of mailboxRef"
+        body = """
+        set msgCount to count of messages of mailboxRef
+        if msgCount > maxCount then set msgCount to maxCount
+        if msgCount is 0 then return ""
+"""
+        columns: tuple[tuple[str, str], ...] = _SEARCH_COLUMNS
+    else:
+        if conditions:
+            messages = f"(messages of mailboxRef whose {' and '.join(conditions)})"
+        else:
+            messages = "messages of mailboxRef"
+        # The id column gives the number of matches
+        body = f"""
+        set msgIds to id of {messages}
+        set msgCount to count of msgIds
+"""
+        if limited:
+            body += """        if msgCount > maxCount then set msgCount to maxCount
+"""
+        body += """        if msgCount is 0 then return ""
+"""
+        if limited:
+            body += """        set msgIds to items 1 thru msgCount of msgIds
+"""
+        columns = _SEARCH_COLUMNS[1:]
+
+    for variable, prop in columns:
+        if limited and conditions:
+            # A filtered set has no range form; truncate the column instead
+            body += f"        set {variable} to items 1 thru msgCount of ({prop} of {messages})\n"
+        else:
+            body += f"        set {variable} to {prop} of {messages}\n"
+
+    return header + body + _SEARCH_FOOTER + DATE_HANDLERS
+
+
+def scan_messages_script(
+    sender: bool = False,
+    subject: bool = False,
+    read_status: bool = False,
+    received_after: bool = False,
+    received_before: bool = False,
+) -> str:
+    """
+    Build the template that scans a mailbox newest first in chunks.
+
+    Instead of asking Mail to test every message (``whose``), the script
+    reads the five columns of ``chunkSize`` messages at a time, applies
+    the filters itself and stops as soon as it has the limit. When the
+    wanted messages are common and recent, that examines a few hundred
+    messages where a ``whose`` clause examines the whole mailbox. A date
+    window first narrows the scan to its range of indices by binary search
+    (see DATE_HANDLERS).
+
+    The output is the number of messages examined, the number in the
+    mailbox, then the columns as search_messages_script returns them. The
+    planner sizes the chunks and learns the filters' selectivity from the
+    first two numbers (see planner).
+
+    argv: the six search_messages_script items, chunk size, then, with a
+    date window, its bounds as search_messages_script takes them (items 8
+    to 11)
+
+    Args:
+        sender: Filter on sender
+        subject: Filter on subject
+        read_status: Filter on read status
+        received_after: Only messages received at or after a date
+        received_before: Only messages received before a date
+
+    Returns:
+        AppleScript template source
+    """
+    tests = []
+    if sender:
+        tests.append("item i of allSenders contains senderFilter")
+    if subject:
+        tests.append("item i of allSubjects contains subjectFilter")
+    if read_status:
+        tests.append("item i of allReads is readFilter")
+    header = _SEARCH_HEADER.replace("DATES\n", _date_args(8, received_after, received_before))
+
+    body = """        set chunkSize to (item 7 of argv) as integer
+        set mailboxSize to count of messages of mailboxRef
+        set firstIndex to 1
+        set lastIndex to mailboxSize
+"""
+    if received_before:
+        body += "        set firstIndex to my firstOlder(mailboxRef, beforeDate, mailboxSize)\n"
+    if received_after:
+        body += "        set lastIndex to (my firstOlder(mailboxRef, afterDate, mailboxSize)) - 1\n"
+    body += """        set {msgIds, msgSubjects, msgSenders, msgDates, msgReads} to {{}, {}, {}, {}, {}}
+        set msgCount to 0
+        set examined to firstIndex - 1
+        repeat while examined < lastIndex and (maxCount is 0 or msgCount < maxCount)
+            set chunkStart to examined + 1
+            set chunkEnd to examined + chunkSize
+            if chunkEnd > lastIndex then set chunkEnd to lastIndex
+"""
+    for variable, prop in _SEARCH_COLUMNS:
+        body += (
+            f"            set {variable.replace('msg', 'all')} to"
+            f" {prop} of messages chunkStart thru chunkEnd of mailboxRef\n"
+        )
+    body += f"""            repeat with i from 1 to chunkEnd - chunkStart + 1
+                set examined to chunkStart + i - 1
+                if {' and '.join(tests) or 'true'} then
+"""
+    for variable, _ in _SEARCH_COLUMNS:
+        body += f"                    set end of {variable} to item i of {variable.replace('msg', 'all')}\n"
+    body += """                    set msgCount to msgCount + 1
+                    if msgCount = maxCount then exit repeat
+                end if
+            end repeat
+        end repeat
+"""
+    footer = """
+        return my wireJoin({(examined - firstIndex + 1) as text, mailboxSize as text, msgCount as text, my wireRecord(msgIds), my wireRecord(msgSubjects), my wireRecord(msgSenders), my wireRecord(msgDates), my wireRecord(msgReads), my wireRecord(my dateKeys(msgDates))})
+    end tell
+end run
+""" + WIRE_HANDLERS + DATE_HANDLERS
+    return header + body + footer
+
+
+# argv: account, mailbox
+COUNT_MESSAGES = """
+on run argv
+    tell application "Mail"
+        return count of messages of mailbox (item 2 of argv) of account (item 1 of argv)
+    end tell
+end run
+"""
+
+_PAGE_HANDLERS = """
+on indexAfter(idList, lastId)
+    repeat with i from 1 to count of idList
+        if item i of idList is lastId then return i + 1
+    end repeat
+    return 0
+end indexAfter
+
+on indexAfterDate(dateList, lastDate)
+    -- May repeat a message received in the same second; never skips one
+    repeat with i from 1 to count of dateList
+        if item i of dateList is not greater than lastDate then return i
+    end repeat
+    return (count of dateList) + 1
+end indexAfterDate
+"""
+
+
+def search_page_script(
+    sender: bool = False,
+    subject: bool = False,
+    read_status: bool = False,
+    received_after: bool = False,
+    received_before: bool = False,
+    query: WhoseClause | None = None,
+) -> str:
+    """
+    Build the template for a page after a cursor (see pagination).
+
+    A page is a range of the listing: of the mailbox's messages, or of the
+    ``whose`` set for a filtered search (which has no range form, so its
+    ID column is read whole and the other columns are truncated, like
+    search_messages_script does for a limited filtered search). The page
+    starts after the cursor's message: at the recorded index if that
+    message is still there, otherwise after wherever its ID is now,
+    otherwise (it left the mailbox) at the first message no newer than its
+    date.
+
+    Without other filters, a date window only ends the range early (at
+    the first message older than received_after, found by binary search;
+    messages after the cursor are older than received_before already).
+    With other filters, the window's bounds join the ``whose`` clause.
+
+    The output is the listing index of the page's last message, then the
+    columns as search_messages_script returns them; "lost" if the cursor's
+    message cannot be found and its date is unknown.
+
+    argv: account, mailbox, sender filter, subject filter, read filter
+    ("true"/"false"/""), limit ("0" for no limit), cursor index ("0" if
+    unknown), cursor message ID, cursor local days and seconds ("" if
+    unknown), then, with a date window, its bounds as search_messages_script
+    takes them, then the query's values
+
+    Args:
+        sender: Filter on sender
+        subject: Filter on subject
+        read_status: Filter on read status
+        received_after: Only messages received at or after a date
+        received_before: Only messages received before a date
+        query: Compiled query expression, joined to the ``whose`` clause
+
+    Returns:
+        AppleScript template source
+    """
+    conditions = _filter_conditions(sender, subject, read_status)
+    params = _date_args(11, received_after, received_before)
+    if query is not None:
+        conditions.append(query.text)
+        params += query.preamble(15 if received_after or received_before else 11)
+    if conditions and received_after:
+        conditions.append("date received >= afterDate")
+    if conditions and received_before:
+        conditions.append("date received < beforeDate")
+    header = _SEARCH_HEADER.replace("DATES\n", params)
+
+    body = """        set hintIndex to (item 7 of argv) as integer
+        set lastId to (item 8 of argv) as integer
+        set keyDays to item 9 of argv
+        set keySeconds to item 10 of argv
+        set startIndex to 0
+"""
+    if conditions:
+        messages = f"(messages of mailboxRef whose {' and '.join(conditions)})"
+        body += f"""        set allIds to id of {messages}
+        set totalCount to count of allIds
+        if hintIndex > 0 and hintIndex is not greater than totalCount then
+            if item hintIndex of allIds is lastId then set startIndex to hintIndex + 1
+        end if
+        if startIndex is 0 then set startIndex to my indexAfter(allIds, lastId)
+"""
+    else:
+        messages = "messages of mailboxRef"
+        # One event checks the recorded index; IDs are only read if it moved
+        body += """        set totalCount to count of messages of mailboxRef
+        if hintIndex > 0 and hintIndex is not greater than totalCount then
+            if id of message hintIndex of mailboxRef is lastId then set startIndex to hintIndex + 1
+        end if
+        if startIndex is 0 then set startIndex to my indexAfter(id of messages of mailboxRef, lastId)
+"""
+    body += f"""        if startIndex is 0 then
+            if keyDays is "" then return "lost"
+            set startIndex to my indexAfterDate(date received of {messages}, my keyDate(keyDays, keySeconds))
+        end if
+"""
+    if received_after and not conditions:
+        body += """        set totalCount to (my firstOlder(mailboxRef, afterDate, totalCount)) - 1
+"""
+    body += """
+        set endIndex to totalCount
+        if maxCount > 0 and startIndex + maxCount - 1 < endIndex then set endIndex to startIndex + maxCount - 1
+        set msgCount to endIndex - startIndex + 1
+        if msgCount < 1 then return endIndex as text
+"""
+    for variable, prop in _SEARCH_COLUMNS:
+        if conditions and variable == "msgIds":
+            body += "        set msgIds to items startIndex thru endIndex of allIds\n"
+        elif conditions:
+            body += f"        set {variable} to items startIndex thru endIndex of ({prop} of {messages})\n"
+        else:
+            body += f"        set {variable} to {prop} of messages startIndex thru endIndex of mailboxRef\n"
+
+    footer = """
+        return my wireJoin({endIndex as text, msgCount as text, my wireRecord(msgIds), my wireRecord(msgSubjects), my wireRecord(msgSenders), my wireRecord(msgDates), my wireRecord(msgReads), my wireRecord(my dateKeys(msgDates))})
+    end tell
+end run
+""" + WIRE_HANDLERS + _PAGE_HANDLERS + DATE_HANDLERS
+    return header + body + footer
+
+
+# Streams matching messages instead of returning them: each record is
+# written with `log` (osascript prints it to stderr straight away) and
+# terminated by RS + the linefeed log appends. Messages are visited one index
+# at a time so neither Mail nor the script holds the whole mailbox.
+#
+# argv: account, mailbox, sender filter, subject filter, read filter
+# ("true"/"false"/""), limit ("0" for no limit)
+ITER_MESSAGES = """
+on run argv
+    set accountName to item 1 of argv
+    set mailboxName to item 2 of argv
+    set senderFilter to item 3 of argv
+    set subjectFilter to item 4 of argv
+    set readFilter to item 5 of argv
+    set maxCount to (item 6 of argv) as integer
+
+    tell application "Mail"
+        set mailboxRef to mailbox mailboxName of account accountName
+        set msgCount to count of messages of mailboxRef
+        set matchCount to 0
+
+        repeat with i from 1 to msgCount
+            set msg to message i of mailboxRef
+            set msgSubject to subject of msg
+            set msgSender to sender of msg
+
+            if (senderFilter is "" or msgSender contains senderFilter) and (subjectFilter is "" or msgSubject contains subjectFilter) then
+                set msgRead to read status of msg as text
+                if readFilter is "" or msgRead is readFilter then
+                    set msgId to id of msg as text
+                    set msgReceived to date received of msg
+                    set msgKey to my dateKey(msgReceived, my keyDate(0, 0))
+                    my emitRecord(my wireRecord({msgId, msgSubject, msgSender, msgReceived as text, msgRead, msgKey}))
+
+                    set matchCount to matchCount + 1
+                    if maxCount > 0 and matchCount >= maxCount then exit repeat
+                end if
+            end if
+        end repeat
+    end tell
+
+    return ""
+end run
+
+on emitRecord(theRecord)
+    log theRecord & (character id 30)
+end emitRecord
+""" + WIRE_HANDLERS + DATE_HANDLERS
+
+
+# argv: message id, include content ("true"/"false")
+GET_MESSAGE = """
+on run argv
+    set includeContent to (item 2 of argv) is "true"
+
+    tell application "Mail"
+        set msg to my findMessage(item 1 of argv)
+
+        set msgId to id of msg as text
+        set msgSubject to subject of msg
+        set msgSender to sender of msg
+        set msgReceived to date received of msg
+        set msgRead to read status of msg as text
+        set msgFlagged to flagged status of msg as text
+        if includeContent then
+            set msgContent to content of msg
+        else
+            set msgContent to ""
+        end if
+
+        set msgKey to my dateKey(msgReceived, my keyDate(0, 0))
+        return my wireRecord({msgId, msgSubject, msgSender, msgReceived as text, msgRead, msgFlagged, msgContent, msgKey})
+    end tell
+end run
+""" + WIRE_HANDLERS + FIND_MESSAGE_HANDLER + DATE_HANDLERS
+
+_COMPOSE_HEADER = """
+on run argv
+    set msgSubject to item 1 of argv
+    set msgBody to item 2 of argv
+    set toList to my splitLines(item 3 of argv)
+    set ccList to my splitLines(item 4 of argv)
+    set bccList to my splitLines(item 5 of argv)
+
+    tell application "Mail"
+        set theMessage to make new outgoing message with properties {subject:msgSubject, content:msgBody, visible:false}
+
+        tell theMessage
+            -- Add To recipients
+            repeat with addr in toList
+                make new to recipient with properties {address:addr}
+            end repeat
+
+            -- Add CC recipients
+            repeat with addr in ccList
+                make new cc recipient with properties {address:addr}
+            end repeat
+
+            -- Add BCC recipients
+            repeat with addr in bccList
+                make new bcc recipient with properties {address:addr}
+            end repeat
+"""
+
+# argv: subject, body, to, cc, bcc (recipient lists are linefeed-separated)
+SEND_EMAIL = _COMPOSE_HEADER + """
+            send
+        end tell
+
+        return "sent"
+    end tell
+end run
+""" + SPLIT_LINES_HANDLER
+
+# argv: subject, body, to, cc, bcc (recipient lists are linefeed-separated)
+CREATE_DRAFT = _COMPOSE_HEADER + """
+            -- Save as draft (don't send)
+            save
+        end tell
+
+        -- Return the message ID
+        set msgId to id of theMessage as text
+        return "draft_" & msgId
+    end tell
+end run
+""" + SPLIT_LINES_HANDLER
+
+# argv: subject, body, to, cc, bcc, attachment paths (all lists
+# linefeed-separated)
+SEND_EMAIL_WITH_ATTACHMENTS = (
+    _COMPOSE_HEADER.replace(
+        "    set bccList to my splitLines(item 5 of argv)\n",
+        "    set bccList to my splitLines(item 5 of argv)\n"
+        "    set attachmentPaths to my splitLines(item 6 of argv)\n",
+    )
+    + """
+            -- Add attachments
+            repeat with filePath in attachmentPaths
+                make new attachment with properties {file name:(POSIX file filePath)} at after last paragraph
+            end repeat
+
+            send
+        end tell
+
+        return "sent"
+    end tell
+end run
+"""
+    + SPLIT_LINES_HANDLER
+)
+
+# argv: message id
+GET_ATTACHMENTS = """
+on run argv
+    tell application "Mail"
+        set msg to my findMessage(item 1 of argv)
+        set attList to mail attachments of msg
+
+        set resultList to {}
+        repeat with att in attList
+            set attName to name of att
+            set attType to MIME type of att
+            set attSize to file size of att as text
+            set attDownloaded to downloaded of att as text
+
+            set end of resultList to my wireRecord({attName, attType, attSize, attDownloaded})
+        end repeat
+
+        return my wireJoin(resultList)
+    end tell
+end run
+""" + WIRE_HANDLERS + FIND_MESSAGE_HANDLER
+
+# Writes the raw RFC 822 source of a message to a file (UTF-8), so the
+# connector can extract attachments from it without holding it in memory
+# (see mime_stream). Mail's own `save` takes one Apple Event per attachment
+# and reports nothing about the files.
+#
+# argv: message id, file path
+SAVE_SOURCE = """
+on run argv
+    tell application "Mail"
+        set msgSource to source of (my findMessage(item 1 of argv))
+    end tell
+
+    set fileRef to open for access (POSIX file (item 2 of argv)) with write permission
+    try
+        set eof of fileRef to 0
+        write msgSource to fileRef as «class utf8»
+    on error errMsg number errNum
+        close access fileRef
+        error errMsg number errNum
+    end try
+    close access fileRef
+    return "ok"
+end run
+""" + FIND_MESSAGE_HANDLER
+
+# Body of the set-based mutation templates. The connector groups message IDs
+# by their indexed mailbox and passes one argument per group,
+# "<account><US><mailbox><US><id><US><id>...", with an empty account and
+# mailbox for ids whose location is unknown. Each group costs one query for
+# the ids present and one set-based statement on `messages of mb whose id is
+# in {...}`, however many ids it has; ids the mailbox does not have (stale
+# hints, unknown locations) fall back to findMessage one by one. The result
+# is a wire record of the ids that were changed.
+_BULK_MUTATION = """
+on run argv
+PARAMS
+    set groupList to items FIRST_GROUP thru -1 of argv
+    set doneIds to {}
+
+    tell application "Mail"
+SETUP
+        repeat with groupText in groupList
+            set savedDelimiters to AppleScript's text item delimiters
+            set AppleScript's text item delimiters to (character id 31)
+            set groupParts to text items of (groupText as text)
+            set AppleScript's text item delimiters to savedDelimiters
+
+            set idList to {}
+            repeat with idText in items 3 thru -1 of groupParts
+                set end of idList to idText as integer
+            end repeat
+
+            set foundIds to {}
+            if item 1 of groupParts is not "" then
+                try
+                    set mb to mailbox (item 2 of groupParts) of account (item 1 of groupParts)
+                    set foundIds to id of (messages of mb whose id is in idList)
+                    if foundIds is not {} then
+GROUP_ACTION
+                    end if
+                on error
+                    set foundIds to {}
+                end try
+            end if
+            set doneIds to doneIds & foundIds
+
+            repeat with msgId in idList
+                if foundIds does not contain (contents of msgId) then
+                    try
+                        set msg to my findMessage(msgId as text)
+MESSAGE_ACTION
+                        set end of doneIds to contents of msgId
+                    end try
+                end if
+            end repeat
+        end repeat
+    end tell
+
+    return my wireRecord(doneIds)
+end run
+"""
+
+
+def _bulk_mutation_script(
+    params: Sequence[str], action: Sequence[str], setup: Sequence[str] = ()
+) -> str:
+    """
+    Build a set-based mutation template.
+
+    Args:
+        params: Statements reading the leading (non-group) arguments
+        action: Statements applied to ``TARGET``: the set of messages found
+            in a group's mailbox, or a single message
+        setup: Statements run inside ``tell application "Mail"`` before the
+            groups
+
+    Returns:
+        AppleScript source
+    """
+
+    def block(lines: Sequence[str], indent: int, target: str = "") -> str:
+        return "".join(f"{' ' * indent}{line.replace('TARGET', target)}\n" for line in lines)
+
+    return (
+        _BULK_MUTATION.replace("PARAMS\n", block(params, 4))
+        .replace("FIRST_GROUP", str(len(params) + 1))
+        .replace("SETUP\n", block(setup, 8))
+        .replace("GROUP_ACTION\n", block(action, 24, "(messages of mb whose id is in foundIds)"))
+        .replace("MESSAGE_ACTION\n", block(action, 24, "msg"))
+        + WIRE_HANDLERS
+        + FIND_MESSAGE_HANDLER
+    )
+
+
+# argv: account, destination mailbox, message id groups...
+MOVE_MESSAGES = _bulk_mutation_script(
+    params=["set accountName to item 1 of argv", "set destinationName to item 2 of argv"],
+    setup=["set destMailbox to mailbox destinationName of account accountName"],
+    action=["move TARGET to destMailbox"],
+)
+
+# Gmail requires copy + delete approach to properly handle labels
+# argv: account, destination mailbox, message id groups...
+MOVE_MESSAGES_GMAIL = _bulk_mutation_script(
+    params=["set accountName to item 1 of argv", "set destinationName to item 2 of argv"],
+    setup=["set destMailbox to mailbox destinationName of account accountName"],
+    action=["duplicate TARGET to destMailbox", "delete TARGET"],
+)
+
+# argv: flag index, flagged status ("true"/"false"), message id groups...
+FLAG_MESSAGE = _bulk_mutation_script(
+    params=[
+        "set newFlagIndex to (item 1 of argv) as integer",
+        'set newFlaggedStatus to (item 2 of argv) is "true"',
+    ],
+    action=[
+        "set flag index of TARGET to newFlagIndex",
+        "set flagged status of TARGET to newFlaggedStatus",
+    ],
+)
+
+# argv: read status ("true"/"false"), message id groups...
+MARK_AS_READ = _bulk_mutation_script(
+    params=['set newStatus to (item 1 of argv) is "true"'],
+    action=["set read status of TARGET to newStatus"],
+)
+
+# argv: account, name
+CREATE_MAILBOX = """
+on run argv
+    set accountName to item 1 of argv
+    set newName to item 2 of argv
+
+    tell application "Mail"
+        set accountRef to account accountName
+        make new mailbox at accountRef with properties {name:newName}
+        return "success"
+    end tell
+end run
+"""
+
+# argv: account, name, parent mailbox
+CREATE_NESTED_MAILBOX = """
+on run argv
+    set accountName to item 1 of argv
+    set newName to item 2 of argv
+    set parentName to item 3 of argv
+
+    tell application "Mail"
+        set accountRef to account accountName
+        set parentMailbox to mailbox parentName of accountRef
+        make new mailbox at parentMailbox with properties {name:newName}
+        return "success"
+    end tell
+end run
+"""
+
+# argv: message id groups...
+DELETE_MESSAGES = _bulk_mutation_script(params=[], action=["delete TARGET"])
+
+_MATCHING_HEADER = """
+on run argv
+    set accountName to item 1 of argv
+    set mailboxName to item 2 of argv
+    set senderFilter to item 3 of argv
+    set subjectFilter to item 4 of argv
+    set readFilter to (item 5 of argv) is "true"
+    set cutoffDate to (current date) - ((item 6 of argv) as integer) * days
+    set maxCount to (item 7 of argv) as integer
+    set dryRun to (item 8 of argv) is "true"
+PARAMS
+
+    tell application "Mail"
+        set accountRef to account accountName
+        set mailboxRef to mailbox mailboxName of accountRef
+        set msgCount to count of TARGET
+        if dryRun or msgCount is 0 or msgCount > maxCount then
+            return my wireRecord({msgCount, 0})
+        end if
+ACTION
+        return my wireRecord({msgCount, msgCount})
+    end tell
+end run
+"""
+
+# Per action of update_matching_script: statements reading its arguments
+# (argv items 9...) and statements applied to TARGET, the matching set
+_MATCHING_ACTIONS: dict[str, tuple[tuple[str, ...], tuple[str, ...]]] = {
+    "mark_as_read": (
+        ('set newStatus to (item 9 of argv) is "true"',),
+        ("set read status of TARGET to newStatus",),
+    ),
+    "flag_message": (
+        (
+            "set newFlagIndex to (item 9 of argv) as integer",
+            'set newFlaggedStatus to (item 10 of argv) is "true"',
+        ),
+        (
+            "set flag index of TARGET to newFlagIndex",
+            "set flagged status of TARGET to newFlaggedStatus",
+        ),
+    ),
+    "move_messages": (
+        ("set destinationName to item 9 of argv",),
+        ("move TARGET to mailbox destinationName of accountRef",),
+    ),
+    # Gmail requires copy + delete approach to properly handle labels
+    "move_messages_gmail": (
+        ("set destinationName to item 9 of argv",),
+        ("duplicate TARGET to mailbox destinationName of accountRef", "delete TARGET"),
+    ),
+    "delete_messages": ((), ("delete TARGET",)),
+}
+
+
+def update_matching_script(
+    action: str,
+    sender: bool = False,
+    subject: bool = False,
+    read_status: bool = False,
+    older_than: bool = False,
+) -> str:
+    """
+    Build the template that applies an action to the messages matching a filter.
+
+    The filter is a ``whose`` clause on one mailbox, so Mail resolves the
+    matching set itself: the script counts it, then changes all of it with
+    one statement per property set, however many messages match. Nothing
+    is changed on a dry run, or when more than the given maximum match.
+    The result is a wire record of the number of matching messages and
+    the number changed.
+
+    argv: account, mailbox, sender filter, subject filter, read filter
+    ("true"/"false"/""), age in days, maximum, dry run ("true"/"false"),
+    then the action's own arguments: read status for mark_as_read; flag
+    index and flagged status for flag_message; destination mailbox (of the
+    same account) for move_messages and move_messages_gmail; none for
+    delete_messages
+
+    Args:
+        action: Key of _MATCHING_ACTIONS
+        sender: Filter on sender
+        subject: Filter on subject
+        read_status: Filter on read status
+        older_than: Only messages received before the age cutoff
+
+    Returns:
+        AppleScript template source
+    """
+    conditions = _filter_conditions(sender, subject, read_status)
+    if older_than:
+        conditions.append("date received < cutoffDate")
+
+    if conditions:
+        target = f"(messages of mailboxRef whose {' and '.join(conditions)})"
+    else:
+        target = "messages of mailboxRef"
+
+    params, statements = _MATCHING_ACTIONS[action]
+    return (
+        _MATCHING_HEADER.replace("PARAMS\n", "".join(f"    {line}\n" for line in params))
+        .replace("ACTION\n", "".join(f"        {line}\n" for line in statements))
+        .replace("TARGET", target)
+        + WIRE_HANDLERS
+    )
+
+
+# argv: message id, body, reply to all ("true"/"false")
+REPLY_TO_MESSAGE = """
+on run argv
+    set replyBody to item 2 of argv
+    set replyAll to (item 3 of argv) is "true"
+
+    tell application "Mail"
+        set origMsg to my findMessage(item 1 of argv)
+
+        -- Create reply message
+        if replyAll then
+            set replyMsg to reply origMsg with reply to all
+        else
+            set replyMsg to reply origMsg
+        end if
+
+        -- Set body content
+        set content of replyMsg to replyBody
+
+        -- Get the message ID
+        set replyId to id of replyMsg
+
+        -- Send the message
+        send replyMsg
+
+        return replyId
+    end tell
+end run
+""" + FIND_MESSAGE_HANDLER
+
+# argv: message id, body, to, cc, bcc (recipient lists are linefeed-separated)
+FORWARD_MESSAGE = """
+on run argv
+    set fwdBody to item 2 of argv
+    set toRecipients to my splitLines(item 3 of argv)
+    set ccRecipients to my splitLines(item 4 of argv)
+    set bccRecipients to my splitLines(item 5 of argv)
+
+    tell application "Mail"
+        set origMsg to my findMessage(item 1 of argv)
+
+        -- Create forward message
+        set fwdMsg to forward origMsg
+
+        -- Add body text before forwarded content
+        if fwdBody is not "" then
+            set origContent to content of fwdMsg
+            set content of fwdMsg to fwdBody & return & return & origContent
+        end if
+
+        -- Set recipients
+        repeat with recipientAddr in toRecipients
+            make new to recipient at end of to recipients of fwdMsg with properties {address:recipientAddr}
+        end repeat
+
+        repeat with recipientAddr in ccRecipients
+            make new cc recipient at end of cc recipients of fwdMsg with properties {address:recipientAddr}
+        end repeat
+
+        repeat with recipientAddr in bccRecipients
+            make new bcc recipient at end of bcc recipients of fwdMsg with properties {address:recipientAddr}
+        end repeat
+
+        -- Get the message ID
+        set fwdId to id of fwdMsg
+
+        -- Send the message
+        send fwdMsg
+
+        return fwdId
+    end tell
+end run
+""" + SPLIT_LINES_HANDLER + FIND_MESSAGE_HANDLER
+
+
+_RUN_HANDLER = re.compile(r"^on run argv$", re.MULTILINE)
+_END_RUN = re.compile(r"^end run$", re.MULTILINE)
+
+_BATCH_HEADER = """
+on run argv
+    set marker to item 1 of argv
+    set opCount to (item 2 of argv) as integer
+    set envelope to {}
+    set pos to 3
+
+    repeat opCount times
+        set handlerIndex to (item pos of argv) as integer
+        set argCount to (item (pos + 1) of argv) as integer
+        if argCount > 0 then
+            set opArgs to items (pos + 2) thru (pos + 1 + argCount) of argv
+        else
+            set opArgs to {}
+        end if
+        set pos to pos + 2 + argCount
+
+        -- One failing operation must not abort the others
+        try
+"""
+
+_BATCH_FOOTER = """
+            set end of envelope to marker & "ok" & linefeed & (opResult as text)
+        on error errMsg number errNum
+            set end of envelope to marker & "error " & errNum & linefeed & errMsg
+        end try
+    end repeat
+
+    set AppleScript's text item delimiters to ""
+    set output to envelope as text
+    return output
+end run
+"""
+
+
+# Handlers several templates append; a batch script defines each one once
+_SHARED_HANDLERS = (
+    SPLIT_LINES_HANDLER,
+    WIRE_HANDLERS,
+    FIND_MESSAGE_HANDLER,
+    _PAGE_HANDLERS,
+    DATE_HANDLERS,
+)
+
+
+def batch_script(sources: list[str]) -> str:
+    """
+    Combine operation templates into one script that runs a list of calls.
+
+    Each template's run handler becomes a ``batchOp<N>`` handler (numbered
+    from 1 in the order given) and a dispatching run handler calls them.
+    Callers should pass the distinct templates in a canonical order so that
+    the same set of templates always yields the same (cached) source.
+
+    argv: marker, operation count, then per operation: handler number,
+    argument count, arguments
+
+    The result is, per operation, the marker followed by either
+    ``ok\\n<output>`` or ``error <number>\\n<message>``.
+
+    Args:
+        sources: Distinct template sources
+
+    Returns:
+        AppleScript source of the batch script
+    """
+    handlers = []
+    dispatch = []
+    shared: list[str] = []
+
+    for number, source in enumerate(sources, start=1):
+        name = f"batchOp{number}"
+        # Shared handlers may only be defined once in the combined script
+        for handler in _SHARED_HANDLERS:
+            if handler in source:
+                source = source.replace(handler, "")
+                if handler not in shared:
+                    shared.append(handler)
+        source = _RUN_HANDLER.sub(f"on {name}(argv)", source)
+        source = _END_RUN.sub(f"end {name}", source)
+        handlers.append(source)
+
+        keyword = "if" if number == 1 else "else if"
+        dispatch.append(
+            f"            {keyword} handlerIndex is {number} then\n"
+            f"                set opResult to my {name}(opArgs)"
+        )
+
+    script = _BATCH_HEADER + "\n".join(dispatch) + "\n            end if" + _BATCH_FOOTER
+    script += "".join(handlers) + "".join(shared)
+    return script
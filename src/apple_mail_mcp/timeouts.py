@@ -0,0 +1,220 @@
+"""
+Adaptive per-operation script timeouts.
+
+A single fixed timeout is wrong for almost everything: a ``list_accounts``
+that hangs for a minute should have been killed long before, while a search
+over a large mailbox can legitimately take longer. Each operation keeps a
+rolling window of its observed run times instead, and its timeout is a
+multiple of a high percentile of that window, clamped to the floor and
+ceiling of its policy. Until enough samples exist the connector's configured
+timeout is used, capped at the ceiling.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from .scheduler import BULK, INTERACTIVE, MUTATION, SEND, LaneScheduler
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TimeoutPolicy:
+    """How an operation's timeout follows its observed latency."""
+
+    floor: float
+    """Shortest timeout in seconds, however fast the operation usually is."""
+
+    ceiling: float
+    """Longest timeout in seconds, however slow the operation has been."""
+
+    multiplier: float = 3.0
+    """Headroom over the percentile latency."""
+
+    percentile: float = 0.99
+
+
+# Policies by scheduler lane; OPERATION_POLICIES takes precedence
+LANE_POLICIES: dict[str, TimeoutPolicy] = {
+    INTERACTIVE: TimeoutPolicy(floor=5, ceiling=30),
+    SEND: TimeoutPolicy(floor=15, ceiling=120),
+    MUTATION: TimeoutPolicy(floor=10, ceiling=120),
+    BULK: TimeoutPolicy(floor=15, ceiling=600),
+}
+
+OPERATION_POLICIES: dict[str, TimeoutPolicy] = {
+    # A batch runs up to 50 operations in one script
+    "batch": TimeoutPolicy(floor=15, ceiling=600),
+}
+
+# Timeout for scripts started in the current context, overriding the
+# adaptive value (see AdaptiveTimeouts.override)
+timeout_override: ContextVar[float | None] = ContextVar("timeout_override", default=None)
+
+
+class AdaptiveTimeouts:
+    """Latency windows and timeout policies per operation."""
+
+    def __init__(
+        self,
+        default: float = 60,
+        policies: dict[str, TimeoutPolicy] | None = None,
+        window: int = 1000,
+        min_samples: int = 20,
+    ) -> None:
+        """
+        Initialize the timeouts.
+
+        Args:
+            default: Timeout in seconds until an operation has enough samples
+            policies: Per-operation policies, merged over OPERATION_POLICIES
+            window: Run times kept per operation
+            min_samples: Samples needed before the timeout adapts
+        """
+        self.default = default
+        self.policies = {**OPERATION_POLICIES, **(policies or {})}
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque[float]] = {}
+        self._timeouts: dict[str, int] = {}
+        self._events: deque[dict[str, Any]] = deque(maxlen=100)
+
+    def policy_for(self, operation: str | None) -> TimeoutPolicy:
+        """
+        Return the policy for an operation.
+
+        Args:
+            operation: Connector operation name
+
+        Returns:
+            The operation's own policy, or its scheduler lane's policy
+        """
+        if operation in self.policies:
+            return self.policies[operation]
+        return LANE_POLICIES.get(LaneScheduler.lane_for(operation), LANE_POLICIES[INTERACTIVE])
+
+    def timeout_for(self, operation: str | None) -> float:
+        """
+        Return the timeout for the next run of an operation.
+
+        Args:
+            operation: Connector operation name
+
+        Returns:
+            Timeout in seconds: the override set for the current context if
+            any, otherwise percentile latency times the policy multiplier,
+            clamped to the policy's floor and ceiling (the default timeout,
+            capped at the ceiling, while there are too few samples)
+        """
+        override = timeout_override.get()
+        if override is not None:
+            return override
+
+        with self._lock:
+            samples = sorted(self._samples.get(operation or "", ()))
+        return self._adaptive_timeout(operation, samples)
+
+    def _adaptive_timeout(self, operation: str | None, samples: list[float]) -> float:
+        policy = self.policy_for(operation)
+        if len(samples) < self.min_samples:
+            return min(self.default, policy.ceiling)
+        index = min(int(len(samples) * policy.percentile), len(samples) - 1)
+        return min(max(samples[index] * policy.multiplier, policy.floor), policy.ceiling)
+
+    def record(self, operation: str | None, seconds: float) -> None:
+        """
+        Record the run time of a completed script.
+
+        Args:
+            operation: Connector operation name
+            seconds: Run time in seconds
+        """
+        key = operation or ""
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def record_timeout(self, operation: str | None, timeout: float, input_size: int) -> None:
+        """
+        Record a script that was killed for exceeding its timeout.
+
+        The timeout also goes into the latency window: the real run time was
+        at least that long, and counting it lets an operation that is
+        legitimately slow grow its timeout up to the policy ceiling.
+
+        Args:
+            operation: Connector operation name
+            timeout: Timeout that was exceeded, in seconds
+            input_size: Number of message IDs the script was given (for
+                other operations, the number of its arguments)
+        """
+        key = operation or ""
+        logger.warning(
+            f"{operation or 'script'} timed out after {timeout:.1f}s (input size {input_size})"
+        )
+        self.record(operation, timeout)
+        with self._lock:
+            self._timeouts[key] = self._timeouts.get(key, 0) + 1
+            self._events.append(
+                {
+                    "operation": operation,
+                    "timeout": timeout,
+                    "input_size": input_size,
+                    "time": time.time(),
+                }
+            )
+
+    @staticmethod
+    @contextmanager
+    def override(seconds: float | None) -> Iterator[None]:
+        """
+        Use a fixed timeout for scripts started in this context.
+
+        Args:
+            seconds: Timeout in seconds, or None to keep the adaptive timeout
+        """
+        if seconds is None:
+            yield
+            return
+        token = timeout_override.set(seconds)
+        try:
+            yield
+        finally:
+            timeout_override.reset(token)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return latency percentiles, current timeouts and timeout events.
+
+        Returns:
+            Dictionary with per-operation metrics (seconds) and the most
+            recent timeout events
+        """
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+            timeouts = dict(self._timeouts)
+            events = list(self._events)
+
+        operations = {}
+        for key, values in samples.items():
+            operations[key or "script"] = {
+                "samples": len(values),
+                "p50": values[len(values) // 2],
+                "p99": values[min(int(len(values) * 0.99), len(values) - 1)],
+                "timeout": self._adaptive_timeout(key or None, values),
+                "timeouts": timeouts.get(key, 0),
+            }
+
+        return {"operations": operations, "recent_timeouts": events}
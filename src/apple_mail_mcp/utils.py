@@ -2,7 +2,9 @@
 Utility functions for Apple Mail MCP.
 """
 
+import calendar
 import re
+from datetime import datetime, timedelta
 from typing import Any
 
 
@@ -104,6 +106,97 @@ def parse_date_filter(date_str: str) -> str:
     return f'date "{date_str}"'
 
 
+def _months_before(moment: datetime, months: int) -> datetime:
+    year, month = divmod(moment.year * 12 + moment.month - 1 - months, 12)
+    # March 31 minus one month is the last day of February
+    day = min(moment.day, calendar.monthrange(year, month + 1)[1])
+    return moment.replace(year=year, month=month + 1, day=day)
+
+
+def parse_received_date(date_str: str, now: datetime | None = None) -> datetime:
+    """
+    Convert a human-readable date filter to a local date and time.
+
+    Accepts what parse_date_filter does ("7 days ago", "2 weeks ago",
+    "last month", "2024-01-15"), plus "today", "yesterday" and ISO date
+    and time ("2024-01-15T09:30"). Unlike parse_date_filter, the result is
+    a value: scripts receive it through argv, never as script text.
+
+    Args:
+        date_str: Date filter text
+        now: Current local time (default: datetime.now())
+
+    Returns:
+        Naive local datetime
+
+    Raises:
+        ValueError: If the text is not a date filter
+    """
+    now = now or datetime.now()
+    text = date_str.strip().lower()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if text == "today":
+        return midnight
+    if text == "yesterday":
+        return midnight - timedelta(days=1)
+
+    match = re.fullmatch(r"(\d+)\s+(day|week|month|year)s?\s+ago", text)
+    amount, unit = (int(match.group(1)), match.group(2)) if match else (1, "")
+    if not match and text.startswith("last "):
+        unit = text[5:].strip().rstrip("s")
+    if unit == "day":
+        return now - timedelta(days=amount)
+    if unit == "week":
+        return now - timedelta(weeks=amount)
+    if unit in ("month", "year"):
+        return _months_before(now, amount * (12 if unit == "year" else 1))
+
+    try:
+        moment = datetime.fromisoformat(date_str.strip())
+    except ValueError:
+        raise ValueError(f"Unrecognized date: {date_str!r}") from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def local_days_seconds(moment: datetime) -> tuple[int, int]:
+    """
+    Split a naive local datetime into days and seconds since 1970-01-01.
+
+    AppleScript dates are local wall-clock times; scripts rebuild a date
+    from these two numbers (see templates.DATE_HANDLERS) without parsing
+    date text in the user's locale or knowing the time zone.
+
+    Args:
+        moment: Naive local datetime
+
+    Returns:
+        (days, seconds)
+    """
+    delta = moment - datetime(1970, 1, 1)
+    return delta.days, delta.seconds
+
+
+def local_timestamp(days: int, seconds: int) -> int:
+    """
+    Convert local days and seconds since 1970-01-01 to epoch seconds.
+
+    The inverse of local_days_seconds: scripts report dates in this form
+    (see templates.DATE_HANDLERS), which unlike date text does not depend
+    on the user's locale.
+
+    Args:
+        days: Local days since 1970-01-01
+        seconds: Seconds on top of the days (may be negative)
+
+    Returns:
+        Epoch seconds
+    """
+    return int((datetime(1970, 1, 1) + timedelta(days=days, seconds=seconds)).timestamp())
+
+
 def validate_email(email: str) -> bool:
     """
     Validate email address format.
@@ -118,6 +211,28 @@ def validate_email(email: str) -> bool:
     return bool(re.match(pattern, email))
 
 
+def validate_message_id(message_id: str) -> bool:
+    """
+    Validate a Mail message ID.
+
+    Mail message IDs are positive integers; anything else is rejected before
+    it reaches a script.
+
+    Args:
+        message_id: Message ID to validate
+
+    Returns:
+        True if valid, False otherwise
+
+    Example:
+        >>> validate_message_id("12345")
+        True
+        >>> validate_message_id("1} & do shell script")
+        False
+    """
+    return bool(re.fullmatch(r"[0-9]{1,19}", message_id))
+
+
 def sanitize_input(value: Any) -> str:
     """
     Sanitize user input for safety.
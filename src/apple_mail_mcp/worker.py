@@ -0,0 +1,327 @@
+"""
+Persistent AppleScript runner process.
+
+Instead of spawning ``osascript`` for every call, the worker keeps one
+long-lived runner process alive and exchanges framed requests with it over
+its stdin/stdout pipes.
+
+Frame format (both directions)::
+
+    <payload length in bytes, ASCII decimal>\\n<UTF-8 JSON payload>
+
+Requests are ``{"id": 1, "type": "run", "script": "..."}`` (optionally with
+``"args"`` for the script's ``on run argv`` handler and ``"digest"``, the
+content hash the runner caches the compiled script under) or
+``{"id": 2, "type": "ping"}``. Replies echo the id and carry either
+``{"ok": true, "output": "..."}`` or
+``{"ok": false, "error": "...", "number": -1728}``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any
+
+from .exceptions import MailAppleScriptError, MailTimeoutError
+from .templates import script_digest
+
+logger = logging.getLogger(__name__)
+
+RUNNER_SCRIPT = Path(__file__).parent / "runner.js"
+DEFAULT_RUNNER_COMMAND = ["/usr/bin/osascript", "-l", "JavaScript", str(RUNNER_SCRIPT)]
+
+# Largest frame we are willing to read (guards against a corrupted header)
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+
+class WorkerCrashedError(MailAppleScriptError):
+    """The runner process exited or closed its pipes mid-request."""
+
+    pass
+
+
+class ScriptFailedError(MailAppleScriptError):
+    """The runner executed the script and it raised an AppleScript error."""
+
+    def __init__(self, message: str, number: int | None = None) -> None:
+        super().__init__(message)
+        self.number = number
+
+
+def write_frame(stream: IO[bytes], payload: dict[str, Any]) -> None:
+    """
+    Write one length-prefixed JSON frame to a binary stream.
+
+    Args:
+        stream: Binary stream to write to
+        payload: JSON-serializable payload
+    """
+    data = json.dumps(payload).encode("utf-8")
+    stream.write(str(len(data)).encode("ascii") + b"\n" + data)
+    stream.flush()
+
+
+def read_frame(stream: IO[bytes]) -> dict[str, Any] | None:
+    """
+    Read one length-prefixed JSON frame from a binary stream.
+
+    Args:
+        stream: Binary stream to read from
+
+    Returns:
+        Decoded payload, or None on end of stream
+
+    Raises:
+        ValueError: If the frame header or payload is malformed
+    """
+    header = stream.readline()
+    if not header:
+        return None
+
+    try:
+        size = int(header.strip())
+    except ValueError:
+        raise ValueError(f"Malformed frame header: {header[:40]!r}") from None
+
+    if size < 0 or size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame size out of range: {size}")
+
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+
+    payload: dict[str, Any] = json.loads(data.decode("utf-8"))
+    return payload
+
+
+class AppleScriptWorker:
+    """
+    Long-lived runner process that executes AppleScript on request.
+
+    Requests are serialized: the runner handles one script at a time, which
+    matches how Mail.app processes Apple Events anyway. A crashed runner is
+    restarted on the next request; a request that exceeds its timeout kills
+    the runner, since an in-flight Apple Event cannot be cancelled.
+    """
+
+    def __init__(
+        self,
+        command: list[str] | None = None,
+        timeout: float = 60,
+        health_check_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+    ) -> None:
+        """
+        Initialize the worker (the process is started lazily).
+
+        Args:
+            command: Runner command line (defaults to the bundled JXA runner)
+            timeout: Default per-request timeout in seconds
+            health_check_interval: Ping the runner before a request if it has
+                been idle for longer than this many seconds
+            ping_timeout: Timeout in seconds for health-check pings
+        """
+        self.command = list(command) if command else list(DEFAULT_RUNNER_COMMAND)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+
+        self.restarts = 0
+        self._process: subprocess.Popen[bytes] | None = None
+        self._replies: queue.Queue[dict[str, Any] | None] = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._last_activity = 0.0
+        self._needs_restart = False
+
+    @property
+    def pid(self) -> int | None:
+        """PID of the running runner process, if any."""
+        return self._process.pid if self.is_alive() and self._process else None
+
+    def is_alive(self) -> bool:
+        """Return True if the runner process is running."""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """Start the runner process if it is not already running."""
+        with self._lock:
+            self._ensure_started()
+
+    def stop(self) -> None:
+        """Stop the runner process."""
+        with self._lock:
+            self._kill(crashed=False)
+
+    def ping(self, timeout: float | None = None) -> bool:
+        """
+        Check that the runner is responsive.
+
+        Args:
+            timeout: Seconds to wait for the reply (default: ping_timeout)
+
+        Returns:
+            True if the runner answered, False otherwise (the runner is killed)
+        """
+        with self._lock:
+            return self._ping(timeout)
+
+    def run(self, script: str, timeout: float | None = None, args: list[str] | None = None) -> str:
+        """
+        Execute a script in the runner.
+
+        With ``args``, the runner compiles the script once (keyed by its
+        content hash) and calls its run handler with the arguments.
+
+        Args:
+            script: AppleScript source
+            timeout: Per-request timeout in seconds (default: worker timeout)
+            args: Arguments for the script's run handler
+
+        Returns:
+            Script result as text
+
+        Raises:
+            ScriptFailedError: If the script raised an error
+            WorkerCrashedError: If the runner died while handling the request
+            MailTimeoutError: On timeout
+        """
+        request_timeout = self.timeout if timeout is None else timeout
+
+        request: dict[str, Any] = {"type": "run", "script": script}
+        if args is not None:
+            request["args"] = list(args)
+            request["digest"] = script_digest(script)
+
+        with self._lock:
+            self._ensure_started()
+
+            idle = time.monotonic() - self._last_activity
+            if idle > self.health_check_interval and not self._ping(None):
+                # Unresponsive runner was killed by _ping; start a fresh one
+                self._ensure_started()
+
+            reply = self._request(request, request_timeout)
+
+        if reply.get("ok"):
+            return str(reply.get("output", ""))
+
+        raise ScriptFailedError(str(reply.get("error", "")), reply.get("number"))
+
+    def _ensure_started(self) -> None:
+        if self.is_alive():
+            return
+
+        if self._process is not None:
+            self._kill()
+
+        if self._needs_restart:
+            logger.warning("AppleScript runner exited, restarting")
+            self.restarts += 1
+            self._needs_restart = False
+
+        logger.debug(f"Starting AppleScript runner: {self.command}")
+        process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._process = process
+        self._replies = queue.Queue()
+        self._last_activity = time.monotonic()
+
+        reader = threading.Thread(
+            target=self._read_replies,
+            args=(process, self._replies),
+            name="applescript-runner-reader",
+            daemon=True,
+        )
+        reader.start()
+
+    def _kill(self, crashed: bool = True) -> None:
+        process, self._process = self._process, None
+        if process is None:
+            return
+
+        self._needs_restart = crashed
+
+        if process.poll() is None:
+            process.kill()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            logger.error(f"AppleScript runner {process.pid} did not exit after kill")
+
+        for stream in (process.stdin, process.stdout):
+            if stream is not None:
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+
+    def _ping(self, timeout: float | None) -> bool:
+        ping_timeout = self.ping_timeout if timeout is None else timeout
+        try:
+            self._ensure_started()
+            reply = self._request({"type": "ping"}, ping_timeout)
+        except MailAppleScriptError as e:
+            logger.warning(f"AppleScript runner health check failed: {e}")
+            return False
+        return bool(reply.get("ok"))
+
+    def _request(self, payload: dict[str, Any], timeout: float) -> dict[str, Any]:
+        process = self._process
+        assert process is not None and process.stdin is not None
+
+        self._next_id += 1
+        request_id = self._next_id
+
+        try:
+            write_frame(process.stdin, {"id": request_id, **payload})
+        except (BrokenPipeError, OSError) as e:
+            self._kill()
+            raise WorkerCrashedError(f"AppleScript runner is not accepting requests: {e}") from e
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                reply = self._replies.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                self._kill()
+                raise MailTimeoutError(f"Script execution timeout after {timeout:g}s") from None
+
+            if reply is None:
+                self._kill()
+                raise WorkerCrashedError("AppleScript runner exited during request")
+
+            if reply.get("id") == request_id:
+                self._last_activity = time.monotonic()
+                return reply
+
+            logger.warning(f"Discarding stale runner reply {reply.get('id')}")
+
+    @staticmethod
+    def _read_replies(
+        process: subprocess.Popen[bytes], replies: queue.Queue[dict[str, Any] | None]
+    ) -> None:
+        assert process.stdout is not None
+        try:
+            while True:
+                frame = read_frame(process.stdout)
+                if frame is None:
+                    break
+                replies.put(frame)
+        except (ValueError, OSError) as e:
+            logger.error(f"AppleScript runner protocol error: {e}")
+        finally:
+            replies.put(None)
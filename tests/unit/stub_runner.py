@@ -0,0 +1,57 @@
+"""
+Stub AppleScript runner used by the worker tests.
+
+Speaks the same framed protocol as runner.js but interprets a tiny command
+language instead of AppleScript:
+
+    echo <text>    reply with <text>
+    fail <text>    reply with an AppleScript-style error
+    sleep <secs>   sleep, then reply "slept"
+    crash          exit without replying
+    pid            reply with the runner's PID
+    argv           reply with the request's args, joined with "|"
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+from apple_mail_mcp.worker import read_frame, write_frame  # noqa: E402
+
+
+def handle(script: str, args: list[str] | None) -> dict:
+    command, _, arg = script.strip().partition(" ")
+    if command == "echo":
+        return {"ok": True, "output": arg}
+    if command == "fail":
+        return {"ok": False, "error": arg, "number": -1728}
+    if command == "sleep":
+        time.sleep(float(arg))
+        return {"ok": True, "output": "slept"}
+    if command == "crash":
+        sys.exit(1)
+    if command == "pid":
+        return {"ok": True, "output": str(os.getpid())}
+    if command == "argv":
+        return {"ok": True, "output": "|".join(args or [])}
+    return {"ok": False, "error": f"Unknown command: {command}"}
+
+
+def main() -> None:
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    while True:
+        request = read_frame(stdin)
+        if request is None:
+            return
+        if request["type"] == "ping":
+            reply = {"ok": True, "output": "pong"}
+        else:
+            reply = handle(request["script"], request.get("args"))
+        reply["id"] = request["id"]
+        write_frame(stdout, reply)
+
+
+if __name__ == "__main__":
+    main()
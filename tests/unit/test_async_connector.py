@@ -0,0 +1,171 @@
+"""Unit tests for the asyncio connector."""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from apple_mail_mcp.async_connector import AsyncAppleMailConnector, run_osascript
+from apple_mail_mcp.exceptions import MailAccountNotFoundError, MailAppleScriptError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.wire import encode_records
+
+FAKE_OSASCRIPT = f"""#!{sys.executable}
+import os, sys, time
+
+script = sys.stdin.read() if sys.argv[1] == "-" else " ".join(sys.argv[2:])
+command, _, arg = script.strip().partition(" ")
+
+if command == "sleep":
+    with open(arg, "w") as f:
+        f.write(str(os.getpid()))
+    time.sleep(30)
+elif command == "fail":
+    sys.stderr.write(arg + "\\n")
+    sys.exit(1)
+else:
+    print(arg)
+"""
+
+
+def pid_alive(pid: int) -> bool:
+    """Return True if a process with this PID is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # Reaped zombies don't count; a killed child may linger briefly
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split()[2] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+async def wait_for_file(path: Path) -> int:
+    """Wait until the fake script wrote its PID."""
+    for _ in range(200):
+        if path.exists() and path.read_text():
+            return int(path.read_text())
+        await asyncio.sleep(0.01)
+    raise AssertionError("fake osascript did not start")
+
+
+@pytest.fixture
+def fake_osascript(tmp_path: Path):
+    """Install a fake osascript executable."""
+    script = tmp_path / "osascript"
+    script.write_text(FAKE_OSASCRIPT)
+    script.chmod(0o755)
+    with patch("apple_mail_mcp.mail_connector.OSASCRIPT", str(script)):
+        yield script
+
+
+class TestRunOsascript:
+    """Tests for run_osascript."""
+
+    async def test_success(self) -> None:
+        """Test capturing output."""
+        code, out, err = await run_osascript(
+            [sys.executable, "-c", "import sys; print(sys.stdin.read().upper())"], "hi", 10
+        )
+        assert (code, out.strip(), err) == (0, "HI", "")
+
+    async def test_timeout_kills_process(self, tmp_path: Path) -> None:
+        """Test that a timed out process is killed."""
+        pid_file = tmp_path / "pid"
+        command = [
+            sys.executable,
+            "-c",
+            f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)",
+        ]
+
+        with pytest.raises(subprocess.TimeoutExpired):
+            await run_osascript(command, None, 0.5)
+
+        assert not pid_alive(int(pid_file.read_text()))
+
+
+class TestAsyncAppleMailConnector:
+    """Tests for AsyncAppleMailConnector."""
+
+    @pytest.fixture
+    def connector(self, fake_osascript: Path) -> AsyncAppleMailConnector:
+        """Create an async connector running the fake osascript."""
+        return AsyncAppleMailConnector(AppleMailConnector(timeout=10))
+
+    async def test_method_runs_script(self, connector: AsyncAppleMailConnector) -> None:
+        """Test running a connector method end to end."""
+        with patch.object(
+            AppleMailConnector,
+            "_run_applescript",
+            return_value=encode_records([["Gmail", "g@x.com"]]),
+        ):
+            accounts = await connector.list_accounts()
+        assert accounts == [{"name": "Gmail", "email": "g@x.com"}]
+
+    async def test_scripts_run_on_event_loop(self, connector: AsyncAppleMailConnector) -> None:
+        """Test that osascript is started with asyncio subprocesses."""
+        with patch("apple_mail_mcp.async_connector.run_osascript", wraps=run_osascript) as mock_run:
+            result = await connector._call(connector.connector._run_applescript, "echo hello")
+
+        assert result == "hello"
+        assert mock_run.call_count == 1
+
+    async def test_error_mapping(self, connector: AsyncAppleMailConnector) -> None:
+        """Test that script errors map to connector exceptions."""
+        with pytest.raises(MailAccountNotFoundError):
+            await connector._call(
+                connector.connector._run_applescript, 'fail Can\'t get account "x"'
+            )
+
+    async def test_timeout(self, fake_osascript: Path, tmp_path: Path) -> None:
+        """Test that connector timeouts apply to async scripts."""
+        connector = AsyncAppleMailConnector(AppleMailConnector(timeout=1))
+        pid_file = tmp_path / "slow.pid"
+
+        with pytest.raises(MailAppleScriptError, match="timeout"):
+            await connector._call(connector.connector._run_applescript, f"sleep {pid_file}")
+
+        assert not pid_alive(int(pid_file.read_text()))
+
+    async def test_calls_overlap(self, connector: AsyncAppleMailConnector, tmp_path: Path) -> None:
+        """Test that a slow call doesn't block other calls."""
+        slow = asyncio.create_task(
+            connector._call(connector.connector._run_applescript, f"sleep {tmp_path / 'a'}")
+        )
+        await wait_for_file(tmp_path / "a")
+
+        started = time.monotonic()
+        result = await connector._call(connector.connector._run_applescript, "echo fast")
+        assert result == "fast"
+        assert time.monotonic() - started < 5
+
+        slow.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await slow
+
+    async def test_cancel_kills_script(
+        self, connector: AsyncAppleMailConnector, tmp_path: Path
+    ) -> None:
+        """Test that cancelling a call kills its in-flight script."""
+        pid_file = tmp_path / "pid"
+        task = asyncio.create_task(
+            connector._call(connector.connector._run_applescript, f"sleep {pid_file}")
+        )
+        pid = await wait_for_file(pid_file)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        for _ in range(100):
+            if not pid_alive(pid):
+                break
+            await asyncio.sleep(0.02)
+        assert not pid_alive(pid)
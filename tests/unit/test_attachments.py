@@ -1,5 +1,7 @@
 """Unit tests for attachment functionality."""
 
+import hashlib
+from email.message import EmailMessage
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -10,6 +12,7 @@ from apple_mail_mcp.exceptions import (
     MailMessageNotFoundError,
 )
 from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.wire import encode_records
 
 
 class TestSendWithAttachments:
@@ -42,9 +45,10 @@ class TestSendWithAttachments:
         )
 
         assert result is True
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert str(test_file) in call_args
-        assert "make new attachment" in call_args
+        assert "make new attachment" in script
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_send_with_multiple_attachments(
@@ -67,7 +71,8 @@ class TestSendWithAttachments:
         )
 
         assert result is True
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert str(file1) in call_args
         assert str(file2) in call_args
 
@@ -117,7 +122,12 @@ class TestGetAttachments:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test listing attachments from a message."""
-        mock_run.return_value = "document.pdf|application/pdf|524288|true\nimage.jpg|image/jpeg|102400|true"
+        mock_run.return_value = encode_records(
+            [
+                ["document.pdf", "application/pdf", 524288, True],
+                ["image.jpg", "image/jpeg", 102400, True],
+            ]
+        )
 
         result = connector.get_attachments("12345")
 
@@ -157,29 +167,46 @@ class TestSaveAttachments:
         """Create a connector instance."""
         return AppleMailConnector(timeout=30)
 
+    @staticmethod
+    def write_source(script: str, args: list[str], operation: str) -> str:
+        """Stand in for Mail writing a message's source to the given file."""
+        message = EmailMessage()
+        message["Subject"] = "Report"
+        message.set_content("See attached.")
+        message.add_attachment(
+            b"%PDF-1.4" * 100, maintype="application", subtype="pdf", filename="report.pdf"
+        )
+        message.add_attachment("a,b\n1,2\n", subtype="csv", filename="data.csv")
+        message.add_attachment(b"\x89PNG", maintype="image", subtype="png", filename="chart.png")
+        Path(args[1]).write_bytes(message.as_bytes())
+        return ""
+
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_save_single_attachment(
         self, mock_run: MagicMock, connector: AppleMailConnector, tmp_path: Path
     ) -> None:
         """Test saving a single attachment."""
-        mock_run.return_value = "1"
+        mock_run.side_effect = self.write_source
 
         result = connector.save_attachments(
-            message_id="12345",
-            save_directory=tmp_path,
-            attachment_indices=[0]
+            message_id="12345", save_directory=tmp_path, attachment_indices=[1]
         )
 
         assert result == 1
-        call_args = mock_run.call_args[0][0]
-        assert str(tmp_path) in call_args
+        assert result.files[0]["index"] == 1
+        assert result.files[0]["mime_type"] == "text/csv"
+        assert (tmp_path / "data.csv").read_text() == "a,b\n1,2\n"
+        script, args = mock_run.call_args[0]
+        assert args[0] == "12345"
+        # The temporary source file is removed
+        assert not Path(args[1]).exists()
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_save_all_attachments(
         self, mock_run: MagicMock, connector: AppleMailConnector, tmp_path: Path
     ) -> None:
         """Test saving all attachments from a message."""
-        mock_run.return_value = "3"
+        mock_run.side_effect = self.write_source
 
         result = connector.save_attachments(
             message_id="12345",
@@ -187,6 +214,15 @@ class TestSaveAttachments:
         )
 
         assert result == 3
+        data = (tmp_path / "report.pdf").read_bytes()
+        assert data == b"%PDF-1.4" * 100
+        assert result.files[0]["size"] == len(data)
+        assert result.files[0]["sha256"] == hashlib.sha256(data).hexdigest()
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "chart.png",
+            "data.csv",
+            "report.pdf",
+        ]
 
     def test_save_to_invalid_directory(self, connector: AppleMailConnector) -> None:
         """Test error when save directory is invalid."""
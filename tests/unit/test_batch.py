@@ -0,0 +1,301 @@
+"""Unit tests for batched operation execution."""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp import templates
+from apple_mail_mcp.exceptions import MailAppleScriptError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.wire import FIELD_SEP, encode_columns, encode_records
+
+
+def envelope(marker: str, *replies: str) -> str:
+    """Build batch script output from "ok\\n..." / "error N\\n..." replies."""
+    return "".join(marker + reply for reply in replies)
+
+
+def batch_args(args: list[str]) -> list[tuple[int, list[str]]]:
+    """Decode batch argv into (handler number, operation args) pairs."""
+    count = int(args[1])
+    pos = 2
+    calls = []
+    for _ in range(count):
+        handler, arg_count = int(args[pos]), int(args[pos + 1])
+        calls.append((handler, args[pos + 2 : pos + 2 + arg_count]))
+        pos += 2 + arg_count
+    return calls
+
+
+class TestBatchScript:
+    """Tests for combining templates into one batch script."""
+
+    def test_run_handlers_become_numbered_handlers(self) -> None:
+        script = templates.batch_script([templates.GET_MESSAGE, templates.MARK_AS_READ])
+
+        assert script.count("on run argv") == 1
+        assert "on batchOp1(argv)" in script
+        assert "end batchOp1" in script
+        assert "on batchOp2(argv)" in script
+        assert "set opResult to my batchOp2(opArgs)" in script
+
+    def test_split_lines_handler_included_once(self) -> None:
+        script = templates.batch_script([templates.SEND_EMAIL, templates.CREATE_DRAFT])
+
+        assert script.count("on splitLines(theText)") == 1
+
+    def test_wire_handlers_included_once(self) -> None:
+        script = templates.batch_script([templates.GET_MESSAGE, templates.GET_ATTACHMENTS])
+
+        assert script.count("on wireRecord(fields)") == 1
+
+    def test_each_operation_is_isolated(self) -> None:
+        script = templates.batch_script([templates.GET_MESSAGE])
+
+        assert "on error errMsg number errNum" in script
+
+
+class TestBatch:
+    """Tests for AppleMailConnector.batch."""
+
+    @pytest.fixture
+    def connector(self) -> AppleMailConnector:
+        """Create a connector instance."""
+        return AppleMailConnector(timeout=30)
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_runs_operations_in_one_script(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Several operations share one script execution."""
+        message = encode_records(
+            [["12345", "Hello", "a@example.com", "Monday", False, False, "Body", ""]]
+        )
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(
+            args[0], "ok\n" + message, f"ok\n1{FIELD_SEP}2"
+        )
+
+        results = connector.batch(
+            [
+                {"operation": "get_message", "params": {"message_id": "12345"}},
+                {"operation": "mark_as_read", "params": {"message_ids": ["1", "2"]}},
+            ]
+        )
+
+        assert mock_run.call_count == 1
+        assert results[0]["success"] is True
+        assert results[0]["result"]["subject"] == "Hello"
+        assert results[1] == {"operation": "mark_as_read", "success": True, "result": 2}
+
+        script, args = mock_run.call_args[0]
+        calls = batch_args(args)
+        assert [call_args for _, call_args in calls] == [
+            ["12345", "true"],
+            ["true", f"{FIELD_SEP}{FIELD_SEP}1{FIELD_SEP}2"],
+        ]
+        assert "on batchOp1(argv)" in script
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_same_template_shares_handler(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Repeated operations reuse one handler in the script."""
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(
+            args[0], *["ok\n" + encode_records([["1", "S", "s", "d", True, False, "", ""]])] * 3
+        )
+
+        connector.batch(
+            [{"operation": "get_message", "params": {"message_id": str(i)}} for i in range(3)]
+        )
+
+        script, args = mock_run.call_args[0]
+        assert "on batchOp2" not in script
+        assert [handler for handler, _ in batch_args(args)] == [1, 1, 1]
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_script_is_stable_across_operation_order(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """The same set of templates always produces the same script."""
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(args[0], "ok\n1", "ok\n1")
+        mark = {"operation": "mark_as_read", "params": {"message_ids": ["1"]}}
+        delete = {"operation": "delete_messages", "params": {"message_ids": ["2"]}}
+
+        connector.batch([mark, delete])
+        first_script = mock_run.call_args[0][0]
+        connector.batch([delete, mark])
+        second_script = mock_run.call_args[0][0]
+
+        assert first_script == second_script
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_failure_does_not_abort_others(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """A script error is reported for its operation only."""
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(
+            args[0],
+            'error -1728\nCan\'t get mailbox "Nope" of account "Gmail".',
+            "ok\n1",
+        )
+
+        results = connector.batch(
+            [
+                {
+                    "operation": "move_messages",
+                    "params": {
+                        "message_ids": ["1"],
+                        "destination_mailbox": "Nope",
+                        "account": "Gmail",
+                    },
+                },
+                {
+                    "operation": "flag_message",
+                    "params": {"message_ids": ["2"], "flag_color": "red"},
+                },
+            ]
+        )
+
+        assert results[0]["success"] is False
+        assert results[0]["error_type"] == "mailbox_not_found"
+        assert results[0]["error_number"] == -1728
+        assert results[1]["success"] is True
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_invalid_operations_are_reported_without_running(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Validation errors and unsupported operations don't reach the script."""
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(args[0], "ok\n1")
+
+        results = connector.batch(
+            [
+                {"operation": "send_email", "params": {}},
+                {"operation": "get_message", "params": {"message_id": "1; drop"}},
+                {
+                    "operation": "flag_message",
+                    "params": {"message_ids": ["1"], "flag_color": "pink"},
+                },
+                {"operation": "mark_as_read", "params": {"bogus": True}},
+                {"operation": "delete_messages", "params": {"message_ids": ["1"]}},
+            ]
+        )
+
+        assert [result["success"] for result in results] == [False, False, False, False, True]
+        assert all(result["error_type"] == "validation_error" for result in results[:4])
+        assert "Unsupported batch operation" in results[0]["error"]
+        assert len(batch_args(mock_run.call_args[0][1])) == 1
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_dated_searches_define_date_handlers_once(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Two dated search templates share keyDate and firstOlder."""
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(args[0], "ok\n", "ok\n")
+
+        results = connector.batch(
+            [
+                {
+                    "operation": "search_messages",
+                    "params": {"account": "Gmail", "received_after": datetime(2025, 1, 6)},
+                },
+                {
+                    "operation": "search_messages",
+                    "params": {
+                        "account": "Gmail",
+                        "read_status": False,
+                        "received_before": datetime(2025, 1, 6),
+                    },
+                },
+            ]
+        )
+
+        script = mock_run.call_args[0][0]
+        assert [result["success"] for result in results] == [True, True]
+        assert "on batchOp2(argv)" in script
+        assert script.count("on keyDate(") == 1
+        assert script.count("on firstOlder(") == 1
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_search_queries_are_compiled(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Queries become whose clauses; a bad query fails only its own operation."""
+        rows = encode_columns(
+            [
+                ["2", "Re: lunch", "bob@example.com", "Monday", False, ""],
+                ["1", "Lunch", "bob@example.com", "Monday", False, ""],
+            ]
+        )
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(
+            args[0], "ok\n" + rows, "ok\n" + rows
+        )
+
+        results = connector.batch(
+            [
+                {"operation": "search_messages", "params": {"account": "A", "query": "from bob"}},
+                {"operation": "search_messages", "params": {"account": "A", "query": "from"}},
+                {
+                    "operation": "search_messages",
+                    "params": {"account": "A", "query": 'subject matches "^re:"', "limit": 1},
+                },
+            ]
+        )
+
+        script, args = mock_run.call_args[0]
+        assert "whose sender contains queryValue1" in script
+        assert [call_args[-1] for _, call_args in batch_args(args)] == ["bob", "0"]
+        assert [m["id"] for m in results[0]["result"]] == ["2", "1"]
+        assert results[1]["error_type"] == "validation_error"
+        # The regex is applied to what Mail returned, then the limit
+        assert [m["id"] for m in results[2]["result"]] == ["2"]
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_nothing_to_run(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        """Operations with no work skip the script entirely."""
+        results = connector.batch([{"operation": "mark_as_read", "params": {"message_ids": []}}])
+
+        assert results == [{"operation": "mark_as_read", "success": True, "result": 0}]
+        mock_run.assert_not_called()
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_batch_uses_least_urgent_lane(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """A batch mixing reads and bulk searches waits in the bulk lane."""
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(args[0], "ok\n", "ok\n")
+
+        connector.batch(
+            [
+                {"operation": "get_attachments", "params": {"message_id": "1"}},
+                {"operation": "search_messages", "params": {"account": "Gmail"}},
+            ]
+        )
+
+        assert mock_run.call_args.kwargs["operation"] == "search_messages"
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_malformed_output_raises(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Output that is not an envelope is a script error."""
+        mock_run.return_value = "garbage"
+
+        with pytest.raises(MailAppleScriptError, match="Malformed batch output"):
+            connector.batch([{"operation": "list_accounts", "params": {}}])
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_result_count_mismatch_raises(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Every operation must have a result."""
+        mock_run.side_effect = lambda script, args, **kwargs: envelope(args[0], "ok\n1")
+
+        with pytest.raises(MailAppleScriptError, match="1 results for 2 operations"):
+            connector.batch(
+                [
+                    {"operation": "mark_as_read", "params": {"message_ids": ["1"]}},
+                    {"operation": "delete_messages", "params": {"message_ids": ["2"]}},
+                ]
+            )
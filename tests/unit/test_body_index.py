@@ -0,0 +1,209 @@
+"""Unit tests for the full-text body index."""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp.body_index import BodyIndex, fts_query
+from apple_mail_mcp.exceptions import MailError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.memory_backend import InMemoryBackend, format_date
+from apple_mail_mcp.message_cache import MessageCache
+
+
+def message(message_id: str, subject: str, content: str, day: int = 1) -> dict:
+    """Build a message as get_message returns it."""
+    return {
+        "id": message_id,
+        "subject": subject,
+        "sender": "Ann <ann@example.com>",
+        "date_received": format_date(datetime(2025, 1, day, 9)),
+        "read_status": False,
+        "content": content,
+    }
+
+
+INBOX = [
+    message("1", "Café order", "Two flat whites and a croissant, please."),
+    message("2", "Invoice 2041", "Please confirm the wire transfer for invoice 2041 by Friday."),
+    message("3", "Draft invoice", "This draft invoice is not final. Wire details follow."),
+    message("4", "Lunch", "Pizza or sushi? Ann"),
+]
+
+
+@pytest.fixture
+def index() -> BodyIndex:
+    """Create an in-memory index holding Gmail/INBOX."""
+    index = BodyIndex(":memory:")
+    index.add("Gmail", "INBOX", INBOX)
+    return index
+
+
+def ids(results: list[dict]) -> list[str]:
+    return [result["id"] for result in results]
+
+
+class TestFtsQuery:
+    """Tests for query translation."""
+
+    def test_terms(self) -> None:
+        assert fts_query('invoice "wire transfer" pay* -draft') == (
+            '("invoice" AND "wire transfer" AND "pay" *) NOT ("draft")'
+        )
+
+    def test_operators_are_literal(self) -> None:
+        assert fts_query('a OR b NEAR("x") ^c') == (
+            '"a" AND "OR" AND "b" AND "NEAR(""x"")" AND "^c"'
+        )
+
+    @pytest.mark.parametrize("query", ["", "  ", "-draft", '"" *'])
+    def test_needs_a_term(self, query: str) -> None:
+        with pytest.raises(ValueError):
+            fts_query(query)
+
+
+class TestBodyIndex:
+    """Tests for BodyIndex."""
+
+    def test_unicode_folding(self, index: BodyIndex) -> None:
+        assert ids(index.search("cafe")) == ["1"]
+        assert ids(index.search("CROISSANT")) == ["1"]
+
+    def test_ranking_and_snippet(self, index: BodyIndex) -> None:
+        index.add("Gmail", "INBOX", [message("5", "Notes", "The invoice is in the shared folder.")])
+
+        results = index.search("invoice")
+
+        # A match in the subject weighs more than one in the body
+        assert set(ids(results[:2])) == {"2", "3"}
+        assert ids(results)[2] == "5"
+        assert results[0]["score"] > 0
+        assert "**invoice**" in results[0]["snippet"].lower()
+        assert results[0]["account"] == "Gmail"
+        assert results[0]["date_received"] == INBOX[1]["date_received"]
+
+    def test_phrase_prefix_and_exclusion(self, index: BodyIndex) -> None:
+        assert ids(index.search('"wire transfer"')) == ["2"]
+        assert ids(index.search('"transfer wire"')) == []
+        assert ids(index.search("sush*")) == ["4"]
+        assert ids(index.search("invoice -draft")) == ["2"]
+
+    def test_scope(self, index: BodyIndex) -> None:
+        index.add("Work", "INBOX", [message("9", "Invoice", "Invoice attached")])
+
+        assert set(ids(index.search("invoice"))) == {"2", "3", "9"}
+        assert ids(index.search("invoice", account="Work")) == ["9"]
+        assert ids(index.search("invoice", mailbox="Archive")) == []
+        assert len(index.search("invoice", limit=1)) == 1
+
+    def test_incremental_updates(self, index: BodyIndex) -> None:
+        index.add("Gmail", "INBOX", [message("4", "Lunch", "Tacos today")])
+        assert ids(index.search("pizza")) == []
+        assert ids(index.search("tacos")) == ["4"]
+
+        index.move(["4"], "Gmail", "Archive")
+        assert index.search("tacos")[0]["mailbox"] == "Archive"
+
+        index.remove(["1"])
+        assert index.prune("Gmail", "INBOX", ["2"]) == 1
+        assert index.indexed(["1", "2", "3", "4"]) == {"2", "4"}
+        assert ids(index.search("croissant")) == []
+        assert index.stats()["messages"] == 2
+
+    def test_persists(self, tmp_path: object) -> None:
+        path = f"{tmp_path}/bodies.db"
+        index = BodyIndex(path)
+        index.add("Gmail", "INBOX", INBOX)
+        index.close()
+
+        assert ids(BodyIndex(path).search("croissant")) == ["1"]
+
+
+class TestConnectorIndexing:
+    """Tests for index_mailbox and full_text_search on the connector."""
+
+    @pytest.fixture
+    def connector(self) -> AppleMailConnector:
+        return AppleMailConnector(body_index=BodyIndex(":memory:"))
+
+    @patch.object(AppleMailConnector, "_get_message")
+    @patch.object(AppleMailConnector, "_search_live")
+    def test_indexes_new_messages_only(
+        self, mock_search: MagicMock, mock_get: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        listing = [{k: v for k, v in m.items() if k != "content"} for m in INBOX]
+        mock_search.return_value = listing[:3]
+        mock_get.side_effect = lambda message_id, *args: next(
+            m for m in INBOX if m["id"] == message_id
+        )
+
+        assert connector.index_mailbox("Gmail", limit=2) == {
+            "indexed": 2,
+            "pending": 1,
+            "removed": 0,
+        }
+        assert connector.index_mailbox("Gmail") == {"indexed": 1, "pending": 0, "removed": 0}
+        assert mock_get.call_count == 3
+
+        # Message 1 left the mailbox, message 4 arrived
+        mock_search.return_value = listing[1:]
+        assert connector.index_mailbox("Gmail") == {"indexed": 1, "pending": 0, "removed": 1}
+        assert mock_get.call_count == 4
+
+        results = connector.full_text_search("wire", account="Gmail", mailbox="INBOX")
+        assert set(ids(results)) == {"2", "3"}
+        assert connector.locations.get("3") == ("Gmail", "INBOX")
+        assert connector.stats()["body_index"]["messages"] == 3
+
+    @patch.object(AppleMailConnector, "_get_message")
+    @patch.object(AppleMailConnector, "_search_live")
+    def test_lists_from_fresh_cache(self, mock_search: MagicMock, mock_get: MagicMock) -> None:
+        """With a message cache, Mail is only listed again once the listing is stale."""
+        cache = MessageCache(":memory:")
+        connector = AppleMailConnector(cache=cache, body_index=BodyIndex(":memory:"))
+        mock_search.return_value = [{k: v for k, v in m.items() if k != "content"} for m in INBOX]
+        mock_get.side_effect = lambda message_id, *args: next(
+            m for m in INBOX if m["id"] == message_id
+        )
+
+        assert connector.index_mailbox("Gmail", limit=2)["pending"] == 2
+        assert connector.index_mailbox("Gmail")["indexed"] == 2
+        assert mock_search.call_count == 1
+
+        cache.invalidate("Gmail", "INBOX")
+        connector.index_mailbox("Gmail")
+        assert mock_search.call_count == 2
+
+    @patch.object(AppleMailConnector, "_run_applescript", return_value="2")
+    def test_writes_through_moves_and_deletes(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        assert connector.body_index is not None
+        connector.body_index.add("Gmail", "INBOX", INBOX)
+
+        connector.move_messages(["2"], "Archive", "Gmail")
+        assert connector.full_text_search("wire transfer")[0]["mailbox"] == "Archive"
+
+        mock_run.return_value = "3"
+        connector.delete_messages(["3"])
+        assert ids(connector.full_text_search("draft")) == []
+
+    def test_requires_index(self) -> None:
+        with pytest.raises(MailError, match="body index"):
+            AppleMailConnector().full_text_search("x")
+
+
+def test_memory_backend() -> None:
+    backend = InMemoryBackend()
+    backend.add_account("Gmail", "me@gmail.com")
+    for m in INBOX:
+        backend.add_message("Gmail", "INBOX", m["subject"], m["sender"], m["content"])
+
+    assert backend.full_text_search("wire") == []
+    assert backend.index_mailbox("Gmail", "INBOX")["indexed"] == 4
+
+    results = backend.full_text_search('"wire transfer"', account="Gmail")
+    assert [r["subject"] for r in results] == ["Invoice 2041"]
+    backend.delete_messages([results[0]["id"]])
+    assert backend.full_text_search('"wire transfer"') == []
@@ -0,0 +1,199 @@
+"""Unit tests for the .emlx message file reader, on synthetic files."""
+
+from email.message import EmailMessage
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp.emlx import (
+    EmlxError,
+    EmlxReader,
+    html_to_text,
+    message_directory,
+    read_emlx,
+)
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.wire import encode_records
+
+ACCOUNT = "6F2C1E4A-0000-4000-8000-00000000009A"
+
+PLIST = b"""<?xml version="1.0" encoding="UTF-8"?>
+<plist version="1.0"><dict><key>flags</key><integer>8590195713</integer></dict></plist>
+"""
+
+
+def emlx_bytes(message: EmailMessage) -> bytes:
+    """Encode a message the way Mail stores it."""
+    payload = message.as_bytes()
+    return f"{len(payload)}\n".encode() + payload + PLIST
+
+
+def plain_message(body: str = "Hello, Wörld!\n") -> EmailMessage:
+    """Build a text/plain message (quoted-printable, with a repeated header)."""
+    message = EmailMessage()
+    message["Subject"] = "Quarterly report"
+    message["From"] = "Boss <boss@example.com>"
+    message["Received"] = "from a"
+    message["Received"] = "from b"
+    message.set_content(body, cte="quoted-printable")
+    return message
+
+
+def write_message(
+    mail_directory: Path,
+    mailbox: str,
+    message_id: str,
+    message: EmailMessage,
+    suffix: str = ".emlx",
+) -> Path:
+    """Store a message file in Mail's layout."""
+    mbox = Path(*(f"{part}.mbox" for part in mailbox.split("/")))
+    data = mail_directory / "V10" / ACCOUNT / mbox / "STORE-UUID" / "Data"
+    path = data / message_directory(message_id) / f"{message_id}{suffix}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(emlx_bytes(message))
+    return path
+
+
+class TestReadEmlx:
+    """Tests for parsing message files."""
+
+    def test_message_directory(self) -> None:
+        assert message_directory("999") == Path("Messages")
+        assert message_directory("123456") == Path("3/2/1/Messages")
+
+    def test_plain(self, tmp_path: Path) -> None:
+        path = tmp_path / "1.emlx"
+        path.write_bytes(emlx_bytes(plain_message()))
+
+        result = read_emlx(path)
+
+        assert result["content"] == "Hello, Wörld!\n"
+        assert result["headers"]["Subject"] == "Quarterly report"
+        assert result["headers"]["Received"] == "from a\nfrom b"
+        assert result["partial"] is False
+
+    def test_multipart_prefers_plain(self, tmp_path: Path) -> None:
+        message = plain_message("Plain ✓\n")
+        message.add_alternative("<p>HTML</p>", subtype="html")
+        message.add_attachment(b"\x00" * 1000, maintype="application", subtype="pdf")
+        path = tmp_path / "2.partial.emlx"
+        path.write_bytes(emlx_bytes(message))
+
+        result = read_emlx(path)
+
+        assert result["content"] == "Plain ✓\n"
+        assert result["partial"] is True
+
+    def test_html_only(self, tmp_path: Path) -> None:
+        message = EmailMessage()
+        message.set_content(
+            "<html><style>p {}</style><p>Caf&eacute;<br>menu</p><script>x()</script></html>",
+            subtype="html",
+            cte="base64",
+        )
+        path = tmp_path / "3.emlx"
+        path.write_bytes(emlx_bytes(message))
+
+        assert read_emlx(path)["content"] == "Café\nmenu"
+
+    def test_large_body_is_read_in_chunks(self, tmp_path: Path) -> None:
+        body = "line of text\n" * 50_000
+        path = tmp_path / "4.emlx"
+        path.write_bytes(emlx_bytes(plain_message(body)))
+
+        with patch("apple_mail_mcp.emlx.READ_CHUNK_SIZE", 4096):
+            assert read_emlx(path)["content"] == body
+
+    @pytest.mark.parametrize(
+        ("data", "error"),
+        [(b"From: x\n\nbody", "byte count"), (b"500\nFrom: x\n\nshort", "shorter")],
+    )
+    def test_malformed(self, tmp_path: Path, data: bytes, error: str) -> None:
+        path = tmp_path / "5.emlx"
+        path.write_bytes(data)
+
+        with pytest.raises(EmlxError, match=error):
+            read_emlx(path)
+
+    def test_html_to_text(self) -> None:
+        assert html_to_text("<div>a</div><div>b &amp; c</div>") == "a\nb & c"
+
+
+class TestEmlxReader:
+    """Tests for locating message files."""
+
+    def test_find(self, tmp_path: Path) -> None:
+        inbox = write_message(tmp_path, "INBOX", "123456", plain_message())
+        nested = write_message(tmp_path, "[Gmail]/All Mail", "42", plain_message(), ".partial.emlx")
+        reader = EmlxReader(tmp_path)
+
+        assert reader.find("123456") == inbox
+        assert reader.find("42", hint=("Gmail", "[Gmail]/All Mail")) == nested
+        assert reader.find("7") is None
+        assert reader.find("../etc") is None
+        assert reader.stats() == {"stores": 2, "hits": 2, "misses": 1}
+
+    def test_finds_new_mailboxes(self, tmp_path: Path) -> None:
+        reader = EmlxReader(tmp_path, rescan_interval=0)
+        assert reader.find("1") is None
+
+        path = write_message(tmp_path, "Archive", "1", plain_message())
+
+        assert reader.find("1") == path
+
+    def test_rescans_are_rate_limited(self, tmp_path: Path) -> None:
+        write_message(tmp_path, "INBOX", "1", plain_message())
+        reader = EmlxReader(tmp_path, rescan_interval=60)
+
+        with patch.object(reader, "_scan_stores", wraps=reader._scan_stores) as scan:
+            with patch("apple_mail_mcp.emlx.time.monotonic", return_value=1000.0):
+                assert reader.find("7") is None
+                assert reader.find("8") is None
+            assert scan.call_count == 1
+
+            with patch("apple_mail_mcp.emlx.time.monotonic", return_value=1060.0):
+                assert reader.find("7") is None
+            assert scan.call_count == 2
+
+    def test_read_missing(self, tmp_path: Path) -> None:
+        assert EmlxReader(tmp_path / "nothing").read("1") is None
+
+
+class TestConnectorEmlx:
+    """Tests for get_message with message files."""
+
+    @pytest.fixture
+    def connector(self, tmp_path: Path) -> AppleMailConnector:
+        """Create a connector that reads message files under tmp_path."""
+        write_message(tmp_path, "INBOX", "1001", plain_message())
+        return AppleMailConnector(emlx=EmlxReader(tmp_path))
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_body_from_disk(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        mock_run.return_value = encode_records(
+            [["1001", "Quarterly report", "boss@example.com", "d", True, False, "", ""]]
+        )
+
+        message = connector.get_message("1001")
+
+        # Mail is only asked for the state, not the content
+        assert mock_run.call_args[0][1][-1] == "false"
+        assert message["content"] == "Hello, Wörld!\n"
+        assert message["headers"]["From"] == "Boss <boss@example.com>"
+        assert message["read_status"] is True
+        assert connector.stats()["emlx"]["hits"] == 1
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_falls_back_to_mail(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        mock_run.side_effect = [
+            encode_records([["77", "S", "s", "d", False, False, "", ""]]),
+            encode_records([["77", "S", "s", "d", False, False, "Rendered by Mail", ""]]),
+        ]
+
+        message = connector.get_message("77")
+
+        assert mock_run.call_args[0][1][-1] == "true"
+        assert message["content"] == "Rendered by Mail"
+        assert "headers" not in message
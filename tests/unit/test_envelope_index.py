@@ -0,0 +1,275 @@
+"""Unit tests for the Envelope Index backend, on synthetic databases."""
+
+import sqlite3
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp.backend import create_backend
+from apple_mail_mcp.envelope_index import (
+    EnvelopeIndex,
+    EnvelopeIndexConnector,
+    InlineSchema,
+    NormalizedSchema,
+    detect_schema,
+    find_envelope_index,
+    parse_mailbox_url,
+)
+from apple_mail_mcp.exceptions import (
+    MailAccountNotFoundError,
+    MailMailboxNotFoundError,
+    MailUnavailableError,
+)
+from apple_mail_mcp.memory_backend import format_date
+
+GMAIL = "6F2C1E4A-0000-4000-8000-00000000009A"
+WORK = "11111111-2222-4333-8444-555555555555"
+
+MAILBOXES = [
+    (1, f"imap://{GMAIL}/INBOX"),
+    (2, f"imap://{GMAIL}/%5BGmail%5D/All%20Mail"),
+    (3, f"ews://{WORK}/INBOX"),
+]
+
+# (rowid, mailbox, prefix, subject, sender name, sender address, day, read, flagged, deleted)
+MESSAGES = [
+    (10, 1, "", "Quarterly report", "Boss", "boss@example.com", 1, False, False, False),
+    (11, 1, "Re: ", "Quarterly report", "Ann", "ann@example.com", 3, True, True, False),
+    (12, 1, "", "Lunch?", "", "ann@example.com", 2, False, False, False),
+    (13, 1, "", "Deleted", "", "spam@example.com", 4, False, False, True),
+    (14, 2, "", "Archived report", "Boss", "boss@example.com", 1, True, False, False),
+    (15, 3, "", "Standup", "Lead", "lead@work.example", 5, False, False, False),
+]
+
+
+def received(day: int) -> int:
+    """Epoch seconds of a message's date."""
+    return int(datetime(2025, 1, day, 9).timestamp())
+
+
+def build_normalized(path: Path) -> Path:
+    """Write a database with the normalized layout (subjects/addresses tables)."""
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE mailboxes (ROWID INTEGER PRIMARY KEY, url TEXT, total_count INTEGER);
+        CREATE TABLE subjects (ROWID INTEGER PRIMARY KEY, subject TEXT);
+        CREATE TABLE addresses (ROWID INTEGER PRIMARY KEY, address TEXT, comment TEXT);
+        CREATE TABLE messages (
+            ROWID INTEGER PRIMARY KEY, message_id INTEGER, sender INTEGER,
+            subject_prefix TEXT, subject INTEGER, date_sent INTEGER, date_received INTEGER,
+            mailbox INTEGER, read INTEGER, flagged INTEGER, deleted INTEGER, size INTEGER
+        );
+        """)
+    db.executemany("INSERT INTO mailboxes (ROWID, url) VALUES (?, ?)", MAILBOXES)
+    for rowid, mailbox, prefix, subject, name, address, day, read, flagged, deleted in MESSAGES:
+        subject_id = db.execute("INSERT INTO subjects (subject) VALUES (?)", (subject,)).lastrowid
+        sender_id = db.execute(
+            "INSERT INTO addresses (address, comment) VALUES (?, ?)", (address, name)
+        ).lastrowid
+        db.execute(
+            "INSERT INTO messages (ROWID, sender, subject_prefix, subject, date_received,"
+            " mailbox, read, flagged, deleted) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rowid, sender_id, prefix, subject_id, received(day), mailbox, read, flagged, deleted),
+        )
+    db.commit()
+    db.close()
+    return path
+
+
+def build_inline(path: Path) -> Path:
+    """Write a database with the inline layout (text columns, flags bit field)."""
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE mailboxes (ROWID INTEGER PRIMARY KEY, url TEXT);
+        CREATE TABLE messages (
+            ROWID INTEGER PRIMARY KEY, sender TEXT, subject TEXT, date_received INTEGER,
+            mailbox INTEGER, flags INTEGER
+        );
+        """)
+    db.executemany("INSERT INTO mailboxes (ROWID, url) VALUES (?, ?)", MAILBOXES)
+    for rowid, mailbox, prefix, subject, name, address, day, read, flagged, deleted in MESSAGES:
+        sender = f"{name} <{address}>" if name else address
+        flags = read | deleted << 1 | flagged << 4
+        db.execute(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+            (rowid, sender, prefix + subject, received(day), mailbox, flags),
+        )
+    db.commit()
+    db.close()
+    return path
+
+
+@pytest.fixture(params=["normalized", "inline"])
+def database(request: pytest.FixtureRequest, tmp_path: Path) -> Path:
+    """Create a synthetic Envelope Index in each supported layout."""
+    build = build_normalized if request.param == "normalized" else build_inline
+    return build(tmp_path / "Envelope Index")
+
+
+@pytest.fixture
+def connector(database: Path) -> Iterator[EnvelopeIndexConnector]:
+    """Create a connector reading the synthetic database."""
+    index = EnvelopeIndex(database, accounts_database=None, account_names={GMAIL: "Gmail"})
+    connector = EnvelopeIndexConnector(index=index)
+    yield connector
+    connector.close()
+
+
+class TestEnvelopeIndex:
+    """Tests for locating and opening the database."""
+
+    def test_find_newest(self, tmp_path: Path) -> None:
+        for version in ("V8", "V10", "V9"):
+            (tmp_path / version / "MailData").mkdir(parents=True)
+            (tmp_path / version / "MailData" / "Envelope Index").touch()
+
+        assert find_envelope_index(tmp_path).parent.parent.name == "V10"
+        with pytest.raises(MailUnavailableError, match="Full Disk Access"):
+            find_envelope_index(tmp_path / "missing")
+
+    def test_detect_schema(self, tmp_path: Path) -> None:
+        normalized = sqlite3.connect(build_normalized(tmp_path / "a"))
+        inline = sqlite3.connect(build_inline(tmp_path / "b"))
+        unknown = sqlite3.connect(":memory:")
+
+        assert detect_schema(normalized) is NormalizedSchema
+        assert detect_schema(inline) is InlineSchema
+        with pytest.raises(MailUnavailableError, match="Unsupported"):
+            detect_schema(unknown)
+
+    def test_parse_mailbox_url(self) -> None:
+        assert parse_mailbox_url(MAILBOXES[1][1]) == (GMAIL, "[Gmail]/All Mail")
+
+    def test_opens_read_only(self, tmp_path: Path) -> None:
+        index = EnvelopeIndex(build_normalized(tmp_path / "Envelope Index"))
+
+        with pytest.raises(MailUnavailableError, match="readonly"):
+            index.query("DELETE FROM messages")
+        assert index.query("SELECT count(*) FROM messages") == [(len(MESSAGES),)]
+        index.close()
+
+    def test_reads_snapshot_while_locked(self, tmp_path: Path) -> None:
+        path = build_normalized(tmp_path / "Envelope Index")
+        index = EnvelopeIndex(path, busy_timeout=0)
+        writer = sqlite3.connect(path, isolation_level=None)
+        writer.execute("BEGIN EXCLUSIVE")
+
+        try:
+            assert index.query("SELECT count(*) FROM messages") == [(len(MESSAGES),)]
+            assert index.query("SELECT count(*) FROM mailboxes") == [(len(MAILBOXES),)]
+        finally:
+            writer.execute("ROLLBACK")
+            writer.close()
+
+        # One snapshot served both queries; it is removed on close
+        assert index.stats()["snapshots"] == 1
+        snapshot_dir = index._snapshot_dir
+        assert snapshot_dir is not None and snapshot_dir.exists()
+        index.close()
+        assert not snapshot_dir.exists()
+
+    def test_account_names_from_accounts_database(self, tmp_path: Path) -> None:
+        accounts = sqlite3.connect(tmp_path / "Accounts4.sqlite")
+        accounts.executescript(f"""
+            CREATE TABLE ZACCOUNT (
+                Z_PK INTEGER PRIMARY KEY, ZIDENTIFIER TEXT, ZACCOUNTDESCRIPTION TEXT,
+                ZPARENTACCOUNT INTEGER
+            );
+            INSERT INTO ZACCOUNT VALUES (1, 'parent', 'Work', NULL);
+            INSERT INTO ZACCOUNT VALUES (2, '{WORK}', NULL, 1);
+            """)
+        accounts.commit()
+        accounts.close()
+        index = EnvelopeIndex(
+            build_normalized(tmp_path / "Envelope Index"),
+            accounts_database=tmp_path / "Accounts4.sqlite",
+        )
+
+        assert index.account_uuid("work") == WORK
+        assert index.account_uuid(GMAIL) == GMAIL
+        with pytest.raises(MailAccountNotFoundError):
+            index.account_uuid("Gmail")
+        index.close()
+
+
+class TestEnvelopeIndexConnector:
+    """Tests for listings served from the database."""
+
+    def test_search(self, connector: EnvelopeIndexConnector) -> None:
+        messages = connector.search_messages("Gmail")
+
+        assert [m["id"] for m in messages] == ["11", "12", "10"]
+        assert messages[0] == {
+            "id": "11",
+            "subject": "Re: Quarterly report",
+            "sender": "Ann <ann@example.com>",
+            "date_received": format_date(datetime(2025, 1, 3, 9)),
+            "read_status": True,
+            "timestamp": int(datetime(2025, 1, 3, 9).timestamp()),
+        }
+        assert messages[1]["sender"] == "ann@example.com"
+        assert connector.locations.get("12") == ("Gmail", "INBOX")
+
+    def test_search_filters(self, connector: EnvelopeIndexConnector) -> None:
+        def ids(**filters: object) -> list[str]:
+            return [m["id"] for m in connector.search_messages("Gmail", **filters)]
+
+        assert ids(subject_contains="REPORT") == ["11", "10"]
+        assert ids(sender_contains="ann@") == ["11", "12"]
+        assert ids(sender_contains="boss", subject_contains="report") == ["10"]
+        assert ids(read_status=False) == ["12", "10"]
+        assert ids(limit=1) == ["11"]
+        assert ids(received_after=datetime(2025, 1, 2, 9)) == ["11", "12"]
+        assert ids(received_before=datetime(2025, 1, 2, 9)) == ["10"]
+        assert ids(subject_contains="%") == []
+        assert [m["id"] for m in connector.search_messages("Gmail", "[Gmail]/All Mail")] == ["14"]
+
+    def test_search_query(self, connector: EnvelopeIndexConnector) -> None:
+        def ids(query: str) -> list[str]:
+            return [m["id"] for m in connector.search_messages("Gmail", query=query)]
+
+        assert ids("from boss or subject lunch") == ["12", "10"]
+        assert ids("not (from boss or read)") == ["12"]
+        assert ids("before 2025-01-03") == ["12", "10"]
+        assert ids('subject matches "^re:" or unread') == ["11", "12", "10"]
+        assert ids('from ann, subject matches "^re:"') == ["11"]
+
+    def test_search_pages(self, connector: EnvelopeIndexConnector) -> None:
+        first = connector.search_messages("Gmail", limit=2)
+        second = connector.search_messages("Gmail", limit=2, cursor=first.next_cursor)
+
+        assert [m["id"] for m in first] == ["11", "12"]
+        assert [m["id"] for m in second] == ["10"]
+        assert second.next_cursor is None
+
+    def test_search_not_found(self, connector: EnvelopeIndexConnector) -> None:
+        with pytest.raises(MailAccountNotFoundError):
+            connector.search_messages("Nope")
+        with pytest.raises(MailMailboxNotFoundError):
+            connector.search_messages("Gmail", "Nope")
+
+    def test_list_mailboxes(self, connector: EnvelopeIndexConnector) -> None:
+        assert connector.list_mailboxes("Gmail") == [
+            {"name": "[Gmail]/All Mail", "message_count": 1, "unread_count": 0},
+            {"name": "INBOX", "message_count": 3, "unread_count": 2},
+        ]
+        # Accounts without a known name are addressed by UUID
+        assert connector.list_mailboxes(WORK)[0]["unread_count"] == 1
+
+    @patch.object(EnvelopeIndexConnector, "_run_applescript", return_value="11")
+    def test_mutations_use_applescript(
+        self, mock_run: MagicMock, connector: EnvelopeIndexConnector
+    ) -> None:
+        connector.search_messages("Gmail")
+
+        assert connector.mark_as_read(["11"]) == 1
+        assert mock_run.call_args[0][1][1].split("\x1f")[:2] == ["Gmail", "INBOX"]
+        assert connector.stats()["envelope_index"]["queries"] > 0
+
+    def test_create_backend(self, database: Path) -> None:
+        backend = create_backend("envelope", index=EnvelopeIndex(database))
+
+        assert isinstance(backend, EnvelopeIndexConnector)
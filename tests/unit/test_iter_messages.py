@@ -0,0 +1,174 @@
+"""Unit tests for streaming search results."""
+
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from apple_mail_mcp import templates
+from apple_mail_mcp.exceptions import MailMailboxNotFoundError, MailTimeoutError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.scheduler import BULK
+from apple_mail_mcp.timeouts import AdaptiveTimeouts
+
+from .test_async_connector import pid_alive
+
+# argv: compiled script, then the ITER_MESSAGES argv. The fake uses the
+# account as a mode, the mailbox as a record count and the subject filter as
+# a file to write its PID to.
+FAKE_OSASCRIPT = f"""#!{sys.executable}
+import os, sys, time
+
+mode, count, pid_file = sys.argv[2], int(sys.argv[3]), sys.argv[5]
+if pid_file:
+    with open(pid_file, "w") as f:
+        f.write(str(os.getpid()))
+
+def emit(index):
+    fields = [
+        str(index), "Subject | with\\nnewline " + str(index), "a@example.com", "Monday", "false",
+        "20094:76500",
+    ]
+    sys.stderr.write("\\x1f".join(fields) + "\\x1e\\n")
+    sys.stderr.flush()
+
+if mode == "stream":
+    for index in range(count):
+        emit(index)
+elif mode == "slow":
+    for index in range(count):
+        emit(index)
+        time.sleep(0.05)
+elif mode == "silent":
+    time.sleep(30)
+elif mode == "fail":
+    for index in range(count):
+        emit(index)
+    sys.stderr.write('execution error: Can\\'t get mailbox "X" of account "fail". (-1728)\\n')
+    sys.exit(1)
+"""
+
+
+@pytest.fixture
+def connector(tmp_path: Path) -> AppleMailConnector:
+    """Create a connector that runs the fake osascript."""
+    script = tmp_path / "osascript"
+    script.write_text(FAKE_OSASCRIPT)
+    script.chmod(0o755)
+
+    connector = AppleMailConnector(timeout=10)
+    with (
+        patch("apple_mail_mcp.mail_connector.OSASCRIPT", str(script)),
+        patch.object(connector.script_cache, "path_for", return_value=tmp_path / "iter.scpt"),
+    ):
+        yield connector
+
+
+def wait_for_pid(path: Path) -> int:
+    """Wait until the fake script wrote its PID."""
+    for _ in range(200):
+        if path.exists() and path.read_text():
+            return int(path.read_text())
+        time.sleep(0.01)
+    raise AssertionError("fake osascript did not start")
+
+
+def test_template_logs_each_record() -> None:
+    """The script emits records as it goes instead of returning them."""
+    assert "my emitRecord(my wireRecord(" in templates.ITER_MESSAGES
+    assert "log theRecord & (character id 30)" in templates.ITER_MESSAGES
+    assert "resultList" not in templates.ITER_MESSAGES
+
+
+class TestIterMessages:
+    """Tests for AppleMailConnector.iter_messages."""
+
+    def test_yields_parsed_records(self, connector: AppleMailConnector) -> None:
+        """Records are parsed like search results, separators included."""
+        messages = list(connector.iter_messages("stream", "3"))
+
+        assert [message["id"] for message in messages] == ["0", "1", "2"]
+        assert messages[1]["subject"] == "Subject | with\nnewline 1"
+        assert messages[1]["read_status"] is False
+        assert messages[1]["timestamp"] == int(datetime(2025, 1, 6, 21, 15).timestamp())
+
+    def test_first_record_arrives_before_script_finishes(
+        self, connector: AppleMailConnector, tmp_path: Path
+    ) -> None:
+        """The first record is yielded while the script is still running."""
+        pid_file = tmp_path / "pid"
+        messages = connector.iter_messages("slow", "40", subject_contains=str(pid_file))
+
+        started = time.monotonic()
+        first = next(messages)
+
+        assert first["id"] == "0"
+        assert time.monotonic() - started < 1.5
+        assert pid_alive(wait_for_pid(pid_file))
+        messages.close()
+
+    def test_closing_early_kills_script(
+        self, connector: AppleMailConnector, tmp_path: Path
+    ) -> None:
+        """Stopping iteration kills the script and frees the lane slot."""
+        pid_file = tmp_path / "pid"
+
+        for message in connector.iter_messages("slow", "1000", subject_contains=str(pid_file)):
+            if message["id"] == "2":
+                break
+
+        assert not pid_alive(wait_for_pid(pid_file))
+        lane = connector.scheduler.stats()["lanes"][BULK]
+        assert lane["active"] == 0
+        assert lane["completed"] == 1
+
+    def test_script_error_after_records(self, connector: AppleMailConnector) -> None:
+        """Records before a failure are delivered, then the error is raised."""
+        received = []
+
+        with pytest.raises(MailMailboxNotFoundError, match="Can't get mailbox"):
+            for message in connector.iter_messages("fail", "2"):
+                received.append(message["id"])
+
+        assert received == ["0", "1"]
+
+    def test_slot_is_released_once_started(self, connector: AppleMailConnector) -> None:
+        """Other bulk operations can run while the caller iterates."""
+        messages = connector.iter_messages("slow", "5")
+        next(messages)
+
+        with connector.scheduler.slot("search_messages"):
+            assert connector.scheduler.stats()["lanes"][BULK]["active"] == 1
+        messages.close()
+
+    def test_idle_timeout_kills_script(self, connector: AppleMailConnector, tmp_path: Path) -> None:
+        """A script that stops producing output is killed like a timed-out script."""
+        pid_file = tmp_path / "pid"
+
+        with (
+            AdaptiveTimeouts.override(0.5),
+            pytest.raises(MailTimeoutError, match="no output for 0.5s"),
+        ):
+            list(connector.iter_messages("silent", "0", subject_contains=str(pid_file)))
+
+        assert not pid_alive(wait_for_pid(pid_file))
+        assert connector.breaker.stats()["consecutive_failures"] == 1
+        assert connector.timeouts.stats()["operations"]["iter_messages"]["timeouts"] == 1
+
+    def test_memory_stays_flat(self, connector: AppleMailConnector) -> None:
+        """Consuming a large stream does not accumulate the output."""
+        tracemalloc.start()
+        try:
+            count = 0
+            for _ in connector.iter_messages("stream", "100000"):
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert count == 100000
+        assert peak < 2 * 1024 * 1024
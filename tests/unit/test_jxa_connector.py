@@ -0,0 +1,147 @@
+"""Unit tests for the JXA connector."""
+
+import json
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp import templates
+from apple_mail_mcp.backend import MailBackend, create_backend
+from apple_mail_mcp.exceptions import (
+    MailAccountNotFoundError,
+    MailAppleScriptError,
+    MailMessageNotFoundError,
+)
+from apple_mail_mcp.jxa_connector import (
+    GET_MESSAGE,
+    SEARCH_MESSAGES,
+    JXAMailConnector,
+    JXAScript,
+    zip_columns,
+)
+
+
+@pytest.fixture
+def connector(tmp_path: Path) -> JXAMailConnector:
+    """Create a connector whose compiled scripts are fake paths."""
+    cache = MagicMock()
+    cache.path_for.side_effect = lambda source, language="AppleScript": tmp_path / language
+    return JXAMailConnector(script_cache=cache)
+
+
+def reply(stdout: str, returncode: int = 0, stderr: str = "") -> MagicMock:
+    return MagicMock(returncode=returncode, stdout=stdout + "\n", stderr=stderr)
+
+
+class TestZipColumns:
+    """Tests for zip_columns."""
+
+    def test_zips_rows(self) -> None:
+        output = json.dumps({"id": ["1", "2"], "read_status": [True, False]})
+
+        assert zip_columns(output) == [
+            {"id": "1", "read_status": True},
+            {"id": "2", "read_status": False},
+        ]
+
+    def test_empty(self) -> None:
+        assert zip_columns(json.dumps({"name": [], "email": []})) == []
+
+    @pytest.mark.parametrize(
+        "output", ["not json", "[1, 2]", '{"id": "1"}', '{"id": ["1"], "subject": []}']
+    )
+    def test_malformed(self, output: str) -> None:
+        with pytest.raises(MailAppleScriptError, match="Malformed JXA output"):
+            zip_columns(output)
+
+
+class TestJXAConnector:
+    """Tests for reads through JXA templates."""
+
+    def test_is_a_backend(self) -> None:
+        assert isinstance(create_backend("jxa"), JXAMailConnector)
+        assert isinstance(JXAMailConnector(), MailBackend)
+
+    @patch("subprocess.run")
+    def test_search_runs_javascript(
+        self, mock_run: MagicMock, connector: JXAMailConnector, tmp_path: Path
+    ) -> None:
+        mock_run.return_value = reply(
+            json.dumps(
+                {
+                    "id": ["101", "102"],
+                    "subject": ["Re: a|b", "Line\none"],
+                    "sender": ["a@example.com", "b@example.com"],
+                    "date_received": ["Monday, January 6, 2025 at 9:15:00 AM"] * 2,
+                    "read_status": [True, False],
+                }
+            )
+        )
+
+        messages = connector.search_messages("Gmail", sender_contains="example", limit=2)
+
+        command = mock_run.call_args[0][0]
+        assert command[:3] == ["/usr/bin/osascript", "-l", "JavaScript"]
+        assert command[3] == str(tmp_path / "JavaScript")
+        assert command[4:] == ["Gmail", "INBOX", "example", "", "", "2"]
+        assert connector.script_cache.path_for.call_args[0][0] == SEARCH_MESSAGES
+        assert messages[1] == {
+            "id": "102",
+            "subject": "Line\none",
+            "sender": "b@example.com",
+            "date_received": "Monday, January 6, 2025 at 9:15:00 AM",
+            "read_status": False,
+        }
+
+    @patch("subprocess.run")
+    def test_list_mailboxes(self, mock_run: MagicMock, connector: JXAMailConnector) -> None:
+        mock_run.return_value = reply('{"name": ["INBOX", "Sent"], "unread_count": [3, 0]}')
+
+        assert connector.list_mailboxes("Gmail") == [
+            {"name": "INBOX", "unread_count": 3},
+            {"name": "Sent", "unread_count": 0},
+        ]
+
+    @patch("subprocess.run")
+    def test_get_message(self, mock_run: MagicMock, connector: JXAMailConnector) -> None:
+        mock_run.return_value = reply(json.dumps({"id": "7", "subject": "Hi", "content": ""}))
+
+        message = connector.get_message("7", include_content=False)
+
+        assert message["subject"] == "Hi"
+        assert mock_run.call_args[0][0][4:] == ["7", "false"]
+        assert connector.script_cache.path_for.call_args[0][0] == GET_MESSAGE
+
+    @patch("subprocess.run")
+    def test_errors_map_like_applescript(
+        self, mock_run: MagicMock, connector: JXAMailConnector
+    ) -> None:
+        mock_run.return_value = reply(
+            "", 1, 'execution error: Error: Can\'t get account "Nope". (-2700)'
+        )
+        with pytest.raises(MailAccountNotFoundError):
+            connector.search_messages("Nope")
+
+        mock_run.return_value = reply(
+            "", 1, "execution error: Error: Can't get message id 9. (-2700)"
+        )
+        with pytest.raises(MailMessageNotFoundError):
+            connector.get_attachments("9")
+
+    @patch("subprocess.run")
+    def test_mutations_stay_applescript(
+        self, mock_run: MagicMock, connector: JXAMailConnector, tmp_path: Path
+    ) -> None:
+        mock_run.return_value = reply("1\x1f2")
+
+        assert connector.mark_as_read(["1", "2"]) == 2
+
+        command = mock_run.call_args[0][0]
+        assert command[:2] == ["/usr/bin/osascript", str(tmp_path / "AppleScript")]
+        assert connector.script_cache.path_for.call_args[0][0] == templates.MARK_AS_READ
+
+    def test_templates_are_marked(self) -> None:
+        assert isinstance(SEARCH_MESSAGES, JXAScript)
+        assert "function run(argv)" in SEARCH_MESSAGES
+        assert not isinstance(templates.MARK_AS_READ, JXAScript)
@@ -0,0 +1,161 @@
+"""Unit tests for the message location index."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp import templates
+from apple_mail_mcp.locations import MessageLocations
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.wire import FIELD_SEP, encode_columns
+
+ID_TEMPLATES = [
+    templates.GET_MESSAGE,
+    templates.GET_ATTACHMENTS,
+    templates.SAVE_SOURCE,
+    templates.MARK_AS_READ,
+    templates.MOVE_MESSAGES,
+    templates.MOVE_MESSAGES_GMAIL,
+    templates.FLAG_MESSAGE,
+    templates.DELETE_MESSAGES,
+    templates.REPLY_TO_MESSAGE,
+    templates.FORWARD_MESSAGE,
+]
+
+
+class TestMessageLocations:
+    """Tests for MessageLocations."""
+
+    def test_record_and_get(self) -> None:
+        locations = MessageLocations()
+        locations.record("Gmail", "INBOX", ["1", "2"])
+
+        assert locations.get("1") == ("Gmail", "INBOX")
+        assert locations.get("3") is None
+        assert locations.stats() == {"entries": 2, "hits": 1, "misses": 1}
+
+    def test_annotate(self) -> None:
+        locations = MessageLocations()
+        locations.record("Gmail", "Archive/2024", ["1"])
+
+        assert locations.annotate(["1", "2"]) == [
+            f"1{FIELD_SEP}Gmail{FIELD_SEP}Archive/2024",
+            "2",
+        ]
+
+    def test_evicts_least_recently_used(self) -> None:
+        locations = MessageLocations(max_entries=2)
+        locations.record("Gmail", "INBOX", ["1", "2"])
+        locations.get("1")
+
+        locations.record("Gmail", "INBOX", ["3"])
+
+        assert locations.get("2") is None
+        assert locations.get("1") is not None
+        assert len(locations) == 2
+
+    def test_discard(self) -> None:
+        locations = MessageLocations()
+        locations.record("Gmail", "INBOX", ["1"])
+
+        locations.discard(["1", "unknown"])
+
+        assert len(locations) == 0
+
+
+class TestConnectorLocations:
+    """Tests for how the connector fills and uses the index."""
+
+    @pytest.fixture
+    def connector(self) -> AppleMailConnector:
+        """Create a connector that has listed messages 1 and 2 in Gmail/INBOX."""
+        connector = AppleMailConnector()
+        rows = [[message_id, "S", "s@example.com", "d", False, ""] for message_id in ("1", "2")]
+        with patch.object(connector, "_run_applescript", return_value=encode_columns(rows)):
+            connector.search_messages("Gmail", "INBOX")
+        return connector
+
+    def test_search_fills_index(self, connector: AppleMailConnector) -> None:
+        assert connector.locations.get("2") == ("Gmail", "INBOX")
+        assert connector.stats()["locations"]["entries"] == 2
+
+    @patch.object(AppleMailConnector, "_run_applescript", return_value="1")
+    def test_mutations_group_ids_by_mailbox(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        connector.mark_as_read(["1", "99", "2", "1"])
+
+        args = mock_run.call_args[0][1]
+        assert args == [
+            "true",
+            FIELD_SEP.join(["Gmail", "INBOX", "1", "2"]),
+            FIELD_SEP.join(["", "", "99"]),
+        ]
+
+    @patch("apple_mail_mcp.mail_connector.MUTATION_CHUNK_SIZE", 1)
+    @patch.object(AppleMailConnector, "_run_applescript", return_value="1")
+    def test_large_groups_are_chunked(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        connector.delete_messages(["1", "2"])
+
+        assert mock_run.call_args[0][1] == [
+            FIELD_SEP.join(["Gmail", "INBOX", "1"]),
+            FIELD_SEP.join(["Gmail", "INBOX", "2"]),
+        ]
+
+    @patch.object(AppleMailConnector, "_run_applescript", return_value="2")
+    def test_move_updates_index(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        connector.move_messages(["2"], "Archive", "Gmail")
+        connector.move_messages(["1"], "Archive", "Gmail")
+
+        assert connector.locations.get("2") == ("Gmail", "Archive")
+        # Not moved: the old location stays
+        assert connector.locations.get("1") == ("Gmail", "INBOX")
+
+        connector.move_messages(["2"], "[Gmail]/All Mail", "Gmail", gmail_mode=True)
+        assert connector.locations.get("2") is None
+
+    @patch.object(AppleMailConnector, "_run_applescript", return_value="1")
+    def test_delete_forgets(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        connector.delete_messages(["1"])
+
+        assert connector.locations.get("1") is None
+
+    @patch.object(AppleMailConnector, "_run_applescript", side_effect=RuntimeError("boom"))
+    def test_failed_move_keeps_index(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        with pytest.raises(RuntimeError):
+            connector.move_messages(["1"], "Archive", "Gmail")
+
+        assert connector.locations.get("1") == ("Gmail", "INBOX")
+
+
+class TestFindMessageHandler:
+    """Tests for the AppleScript side of location lookups."""
+
+    @pytest.mark.parametrize(
+        "template",
+        [
+            templates.MARK_AS_READ,
+            templates.FLAG_MESSAGE,
+            templates.MOVE_MESSAGES,
+            templates.MOVE_MESSAGES_GMAIL,
+            templates.DELETE_MESSAGES,
+        ],
+    )
+    def test_mutations_are_set_based(self, template: str) -> None:
+        assert "(messages of mb whose id is in foundIds)" in template
+        assert "TARGET" not in template
+
+    @pytest.mark.parametrize("template", ID_TEMPLATES)
+    def test_id_templates_use_handler(self, template: str) -> None:
+        assert "my findMessage(" in template
+        assert template.count("on findMessage(msgRef)") == 1
+        assert "first message of mb whose id is" not in template.split("on findMessage")[0]
+
+    def test_batch_defines_handler_once(self) -> None:
+        script = templates.batch_script([templates.MARK_AS_READ, templates.GET_MESSAGE])
+
+        assert script.count("on findMessage(msgRef)") == 1
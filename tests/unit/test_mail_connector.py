@@ -1,9 +1,11 @@
 """Unit tests for mail connector."""
 
+from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 import pytest
 
+from apple_mail_mcp import templates
 from apple_mail_mcp.exceptions import (
     MailAccountNotFoundError,
     MailAppleScriptError,
@@ -11,6 +13,7 @@ from apple_mail_mcp.exceptions import (
     MailMessageNotFoundError,
 )
 from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.wire import FIELD_SEP, RECORD_SEP, encode_columns, encode_records
 
 
 class TestAppleMailConnector:
@@ -93,7 +96,9 @@ class TestAppleMailConnector:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test basic message search."""
-        mock_run.return_value = "12345|Test Subject|sender@example.com|Mon Jan 1 2024|false"
+        mock_run.return_value = encode_columns(
+            [["12345", "Test Subject", "sender@example.com", "Mon Jan 1 2024", False, "19723:0"]]
+        )
 
         result = connector.search_messages("Gmail", "INBOX")
 
@@ -102,6 +107,7 @@ class TestAppleMailConnector:
         assert result[0]["subject"] == "Test Subject"
         assert result[0]["sender"] == "sender@example.com"
         assert result[0]["read_status"] is False
+        assert result[0]["timestamp"] == int(datetime(2024, 1, 1).timestamp())
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_search_messages_with_filters(
@@ -120,19 +126,136 @@ class TestAppleMailConnector:
         )
 
         # Verify the script includes filter conditions
-        call_args = mock_run.call_args[0][0]
-        assert 'sender of msg contains "john@example.com"' in call_args
-        assert 'subject of msg contains "meeting"' in call_args
-        assert "read status of msg is false" in call_args
-        # Optimized implementation exits early when limit is reached
-        assert "if matchCount >= 10 then exit repeat" in call_args
+        script, args = mock_run.call_args[0]
+        assert (
+            "whose sender contains senderFilter and subject contains subjectFilter"
+            " and read status is readFilter" in script
+        )
+        # Each property is read for all matches at once, then truncated
+        assert "set msgSubjects to items 1 thru msgCount of (subject of" in script
+        assert "repeat" not in script.split("end run")[0]
+
+        # Filter values are passed as arguments, not interpolated
+        assert args == ["Gmail", "INBOX", "john@example.com", "meeting", "false", "10"]
+        assert "john@example.com" not in script
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_search_messages_date_window(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Test that an unfiltered date window is a binary-searched range, not a whose test."""
+        mock_run.return_value = ""
+
+        connector.search_messages("Gmail", received_after=datetime(2025, 1, 6), limit=10)
+
+        script, args = mock_run.call_args[0]
+        assert "my firstOlder(mailboxRef, afterDate, msgCount)" in script
+        assert "of messages firstIndex thru lastIndex of mailboxRef" in script
+        assert "whose" not in script
+        # 2025-01-06 00:00 local time, as days and seconds since 1970; no upper bound
+        assert args == ["Gmail", "INBOX", "", "", "", "10", "20094", "0", "", ""]
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_search_messages_query(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Test that a query joins the whose clause and its values are arguments."""
+        mock_run.return_value = ""
+
+        page = connector.search_messages(
+            "Gmail", read_status=False, query="from alice or bob, not subject x", limit=10
+        )
+
+        script, args = mock_run.call_args[0]
+        assert (
+            "whose read status is readFilter and ((sender contains queryValue1 or sender"
+            " contains queryValue2) and subject does not contain queryValue3)" in script
+        )
+        assert "set queryValue1 to item 7 of argv" in script
+        assert args == ["Gmail", "INBOX", "", "", "false", "10", "alice", "bob", "x"]
+        assert "alice" not in script
+        assert page.plan["strategy"] == "whose"
+
+        with pytest.raises(ValueError, match="Unknown filter"):
+            connector.search_messages("Gmail", query="frm alice")
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_search_messages_query_residual(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Test that regex terms filter a page of candidates, then the limit applies."""
+        rows = [[str(n), "Lunch", "ann@example.com", "Monday", False, ""] for n in range(50, 0, -1)]
+        rows[1][1] = "Re: lunch"
+        rows[2][1] = "RE: report"
+        mock_run.return_value = encode_columns(rows)
+
+        page = connector.search_messages("Gmail", query='from ann subject matches "^re:"', limit=1)
+
+        script, args = mock_run.call_args[0]
+        assert "whose sender contains queryValue1" in script
+        # Candidates are fetched a page at a time, and only until enough matched
+        assert args == ["Gmail", "INBOX", "", "", "", "50", "ann"]
+        assert mock_run.call_count == 1
+        assert [m["id"] for m in page] == ["49"]
+        assert page.next_cursor is not None
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_search_messages_plans_a_hybrid_scan(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Test that a limited search for common matches in a large mailbox scans the window."""
+        mock_run.return_value = RECORD_SEP.join(["40", "50000", "0", "", "", "", "", "", ""])
+        connector.planner.record_size("Gmail", "INBOX", 50000)
+
+        page = connector.search_messages(
+            "Gmail", read_status=False, received_after=datetime(2025, 1, 6), limit=10
+        )
+
+        script, args = mock_run.call_args[0]
+        assert mock_run.call_count == 1
+        assert "my firstOlder(mailboxRef, afterDate, mailboxSize)" in script
+        assert "whose" not in script
+        # The chunk is sized to reach the limit at the default unread selectivity
+        assert args == ["Gmail", "INBOX", "", "", "false", "10", "63", "20094", "0", "", ""]
+        assert page.plan["strategy"] == "hybrid"
+        assert set(page.plan["estimates_ms"]) == {"hybrid", "whose"}
+        # Nothing matched among the 40 messages examined
+        assert connector.planner.selectivity("Gmail", "INBOX", ("read=false",)) == 0.5 / 40
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_search_messages_probes_mailbox_size(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Test that a filtered search asks for the mailbox size once, then plans with it."""
+        mock_run.side_effect = ["100", "", ""]
+
+        first = connector.search_messages("Gmail", sender_contains="john")
+        connector.search_messages("Gmail", sender_contains="john")
+
+        assert mock_run.call_args_list[0][0][0] == templates.COUNT_MESSAGES
+        assert mock_run.call_count == 3
+        assert first.plan["mailbox_size"] == 100
+        assert first.plan["strategy"] == "whose"
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_get_message(
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test getting a message."""
-        mock_run.return_value = "12345|Subject|sender@example.com|Mon Jan 1 2024|true|false|Message body"
+        mock_run.return_value = encode_records(
+            [
+                [
+                    "12345",
+                    "Subject",
+                    "sender@example.com",
+                    "Mon Jan 1 2024",
+                    True,
+                    False,
+                    "Message body",
+                    "19723:0",
+                ]
+            ]
+        )
 
         result = connector.get_message("12345", include_content=True)
 
@@ -175,7 +298,8 @@ class TestAppleMailConnector:
         assert result is True
 
         # Verify script includes recipients
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "recipient@example.com" in call_args
         assert "cc@example.com" in call_args
         assert "bcc@example.com" in call_args
@@ -196,9 +320,10 @@ class TestAppleMailConnector:
         assert result == "draft_12345"
 
         # Verify script calls save but not send command
-        call_args = mock_run.call_args[0][0]
-        assert "save" in call_args
-        assert "\n                send\n" not in call_args  # Check for send as standalone command
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
+        assert "save" in script
+        assert "\n                send\n" not in script  # Check for send as standalone command
         assert "Draft Test" in call_args
 
     @patch.object(AppleMailConnector, "_run_applescript")
@@ -219,7 +344,8 @@ class TestAppleMailConnector:
         assert result == "draft_12346"
 
         # Verify script includes all recipients
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "recipient@example.com" in call_args
         assert "cc@example.com" in call_args
         assert "bcc@example.com" in call_args
@@ -229,26 +355,41 @@ class TestAppleMailConnector:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test marking messages as read."""
-        mock_run.return_value = "2"
+        mock_run.return_value = f"12345{FIELD_SEP}12346"
 
         result = connector.mark_as_read(["12345", "12346"], read=True)
 
         assert result == 2
+        assert result.outcomes == {"12345": "ok", "12346": "ok"}
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_mutation_reports_outcome_per_id(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Test that ids the script did not change are reported, once each."""
+        mock_run.return_value = "12346"
+
+        result = connector.mark_as_read(["12345", "12346", "12345"])
+
+        assert result == 1
+        assert result.not_found == ["12345"]
+        assert mock_run.call_args[0][1] == ["true", f"{FIELD_SEP}{FIELD_SEP}12345{FIELD_SEP}12346"]
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_mark_as_unread(
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test marking messages as unread."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.mark_as_read(["12345"], read=False)
 
         assert result == 1
 
         # Verify script sets read status to false
-        call_args = mock_run.call_args[0][0]
-        assert "set read status of msg to false" in call_args
+        script, args = mock_run.call_args[0]
+        assert "set read status of msg to newStatus" in script
+        assert args == ["false", f"{FIELD_SEP}{FIELD_SEP}12345"]
 
     def test_mark_as_read_empty_list(self, connector: AppleMailConnector) -> None:
         """Test marking with empty list."""
@@ -260,7 +401,9 @@ class TestAppleMailConnector:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test listing all email accounts."""
-        mock_run.return_value = "Gmail|gmail@example.com\niCloud|icloud@example.com"
+        mock_run.return_value = encode_records(
+            [["Gmail", "gmail@example.com"], ["iCloud", "icloud@example.com"]]
+        )
 
         result = connector.list_accounts()
 
@@ -0,0 +1,314 @@
+"""Unit tests for mail backends and the in-memory backend."""
+
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from apple_mail_mcp.async_connector import AsyncAppleMailConnector
+from apple_mail_mcp.backend import MailBackend, create_backend
+from apple_mail_mcp.exceptions import (
+    MailAccountNotFoundError,
+    MailAppleScriptError,
+    MailMailboxNotFoundError,
+    MailMessageNotFoundError,
+)
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.memory_backend import InMemoryBackend, MemoryAttachment, format_date
+
+
+@pytest.fixture
+def backend() -> InMemoryBackend:
+    """Create a backend with one account and a few messages."""
+    backend = InMemoryBackend()
+    backend.add_account("Gmail", "me@gmail.com")
+    backend.add_message(
+        "Gmail", "INBOX", "Old report", "boss@example.com", "Q1", datetime(2025, 1, 1, 9)
+    )
+    backend.add_message(
+        "Gmail",
+        "INBOX",
+        "New report",
+        "boss@example.com",
+        "Q2",
+        datetime(2025, 2, 1, 14, 5),
+        read=True,
+        attachments=[MemoryAttachment("q2.pdf", b"%PDF", "application/pdf")],
+    )
+    backend.add_message(
+        "Gmail", "INBOX", "Lunch?", "friend@example.org", "Noon", datetime(2025, 3, 1, 11)
+    )
+    return backend
+
+
+class TestBackendSelection:
+    """Tests for the MailBackend protocol and create_backend."""
+
+    def test_both_backends_implement_protocol(self) -> None:
+        assert isinstance(AppleMailConnector(), MailBackend)
+        assert isinstance(InMemoryBackend(), MailBackend)
+
+    def test_create_backend(self) -> None:
+        backend = create_backend("memory", accounts=1, messages_per_mailbox=3)
+
+        assert isinstance(backend, InMemoryBackend)
+        assert [a["name"] for a in backend.list_accounts()] == ["Work"]
+        assert len(backend.search_messages("Work", "Archive")) == 3
+
+    def test_unknown_backend(self) -> None:
+        with pytest.raises(ValueError, match="Unknown mail backend"):
+            create_backend("exchange")
+
+    def test_server_uses_configured_backend(self) -> None:
+        from apple_mail_mcp import server
+
+        with patch.dict(
+            "os.environ",
+            {"APPLE_MAIL_MCP_BACKEND": "memory", "APPLE_MAIL_MCP_MEMORY_MESSAGES": "5"},
+        ):
+            backend = server._create_backend()
+
+        assert isinstance(backend, InMemoryBackend)
+        assert len(backend.search_messages("Work")) == 5
+
+    def test_sample_data_is_deterministic(self) -> None:
+        first = InMemoryBackend.with_sample_data(messages_per_mailbox=20, seed=3)
+        second = InMemoryBackend.with_sample_data(messages_per_mailbox=20, seed=3)
+
+        assert first.search_messages("Personal") == second.search_messages("Personal")
+
+
+class TestReads:
+    """Tests for reading from the in-memory backend."""
+
+    def test_list_accounts(self, backend: InMemoryBackend) -> None:
+        assert backend.list_accounts() == [{"name": "Gmail", "email": "me@gmail.com"}]
+
+    def test_list_mailboxes(self, backend: InMemoryBackend) -> None:
+        mailboxes = backend.list_mailboxes("Gmail")
+
+        assert {"name": "INBOX", "unread_count": 2} in mailboxes
+
+    def test_search_newest_first_with_filters(self, backend: InMemoryBackend) -> None:
+        messages = backend.search_messages("Gmail", sender_contains="BOSS")
+
+        assert [m["subject"] for m in messages] == ["New report", "Old report"]
+        assert messages[0]["date_received"] == "Saturday, February 1, 2025 at 2:05:00 PM"
+
+        unread = backend.search_messages("Gmail", read_status=False, limit=1)
+        assert [m["subject"] for m in unread] == ["Lunch?"]
+
+    def test_search_date_window(self, backend: InMemoryBackend) -> None:
+        def subjects(**window: datetime) -> list[str]:
+            return [m["subject"] for m in backend.search_messages("Gmail", **window)]
+
+        assert subjects(received_after=datetime(2025, 2, 1, 14, 5)) == ["Lunch?", "New report"]
+        assert subjects(received_before=datetime(2025, 2, 1, 14, 5)) == ["Old report"]
+        assert subjects(
+            received_after=datetime(2025, 1, 15), received_before=datetime(2025, 3, 1)
+        ) == ["New report"]
+
+    def test_search_query(self, backend: InMemoryBackend) -> None:
+        def subjects(query: str, **filters: object) -> list[str]:
+            return [m["subject"] for m in backend.search_messages("Gmail", query=query, **filters)]
+
+        assert subjects("from friend or read") == ["Lunch?", "New report"]
+        assert subjects('subject matches "^(old|lunch)"', limit=1) == ["Lunch?"]
+        assert subjects("not from friend", read_status=False) == ["Old report"]
+        with pytest.raises(ValueError):
+            backend.search_messages("Gmail", query="from")
+
+    def test_iter_messages(self, backend: InMemoryBackend) -> None:
+        messages = backend.iter_messages("Gmail", subject_contains="report")
+
+        assert next(messages)["subject"] == "New report"
+        messages.close()
+        assert backend.scheduler.stats()["active"] == 0
+
+    def test_get_message(self, backend: InMemoryBackend) -> None:
+        message_id = backend.search_messages("Gmail", subject_contains="Lunch")[0]["id"]
+
+        message = backend.get_message(message_id)
+
+        assert message["content"] == "Noon"
+        assert message["flagged"] is False
+        assert backend.get_message(message_id, include_content=False)["content"] == ""
+
+    def test_not_found(self, backend: InMemoryBackend) -> None:
+        with pytest.raises(MailAccountNotFoundError):
+            backend.search_messages("Nope")
+        with pytest.raises(MailMailboxNotFoundError):
+            backend.search_messages("Gmail", "Nope")
+        with pytest.raises(MailMessageNotFoundError):
+            backend.get_message("999")
+        with pytest.raises(ValueError, match="Invalid message ID"):
+            backend.get_message("1 or 2")
+
+    def test_attachments(self, backend: InMemoryBackend, tmp_path: Path) -> None:
+        message_id = backend.search_messages("Gmail", subject_contains="New")[0]["id"]
+
+        assert backend.get_attachments(message_id) == [
+            {"name": "q2.pdf", "mime_type": "application/pdf", "size": 4, "downloaded": True}
+        ]
+        assert backend.save_attachments(message_id, tmp_path) == 1
+        assert (tmp_path / "q2.pdf").read_bytes() == b"%PDF"
+
+
+class TestMutations:
+    """Tests for changing state in the in-memory backend."""
+
+    def ids(self, backend: InMemoryBackend, mailbox: str = "INBOX") -> list[str]:
+        return [m["id"] for m in backend.search_messages("Gmail", mailbox)]
+
+    def test_mark_and_flag(self, backend: InMemoryBackend) -> None:
+        ids = self.ids(backend)
+
+        result = backend.mark_as_read(ids + ["999"])
+        assert result == 3
+        assert result.not_found == ["999"]
+        assert backend.search_messages("Gmail", read_status=False) == []
+
+        assert backend.flag_message(ids[:1], "red") == 1
+        assert backend.get_message(ids[0])["flagged"] is True
+        with pytest.raises(ValueError, match="Invalid flag color"):
+            backend.flag_message(ids, "pink")
+
+    def test_move_and_delete(self, backend: InMemoryBackend) -> None:
+        ids = self.ids(backend)
+
+        assert backend.move_messages(ids[:2] + ids[:1], "Archive", "Gmail") == 2
+        assert self.ids(backend, "Archive") == ids[:2]
+        with pytest.raises(MailMailboxNotFoundError):
+            backend.move_messages(ids, "Nope", "Gmail")
+
+        assert backend.delete_messages(ids[:1]) == 1
+        assert self.ids(backend, "Trash") == ids[:1]
+        assert backend.delete_messages(ids[:1], permanent=True) == 1
+        with pytest.raises(MailMessageNotFoundError):
+            backend.get_message(ids[0])
+
+    def test_update_matching(self, backend: InMemoryBackend) -> None:
+        assert backend.update_matching(
+            "Gmail", "INBOX", "mark_as_read", sender_contains="BOSS@", dry_run=True
+        ) == {"matched": 2, "changed": 0}
+        assert backend.update_matching(
+            "Gmail", "INBOX", "delete_messages", older_than_days=0, max_messages=2
+        ) == {"matched": 3, "changed": 0}
+        assert len(self.ids(backend)) == 3
+
+        assert backend.update_matching(
+            "Gmail", "INBOX", "move_messages", read_status=False, destination_mailbox="Archive"
+        ) == {"matched": 2, "changed": 2}
+        assert [m["subject"] for m in backend.search_messages("Gmail")] == ["New report"]
+
+    def test_create_mailbox(self, backend: InMemoryBackend) -> None:
+        assert backend.create_mailbox("Gmail", "Client Work", parent_mailbox="Archive") is True
+        assert backend.search_messages("Gmail", "Archive/Client Work") == []
+
+        with pytest.raises(MailAppleScriptError, match="already exists"):
+            backend.create_mailbox("Gmail", "Archive")
+
+    def test_compose(self, backend: InMemoryBackend) -> None:
+        original = self.ids(backend)[0]
+
+        assert backend.send_email("Hi", "Body", ["a@example.com"]) is True
+        draft_id = backend.create_draft("Later", "Body", ["a@example.com"])
+        reply_id = backend.reply_to_message(original, "Thanks")
+        forward_id = backend.forward_message(original, ["b@example.com"])
+
+        assert backend.get_message(draft_id)["subject"] == "Later"
+        assert backend.get_message(reply_id)["subject"] == "Re: Lunch?"
+        assert backend.get_message(forward_id)["subject"] == "Fwd: Lunch?"
+        assert len(backend.search_messages("Gmail", "Sent")) == 3
+        with pytest.raises(ValueError, match="Invalid email address"):
+            backend.send_email("Hi", "Body", ["not an address"])
+
+    def test_batch(self, backend: InMemoryBackend) -> None:
+        ids = self.ids(backend)
+
+        results = backend.batch(
+            [
+                {"operation": "get_message", "params": {"message_id": ids[0]}},
+                {"operation": "mark_as_read", "params": {"message_ids": ids}},
+                {
+                    "operation": "move_messages",
+                    "params": {
+                        "message_ids": ids,
+                        "destination_mailbox": "Nope",
+                        "account": "Gmail",
+                    },
+                },
+                {"operation": "send_email", "params": {}},
+            ]
+        )
+
+        assert results[0]["result"]["subject"] == "Lunch?"
+        assert results[1] == {"operation": "mark_as_read", "success": True, "result": 3}
+        assert results[2]["error_type"] == "mailbox_not_found"
+        assert results[3]["error_type"] == "validation_error"
+        # One call, in the least urgent lane among the operations
+        assert backend.stats()["calls"] == {"search_messages": 1, "mark_as_read": 1}
+
+    async def test_batch_tool_parses_dates(self, backend: InMemoryBackend) -> None:
+        from apple_mail_mcp import server
+
+        with patch.object(server, "mail", AsyncAppleMailConnector(backend)):
+            response = await server.batch(
+                [
+                    {
+                        "operation": "search_messages",
+                        "params": {"account": "Gmail", "received_after": "2025-02-01"},
+                    },
+                    {
+                        "operation": "search_messages",
+                        "params": {"account": "Gmail", "received_before": "someday"},
+                    },
+                    {"operation": "list_accounts", "params": {}},
+                ]
+            )
+
+        results = response["results"]
+        assert [m["subject"] for m in results[0]["result"]] == ["Lunch?", "New report"]
+        assert results[1]["error_type"] == "validation_error"
+        assert "Unrecognized date" in results[1]["error"]
+        assert results[2]["success"] is True
+        assert response["failed"] == 1
+
+
+class TestConcurrency:
+    """Tests for latency, scheduling and coalescing."""
+
+    def test_latency_holds_scheduler_slot(self) -> None:
+        backend = InMemoryBackend(latency={"list_accounts": 0.2})
+
+        started = time.monotonic()
+        backend.list_accounts()
+
+        assert time.monotonic() - started >= 0.2
+        lane = backend.scheduler.stats()["lanes"]["interactive"]
+        assert lane["completed"] == 1
+
+    def test_identical_reads_are_coalesced(self, backend: InMemoryBackend) -> None:
+        backend.latency = 0.2
+        threads = [threading.Thread(target=backend.list_accounts) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert backend.stats()["calls"] == {"list_accounts": 1}
+        assert backend.stats()["coalescing"]["coalesced"] == 4
+
+    async def test_async_front_end(self, backend: InMemoryBackend) -> None:
+        mail = AsyncAppleMailConnector(backend)
+
+        messages = await mail.search_messages("Gmail", limit=2)
+
+        assert len(messages) == 2
+
+
+def test_format_date() -> None:
+    assert format_date(datetime(2025, 1, 6, 0, 7, 3)) == "Monday, January 6, 2025 at 12:07:03 AM"
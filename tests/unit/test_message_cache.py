@@ -0,0 +1,219 @@
+"""Unit tests for the SQLite message cache."""
+
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.memory_backend import format_date
+from apple_mail_mcp.message_cache import CachedListing, MessageCache
+from apple_mail_mcp.query import compile_query
+from apple_mail_mcp.wire import FIELD_SEP, encode_columns, encode_date_key
+
+
+def message(message_id: str, subject: str, sender: str, day: int, read: bool = False) -> dict:
+    """Build a listing entry as search_messages returns it."""
+    return {
+        "id": message_id,
+        "subject": subject,
+        "sender": sender,
+        "date_received": format_date(datetime(2025, 1, day, 9)),
+        "read_status": read,
+        "timestamp": int(datetime(2025, 1, day, 9).timestamp()),
+    }
+
+
+INBOX = [
+    message("1", "Quarterly report", "Boss <boss@example.com>", 1),
+    message("2", "Lunch?", "Ann <ann@example.com>", 3, read=True),
+    message("3", "Re: quarterly REPORT", "Ann <ann@example.com>", 2),
+]
+
+
+@pytest.fixture
+def cache() -> MessageCache:
+    """Create an in-memory cache holding Gmail/INBOX."""
+    cache = MessageCache(":memory:")
+    cache.store_mailbox("Gmail", "INBOX", INBOX)
+    return cache
+
+
+class TestMessageCache:
+    """Tests for MessageCache."""
+
+    def test_dates_are_keyed_by_timestamp(self) -> None:
+        """Windows and order use the timestamp, whatever language the date text is in."""
+        cache = MessageCache(":memory:")
+        french = {**INBOX[0], "date_received": "mercredi 1 janvier 2025 à 09:00:00"}
+        cache.store_mailbox("Gmail", "INBOX", [INBOX[1], INBOX[2], french])
+
+        results = cache.search("Gmail", "INBOX", received_before=datetime(2025, 1, 2))
+
+        assert results == [french]
+        assert [m["id"] for m in cache.search("Gmail", "INBOX")] == ["2", "3", "1"]
+
+    def test_search_newest_first(self, cache: MessageCache) -> None:
+        results = cache.search("Gmail", "INBOX")
+
+        assert isinstance(results, CachedListing)
+        assert [m["id"] for m in results] == ["2", "3", "1"]
+        assert results[0] == INBOX[1]
+        assert results.age < 5
+
+    def test_search_filters(self, cache: MessageCache) -> None:
+        assert [m["id"] for m in cache.search("Gmail", subject_contains="report")] == ["3", "1"]
+        assert [m["id"] for m in cache.search("Gmail", sender_contains="ann@")] == ["2", "3"]
+        assert [
+            m["id"] for m in cache.search("Gmail", sender_contains="ann", subject_contains="Re")
+        ] == ["3"]
+        assert [m["id"] for m in cache.search("Gmail", read_status=False, limit=1)] == ["3"]
+        assert cache.search("Gmail", subject_contains='"; DROP') == []
+        assert cache.search("Gmail", "Archive") == []
+
+    def test_search_date_window(self, cache: MessageCache) -> None:
+        def ids(**window: datetime) -> list[str]:
+            return [m["id"] for m in cache.search("Gmail", **window)]
+
+        assert ids(received_after=datetime(2025, 1, 2, 9)) == ["2", "3"]
+        assert ids(received_before=datetime(2025, 1, 2, 9)) == ["1"]
+        assert ids(received_after=datetime(2025, 1, 2), received_before=datetime(2025, 1, 3)) == [
+            "3"
+        ]
+
+    def test_search_query(self, cache: MessageCache) -> None:
+        def ids(query: str, **filters: object) -> list[str]:
+            return [m["id"] for m in cache.search("Gmail", query=compile_query(query), **filters)]
+
+        assert ids("from boss or subject lunch") == ["2", "1"]
+        assert ids("not from boss, unread") == ["3"]
+        assert ids("subject report", sender_contains="boss") == ["1"]
+        assert ids("after 2025-01-02") == ["2", "3"]
+        # Only the pushdown part is applied here
+        assert ids('subject matches "^re:"') == ["2", "3", "1"]
+
+    def test_short_filters_use_like(self, cache: MessageCache) -> None:
+        assert [m["id"] for m in cache.search("Gmail", subject_contains="Lu")] == ["2"]
+        assert cache.search("Gmail", subject_contains="%") == []
+
+    def test_store_replaces_mailbox(self, cache: MessageCache) -> None:
+        cache.store_mailbox("Gmail", "INBOX", INBOX[:1])
+
+        assert [m["id"] for m in cache.search("Gmail", subject_contains="report")] == ["1"]
+        assert cache.stats()["messages"] == 1
+
+    def test_freshness(self, cache: MessageCache) -> None:
+        assert cache.is_fresh("Gmail", "INBOX")
+        assert not cache.is_fresh("Gmail", "Archive")
+
+        cache.max_age = 0
+        assert not cache.is_fresh("Gmail", "INBOX")
+        cache.max_age = 60
+        cache.invalidate("Gmail", "INBOX")
+        assert not cache.is_fresh("Gmail", "INBOX")
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 3
+
+    def test_write_through(self, cache: MessageCache) -> None:
+        cache.update(["1", "unknown"], read=True)
+        cache.move(["3"], "Gmail", "Archive")
+        cache.delete(["2"])
+
+        assert cache.search("Gmail", read_status=True) == [INBOX[0] | {"read_status": True}]
+        assert [m["id"] for m in cache.search("Gmail", "Archive", sender_contains="ann")] == ["3"]
+
+    def test_persists_in_wal_mode(self, tmp_path: Path) -> None:
+        path = tmp_path / "cache" / "messages.db"
+        MessageCache(path).store_mailbox("Gmail", "INBOX", INBOX)
+
+        reopened = MessageCache(path)
+        assert reopened._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert len(reopened.search("Gmail", subject_contains="quarterly")) == 2
+
+
+class TestConnectorCache:
+    """Tests for how the connector uses the cache."""
+
+    @pytest.fixture
+    def connector(self) -> AppleMailConnector:
+        """Create a connector with an empty in-memory cache."""
+        return AppleMailConnector(cache=MessageCache(":memory:"))
+
+    def test_query_residual_reads_pages_until_the_limit(
+        self, connector: AppleMailConnector
+    ) -> None:
+        assert connector.cache is not None
+        listing = [
+            {**message(str(n), f"Note {n}", "ann@example.com", 1), "read_status": False}
+            for n in range(1, 201)
+        ]
+        connector.cache.store_mailbox("Gmail", "INBOX", listing)
+
+        with patch.object(connector.cache, "search", wraps=connector.cache.search) as search:
+            page = connector.search_messages("Gmail", query='subject matches "^note 12.$"', limit=2)
+
+        assert [m["id"] for m in page] == ["129", "128"]
+        # Pages of 50 then 100 candidates, never the whole mailbox
+        assert [call.args[5] for call in search.call_args_list] == [50, 100]
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_search_syncs_once(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        mock_run.return_value = encode_columns(
+            [
+                [
+                    m["id"],
+                    m["subject"],
+                    m["sender"],
+                    m["date_received"],
+                    m["read_status"],
+                    encode_date_key(m["timestamp"]),
+                ]
+                for m in INBOX
+            ]
+        )
+
+        first = connector.search_messages("Gmail", subject_contains="report")
+        second = connector.search_messages("Gmail", sender_contains="ann", limit=1)
+
+        assert [m["id"] for m in first] == ["3", "1"]
+        assert [m["id"] for m in second] == ["2"]
+        # One unfiltered listing of the mailbox answered both
+        assert mock_run.call_count == 1
+        assert mock_run.call_args[0][1][2:] == ["", "", "", "0"]
+        assert connector.locations.get("1") == ("Gmail", "INBOX")
+        assert connector.stats()["cache"]["messages"] == 3
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_mutations_write_through(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        assert connector.cache is not None
+        connector.cache.store_mailbox("Gmail", "INBOX", INBOX)
+        connector.cache.store_mailbox("Gmail", "Archive", [])
+
+        mock_run.return_value = "1"
+        connector.mark_as_read(["1", "3"])
+        mock_run.return_value = "2"
+        connector.move_messages(["2"], "Archive", "Gmail")
+
+        assert [m["id"] for m in connector.search_messages("Gmail", read_status=True)] == ["1"]
+        assert [m["id"] for m in connector.search_messages("Gmail", "Archive")] == ["2"]
+        assert mock_run.call_count == 2
+
+        mock_run.return_value = FIELD_SEP.join(["5", "5"])
+        connector.update_matching("Gmail", "INBOX", "mark_as_read")
+        assert not connector.cache.is_fresh("Gmail", "INBOX")
+
+    def test_without_cache_searches_mail(self) -> None:
+        connector = AppleMailConnector()
+        with patch.object(connector, "_run_applescript", return_value="") as mock_run:
+            connector.search_messages("Gmail", sender_contains="ann")
+
+        assert mock_run.call_args[0][1][2] == "ann"
+        assert "cache" not in connector.stats()
+
+
+def test_cached_listing_age() -> None:
+    assert CachedListing([], time.time() - 30).age >= 30
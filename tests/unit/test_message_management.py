@@ -1,5 +1,6 @@
 """Unit tests for message management functionality."""
 
+from typing import Any
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -10,6 +11,7 @@ from apple_mail_mcp.exceptions import (
     MailMailboxNotFoundError,
 )
 from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.wire import FIELD_SEP
 
 
 class TestMoveMessages:
@@ -25,7 +27,7 @@ class TestMoveMessages:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test moving a single message."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.move_messages(
             message_ids=["12345"],
@@ -34,7 +36,8 @@ class TestMoveMessages:
         )
 
         assert result == 1
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "Archive" in call_args
         assert "12345" in call_args
 
@@ -43,7 +46,7 @@ class TestMoveMessages:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test moving multiple messages."""
-        mock_run.return_value = "3"
+        mock_run.return_value = FIELD_SEP.join(["12345", "12346", "12347"])
 
         result = connector.move_messages(
             message_ids=["12345", "12346", "12347"],
@@ -58,7 +61,7 @@ class TestMoveMessages:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test moving to nested mailbox."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.move_messages(
             message_ids=["12345"],
@@ -67,7 +70,8 @@ class TestMoveMessages:
         )
 
         assert result == 1
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "Projects/Client Work" in call_args
 
     @patch.object(AppleMailConnector, "_run_applescript")
@@ -75,7 +79,7 @@ class TestMoveMessages:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test Gmail-specific move handling (copy + delete)."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.move_messages(
             message_ids=["12345"],
@@ -126,7 +130,7 @@ class TestFlagMessage:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test flagging message with red flag."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.flag_message(
             message_ids=["12345"],
@@ -134,8 +138,9 @@ class TestFlagMessage:
         )
 
         assert result == 1
-        call_args = mock_run.call_args[0][0]
-        assert "flag index" in call_args
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
+        assert "flag index" in script
         assert "1" in call_args  # Red is index 1
 
     @patch.object(AppleMailConnector, "_run_applescript")
@@ -143,7 +148,7 @@ class TestFlagMessage:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test removing flag from message."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.flag_message(
             message_ids=["12345"],
@@ -151,7 +156,8 @@ class TestFlagMessage:
         )
 
         assert result == 1
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "-1" in call_args  # None is index -1
 
     @patch.object(AppleMailConnector, "_run_applescript")
@@ -159,7 +165,7 @@ class TestFlagMessage:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test flagging multiple messages."""
-        mock_run.return_value = "3"
+        mock_run.return_value = FIELD_SEP.join(["12345", "12346", "12347"])
 
         result = connector.flag_message(
             message_ids=["12345", "12346", "12347"],
@@ -184,7 +190,7 @@ class TestFlagMessage:
         valid_colors = ["none", "orange", "red", "yellow", "blue", "green", "purple", "gray"]
 
         for color in valid_colors:
-            mock_run.return_value = "1"
+            mock_run.return_value = "12345"
             result = connector.flag_message(
                 message_ids=["12345"],
                 flag_color=color
@@ -213,9 +219,10 @@ class TestCreateMailbox:
         )
 
         assert result is True
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "Archive" in call_args
-        assert "make new mailbox" in call_args
+        assert "make new mailbox" in script
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_create_nested_mailbox(
@@ -231,7 +238,8 @@ class TestCreateMailbox:
         )
 
         assert result is True
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "Client Work" in call_args
         assert "Projects" in call_args
 
@@ -270,7 +278,8 @@ class TestCreateMailbox:
         )
 
         assert result is True
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         # Should not contain path traversal
         assert "../" not in call_args
         # Should contain sanitized name
@@ -290,7 +299,7 @@ class TestDeleteMessages:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test deleting a single message (move to trash)."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.delete_messages(
             message_ids=["12345"],
@@ -306,7 +315,7 @@ class TestDeleteMessages:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test deleting multiple messages."""
-        mock_run.return_value = "3"
+        mock_run.return_value = FIELD_SEP.join(["12345", "12346", "12347"])
 
         result = connector.delete_messages(
             message_ids=["12345", "12346", "12347"],
@@ -320,7 +329,7 @@ class TestDeleteMessages:
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
         """Test permanent deletion (bypass trash)."""
-        mock_run.return_value = "1"
+        mock_run.return_value = "12345"
 
         result = connector.delete_messages(
             message_ids=["12345"],
@@ -355,6 +364,82 @@ class TestDeleteMessages:
             )
 
 
+class TestUpdateMatching:
+    """Tests for filter-based bulk mutations."""
+
+    @pytest.fixture
+    def connector(self) -> AppleMailConnector:
+        """Create a connector instance."""
+        return AppleMailConnector(timeout=30)
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_mark_matching_as_read(
+        self, mock_run: MagicMock, connector: AppleMailConnector
+    ) -> None:
+        """Test that the filter becomes a whose clause and values travel as argv."""
+        mock_run.return_value = f"42{FIELD_SEP}42"
+
+        result = connector.update_matching(
+            "Gmail", "INBOX", "mark_as_read", sender_contains="news@example.com"
+        )
+
+        assert result == {"matched": 42, "changed": 42}
+        script, args = mock_run.call_args[0]
+        assert args == ["Gmail", "INBOX", "news@example.com", "", "", "0", "1000", "false", "true"]
+        assert "whose sender contains senderFilter)" in script
+        assert "set read status of (messages of mailboxRef whose" in script
+        assert "news@example.com" not in script
+        assert mock_run.call_args[1]["operation"] == "update_matching"
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_move_older_than(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        """Test moving messages by age, with Gmail handling."""
+        mock_run.return_value = f"3{FIELD_SEP}3"
+
+        connector.update_matching(
+            "Gmail",
+            "INBOX",
+            "move_messages",
+            older_than_days=90,
+            destination_mailbox="Archive",
+            gmail_mode=True,
+        )
+
+        script, args = mock_run.call_args[0]
+        assert args[5] == "90"
+        assert args[8:] == ["Archive"]
+        assert "whose date received < cutoffDate" in script
+        assert "duplicate (messages of mailboxRef whose" in script
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_dry_run_and_cap(self, mock_run: MagicMock, connector: AppleMailConnector) -> None:
+        """Test that dry runs and capped calls report matches without changes."""
+        mock_run.return_value = f"250{FIELD_SEP}0"
+
+        result = connector.update_matching(
+            "Gmail", "INBOX", "delete_messages", read_status=True, dry_run=True, max_messages=10
+        )
+
+        assert result == {"matched": 250, "changed": 0}
+        assert mock_run.call_args[0][1][4:8] == ["true", "0", "10", "true"]
+
+    @pytest.mark.parametrize(
+        "kwargs, message",
+        [
+            ({"action": "archive"}, "Invalid action"),
+            ({"action": "flag_message", "flag_color": "pink"}, "Invalid flag color"),
+            ({"action": "move_messages"}, "destination_mailbox"),
+            ({"action": "delete_messages", "older_than_days": -1}, "older_than_days"),
+        ],
+    )
+    def test_validation(
+        self, connector: AppleMailConnector, kwargs: dict[str, Any], message: str
+    ) -> None:
+        """Test that invalid arguments are rejected before running a script."""
+        with pytest.raises(ValueError, match=message):
+            connector.update_matching("Gmail", "INBOX", **kwargs)
+
+
 class TestMessageManagementSecurity:
     """Tests for message management security features."""
 
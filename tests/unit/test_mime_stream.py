@@ -0,0 +1,146 @@
+"""Unit tests for streaming attachment extraction."""
+
+import hashlib
+import io
+import tracemalloc
+from email.message import EmailMessage
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp.emlx import EmlxReader
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.mime_stream import extract_attachments
+
+
+def message_with(*attachments: tuple[bytes, str, str, str]) -> EmailMessage:
+    """Build a message with (data, maintype, subtype, filename) attachments."""
+    message = EmailMessage()
+    message["Subject"] = "Files"
+    message.set_content("Body text\n")
+    for data, maintype, subtype, filename in attachments:
+        message.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+    return message
+
+
+def extract(message: EmailMessage, directory: Path, **options: object) -> list[dict]:
+    """Extract from a message's bytes."""
+    return extract_attachments(io.BytesIO(message.as_bytes()), directory, **options)
+
+
+class TestExtractAttachments:
+    """Tests for decoding attachment parts to files."""
+
+    def test_base64(self, tmp_path: Path) -> None:
+        data = bytes(range(256)) * 40
+        files = extract(message_with((data, "application", "pdf", "a.pdf")), tmp_path)
+
+        assert (tmp_path / "a.pdf").read_bytes() == data
+        assert files == [
+            {
+                "index": 0,
+                "name": "a.pdf",
+                "path": str(tmp_path / "a.pdf"),
+                "mime_type": "application/pdf",
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+        ]
+
+    def test_quoted_printable(self, tmp_path: Path) -> None:
+        text = "Zeile mit Umlauten: äöü " + "x" * 200 + "\nzweite Zeile\n"
+        message = EmailMessage()
+        message.set_content("Body\n")
+        message.add_attachment(text, subtype="plain", filename="notes.txt", cte="quoted-printable")
+
+        extract(message, tmp_path)
+
+        assert (tmp_path / "notes.txt").read_text() == text
+
+    def test_indices_and_nested_multipart(self, tmp_path: Path) -> None:
+        message = EmailMessage()
+        message.set_content("Body\n")
+        message.add_alternative("<p>Body</p>", subtype="html")
+        for name in ("one", "two"):
+            message.add_attachment(
+                name.encode(),
+                maintype="application",
+                subtype="octet-stream",
+                filename=f"{name}.bin",
+            )
+        outer = EmailMessage()
+        outer.set_content("Forwarded\n")
+        outer.add_attachment(b"three", maintype="application", subtype="zip", filename="3.zip")
+        # Enclosed message without a file name: its attachments are counted
+        outer.add_attachment(message)
+
+        files = extract(outer, tmp_path, indices=[0, 2])
+
+        assert [(f["index"], f["name"]) for f in files] == [(0, "3.zip"), (2, "two.bin")]
+        assert (tmp_path / "two.bin").read_bytes() == b"two"
+        assert not (tmp_path / "one.bin").exists()
+
+    def test_never_overwrites(self, tmp_path: Path) -> None:
+        (tmp_path / "a.txt").write_text("keep")
+        message = message_with(
+            (b"first", "text", "plain", "a.txt"), (b"second", "text", "plain", "a.txt")
+        )
+
+        files = extract(message, tmp_path)
+
+        assert [f["name"] for f in files] == ["a (1).txt", "a (2).txt"]
+        assert (tmp_path / "a.txt").read_text() == "keep"
+
+    def test_unsafe_and_missing_names(self, tmp_path: Path) -> None:
+        message = EmailMessage()
+        message.set_content("Body\n")
+        message.add_attachment(b"x", maintype="image", subtype="png", filename="../../evil.png")
+        message.add_attachment(b"y", maintype="image", subtype="png", disposition="attachment")
+
+        files = extract(message, tmp_path)
+
+        assert all(Path(f["path"]).parent == tmp_path for f in files)
+        assert files[1]["name"] == "attachment-2.png"
+
+    def test_memory_is_bounded(self, tmp_path: Path) -> None:
+        data = bytes(range(256)) * (8 * 1024 * 1024 // 256)
+        source = io.BytesIO(
+            message_with((data, "application", "octet-stream", "big.bin")).as_bytes()
+        )
+
+        tracemalloc.start()
+        try:
+            files = extract_attachments(source, tmp_path)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert files[0]["sha256"] == hashlib.sha256(data).hexdigest()
+        assert peak < 1024 * 1024
+
+
+class TestSaveFromEmlx:
+    """Tests for save_attachments reading message files."""
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_reads_message_file(self, mock_run: MagicMock, tmp_path: Path) -> None:
+        payload = message_with((b"data", "text", "csv", "t.csv")).as_bytes()
+        messages = tmp_path / "V10" / "ACCOUNT" / "INBOX.mbox" / "STORE" / "Data" / "Messages"
+        messages.mkdir(parents=True)
+        (messages / "42.emlx").write_bytes(
+            f"{len(payload)}\n".encode() + payload + b"<?xml version='1.0'?><plist/>"
+        )
+        out = tmp_path / "out"
+        out.mkdir()
+        connector = AppleMailConnector(emlx=EmlxReader(tmp_path))
+
+        result = connector.save_attachments("42", out)
+
+        assert result == 1
+        assert (out / "t.csv").read_bytes() == b"data"
+        mock_run.assert_not_called()
+
+    def test_rejects_bad_id(self, tmp_path: Path) -> None:
+        with pytest.raises(ValueError):
+            AppleMailConnector().save_attachments("1; rm", tmp_path)
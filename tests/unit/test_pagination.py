@@ -0,0 +1,192 @@
+"""Unit tests for search_messages continuation cursors."""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp import templates
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.memory_backend import InMemoryBackend, format_date
+from apple_mail_mcp.message_cache import MessageCache
+from apple_mail_mcp.pagination import (
+    CursorPosition,
+    decode_cursor,
+    encode_cursor,
+    next_page,
+    search_digest,
+)
+from apple_mail_mcp.wire import RECORD_SEP, encode_columns, encode_date_key
+
+
+def message(message_id: str, hour: int, subject: str = "Hello") -> dict:
+    """Build a listing entry as search_messages returns it."""
+    return {
+        "id": message_id,
+        "subject": subject,
+        "sender": "Ann <ann@example.com>",
+        "date_received": format_date(datetime(2025, 1, 6, hour)),
+        "read_status": False,
+        "timestamp": int(datetime(2025, 1, 6, hour).timestamp()),
+    }
+
+
+def columns(messages: list[dict]) -> str:
+    """Encode messages as a listing template returns them."""
+    return encode_columns(
+        [
+            m["id"],
+            m["subject"],
+            m["sender"],
+            m["date_received"],
+            m["read_status"],
+            encode_date_key(m["timestamp"]),
+        ]
+        for m in messages
+    )
+
+
+def ids(messages: list[dict]) -> list[str]:
+    return [m["id"] for m in messages]
+
+
+# Newest first; 12 and 11 arrived in the same hour
+INBOX = [message("14", 9), message("12", 8), message("11", 8), message("10", 7)]
+SEARCH = search_digest("Gmail", "INBOX")
+
+
+class TestCursor:
+    """Tests for encoding and decoding cursors."""
+
+    def test_round_trip(self) -> None:
+        position = CursorPosition(1736150400, "42", 7)
+
+        assert decode_cursor(encode_cursor(SEARCH, position), SEARCH) == position
+
+    def test_local_key(self) -> None:
+        key = int(datetime(2025, 1, 6, 9, 30).timestamp())
+
+        assert CursorPosition(key, "1").local_key() == (20094, 9 * 3600 + 1800)
+        assert CursorPosition(None, "1").local_key() is None
+
+    def test_belongs_to_its_search(self) -> None:
+        cursor = encode_cursor(SEARCH, CursorPosition(None, "1"))
+
+        with pytest.raises(ValueError, match="different search"):
+            decode_cursor(cursor, search_digest("Gmail", "INBOX", sender_contains="ann"))
+
+    @pytest.mark.parametrize("cursor", ["", "!!", "bm90IGpzb24", "eyJ2IjoxfQ"])
+    def test_malformed(self, cursor: str) -> None:
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_cursor(cursor, SEARCH)
+
+    def test_next_page(self) -> None:
+        assert next_page(INBOX[:2], 3, SEARCH).next_cursor is None
+
+        page = next_page(INBOX[:2], 2, SEARCH, last_index=2)
+
+        position = decode_cursor(page.next_cursor or "", SEARCH)
+        assert position.message_id == "12"
+        assert position.listing_index == 2
+        assert position.key == int(datetime(2025, 1, 6, 8).timestamp())
+
+
+class TestCacheKeyset:
+    """Tests for pages served from the message cache."""
+
+    def test_pages_are_stable_when_mail_arrives(self) -> None:
+        cache = MessageCache(":memory:")
+        cache.store_mailbox("Gmail", "INBOX", INBOX)
+        first = next_page(cache.search("Gmail", limit=2), 2, SEARCH)
+        assert ids(first) == ["14", "12"]
+
+        cache.store_mailbox("Gmail", "INBOX", [message("15", 10), *INBOX])
+        after = decode_cursor(first.next_cursor or "", SEARCH)
+
+        assert ids(cache.search("Gmail", limit=2, after=after)) == ["11", "10"]
+
+    def test_filters_apply_after_the_cursor(self) -> None:
+        cache = MessageCache(":memory:")
+        cache.store_mailbox("Gmail", "INBOX", [*INBOX[:3], message("10", 7, "Other")])
+        after = CursorPosition(int(datetime(2025, 1, 6, 9).timestamp()), "14")
+
+        assert ids(cache.search("Gmail", subject_contains="hello", after=after)) == ["12", "11"]
+
+
+class TestConnectorPages:
+    """Tests for pages read from Mail."""
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_next_page_continues_at_index(self, mock_run: MagicMock) -> None:
+        connector = AppleMailConnector()
+        mock_run.return_value = columns(INBOX[:2])
+
+        first = connector.search_messages("Gmail", limit=2)
+
+        assert ids(first) == ["14", "12"]
+        assert first.last_index == 2
+        assert first.next_cursor is not None
+
+        mock_run.return_value = "4" + RECORD_SEP + columns(INBOX[2:])
+        second = connector.search_messages("Gmail", limit=2, cursor=first.next_cursor)
+
+        script, args = mock_run.call_args[0][:2]
+        assert "messages startIndex thru endIndex of mailboxRef" in script
+        # 2025-01-06 08:00 local time: 20094 days and 8 hours after 1970-01-01
+        assert args == ["Gmail", "INBOX", "", "", "", "2", "2", "12", "20094", "28800"]
+        assert ids(second) == ["11", "10"]
+        assert second.last_index == 4
+        assert decode_cursor(second.next_cursor or "", SEARCH).listing_index == 4
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_end_of_listing(self, mock_run: MagicMock) -> None:
+        cursor = encode_cursor(SEARCH, CursorPosition(None, "10", 4))
+        mock_run.return_value = "4"
+
+        page = AppleMailConnector().search_messages("Gmail", limit=2, cursor=cursor)
+
+        assert page == []
+        assert page.next_cursor is None
+
+    @patch.object(AppleMailConnector, "_run_applescript", return_value="lost")
+    def test_lost_message(self, mock_run: MagicMock) -> None:
+        cursor = encode_cursor(SEARCH, CursorPosition(None, "12", 2))
+
+        with pytest.raises(ValueError, match="no longer in the mailbox"):
+            AppleMailConnector().search_messages("Gmail", limit=2, cursor=cursor)
+
+    def test_page_template_variants(self) -> None:
+        plain = templates.search_page_script()
+        filtered = templates.search_page_script(sender=True)
+
+        assert "whose" not in plain
+        assert "id of message hintIndex of mailboxRef is lastId" in plain
+        assert "(messages of mailboxRef whose sender contains senderFilter)" in filtered
+        assert "items startIndex thru endIndex of allIds" in filtered
+        for script in (plain, filtered):
+            assert "my keyDate(keyDays, keySeconds)" in script
+            assert "on indexAfterDate(" in script
+
+
+def test_memory_backend_pages() -> None:
+    backend = InMemoryBackend()
+    backend.add_account("Gmail", "me@gmail.com")
+    for hour in range(5):
+        backend.add_message(
+            "Gmail",
+            "INBOX",
+            f"Message {hour}",
+            "ann@example.com",
+            "",
+            date_received=datetime(2025, 1, 6, 9 + hour),
+        )
+
+    first = backend.search_messages("Gmail", limit=2)
+    backend.add_message("Gmail", "INBOX", "Late", "ann@example.com", "")
+    second = backend.search_messages("Gmail", limit=2, cursor=first.next_cursor)
+    third = backend.search_messages("Gmail", limit=2, cursor=second.next_cursor)
+
+    assert [m["subject"] for m in first + second + third] == [
+        f"Message {hour}" for hour in range(4, -1, -1)
+    ]
+    assert third.next_cursor is None
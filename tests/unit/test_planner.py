@@ -0,0 +1,163 @@
+"""Unit tests for cost-based search planning."""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.message_cache import MessageCache
+from apple_mail_mcp.planner import (
+    DEFAULT_WINDOW_FRACTION,
+    MAX_CHUNK,
+    MIN_CHUNK,
+    QueryPlanner,
+    SearchPlan,
+    chunk_size,
+    predicate_keys,
+    window_fraction,
+)
+from apple_mail_mcp.wire import encode_columns
+
+
+class TestEstimates:
+    """Tests for choosing between strategies."""
+
+    def test_common_matches_are_scanned(self) -> None:
+        plan = QueryPlanner().plan("Gmail", "INBOX", ("read=false",), 10, 20000)
+
+        assert plan.strategy == "scan"
+        assert plan.chunk_size == 63
+        assert plan.estimates is not None and set(plan.estimates) == {"scan", "whose"}
+
+    def test_rare_matches_are_pushed_into_whose(self) -> None:
+        planner = QueryPlanner()
+        planner.observe("Gmail", "INBOX", ("sender",), matched=2, examined=20000)
+
+        plan = planner.plan("Gmail", "INBOX", ("sender",), 10, 20000)
+
+        assert plan.strategy == "whose"
+        assert plan.chunk_size == 0
+
+    def test_date_windows_scan_their_range(self) -> None:
+        plan = QueryPlanner().plan(
+            "Gmail", "INBOX", ("subject",), 20, 100000, bounds=1, fraction=0.01
+        )
+
+        assert plan.strategy == "hybrid"
+
+    def test_unfiltered_searches_read_a_range(self) -> None:
+        plan = QueryPlanner().plan("Gmail", "INBOX", (), 10, 5000, cache="stale")
+
+        assert plan.strategy == "range"
+        assert plan.estimates is not None and plan.estimates["cache"] > plan.estimates["range"]
+
+    def test_stale_cache_is_relisted_when_cheaper(self) -> None:
+        plan = QueryPlanner().plan("Gmail", "INBOX", ("subject",), None, 10000, cache="stale")
+
+        assert plan.strategy == "cache"
+
+    def test_fresh_cache_and_unknown_size(self) -> None:
+        planner = QueryPlanner()
+
+        assert planner.plan("Gmail", "INBOX", ("sender",), 10, None, cache="fresh").strategy == (
+            "cache"
+        )
+        assert planner.plan("Gmail", "INBOX", ("sender",), 10, None, cache="stale").strategy == (
+            "cache"
+        )
+        assert planner.plan("Gmail", "INBOX", ("sender",), 10, None).strategy == "whose"
+        assert planner.plan("Gmail", "INBOX", (), 10, None).strategy == "range"
+        assert planner.stats()["plans"] == {"cache": 2, "whose": 1, "range": 1}
+
+
+class TestSignals:
+    """Tests for sizes, selectivity and window estimates."""
+
+    def test_selectivity_is_learned_per_mailbox(self) -> None:
+        planner = QueryPlanner(smoothing=0.5)
+
+        assert planner.selectivity("Gmail", "INBOX", ("read=false", "sender")) == 0.2 * 0.05
+
+        planner.observe("Gmail", "INBOX", ("read=false",), matched=10, examined=20)
+        planner.observe("Gmail", "INBOX", ("read=false",), matched=0, examined=20)
+
+        assert planner.selectivity("Gmail", "INBOX", ("read=false",)) == (0.5 + 0.025) / 2
+        # Other mailboxes fall back to what any mailbox showed
+        assert planner.selectivity("Gmail", "Work", ("read=false",)) == (0.5 + 0.025) / 2
+        assert planner.selectivity("Gmail", "INBOX", ()) == 1.0
+
+    def test_sizes_expire(self) -> None:
+        planner = QueryPlanner(size_ttl=60)
+        planner.record_size("Gmail", "INBOX", 1234)
+
+        assert planner.mailbox_size("Gmail", "INBOX") == 1234
+        assert planner.mailbox_size("Gmail", "INBOX", now=datetime.now().timestamp() + 61) is None
+        assert planner.mailbox_size("Gmail", "Work") is None
+
+    def test_window_fraction(self) -> None:
+        oldest = int(datetime(2025, 1, 1).timestamp())
+        newest = int(datetime(2025, 1, 11).timestamp())
+
+        assert window_fraction(datetime(2025, 1, 10), None, oldest, newest) == 0.1
+        assert window_fraction(None, datetime(2024, 1, 1), oldest, newest) == 0.0
+        assert window_fraction(datetime(2025, 1, 10), None) == DEFAULT_WINDOW_FRACTION
+
+    def test_chunk_size_and_keys(self) -> None:
+        assert chunk_size(None, 0.5) == MAX_CHUNK
+        assert chunk_size(5, 0.9) == MIN_CHUNK
+        assert chunk_size(10, 0.0001) == MAX_CHUNK
+        assert predicate_keys("ann", None, False) == ("read=false", "sender")
+
+    def test_explain(self) -> None:
+        plan = SearchPlan("scan", "lowest estimated cost", {"scan": 12.34}, 100, 0.123456, 50)
+
+        assert plan.explain(plan_ms=0.04) == {
+            "strategy": "scan",
+            "reason": "lowest estimated cost",
+            "estimates_ms": {"scan": 12.3},
+            "mailbox_size": 100,
+            "selectivity": 0.1235,
+            "chunk_size": 50,
+            "timings_ms": {"plan_ms": 0.0},
+        }
+
+
+class TestConnectorPlans:
+    """Tests for plans the connector runs."""
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_stale_cache_is_bypassed_for_a_short_listing(self, mock_run: MagicMock) -> None:
+        cache = MessageCache(":memory:", max_age=0)
+        listing = [
+            {
+                "id": str(n),
+                "subject": "Hello",
+                "sender": "ann@example.com",
+                "date_received": "Monday",
+                "read_status": False,
+            }
+            for n in range(5000)
+        ]
+        cache.store_mailbox("Gmail", "INBOX", listing)
+        connector = AppleMailConnector(cache=cache)
+        mock_run.return_value = encode_columns(
+            [["1", "Hello", "ann@example.com", "Monday", False, ""]]
+        )
+
+        page = connector.search_messages("Gmail", limit=1)
+
+        assert page.plan is not None and page.plan["strategy"] == "range"
+        assert "messages 1 thru msgCount of mailboxRef" in mock_run.call_args[0][0]
+        assert connector.stats()["planner"]["plans"] == {"range": 1}
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_cursor_pages_are_not_planned(self, mock_run: MagicMock) -> None:
+        mock_run.return_value = encode_columns(
+            [["2", "Hello", "ann@example.com", "Monday", False, ""]]
+        )
+        connector = AppleMailConnector()
+        first = connector.search_messages("Gmail", limit=1)
+
+        mock_run.return_value = "1"
+        page = connector.search_messages("Gmail", limit=1, cursor=first.next_cursor)
+
+        assert page.plan is not None and page.plan["strategy"] == "page"
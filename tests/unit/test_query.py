@@ -0,0 +1,132 @@
+"""Unit tests for boolean query expressions."""
+
+from datetime import datetime
+
+import pytest
+
+from apple_mail_mcp.query import (
+    And,
+    Contains,
+    Matches,
+    Not,
+    Or,
+    ReadStatus,
+    Received,
+    SqlColumns,
+    compile_query,
+    matcher,
+    parse_query,
+)
+
+NOW = datetime(2025, 3, 1, 12)
+
+
+def message(sender: str, subject: str, read: bool = False, day: int = 1) -> dict:
+    """Build a message dictionary as search_messages returns it."""
+    return {
+        "id": "1",
+        "sender": sender,
+        "subject": subject,
+        "read_status": read,
+        "date_received": f"Saturday, February {day}, 2025 at 9:00:00 AM",
+        "timestamp": int(datetime(2025, 2, day, 9).timestamp()),
+    }
+
+
+class TestParser:
+    """Tests for parsing query text."""
+
+    def test_precedence(self) -> None:
+        assert parse_query("from alice OR bob, NOT read, subject contains invoice") == And(
+            (
+                Or((Contains("sender", "alice"), Contains("sender", "bob"))),
+                Not(ReadStatus(True)),
+                Contains("subject", "invoice"),
+            )
+        )
+        # AND binds tighter than OR; a comma looser than both
+        assert parse_query("from a or from b and unread") == Or(
+            (Contains("sender", "a"), And((Contains("sender", "b"), ReadStatus(False))))
+        )
+        assert parse_query("from:a (subject x or unread)") == And(
+            (Contains("sender", "a"), Or((Contains("subject", "x"), ReadStatus(False))))
+        )
+
+    def test_terms(self) -> None:
+        assert parse_query('subject matches "^re:"') == Matches("subject", "^re:")
+        assert parse_query('from "and"') == Contains("sender", "and")
+        assert parse_query('sender "Ann \\"A\\" Lee"') == Contains("sender", 'Ann "A" Lee')
+        assert parse_query('received after "7 days ago"') == Received(">=", "7 days ago")
+        assert parse_query("before 2025-01-15") == Received("<", "2025-01-15")
+
+    @pytest.mark.parametrize(
+        ("text", "error"),
+        [
+            ("", "empty"),
+            ("from", "value was expected"),
+            ("(from a", "Missing '\\)'"),
+            ("from a )", "position 7"),
+            ("bogus", "Unknown filter 'bogus' at position 0"),
+            ("unread read:foo", "Unknown filter 'read:foo' at position 7"),
+            ('subject matches "("', "Invalid regular expression"),
+            ("after someday", "Unrecognized date"),
+        ],
+    )
+    def test_errors(self, text: str, error: str) -> None:
+        with pytest.raises(ValueError, match=error):
+            parse_query(text)
+
+
+class TestCompilation:
+    """Tests for compiling queries to whose clauses, SQL and Python."""
+
+    def test_whose_clause(self) -> None:
+        whose = compile_query("not (from a or b), after 2025-01-15").whose
+
+        assert whose is not None
+        assert whose.text == (
+            "((sender does not contain queryValue1 and sender does not contain queryValue2)"
+            " and date received >= queryValue3)"
+        )
+        assert whose.args(NOW) == ["a", "b", "20103", "0"]
+        assert whose.dated
+        assert "set queryValue3 to my keyDate(item 9 of argv, item 10 of argv)" in (
+            whose.preamble(7)
+        )
+
+    def test_sql(self) -> None:
+        query = compile_query("from a or unread, before 2025-01-15")
+        condition, params = query.sql(SqlColumns("s", "j", "r", "d"), NOW)
+
+        assert condition == "((instr(lower(s), lower(?)) > 0 OR r = 0) AND d < ?)"
+        assert params == ["a", int(datetime(2025, 1, 15).timestamp())]
+
+    def test_residual(self) -> None:
+        query = compile_query('subject matches "^re:" from bob')
+
+        assert query.pushdown == Contains("sender", "bob")
+        assert query.residual == Matches("subject", "^re:")
+        test = query.residual_filter(NOW)
+        assert test is not None
+        assert test(message("bob", "Re: lunch"))
+        assert not test(message("bob", "Fwd: re: lunch"))
+        assert compile_query("from bob").residual_filter() is None
+        # Nothing to push down
+        assert compile_query('subject matches "x"').sql(SqlColumns("s", "j", "r", "d")) == (
+            "1",
+            [],
+        )
+
+    def test_matcher(self) -> None:
+        test = matcher(parse_query("from ann or subject lunch, not read, after 2025-02-02"), NOW)
+
+        assert test(message("Ann <ann@example.com>", "Hi", day=3))
+        assert not test(message("Ann <ann@example.com>", "Hi", read=True, day=3))
+        assert not test(message("Boss", "Lunch?", day=1))
+
+    def test_compiled_queries_are_cached(self) -> None:
+        compile_query.cache_clear()
+        compile_query("from a")
+        compile_query("from a")
+
+        assert compile_query.cache_info().hits == 1
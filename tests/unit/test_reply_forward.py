@@ -31,10 +31,11 @@ class TestReplyToMessage:
         )
 
         assert result == "67890"
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "12345" in call_args
         assert "Thanks for your email!" in call_args
-        assert "reply" in call_args.lower()
+        assert "reply" in script.lower()
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_reply_all(
@@ -50,9 +51,10 @@ class TestReplyToMessage:
         )
 
         assert result == "67890"
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "12345" in call_args
-        assert "reply to all" in call_args.lower() or "reply all" in call_args.lower()
+        assert "reply to all" in script.lower() or "reply all" in script.lower()
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_reply_with_quote(
@@ -69,7 +71,8 @@ class TestReplyToMessage:
         )
 
         assert result == "67890"
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "12345" in call_args
         # AppleScript should handle quoting via reply command
 
@@ -88,7 +91,8 @@ class TestReplyToMessage:
         )
 
         assert result == "67890"
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "12345" in call_args
 
     @patch.object(AppleMailConnector, "_run_applescript")
@@ -139,10 +143,11 @@ class TestForwardMessage:
         )
 
         assert result == "67890"
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "12345" in call_args
         assert "colleague@example.com" in call_args
-        assert "forward" in call_args.lower()
+        assert "forward" in script.lower()
 
     @patch.object(AppleMailConnector, "_run_applescript")
     def test_forward_multiple_recipients(
@@ -158,7 +163,8 @@ class TestForwardMessage:
         )
 
         assert result == "67890"
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "colleague1@example.com" in call_args
         assert "colleague2@example.com" in call_args
 
@@ -177,7 +183,8 @@ class TestForwardMessage:
         )
 
         assert result == "67890"
-        call_args = mock_run.call_args[0][0]
+        script, args = mock_run.call_args[0]
+        call_args = "\n".join(args)
         assert "colleague@example.com" in call_args
         assert "manager@example.com" in call_args
 
@@ -258,10 +265,10 @@ class TestReplyForwardSecurity:
     """Security tests for reply and forward operations."""
 
     @patch.object(AppleMailConnector, "_run_applescript")
-    def test_reply_sanitizes_body(
+    def test_reply_passes_body_as_argument(
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
-        """Test that reply body is sanitized."""
+        """Test that reply body is passed verbatim as an argument."""
         mock_run.return_value = "67890"
 
         connector.reply_to_message(
@@ -270,15 +277,24 @@ class TestReplyForwardSecurity:
             reply_all=False,
         )
 
-        call_args = mock_run.call_args[0][0]
-        # Should have escaped special characters
-        assert '\\"' in call_args or "\\'" in call_args or "\\\\" in call_args
+        script, args = mock_run.call_args[0]
+        # Untrusted text never becomes part of the script source
+        assert 'Dangerous "quotes" and \\backslashes\\' in args
+        assert "Dangerous" not in script
+
+    def test_reply_rejects_invalid_message_id(self, connector: AppleMailConnector) -> None:
+        """Test that message IDs must be numeric."""
+        with pytest.raises(ValueError, match="Invalid message ID"):
+            connector.reply_to_message(
+                message_id='1" & (do shell script "id") & "',
+                body="Hello",
+            )
 
     @patch.object(AppleMailConnector, "_run_applescript")
-    def test_forward_sanitizes_body(
+    def test_forward_passes_body_as_argument(
         self, mock_run: MagicMock, connector: AppleMailConnector
     ) -> None:
-        """Test that forward body is sanitized."""
+        """Test that forward body is passed verbatim as an argument."""
         mock_run.return_value = "67890"
 
         connector.forward_message(
@@ -287,6 +303,7 @@ class TestReplyForwardSecurity:
             body='Dangerous "quotes" and \\backslashes\\',
         )
 
-        call_args = mock_run.call_args[0][0]
-        # Should have escaped special characters
-        assert '\\"' in call_args or "\\'" in call_args or "\\\\" in call_args
+        script, args = mock_run.call_args[0]
+        # Untrusted text never becomes part of the script source
+        assert 'Dangerous "quotes" and \\backslashes\\' in args
+        assert "Dangerous" not in script
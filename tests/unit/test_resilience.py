@@ -0,0 +1,202 @@
+"""Unit tests for retries and circuit breaking."""
+
+from unittest.mock import patch
+
+import pytest
+
+from apple_mail_mcp import templates
+from apple_mail_mcp.exceptions import (
+    MailAccountNotFoundError,
+    MailTimeoutError,
+    MailTransientError,
+    MailUnavailableError,
+)
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.resilience import READ_OPERATIONS, CircuitBreaker, RetryPolicy, error_number
+
+TIMED_OUT = "execution error: Mail got an error: AppleEvent timed out. (-1712)"
+NOT_RUNNING = "execution error: Mail got an error: Application isn't running. (-600)"
+
+
+def transient(message: str = TIMED_OUT) -> MailTransientError:
+    return AppleMailConnector._error_for(message)
+
+
+class TestErrorClassification:
+    """Tests for mapping AppleScript errors by number."""
+
+    def test_error_number(self) -> None:
+        assert error_number(TIMED_OUT) == -1712
+        assert error_number('Can\'t get account "x". (-1728)\n') == -1728
+        assert error_number("no number here") is None
+
+    @pytest.mark.parametrize("message", [TIMED_OUT, NOT_RUNNING])
+    def test_transient_numbers(self, message: str) -> None:
+        error = AppleMailConnector._error_for(message)
+
+        assert isinstance(error, MailTransientError)
+        assert error.error_number == error_number(message)
+
+    def test_other_errors_keep_their_type(self) -> None:
+        error = AppleMailConnector._error_for('Can\'t get account "x". (-1728)')
+
+        assert isinstance(error, MailAccountNotFoundError)
+        assert error.error_number == -1728
+
+    def test_number_from_runner(self) -> None:
+        error = AppleMailConnector._error_for("AppleEvent timed out.", -1712)
+
+        assert isinstance(error, MailTransientError)
+
+
+class TestRetryPolicy:
+    """Tests for RetryPolicy."""
+
+    def test_reads_only_by_default(self) -> None:
+        policy = RetryPolicy()
+
+        assert policy.allows("get_message")
+        assert not policy.allows("delete_messages")
+        assert not policy.allows(None)
+
+    def test_delay_is_jittered_and_capped(self) -> None:
+        policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+
+        delays = [policy.delay(attempt) for attempt in range(1, 10) for _ in range(20)]
+
+        assert all(0 <= delay <= 4.0 for delay in delays)
+        assert len(set(delays)) > 1
+
+
+class TestCircuitBreaker:
+    """Tests for CircuitBreaker."""
+
+    def test_opens_after_threshold(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=3)
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.acquire() is False
+
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(MailUnavailableError, match="not responding"):
+            breaker.acquire()
+
+    def test_success_resets_failures(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_probe_after_cool_down(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        assert breaker.acquire() is True
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(MailUnavailableError):
+            breaker.acquire()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_probe_backs_off(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, max_reset_timeout=15)
+        breaker.record_failure()
+        breaker._opened_at -= 10
+        assert breaker.acquire() is True
+
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.stats()["retry_in"] == pytest.approx(15, abs=1)
+        assert breaker.stats()["times_opened"] == 2
+
+
+class TestConnectorRetries:
+    """Tests for retries in AppleMailConnector."""
+
+    @pytest.fixture
+    def connector(self) -> AppleMailConnector:
+        """Create a connector that retries without waiting."""
+        return AppleMailConnector(
+            timeout=30, retry=RetryPolicy(base_delay=0), breaker=CircuitBreaker()
+        )
+
+    def test_read_is_retried(self, connector: AppleMailConnector) -> None:
+        with patch.object(
+            connector, "_execute", side_effect=[transient(), transient(NOT_RUNNING), "ok"]
+        ) as mock_execute:
+            result = connector._run_applescript("s", [], operation="get_message")
+
+        assert result == "ok"
+        assert mock_execute.call_count == 3
+        assert connector.breaker.stats()["consecutive_failures"] == 0
+
+    def test_retries_are_bounded(self, connector: AppleMailConnector) -> None:
+        with patch.object(connector, "_execute", side_effect=transient()) as mock_execute:
+            with pytest.raises(MailTransientError):
+                connector._run_applescript("s", [], operation="search_messages")
+
+        assert mock_execute.call_count == 3
+
+    def test_mutation_is_not_retried(self, connector: AppleMailConnector) -> None:
+        with patch.object(connector, "_execute", side_effect=transient()) as mock_execute:
+            with pytest.raises(MailTransientError):
+                connector._run_applescript("s", ["1"], operation="delete_messages")
+
+        assert mock_execute.call_count == 1
+
+    def test_mutation_opt_in(self) -> None:
+        connector = AppleMailConnector(
+            retry=RetryPolicy(base_delay=0, operations=READ_OPERATIONS | {"mark_as_read"})
+        )
+
+        with patch.object(connector, "_execute", side_effect=[transient(), "1"]):
+            assert connector.mark_as_read(["1"]) == 1
+
+    def test_own_timeout_is_not_retried(self, connector: AppleMailConnector) -> None:
+        with patch.object(
+            connector, "_execute", side_effect=MailTimeoutError("timeout")
+        ) as mock_execute:
+            with pytest.raises(MailTimeoutError):
+                connector._run_applescript("s", [], operation="get_message")
+
+        assert mock_execute.call_count == 1
+        assert connector.breaker.stats()["consecutive_failures"] == 1
+
+    def test_open_circuit_fails_fast(self, connector: AppleMailConnector) -> None:
+        connector.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        with patch.object(connector, "_execute", side_effect=transient()) as mock_execute:
+            # The circuit opens after the second try, so the retry fails fast
+            with pytest.raises(MailUnavailableError):
+                connector._run_applescript("s", [], operation="get_message")
+            with pytest.raises(MailUnavailableError):
+                connector._run_applescript("s", [], operation="get_message")
+
+        assert mock_execute.call_count == 2
+
+    def test_probe_closes_circuit(self, connector: AppleMailConnector) -> None:
+        connector.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        connector.breaker.record_failure()
+
+        with patch.object(connector, "_execute", return_value="16.0") as mock_execute:
+            connector._run_applescript("s", [], operation="get_message")
+
+        assert mock_execute.call_args_list[0][0][0] == templates.PROBE
+        assert mock_execute.call_count == 2
+        assert connector.breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_probe_reopens_circuit(self, connector: AppleMailConnector) -> None:
+        connector.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        connector.breaker.record_failure()
+
+        with patch.object(connector, "_execute", side_effect=transient(NOT_RUNNING)):
+            with pytest.raises(MailUnavailableError, match="not responding"):
+                connector._run_applescript("s", [], operation="get_message")
+
+        assert connector.breaker.state == CircuitBreaker.OPEN
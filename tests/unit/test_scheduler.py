@@ -0,0 +1,218 @@
+"""
+Tests for the lane scheduler.
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from apple_mail_mcp.exceptions import MailBusyError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.scheduler import (
+    BULK,
+    INTERACTIVE,
+    MUTATION,
+    SEND,
+    LaneConfig,
+    LaneScheduler,
+)
+
+
+def hold_slot(
+    scheduler: LaneScheduler, operation: str, release: threading.Event
+) -> threading.Thread:
+    """Start a thread that holds a slot for operation until release is set."""
+    entered = threading.Event()
+
+    def target() -> None:
+        with scheduler.slot(operation):
+            entered.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    assert entered.wait(5)
+    return thread
+
+
+def wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+class TestLaneAssignment:
+    """Tests for mapping operations to lanes."""
+
+    @pytest.mark.parametrize(
+        "operation,lane",
+        [
+            ("get_message", INTERACTIVE),
+            ("list_accounts", INTERACTIVE),
+            ("search_messages", BULK),
+            ("mark_as_read", MUTATION),
+            ("move_messages", MUTATION),
+            ("delete_messages", MUTATION),
+            ("send_email", SEND),
+            ("reply_to_message", SEND),
+            (None, INTERACTIVE),
+            ("unknown_operation", INTERACTIVE),
+        ],
+    )
+    def test_lane_for(self, operation: str | None, lane: str) -> None:
+        assert LaneScheduler.lane_for(operation) == lane
+
+
+class TestLaneScheduler:
+    """Tests for admission control and ordering."""
+
+    def test_slot_records_completion(self) -> None:
+        scheduler = LaneScheduler()
+
+        with scheduler.slot("get_message"):
+            assert scheduler.stats()["lanes"][INTERACTIVE]["active"] == 1
+
+        stats = scheduler.stats()
+        assert stats["active"] == 0
+        assert stats["lanes"][INTERACTIVE]["completed"] == 1
+        assert stats["lanes"][INTERACTIVE]["active"] == 0
+
+    def test_full_queue_is_rejected_as_busy(self) -> None:
+        scheduler = LaneScheduler(
+            lanes={
+                INTERACTIVE: LaneConfig(priority=0),
+                MUTATION: LaneConfig(priority=1, concurrency=1, max_queue=1),
+            }
+        )
+        release = threading.Event()
+        holder = hold_slot(scheduler, "delete_messages", release)
+
+        def queued_call() -> None:
+            with scheduler.slot("mark_as_read"):
+                pass
+
+        queued = threading.Thread(target=queued_call, daemon=True)
+        queued.start()
+        wait_until(lambda: scheduler.stats()["lanes"][MUTATION]["waiting"] == 1)
+
+        with pytest.raises(MailBusyError, match="mutation queue is full"):
+            with scheduler.slot("move_messages"):
+                pass
+
+        assert scheduler.stats()["lanes"][MUTATION]["rejected"] == 1
+
+        release.set()
+        holder.join(5)
+        queued.join(5)
+
+    def test_busy_mutation_lane_does_not_block_reads(self) -> None:
+        scheduler = LaneScheduler(max_in_flight=2)
+        release = threading.Event()
+        holder = hold_slot(scheduler, "delete_messages", release)
+
+        started = time.monotonic()
+        with scheduler.slot("get_message"):
+            pass
+
+        assert time.monotonic() - started < 1.0
+
+        release.set()
+        holder.join(5)
+
+    def test_higher_priority_lane_is_served_first(self) -> None:
+        scheduler = LaneScheduler(max_in_flight=1)
+        release = threading.Event()
+        holder = hold_slot(scheduler, "send_email", release)
+        order: list[str] = []
+
+        def queue(operation: str) -> threading.Thread:
+            def target() -> None:
+                with scheduler.slot(operation):
+                    order.append(operation)
+
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            return thread
+
+        bulk = queue("search_messages")
+        wait_until(lambda: scheduler.stats()["lanes"][BULK]["waiting"] == 1)
+        interactive = queue("get_message")
+        wait_until(lambda: scheduler.stats()["lanes"][INTERACTIVE]["waiting"] == 1)
+
+        release.set()
+        for thread in (holder, bulk, interactive):
+            thread.join(5)
+
+        assert order == ["get_message", "search_messages"]
+
+    def test_queue_wait_is_measured(self) -> None:
+        scheduler = LaneScheduler()
+        release = threading.Event()
+        holder = hold_slot(scheduler, "search_messages", release)
+
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        with scheduler.slot("search_messages"):
+            pass
+        holder.join(5)
+
+        lane = scheduler.stats()["lanes"][BULK]
+        assert lane["completed"] == 2
+        assert lane["max_wait"] >= 0.05
+        assert lane["avg_wait"] > 0
+
+    def test_slot_is_released_on_error(self) -> None:
+        scheduler = LaneScheduler()
+
+        with pytest.raises(RuntimeError):
+            with scheduler.slot("delete_messages"):
+                raise RuntimeError("boom")
+
+        assert scheduler.stats()["active"] == 0
+        assert scheduler.stats()["lanes"][MUTATION]["active"] == 0
+
+    def test_capacity(self) -> None:
+        scheduler = LaneScheduler(
+            lanes={
+                INTERACTIVE: LaneConfig(priority=0, concurrency=2, max_queue=3),
+                BULK: LaneConfig(priority=1, concurrency=1, max_queue=4),
+            }
+        )
+        assert scheduler.capacity == 10
+
+
+class TestConnectorScheduling:
+    """Tests for the connector routing scripts through the scheduler."""
+
+    def test_run_applescript_uses_operation_lane(self) -> None:
+        connector = AppleMailConnector()
+
+        with patch.object(connector, "_execute", return_value="") as mock_execute:
+            with patch.object(
+                connector.scheduler, "slot", wraps=connector.scheduler.slot
+            ) as mock_slot:
+                connector.mark_as_read(["12345"])
+
+        mock_slot.assert_called_once_with("mark_as_read")
+        mock_execute.assert_called_once()
+
+    def test_busy_error_propagates(self) -> None:
+        scheduler = LaneScheduler(
+            lanes={
+                INTERACTIVE: LaneConfig(priority=0),
+                MUTATION: LaneConfig(priority=1, concurrency=1, max_queue=0),
+            }
+        )
+        connector = AppleMailConnector(scheduler=scheduler)
+        release = threading.Event()
+        holder = hold_slot(scheduler, "delete_messages", release)
+
+        with patch.object(connector, "_execute", return_value="1"):
+            with pytest.raises(MailBusyError):
+                connector.delete_messages(["12345"])
+
+        release.set()
+        holder.join(5)
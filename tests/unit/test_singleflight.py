@@ -0,0 +1,190 @@
+"""
+Tests for single-flight coalescing of identical concurrent reads.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from apple_mail_mcp.exceptions import MailAppleScriptError, MailOperationCancelledError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.singleflight import SingleFlight
+from apple_mail_mcp.wire import encode_columns, encode_records
+
+
+class TestSingleFlight:
+    """Tests for the SingleFlight primitive."""
+
+    def test_concurrent_calls_share_one_execution(self) -> None:
+        flight = SingleFlight()
+        release = threading.Event()
+        executions = []
+
+        def fn() -> list[str]:
+            executions.append(1)
+            release.wait(5)
+            return ["result"]
+
+        def call() -> list[str]:
+            return flight.do("key", fn)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(call) for _ in range(4)]
+            deadline = time.monotonic() + 5
+            while flight.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            release.set()
+            results = [future.result(timeout=5) for future in futures]
+
+        assert results == [["result"]] * 4
+        assert len(executions) == 1
+        assert flight.stats() == {"calls": 4, "executions": 1, "coalesced": 3, "in_flight": 0}
+
+    def test_followers_get_independent_copies(self) -> None:
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn() -> list[dict[str, str]]:
+            release.wait(5)
+            return [{"name": "Gmail"}]
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(flight.do, "key", fn) for _ in range(2)]
+            deadline = time.monotonic() + 5
+            while flight.stats()["coalesced"] < 1 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            release.set()
+            first, second = [future.result(timeout=5) for future in futures]
+
+        first[0]["name"] = "changed"
+        assert second == [{"name": "Gmail"}]
+
+    def test_sequential_calls_are_not_cached(self) -> None:
+        flight = SingleFlight()
+        calls = []
+
+        flight.do("key", lambda: calls.append(1))
+        flight.do("key", lambda: calls.append(1))
+
+        assert len(calls) == 2
+        assert flight.stats()["coalesced"] == 0
+
+    def test_different_keys_run_separately(self) -> None:
+        flight = SingleFlight()
+
+        assert flight.do("a", lambda: 1) == 1
+        assert flight.do("b", lambda: 2) == 2
+        assert flight.stats()["executions"] == 2
+
+    def test_error_is_shared_with_followers(self) -> None:
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn() -> None:
+            release.wait(5)
+            raise MailAppleScriptError("boom")
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(flight.do, "key", fn) for _ in range(3)]
+            deadline = time.monotonic() + 5
+            while flight.stats()["coalesced"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            release.set()
+            for future in futures:
+                with pytest.raises(MailAppleScriptError, match="boom"):
+                    future.result(timeout=5)
+
+        assert flight.stats()["executions"] == 1
+
+    def test_follower_reruns_when_leader_is_cancelled(self) -> None:
+        flight = SingleFlight()
+        leader_started = threading.Event()
+        release = threading.Event()
+
+        def cancelled() -> str:
+            leader_started.set()
+            release.wait(5)
+            raise MailOperationCancelledError("Request was cancelled")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(flight.do, "key", cancelled)
+            assert leader_started.wait(5)
+            follower = pool.submit(flight.do, "key", lambda: "fresh")
+            deadline = time.monotonic() + 5
+            while flight.stats()["coalesced"] < 1 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            release.set()
+
+            with pytest.raises(MailOperationCancelledError):
+                leader.result(timeout=5)
+            assert follower.result(timeout=5) == "fresh"
+
+        assert flight.stats()["executions"] == 2
+        assert flight.stats()["coalesced"] == 0
+
+
+class TestConnectorCoalescing:
+    """Tests for coalescing in the connector's read methods."""
+
+    def test_identical_searches_share_one_script(self) -> None:
+        connector = AppleMailConnector()
+        # A known size spares the planner's count probe
+        connector.planner.record_size("Gmail", "INBOX", 100)
+        release = threading.Event()
+
+        def slow_script(*args, **kwargs) -> str:
+            release.wait(5)
+            return encode_columns([["12345", "Hello", "a@example.com", "Monday", False, ""]])
+
+        with patch.object(connector, "_run_applescript", side_effect=slow_script) as mock_run:
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                futures = [
+                    pool.submit(connector.search_messages, "Gmail", sender_contains="a@")
+                    for _ in range(3)
+                ]
+                deadline = time.monotonic() + 5
+                while (
+                    connector.single_flight.stats()["coalesced"] < 2 and time.monotonic() < deadline
+                ):
+                    time.sleep(0.005)
+                release.set()
+                results = [future.result(timeout=5) for future in futures]
+
+        assert mock_run.call_count == 1
+        assert all(result == results[0] for result in results)
+        assert results[0][0]["id"] == "12345"
+
+    def test_different_searches_are_not_coalesced(self) -> None:
+        connector = AppleMailConnector()
+        connector.planner.record_size("Gmail", "INBOX", 100)
+
+        with patch.object(connector, "_run_applescript", return_value="") as mock_run:
+            connector.search_messages("Gmail", sender_contains="a@")
+            connector.search_messages("Gmail", subject_contains="a@")
+
+        assert mock_run.call_count == 2
+
+    def test_list_accounts_is_coalesced(self) -> None:
+        connector = AppleMailConnector()
+        release = threading.Event()
+
+        def slow_script(*args, **kwargs) -> str:
+            release.wait(5)
+            return encode_records([["Gmail", "user@gmail.com"]])
+
+        with patch.object(connector, "_run_applescript", side_effect=slow_script) as mock_run:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = [pool.submit(connector.list_accounts) for _ in range(2)]
+                deadline = time.monotonic() + 5
+                while (
+                    connector.single_flight.stats()["coalesced"] < 1 and time.monotonic() < deadline
+                ):
+                    time.sleep(0.005)
+                release.set()
+                results = [future.result(timeout=5) for future in futures]
+
+        assert mock_run.call_count == 1
+        assert results == [[{"name": "Gmail", "email": "user@gmail.com"}]] * 2
@@ -0,0 +1,197 @@
+"""Unit tests for precompiled script templates."""
+
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apple_mail_mcp import templates
+from apple_mail_mcp.exceptions import MailAppleScriptError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.templates import CompiledScriptCache, script_digest
+from apple_mail_mcp.wire import FIELD_SEP
+
+STUB_RUNNER = [sys.executable, str(Path(__file__).parent / "stub_runner.py")]
+
+
+def fake_osacompile(command: list[str], **kwargs: Any) -> MagicMock:
+    """Pretend to be osacompile: write the source to the -o path."""
+    output = Path(command[command.index("-o") + 1])
+    output.write_text(kwargs["input"])
+    return MagicMock(returncode=0, stdout="", stderr="")
+
+
+class TestCompiledScriptCache:
+    """Tests for CompiledScriptCache."""
+
+    @pytest.fixture
+    def cache(self, tmp_path: Path) -> CompiledScriptCache:
+        """Create a cache in a temporary directory."""
+        return CompiledScriptCache(cache_dir=tmp_path / "scripts")
+
+    def test_digest_is_content_hash(self) -> None:
+        """Test that digests depend only on content."""
+        assert script_digest("a") == script_digest("a")
+        assert script_digest("a") != script_digest("b")
+
+    @patch("subprocess.run", side_effect=fake_osacompile)
+    def test_compiles_once(self, mock_run: MagicMock, cache: CompiledScriptCache) -> None:
+        """Test that a template is compiled on first use only."""
+        first = cache.path_for(templates.LIST_ACCOUNTS)
+        second = cache.path_for(templates.LIST_ACCOUNTS)
+
+        assert first == second
+        assert first.name == f"{script_digest(templates.LIST_ACCOUNTS)}.scpt"
+        assert first.read_text() == templates.LIST_ACCOUNTS
+        assert mock_run.call_count == 1
+
+    @patch("subprocess.run", side_effect=fake_osacompile)
+    def test_reuses_disk_cache(self, mock_run: MagicMock, tmp_path: Path) -> None:
+        """Test that a new cache instance reuses compiled files on disk."""
+        CompiledScriptCache(cache_dir=tmp_path).path_for(templates.MARK_AS_READ)
+        CompiledScriptCache(cache_dir=tmp_path).path_for(templates.MARK_AS_READ)
+
+        assert mock_run.call_count == 1
+
+    @patch("subprocess.run", side_effect=fake_osacompile)
+    def test_compiles_javascript(self, mock_run: MagicMock, cache: CompiledScriptCache) -> None:
+        """Test that the source language is passed to osacompile."""
+        cache.path_for("function run(argv) { return 1; }", language="JavaScript")
+
+        command = mock_run.call_args[0][0]
+        assert command[command.index("-l") + 1] == "JavaScript"
+
+    @patch("subprocess.run")
+    def test_compile_error(self, mock_run: MagicMock, cache: CompiledScriptCache) -> None:
+        """Test that compile errors raise MailAppleScriptError."""
+        mock_run.return_value = MagicMock(returncode=1, stdout="", stderr="syntax error")
+
+        with pytest.raises(MailAppleScriptError, match="compilation failed"):
+            cache.path_for("on run argv\n  bogus\nend run")
+
+        assert not list(cache.cache_dir.glob("*.scpt"))
+
+    @patch("subprocess.run")
+    def test_compile_timeout(self, mock_run: MagicMock, cache: CompiledScriptCache) -> None:
+        """Test compile timeout handling."""
+        mock_run.side_effect = subprocess.TimeoutExpired("osacompile", 60)
+
+        with pytest.raises(MailAppleScriptError, match="timeout"):
+            cache.path_for(templates.LIST_ACCOUNTS)
+
+
+class TestTemplateExecution:
+    """Tests for running templates through the connector."""
+
+    @patch("subprocess.run")
+    def test_run_template_passes_argv(self, mock_run: MagicMock, tmp_path: Path) -> None:
+        """Test that templates run from the compiled file with argv."""
+        cache = MagicMock()
+        cache.path_for.return_value = tmp_path / "compiled.scpt"
+        connector = AppleMailConnector(script_cache=cache)
+        mock_run.return_value = MagicMock(returncode=0, stdout="2\n", stderr="")
+
+        result = connector._run_applescript(templates.MARK_AS_READ, ["true", "1", "2"])
+
+        assert result == "2"
+        command = mock_run.call_args[0][0]
+        assert command == ["/usr/bin/osascript", str(tmp_path / "compiled.scpt"), "true", "1", "2"]
+        assert mock_run.call_args[1]["input"] is None
+
+    def test_search_template_variants(self) -> None:
+        """Test that filter values never appear in search templates."""
+        plain = templates.search_messages_script()
+        filtered = templates.search_messages_script(sender=True, read_status=True)
+
+        assert "whose" not in plain
+        assert "subject of messages 1 thru msgCount of mailboxRef" in (
+            templates.search_messages_script(limited=True)
+        )
+        assert "whose sender contains senderFilter and read status is readFilter" in filtered
+        assert templates.search_messages_script(sender=True) == templates.search_messages_script(
+            sender=True
+        )
+
+    def test_search_template_date_windows(self) -> None:
+        """Test that date windows become index ranges found by binary search."""
+        window = templates.search_messages_script(limited=True, received_before=True)
+        filtered = templates.search_messages_script(read_status=True, received_after=True)
+        page = templates.search_page_script(subject=True, received_after=True)
+
+        assert "set beforeDate to my keyDate(item 9 of argv, item 10 of argv)" in window
+        assert "set firstIndex to my firstOlder(mailboxRef, beforeDate, msgCount)" in window
+        assert "whose" not in window
+        # With other filters, the window's bounds join the whose clause
+        assert "whose read status is readFilter and date received >= afterDate" in filtered
+        assert "on keyDate(keyDays, keySeconds)" in filtered
+        assert "date received >= afterDate" in page
+        assert "set afterDate to my keyDate(item 11 of argv, item 12 of argv)" in page
+
+    def test_templates_key_dates(self) -> None:
+        """Test that every template returning messages adds a numeric key to its dates."""
+        listings = [
+            templates.search_messages_script(),
+            templates.search_messages_script(sender=True, limited=True),
+            templates.scan_messages_script(sender=True),
+            templates.search_page_script(),
+        ]
+
+        for script in listings:
+            assert "my wireRecord(msgReads), my wireRecord(my dateKeys(msgDates))})" in script
+            assert script.count("on dateKeys(theDates)") == 1
+        for script in (templates.ITER_MESSAGES, templates.GET_MESSAGE):
+            assert "set msgKey to my dateKey(msgReceived, my keyDate(0, 0))" in script
+            assert "on dateKey(theDate, epoch)" in script
+
+    def test_scan_template(self) -> None:
+        """Test that scans read chunks of columns and stop at the limit."""
+        plain = templates.scan_messages_script(sender=True, read_status=True)
+        hybrid = templates.scan_messages_script(subject=True, received_before=True)
+
+        assert "whose" not in plain + hybrid
+        assert (
+            "set allSenders to sender of messages chunkStart thru chunkEnd of mailboxRef" in plain
+        )
+        assert "if item i of allSenders contains senderFilter and item i of allReads" in plain
+        assert "if msgCount = maxCount then exit repeat" in plain
+        assert "firstOlder" not in plain.split("end run")[0]
+        assert "set beforeDate to my keyDate(item 10 of argv, item 11 of argv)" in hybrid
+        assert "set firstIndex to my firstOlder(mailboxRef, beforeDate, mailboxSize)" in hybrid
+
+    @pytest.mark.parametrize(
+        "action",
+        ["mark_as_read", "flag_message", "move_messages", "move_messages_gmail", "delete_messages"],
+    )
+    def test_update_matching_template_variants(self, action: str) -> None:
+        """Test that matching templates count first and have no placeholders left."""
+        script = templates.update_matching_script(action, subject=True, older_than=True)
+
+        condition = "whose subject contains subjectFilter and date received < cutoffDate"
+        assert f"set msgCount to count of (messages of mailboxRef {condition})" in script
+        assert "PARAMS" not in script and "ACTION" not in script and "TARGET" not in script
+        assert "whose" not in templates.update_matching_script(action)
+
+    @patch.object(AppleMailConnector, "_run_applescript")
+    def test_message_ids_are_not_interpolated(self, mock_run: MagicMock) -> None:
+        """Test that message IDs travel as arguments and are validated."""
+        mock_run.return_value = "1"
+        connector = AppleMailConnector()
+
+        connector.delete_messages(["12345"])
+        script, args = mock_run.call_args[0]
+        assert args == [f"{FIELD_SEP}{FIELD_SEP}12345"]
+        assert "12345" not in script
+
+        with pytest.raises(ValueError, match="Invalid message ID"):
+            connector.delete_messages(['1}\ndo shell script "rm -rf ~"\n{'])
+
+    def test_worker_receives_argv(self) -> None:
+        """Test that worker requests carry argv to the runner."""
+        connector = AppleMailConnector(use_worker=True, worker_command=STUB_RUNNER)
+        try:
+            assert connector._run_applescript("argv", ["a b", 'c"d']) == 'a b|c"d'
+        finally:
+            connector.close()
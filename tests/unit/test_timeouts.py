@@ -0,0 +1,128 @@
+"""Unit tests for adaptive script timeouts."""
+
+from unittest.mock import patch
+
+import pytest
+
+from apple_mail_mcp.async_connector import AsyncAppleMailConnector
+from apple_mail_mcp.exceptions import MailTimeoutError
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.timeouts import AdaptiveTimeouts, TimeoutPolicy
+
+
+class TestAdaptiveTimeouts:
+    """Tests for AdaptiveTimeouts."""
+
+    def test_default_is_capped_at_ceiling(self) -> None:
+        timeouts = AdaptiveTimeouts(default=60)
+
+        assert timeouts.timeout_for("list_accounts") == 30
+        assert timeouts.timeout_for("search_messages") == 60
+        assert timeouts.timeout_for("batch") == 60
+
+    def test_adapts_to_percentile_latency(self) -> None:
+        timeouts = AdaptiveTimeouts(default=60, min_samples=10)
+        for _ in range(99):
+            timeouts.record("search_messages", 2.0)
+        timeouts.record("search_messages", 20.0)
+
+        assert timeouts.timeout_for("search_messages") == pytest.approx(60.0)
+
+    def test_clamped_to_floor_and_ceiling(self) -> None:
+        timeouts = AdaptiveTimeouts(
+            default=60,
+            min_samples=1,
+            policies={"get_message": TimeoutPolicy(floor=2, ceiling=10)},
+        )
+        timeouts.record("get_message", 0.1)
+        assert timeouts.timeout_for("get_message") == 2
+
+        for _ in range(10):
+            timeouts.record("get_message", 30.0)
+        assert timeouts.timeout_for("get_message") == 10
+
+    def test_unknown_operation_uses_interactive_policy(self) -> None:
+        timeouts = AdaptiveTimeouts(default=60)
+
+        assert timeouts.timeout_for(None) == 30
+
+    def test_override(self) -> None:
+        timeouts = AdaptiveTimeouts(default=60)
+
+        with AdaptiveTimeouts.override(300):
+            assert timeouts.timeout_for("list_accounts") == 300
+            with AdaptiveTimeouts.override(None):
+                assert timeouts.timeout_for("list_accounts") == 300
+        assert timeouts.timeout_for("list_accounts") == 30
+
+    def test_timeout_events(self) -> None:
+        timeouts = AdaptiveTimeouts(default=60, min_samples=1)
+
+        timeouts.record_timeout("move_messages", 45.0, input_size=120)
+        stats = timeouts.stats()
+
+        assert stats["recent_timeouts"][0]["operation"] == "move_messages"
+        assert stats["recent_timeouts"][0]["input_size"] == 120
+        operation = stats["operations"]["move_messages"]
+        assert operation["timeouts"] == 1
+        # The timed-out run counts as a (lower bound) sample
+        assert operation["p99"] == 45.0
+        assert operation["timeout"] == 120
+
+
+class TestConnectorTimeouts:
+    """Tests for adaptive timeouts in AppleMailConnector."""
+
+    @pytest.fixture
+    def connector(self) -> AppleMailConnector:
+        """Create a connector instance."""
+        return AppleMailConnector(timeout=60)
+
+    def test_script_gets_operation_timeout(self, connector: AppleMailConnector) -> None:
+        with patch.object(connector, "_execute", return_value="") as mock_execute:
+            connector._run_applescript("script", ["a"], operation="list_accounts")
+
+        assert mock_execute.call_args[0][2] == 30
+        assert connector.timeouts.stats()["operations"]["list_accounts"]["samples"] == 1
+
+    def test_timeout_is_recorded(self, connector: AppleMailConnector) -> None:
+        with patch.object(
+            connector, "_execute", side_effect=MailTimeoutError("Script execution timeout")
+        ):
+            with pytest.raises(MailTimeoutError):
+                connector._run_applescript(
+                    "script", ["true", "1", "2", "3"], operation="mark_as_read"
+                )
+
+        event = connector.timeouts.stats()["recent_timeouts"][0]
+        assert event["operation"] == "mark_as_read"
+        assert event["timeout"] == 60
+        assert event["input_size"] == 4
+
+    def test_timeout_records_message_count(self, connector: AppleMailConnector) -> None:
+        message_ids = [str(number) for number in range(1, 451)]
+        with patch.object(
+            connector, "_execute", side_effect=MailTimeoutError("Script execution timeout")
+        ) as mock_execute:
+            with pytest.raises(MailTimeoutError):
+                connector.mark_as_read(message_ids)
+
+        # Three chunks of IDs, but 450 messages
+        assert len(mock_execute.call_args[0][1]) == 4
+        assert connector.timeouts.stats()["recent_timeouts"][0]["input_size"] == 450
+
+    def test_batch_is_tracked_separately(self, connector: AppleMailConnector) -> None:
+        with patch.object(connector, "_execute", side_effect=lambda s, args, t: args[0] + "ok\n"):
+            connector.batch([{"operation": "list_accounts", "params": {}}])
+
+        assert list(connector.timeouts.stats()["operations"]) == ["batch"]
+
+    async def test_async_override(self, connector: AppleMailConnector) -> None:
+        mail = AsyncAppleMailConnector(connector)
+
+        with patch.object(connector, "_execute", return_value="") as mock_execute:
+            await mail.with_timeout(300).list_accounts()
+            await mail.list_mailboxes("Gmail")
+
+        assert [call[0][2] for call in mock_execute.call_args_list] == [300, 30]
+        assert mail.with_timeout(None) is mail
@@ -1,14 +1,19 @@
 """Unit tests for utility functions."""
 
+from datetime import datetime, timezone
+
 import pytest
 
 from apple_mail_mcp.utils import (
     escape_applescript_string,
     format_applescript_list,
+    local_days_seconds,
     parse_applescript_list,
     parse_date_filter,
+    parse_received_date,
     sanitize_input,
     validate_email,
+    validate_message_id,
 )
 
 
@@ -92,6 +97,42 @@ class TestParseDateFilter:
         assert result == 'date "2024-01-15"'
 
 
+class TestParseReceivedDate:
+    """Tests for parse_received_date."""
+
+    NOW = datetime(2025, 3, 31, 15, 30)
+
+    @pytest.mark.parametrize(
+        ("text", "expected"),
+        [
+            ("7 days ago", datetime(2025, 3, 24, 15, 30)),
+            ("2 weeks ago", datetime(2025, 3, 17, 15, 30)),
+            ("last week", datetime(2025, 3, 24, 15, 30)),
+            ("1 month ago", datetime(2025, 2, 28, 15, 30)),
+            ("last year", datetime(2024, 3, 31, 15, 30)),
+            ("Today", datetime(2025, 3, 31)),
+            ("yesterday", datetime(2025, 3, 30)),
+            ("2024-01-15", datetime(2024, 1, 15)),
+            ("2024-01-15T09:30", datetime(2024, 1, 15, 9, 30)),
+        ],
+    )
+    def test_forms(self, text: str, expected: datetime) -> None:
+        assert parse_received_date(text, now=self.NOW) == expected
+
+    def test_aware_time_becomes_local(self) -> None:
+        moment = datetime(2024, 1, 15, 9, 30, tzinfo=timezone.utc)
+
+        assert parse_received_date(moment.isoformat()) == moment.astimezone().replace(tzinfo=None)
+
+    @pytest.mark.parametrize("text", ["soon", "last fortnight", 'date "x" & (do shell script)'])
+    def test_rejects_other_text(self, text: str) -> None:
+        with pytest.raises(ValueError):
+            parse_received_date(text)
+
+    def test_local_days_seconds(self) -> None:
+        assert local_days_seconds(datetime(2025, 1, 6, 9, 30)) == (20094, 34200)
+
+
 class TestValidateEmail:
     """Tests for validate_email."""
 
@@ -107,6 +148,20 @@ class TestValidateEmail:
         assert validate_email("user example.com") is False
 
 
+class TestValidateMessageId:
+    """Tests for validate_message_id."""
+
+    def test_valid_ids(self) -> None:
+        assert validate_message_id("12345") is True
+        assert validate_message_id("1") is True
+
+    def test_invalid_ids(self) -> None:
+        assert validate_message_id("") is False
+        assert validate_message_id("12a") is False
+        assert validate_message_id("1, 2") is False
+        assert validate_message_id('1} & (do shell script "id")') is False
+
+
 class TestSanitizeInput:
     """Tests for sanitize_input."""
 
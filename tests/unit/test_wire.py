@@ -0,0 +1,153 @@
+"""Unit tests for the script output record encoding."""
+
+from datetime import datetime
+
+import pytest
+
+from apple_mail_mcp import templates, wire
+from apple_mail_mcp.exceptions import MailAppleScriptError
+from apple_mail_mcp.wire import (
+    ESCAPE,
+    FIELD_SEP,
+    RECORD_SEP,
+    RecordSchema,
+    encode_columns,
+    encode_records,
+    escape,
+    unescape,
+)
+
+ADVERSARIAL_SUBJECTS = [
+    "Re: a|b|c",
+    "Line one\nLine two",
+    "Tabs\tand\r\ncarriage returns",
+    f"Unit{FIELD_SEP}separator",
+    f"Record{RECORD_SEP}separator",
+    f"Escape{ESCAPE}character",
+    f"{ESCAPE}e{ESCAPE}f{ESCAPE}r",
+    f"{ESCAPE}",
+    "",
+    "   padded   ",
+    "Ünïcödé 📧 subject",
+]
+
+
+class TestEscaping:
+    """Tests for field escaping."""
+
+    @pytest.mark.parametrize("value", ADVERSARIAL_SUBJECTS)
+    def test_round_trip(self, value: str) -> None:
+        escaped = escape(value)
+
+        assert FIELD_SEP not in escaped
+        assert RECORD_SEP not in escaped
+        assert unescape(escaped) == value
+
+    def test_plain_text_is_unchanged(self) -> None:
+        assert escape("Hello | world\n") == "Hello | world\n"
+
+
+class TestRecordSchema:
+    """Tests for parsing encoded output."""
+
+    def test_empty_output(self) -> None:
+        assert wire.MESSAGE_SUMMARY.parse("") == []
+
+    def test_typed_fields(self) -> None:
+        output = encode_records([["report.pdf", "application/pdf", 524288, True]])
+
+        assert wire.ATTACHMENT.parse(output) == [
+            {
+                "name": "report.pdf",
+                "mime_type": "application/pdf",
+                "size": 524288,
+                "downloaded": True,
+            }
+        ]
+
+    def test_adversarial_subjects_survive(self) -> None:
+        rows = [
+            [str(index), subject, f"sender{index}@example.com", "Monday", index % 2 == 0, ""]
+            for index, subject in enumerate(ADVERSARIAL_SUBJECTS)
+        ]
+
+        records = wire.MESSAGE_SUMMARY.parse(encode_records(rows))
+
+        assert [record["subject"] for record in records] == ADVERSARIAL_SUBJECTS
+        assert [record["read_status"] for record in records] == [row[4] for row in rows]
+
+    def test_content_with_separators_in_last_field(self) -> None:
+        content = "Body with | pipes\nand lines\n\n-- \nSignature\n"
+        output = encode_records([["1", "S", "s", "d", True, False, content, ""]])
+
+        message = wire.MESSAGE.parse_one(output)
+
+        assert message is not None
+        assert message["content"] == content
+        assert message["flagged"] is False
+
+    def test_date_keys(self) -> None:
+        """Dates are keyed by local days and seconds, whatever the date text's locale."""
+        output = encode_records(
+            [["1", "S", "s", "lundi 6 janvier 2025 à 21:15:00", True, "20094:76500"]]
+        )
+
+        message = wire.MESSAGE_SUMMARY.parse_one(output)
+
+        assert message is not None
+        assert message["timestamp"] == int(datetime(2025, 1, 6, 21, 15).timestamp())
+        assert wire.as_timestamp("-1:86399") == int(datetime(1969, 12, 31, 23, 59, 59).timestamp())
+        assert wire.as_timestamp("") is None
+
+    def test_wrong_field_count_raises(self) -> None:
+        schema = RecordSchema(("a", str), ("b", str))
+
+        with pytest.raises(MailAppleScriptError, match="expected 2 fields, got 3"):
+            schema.parse(f"x{FIELD_SEP}y{FIELD_SEP}z")
+
+    def test_parse_one_empty(self) -> None:
+        assert wire.MESSAGE.parse_one("") is None
+
+    def test_columns_round_trip(self) -> None:
+        rows = [
+            [str(index), subject, f"sender{index}@example.com", "Monday", index % 2 == 0, ""]
+            for index, subject in enumerate(ADVERSARIAL_SUBJECTS)
+        ]
+
+        records = wire.MESSAGE_SUMMARY.parse_columns(encode_columns(rows))
+
+        assert [record["subject"] for record in records] == ADVERSARIAL_SUBJECTS
+        assert [record["read_status"] for record in records] == [row[4] for row in rows]
+        assert wire.MESSAGE_SUMMARY.parse_columns(encode_columns([])) == []
+
+    def test_column_length_mismatch_raises(self) -> None:
+        schema = RecordSchema(("a", str), ("b", str))
+        output = RECORD_SEP.join(["2", f"x{FIELD_SEP}y", "z"])
+
+        with pytest.raises(MailAppleScriptError, match="expected 2 values of b, got 1"):
+            schema.parse_columns(output)
+
+    def test_missing_column_raises(self) -> None:
+        schema = RecordSchema(("a", str), ("b", str))
+
+        with pytest.raises(MailAppleScriptError, match="a count and 2 columns"):
+            schema.parse_columns(encode_records([["x", "y"]]))
+
+
+class TestWireHandlers:
+    """Tests for the AppleScript side of the encoding."""
+
+    @pytest.mark.parametrize(
+        "template",
+        [templates.LIST_ACCOUNTS, templates.GET_MESSAGE, templates.GET_ATTACHMENTS],
+    )
+    def test_row_templates_use_wire_handlers(self, template: str) -> None:
+        assert "my wireRecord(" in template
+        assert template.count("on wireRecord(fields)") == 1
+        assert '"|"' not in template
+
+    def test_search_templates_use_wire_handlers(self) -> None:
+        script = templates.search_messages_script(sender=True, limited=True)
+
+        assert "my wireRecord(msgSubjects)" in script
+        assert "my wireJoin({msgCount as text" in script
@@ -0,0 +1,116 @@
+"""Unit tests for the persistent AppleScript worker."""
+
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from apple_mail_mcp.exceptions import (
+    MailAccountNotFoundError,
+    MailAppleScriptError,
+)
+from apple_mail_mcp.mail_connector import AppleMailConnector
+from apple_mail_mcp.worker import (
+    AppleScriptWorker,
+    ScriptFailedError,
+    WorkerCrashedError,
+)
+
+STUB_RUNNER = [sys.executable, str(Path(__file__).parent / "stub_runner.py")]
+
+
+class TestAppleScriptWorker:
+    """Tests for AppleScriptWorker against the stub runner."""
+
+    @pytest.fixture
+    def worker(self) -> Iterator[AppleScriptWorker]:
+        """Create a worker running the stub runner."""
+        worker = AppleScriptWorker(command=STUB_RUNNER, timeout=10)
+        yield worker
+        worker.stop()
+
+    def test_run_returns_output(self, worker: AppleScriptWorker) -> None:
+        """Test a successful request."""
+        assert worker.run("echo hello world") == "hello world"
+
+    def test_run_preserves_unicode_and_newlines(self, worker: AppleScriptWorker) -> None:
+        """Test that frames carry arbitrary text intact."""
+        assert worker.run("echo Grüße\nline 2 | ✓") == "Grüße\nline 2 | ✓"
+
+    def test_process_is_reused(self, worker: AppleScriptWorker) -> None:
+        """Test that consecutive requests share one runner process."""
+        first = worker.run("pid")
+        second = worker.run("pid")
+        assert first == second
+        assert worker.restarts == 0
+
+    def test_script_error(self, worker: AppleScriptWorker) -> None:
+        """Test that script errors carry message and number."""
+        with pytest.raises(ScriptFailedError) as exc_info:
+            worker.run('fail Can\'t get account "Nope"')
+
+        assert "Can't get account" in str(exc_info.value)
+        assert exc_info.value.number == -1728
+
+    def test_ping(self, worker: AppleScriptWorker) -> None:
+        """Test health check."""
+        assert worker.ping() is True
+        assert worker.is_alive()
+
+    def test_restart_after_crash(self, worker: AppleScriptWorker) -> None:
+        """Test that a crashed runner fails the request and is restarted."""
+        pid = worker.run("pid")
+
+        with pytest.raises(WorkerCrashedError):
+            worker.run("crash")
+
+        assert worker.run("pid") != pid
+        assert worker.restarts == 1
+
+    def test_timeout_kills_runner(self, worker: AppleScriptWorker) -> None:
+        """Test per-request timeout."""
+        pid = worker.run("pid")
+
+        with pytest.raises(MailAppleScriptError, match="timeout"):
+            worker.run("sleep 5", timeout=0.2)
+
+        assert worker.run("pid") != pid
+
+    def test_health_check_before_idle_request(self) -> None:
+        """Test that an idle runner is pinged before the next request."""
+        worker = AppleScriptWorker(command=STUB_RUNNER, health_check_interval=0)
+        try:
+            assert worker.run("echo one") == "one"
+            assert worker.run("echo two") == "two"
+        finally:
+            worker.stop()
+
+
+class TestConnectorWorkerMode:
+    """Tests for AppleMailConnector in worker mode."""
+
+    @pytest.fixture
+    def connector(self) -> Iterator[AppleMailConnector]:
+        """Create a connector using the stub runner."""
+        connector = AppleMailConnector(timeout=10, use_worker=True, worker_command=STUB_RUNNER)
+        yield connector
+        connector.close()
+
+    def test_default_mode_has_no_worker(self) -> None:
+        """Test that worker mode is opt-in."""
+        assert AppleMailConnector().worker is None
+
+    def test_run_applescript_uses_worker(self, connector: AppleMailConnector) -> None:
+        """Test that scripts are routed through the runner."""
+        assert connector._run_applescript("echo result\n") == "result"
+
+    def test_error_mapping(self, connector: AppleMailConnector) -> None:
+        """Test that runner errors map to connector exceptions."""
+        with pytest.raises(MailAccountNotFoundError):
+            connector._run_applescript('fail Can\'t get account "Nope"')
+
+    def test_generic_error(self, connector: AppleMailConnector) -> None:
+        """Test that unknown errors map to MailAppleScriptError."""
+        with pytest.raises(MailAppleScriptError, match="Unknown command"):
+            connector._run_applescript("bogus")